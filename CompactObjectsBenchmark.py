@@ -0,0 +1,69 @@
+from ElsevierAPI.ResnetAPI.ResnetGraph import ResnetGraph
+from ElsevierAPI.ResnetAPI.CompactObjects import CompactPSObject,CompactPSRelation
+import os,gc,time,argparse,textwrap,tracemalloc
+
+SAMPLE_CACHE = os.path.join(os.path.dirname(__file__),'ElsevierAPI/ResnetAPI/__pscache__/protein_expression_network.rnef')
+
+
+def measure(build):
+  '''
+  output:
+    object returned by build(), bytes allocated by build() and still held by returned object, build time
+  '''
+  gc.collect()
+  tracemalloc.start()
+  start = time.time()
+  obj = build()
+  build_time = time.time()-start
+  gc.collect()
+  allocated = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  return obj, allocated, build_time
+
+
+def read_psobjects(rnef_file:str):
+  nodes = dict()
+  rels = dict()
+  for section_nodes, section_rels in ResnetGraph.read_rnef(rnef_file,no_mess=True):
+    nodes.update({n.uid():n for n in section_nodes})
+    rels.update({r.urn():r for r in section_rels})
+  return nodes, rels
+
+
+def compact(model):
+  nodes, rels = model
+  uid2node = {uid:CompactPSObject(n) for uid,n in nodes.items()}
+  urn2rel = {urn:CompactPSRelation.from_psrelation(r,uid2node) for urn,r in rels.items()}
+  return uid2node, urn2rel
+
+
+def access_time(model)->float:
+  nodes, rels = model
+  start = time.time()
+  for n in nodes.values():
+    n.urn(),n.name(),n.objtype(),n.uid(),n.get_prop('Alias')
+  for r in rels.values():
+    r.urn(),r.objtype(),r.effect(),r.get_prop('Mechanism')
+  return time.time()-start
+
+
+if __name__ == "__main__":
+  instructions = '''
+    infile - RNEF file with sample cache. Default: ResnetAPI/__pscache__/protein_expression_network.rnef
+    Script compares memory held by PSObject/PSRelation and CompactPSObject/CompactPSRelation models of the same graph
+    '''
+  parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,epilog=textwrap.dedent(instructions))
+  parser.add_argument('-i', '--infile', type=str, default=SAMPLE_CACHE)
+  args = parser.parse_args()
+
+  ps_model, ps_bytes, ps_time = measure(lambda: read_psobjects(args.infile))
+  compact_model, compact_bytes, compact_time = measure(lambda: compact(read_psobjects(args.infile)))
+  node_count, rel_count = len(ps_model[0]), len(ps_model[1])
+
+  print(f'Sample cache "{os.path.basename(args.infile)}": {node_count} nodes, {rel_count} relations')
+  print(f'{"model":<25}{"MB":>10}{"bytes/object":>15}{"build sec":>12}{"access sec":>12}')
+  for model_name, model, allocated, build_time in [('PSObject/PSRelation',ps_model,ps_bytes,ps_time),
+                                                  ('Compact',compact_model,compact_bytes,compact_time)]:
+    per_object = allocated/max(node_count+rel_count,1)
+    print(f'{model_name:<25}{allocated/1024**2:>10.2f}{per_object:>15.0f}{build_time:>12.2f}{access_time(model):>12.3f}')
+  print(f'Compact model uses {compact_bytes/max(ps_bytes,1):.1%} of PSObject/PSRelation memory')
@@ -4,11 +4,13 @@ from ..NCBI.pubmed import medlineTA2issn
 from ..NCBI.PMC import docid2pmid
 from ..SBS_API.sbs import SBSapi
 from .etm import ETMsearch
+from ..bulksearch import BulkSearch
 from ..ScopusAPI.scopus import Scopus,AuthorSearch
 from .references import Reference,DocMine,pubmed_hyperlink,make_hyperlink,pmc_hyperlink,pii_hyperlink,doi_hyperlink
 from ..ScopusAPI.scopus import SCOPUS_AUTHORIDS,SCOPUS_CITESCORE,SCOPUS_SJR,SCOPUS_SNIP
-from .references import AUTHORS,INSTITUTIONS,JOURNAL,PUBYEAR,RELEVANCE,ETM_CITATION_INDEX,IN_OPENACCESS,PUBLISHER,GRANT_APPLICATION
-import math,time,json,os,zipfile
+from ..ScopusAPI.ScopusStore import normalize_id
+from .references import AUTHORS,INSTITUTIONS,JOURNAL,PUBYEAR,RELEVANCE,ETM_CITATION_INDEX,IN_OPENACCESS,PUBLISHER,GRANT_APPLICATION,SCOPUS_CI
+import math,time,json,os,zipfile,requests,threading
 from datetime import datetime,date
 from concurrent.futures import ThreadPoolExecutor
 from urllib.error import HTTPError
@@ -59,8 +61,11 @@ class RefStats:
       return set([x[0] for x in self.ref_counter.values()])
 
 
-  def _add2counter(self, ref:DocMine):
+  def _add2counter(self, ref:DocMine, relevance:float|None=None):
     '''
+    input:
+      relevance - relevance of ref in search results, defaults to ref.relevance().
+      Must be specified for refs shared by several searches because their RELEVANCE is accumulated by this function
     updates:
       self.ref_counter - {str(id_type+':'+identifier):(ref,count)}
       ref[RELEVANCE] with ref.relevance()
@@ -72,7 +77,7 @@ class RefStats:
     if counter_key in self.ref_counter:
       count_exist = self.ref_counter[counter_key][1]
       self.ref_counter[counter_key] = (ref, count_exist+1)
-      self.ref_counter[counter_key][0][RELEVANCE][0] += ref.relevance()
+      self.ref_counter[counter_key][0][RELEVANCE][0] += ref.relevance() if relevance is None else relevance
     else:
       self.ref_counter[counter_key] = (ref,1)
 
@@ -200,8 +205,17 @@ class RefStats:
       annotates _4ref with fields:
           PUBLISHER, SCOPUS_CITESCORE,SCOPUS_SJR,SCOPUS_SNIP
       '''
-      self.__normalize_journal(ref)
-      self.Scopus.scopus_stats4(ref)
+      self.get_publishers([ref])
+      return
+
+
+  def get_publishers(self,references:list[Reference]):
+      '''
+      batched version of get_publisher() for many references.\n
+      Journals are normalized before journal metrics are retrieved from Scopus in batches
+      '''
+      [self.__normalize_journal(ref) for ref in references]
+      self.Scopus.annotate_journals(references)
       return
   
 
@@ -209,8 +223,26 @@ class RefStats:
     '''
     returns citation index for ref from Scopus
     '''
-    self.Scopus.scopus_stats4(ref)
-    return ref
+    return self.citation_indexes([ref])[0]
+
+
+  def citation_indexes(self,references:list[Reference])->list[Reference]:
+    '''
+    batched version of citation_index() for many references.\n
+    Journal metrics and citation counts are retrieved in batches and kept in Scopus.store between runs
+    '''
+    self.get_publishers(references)
+    idtype2ids = defaultdict(list)
+    for ref in references:
+      id_type,identifier = ref.get_doc_id()
+      idtype2ids[id_type].append(identifier)
+    counts = self.Scopus.citation_counts(idtype2ids)
+    for ref in references:
+      id_type,identifier = ref.get_doc_id()
+      cited_by = counts.get(id_type,dict()).get(normalize_id(id_type,identifier))
+      if cited_by is not None:
+        ref[SCOPUS_CI] = [cited_by]
+    return references
 
 
   @staticmethod
@@ -273,6 +305,14 @@ class RefStats:
       return ''
 
 
+  @staticmethod
+  def refcount_column(between_column:str, and_concepts:str|list):
+      if isinstance(and_concepts,str):
+          return 'Refcount' + ' between '+between_column+' and '+and_concepts
+      else:
+          return 'Refcount' + ' between '+between_column+' and '+','.join(and_concepts)
+
+
   @staticmethod
   def doi_column(between_column:str, and_concepts:str|list):
       if isinstance(and_concepts,str):
@@ -323,7 +363,7 @@ class RefStats:
 class SBSstats(RefStats):
   def __init__(self, APIconfig, **kwargs):
       super().__init__(APIconfig, **kwargs)
-      self.SBSsearch = SBSapi(self.APIconfig)
+      self.SBSsearch = SBSapi(self.APIconfig,**kwargs)
 
 
   def reflinks(self,to_df:df,between_names_in_col:str,and_concepts:list[str],
@@ -341,7 +381,8 @@ class SBSstats(RefStats):
       name2refs = {k[:-1]:v for k,v in name2refsX.items()}
     else:
       names = [x for x in names if ':' not in x] # ':' is invalid character in URL parameter
-      name2refs = self.SBSsearch.sentcooc4list(names,and_concepts,add2query,multithread)
+      self.SBSsearch.multithread = multithread
+      name2refs = self.SBSsearch.sentcooc4list(names,and_concepts,add2query)
     
     names2hyperlinks = dict()
     for name, (search_url,count, refs) in name2refs.items():
@@ -469,54 +510,52 @@ class ETMStats(RefStats):
           copy of "to_df" with added columns. Added reference count columns are listed in self.refcols\n
           self.refcols - []\n
           self.doi_columns - []\n
+          Identical entity-concept searches from different rows are performed once by MAX_TM_SESSIONS concurrent searches.
+          Reference count column of each row is filled as soon as all searches for the row are finished
       """
       if to_df.empty: return to_df
       
-      if max_row:
-          df2annotate = df.from_pd(to_df.iloc[:max_row])
-          unannoated_rows = df.from_pd(to_df.iloc[max_row:])
-      else:
-          df2annotate = to_df.dfcopy()
-          unannoated_rows = df()
-      row_count = len(to_df)
-      
-      if row_count > 9:
-          thread_name = f'{use_query} refs 4 {len(df2annotate)} rows in {MAX_TM_SESSIONS} thrds'
-          partition_size = 100
-          with ThreadPoolExecutor(max_workers=MAX_TM_SESSIONS, thread_name_prefix=thread_name) as e:
-              futures = list()
-              for i in range(0,len(df2annotate),partition_size):
-                  df_part = df.from_pd(df2annotate.iloc[i:i+partition_size])
-                  new_session = self.clone() # need to clone here to avoid self.ref_counter mutation
-                  futures.append(e.submit(new_session.__add_refs1,df_part,between_names_in_col,and_concepts,use_query,add2query))
-
-              dfs2concat = list()
-              for f in futures: # cannot use as_completed here to ensure the same order for concatenation
-                  session_df, session_refcounter = f.result()
-                  dfs2concat.append(session_df)
-                  [self._add2counter(t[0]) for t in session_refcounter.values()] # combine references from all futures
-              
-              dfs2concat.append(unannoated_rows)
-              annotated_df = df.concat_df(dfs2concat,to_df._name_)
-      else:
-          annotated_df = self. __add_refs1(to_df,between_names_in_col,and_concepts,use_query,add2query)[0]
-
-      return annotated_df
-  
-  def __add_refs1(self,to_df:df,between_names_in_col:str,and_concepts:list,use_query,add2query=[]):
-      '''
-          applies search results and creates self.refcount_column and self.doi_columns
-      '''
-      my_df = to_df.dfcopy()
+      start_time = time.time()
+      annotated_df = to_df.dfcopy()
       refcountcol = self.refcount_column(between_names_in_col,and_concepts)
       doi_ref_column_name = self.doi_column(between_names_in_col,and_concepts)
-      my_df[[refcountcol,doi_ref_column_name]] = my_df[between_names_in_col].apply(lambda row: self.__get_refs(row,and_concepts,use_query,add2query)).apply(pd.Series)
-      return my_df,self.ref_counter # need to return self.ref_counter to concatenate ref_counters after cloning
+      annotated_df[refcountcol] = ''
+      annotated_df[doi_ref_column_name] = ''
+      self.refcols.add(refcountcol)
+      self.doi_columns.add(doi_ref_column_name)
+      refcount_pos = annotated_df.columns.get_loc(refcountcol)
+
+      names = annotated_df[between_names_in_col].to_list()
+      if max_row: names = names[:max_row]
+      row2queries = {pos:[(name,c) for c in and_concepts if c != name] for pos,name in enumerate(names)}
+
+      etm_sessions = threading.local() # ETMsearch.params are mutated by every search
+      def search(query:tuple[str,str]):
+          if not hasattr(etm_sessions,'etm'):
+              etm_sessions.etm = self.ETMsearch.clone()
+          hit_count,_,refs = self.dispatch2TMsoft(use_query,*query,add2query,etm_sessions.etm)
+          return hit_count, {ref:ref.relevance() for ref in refs} # refs are shared by rows with identical queries
+
+      def add_refs(pos:int,results:list):
+          ref2relevance = dict()
+          total_hits = 0
+          for hit_count,refs in filter(None,results):
+              total_hits += hit_count
+              ref2relevance.update({r:rel for r,rel in refs.items() if r not in ref2relevance})
+          [self._add2counter(ref,relevance) for ref,relevance in ref2relevance.items()]
+          annotated_df.iat[pos,refcount_pos] = self._2hyperlink(list(ref2relevance),total_hits)
+
+      searched = BulkSearch(search,MAX_TM_SESSIONS,use_query).run(row2queries,add_refs)
+      print(f'Annotated {len(row2queries)} rows from {to_df._name_} with {searched} unique {use_query} searches in {execution_time(start_time)}')
+      return annotated_df
+  
 
-  def dispatch2TMsoft(self,search_name:str,for_entity:str,concept:str,add2query:list)->tuple[int,dict[str,list],list[Reference]]:
+  def dispatch2TMsoft(self,search_name:str,for_entity:str,concept:str,add2query:list,
+                      etm:ETMsearch|None=None)->tuple[int,dict[str,list],list[Reference]]:
       '''
       input:
           search_name in ['ETMbasicSearch','ETMadvancedSearch','ETMrel','SBSsearch']
+          etm - ETMsearch used instead of self.ETMsearch by concurrent searches
       output tuple:
           [0] hit_count - TOTAL number of reference found by ETM basic search 
           [1] ref_ids = {id_type:[identifiers]}, where len(ref_ids) == ETMsearch.params['limit']\n
@@ -524,13 +563,14 @@ class ETMStats(RefStats):
           [2] references = [ref] list of Reference objects sorted by ETM relevance. len(references) == ETMsearch.params['limit'] 
           Relevance score is stored in ref['Relevance'] for every reference
       ''' 
+      if etm is None: etm = self.ETMsearch
       if search_name == 'ETMbasicSearch':
           search4concepts = [for_entity,concept]+add2query
-          return self.ETMsearch.basic_search(search4concepts)
+          return etm.basic_search(search4concepts)
       elif search_name == 'ETMadvancedSearch':
-          return self.ETMsearch.advanced_query(for_entity,concept,add2query)
+          return etm.advanced_query(for_entity,concept,add2query)
       elif search_name == 'ETMrel':
-          return self.ETMsearch.advanced_query_rel(for_entity,concept,add2query)
+          return etm.advanced_query_rel(for_entity,concept,add2query)
       else:
           return None
   
@@ -553,7 +593,7 @@ class ETMStats(RefStats):
 
     [self._add2counter(ref) for ref in references]
     if getScopusInfo:
-      [self.Scopus.scopus_stats4(ref) for ref in references]
+      self.citation_indexes(list(references))
 
     return references, total_hits
   
@@ -585,7 +625,7 @@ class ETMcache (RefStats):
         try:
             self.articles, self.hit_count = self.ETMsearch._get_articles()
             self.can_connect2server = True
-        except HTTPError as er:
+        except (HTTPError,requests.HTTPError) as er:
             print(er)
             print(f'Cannot connect to {APIconfig["ETMURL"]}.  Will use only cache files')
             self.can_connect2server = False
@@ -713,21 +753,22 @@ class ETMcache (RefStats):
             doi2oa = dict()
 
         print(f'Reannotating articles from "{self.search_name}" query with Scopus data')
+        published_refs = list()
         for i,article in enumerate(self.articles):
             etm_ref = ETMsearch.article2ref(article)
             if etm_ref: # etm_ref can be empty if it is conference proceedings
             # scopus_authors = self.AuthorSearch.get_authors(etm_ref)
                 if etm_ref.journal() != GRANT_APPLICATION:
-                    with ThreadPoolExecutor(max_workers=3, thread_name_prefix='Scopus annotation') as e:
-                        #e.submit(self.AuthorSearch.normalize_institution,etm_ref)
-                        e.submit(set_oa_status,etm_ref)
-                        e.submit(self.get_publisher,etm_ref)
-                    e.shutdown()
+                    #self.AuthorSearch.normalize_institution(etm_ref)
+                    set_oa_status(etm_ref)
+                    published_refs.append(etm_ref)
 
                 relevance_score = float(article['score'])
                 etm_ref[RELEVANCE] = [relevance_score]
                 self._add2counter(etm_ref)
 
+        # journal metrics and citation counts are retrieved in batches for all articles
+        self.citation_indexes(published_refs)
         self.AuthorSearch.close()
         self.Scopus.close()
         with open(do12oa_dump, 'w',encoding='utf-8') as f:
@@ -806,13 +847,14 @@ class ETMcache (RefStats):
                       aff_stats = self.count_affiliations(_4affiliations)
                       stat_df = stat_df.merge_dict(aff_stats,'Affiliation count',JOURNAL)
                   
-                  citescore_dict = {v[0]:v[2] for k,v in self.AuthorSearch.JournalInfo.items()}
+                  journal_info = self.AuthorSearch.store.journals()
+                  citescore_dict = {v[0]:v[2] for k,v in journal_info.items()}
                   stat_df = stat_df.merge_dict(citescore_dict,SCOPUS_CITESCORE,JOURNAL)
-                  sjr_dict = {v[0]:v[3] for k,v in self.AuthorSearch.JournalInfo.items()}
+                  sjr_dict = {v[0]:v[3] for k,v in journal_info.items()}
                   stat_df = stat_df.merge_dict(sjr_dict,SCOPUS_SJR,JOURNAL)
-                  csnip_dict = {v[0]:v[4] for k,v in self.AuthorSearch.JournalInfo.items()}
+                  csnip_dict = {v[0]:v[4] for k,v in journal_info.items()}
                   stat_df = stat_df.merge_dict(csnip_dict,SCOPUS_SNIP,JOURNAL)
-                  publ_dict = {v[0]:v[1] for k,v in self.AuthorSearch.JournalInfo.items()}
+                  publ_dict = {v[0]:v[1] for k,v in journal_info.items()}
                   stat_df = stat_df.merge_dict(publ_dict,PUBLISHER,JOURNAL)
               stat_df.df2excel(writer,p)
           except KeyError: continue
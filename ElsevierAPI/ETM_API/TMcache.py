@@ -0,0 +1,135 @@
+import os,json,zlib,hashlib
+from ..sqlitestore import ResultCache,SharedStores
+from collections import defaultdict
+from .references import Reference,Author
+
+TM_CACHE = os.path.join(os.getcwd(),'ENTELLECT_API/ElsevierAPI/ETM_API','__etmcache__','tm_cache.sqlite')
+TM_CACHE_TTL = 30*24*3600 # seconds
+TM_CACHE_SIZE = 1024*1024*1024 # bytes of compressed search results
+NOT_IN_KEY = {'apikey','insttoken'} # API parameters that do not change search results
+
+
+def normalize_query(query:str)->str:
+  '''
+  output:
+    "query" with collapsed whitespace
+  '''
+  return ' '.join(query.split())
+
+
+def _encode(obj):
+  if isinstance(obj,(set,frozenset)):
+    return {'__set__':sorted(obj,key=str)}
+  if isinstance(obj,Author):
+    return {'__author__':vars(obj)}
+  return str(obj)
+
+
+def _decode(obj:dict):
+  if '__set__' in obj:
+    return set(obj['__set__'])
+  if '__author__' in obj:
+    author = Author.__new__(Author)
+    author.__dict__.update(obj['__author__'])
+    return author
+  return obj
+
+
+def ref2record(ref:Reference)->dict:
+  '''
+  output:
+    {'props':{prop:[values]},'attrs':{attribute:value},'snippets':{textref:{prop:[values]}}}\n
+    JSON-serializable record of Reference or its subclass
+  '''
+  props = {k:v for k,v in ref.items() if k != '__key__'} # SBSRef.key() is recalculated on demand
+  attrs = {k:v for k,v in vars(ref).items() if k != 'snippets'}
+  snippets = {textref:{p:list(values) for p,values in sent_props.items()} for textref,sent_props in ref.snippets.items()}
+  return {'props':props,'attrs':attrs,'snippets':snippets}
+
+
+def record2ref(record:dict,ref_class=Reference)->Reference:
+  '''
+  input:
+    record made by ref2record()
+    ref_class - Reference or its subclass used to make ref
+  '''
+  ref = ref_class.__new__(ref_class)
+  dict.__init__(ref,record['props'])
+  ref.__dict__.update(record['attrs'])
+  ref.snippets = defaultdict(lambda: defaultdict(set))
+  for textref, sent_props in record['snippets'].items():
+    for p, values in sent_props.items():
+      ref.snippets[textref][p] = set(values)
+  return ref
+
+
+class TMcache(ResultCache):
+  '''
+  persistent SQLite cache of text-mining search results shared by SBSapi, ETMsearch and ETMStats.\n
+  Results are keyed by search service, normalized query and search parameters,
+  expire after "ttl" seconds and least recently used results are evicted when cache exceeds "max_size" bytes
+  '''
+  def __init__(self,path2db:str=TM_CACHE,ttl:int=TM_CACHE_TTL,max_size:int=TM_CACHE_SIZE):
+    super().__init__(path2db,ttl,max_size,('service','query'),'results_query')
+
+
+  @staticmethod
+  def key(service:str,query:str,params:dict)->str:
+    key_params = sorted((k,str(v)) for k,v in params.items() if k not in NOT_IN_KEY)
+    key_parts = [service,normalize_query(query),key_params]
+    return hashlib.sha1(json.dumps(key_parts).encode('utf-8')).hexdigest()
+
+
+  def get(self,service:str,query:str,params:dict,ref_class=Reference)->tuple[int,list[Reference],dict]|None:
+    '''
+    input:
+      ref_class - class of cached references
+    output:
+      hit_count, [ref_class], {value_name:value} or None if search result is not in cache or expired
+    '''
+    data = self.get_data(self.key(service,query,params))
+    if data is None: return None
+    result = json.loads(zlib.decompress(data),object_hook=_decode)
+    return result['hit_count'], [record2ref(r,ref_class) for r in result['refs']], result['values']
+
+
+  def put(self,service:str,query:str,params:dict,hit_count:int,refs:list[Reference]=[],values:dict={}):
+    '''
+    input:
+      values - {value_name:value} other JSON-serializable search results
+    '''
+    key = self.key(service,query,params)
+    result = {'hit_count':hit_count,'refs':[ref2record(r) for r in refs],'values':values}
+    data = zlib.compress(json.dumps(result,default=_encode).encode('utf-8'))
+    self.put_data(key,(service,normalize_query(query)),data)
+
+
+  def invalidate(self,service:str='',query:str='')->int:
+    '''
+    input:
+      service - removes all results of "service" if "query" is empty
+      query - removes results of "query" retrieved by "service" with any parameters
+    output:
+      number of removed results. Removes all results if "service" is empty
+    '''
+    if service and query:
+      return self.delete(service=service,query=normalize_query(query))
+    return self.delete(service=service) if service else self.delete()
+
+
+__tm_caches__ = SharedStores()
+
+def tm_cache(**kwargs)->TMcache|None:
+  '''
+  input:
+    kwargs:
+      tm_cache - default False, set to True or path to SQLite file to reuse search results retrieved by previous runs
+      tm_cache_ttl - seconds to keep search results in tm_cache, default 30 days
+      tm_cache_size - max size of tm_cache in bytes, default 1Gb
+  output:
+    TMcache shared by all text-mining clients in the process using the same SQLite file or None if cache is not requested
+  '''
+  path2db = kwargs.get('tm_cache',False)
+  if not path2db: return None
+  path2db = path2db if isinstance(path2db,str) else TM_CACHE
+  return __tm_caches__.get(path2db,lambda p: TMcache(p,kwargs.get('tm_cache_ttl',TM_CACHE_TTL),kwargs.get('tm_cache_size',TM_CACHE_SIZE)))
@@ -1,12 +1,13 @@
-from urllib.error import HTTPError
-import json, http.client, time, urllib.request, urllib.parse,ssl,re
+import json, time, urllib.parse,re,requests
 from collections import defaultdict
 from ..utils import  load_api_config
-from time import sleep
+from ..transport import transport
 from .references import AUTHORS,INSTITUTIONS,JOURNAL,SENTENCE,EMAIL,RELEVANCE,PUBLISHER,GRANT_APPLICATION
 from .references import DocMine,Reference
+from .TMcache import tm_cache
 
 DEFAULT_ETM = 'https://covid19-services.elseviertextmining.com/api'
+ETM_RATE = 0.2 # requests per second allowed by ETM server
 
 def remove_the(t:str):
     return t[4:] if t.startswith('The ') else t
@@ -315,6 +316,11 @@ class ETMjson(DocMine):
 
 class ETMsearch:
     def __init__(self,APIconfig:dict=dict(), **kwargs):
+        '''
+        kwargs:
+            limit, add_param, min_relevance
+            tm_cache, tm_cache_ttl, tm_cache_size - see TMcache.tm_cache()
+        '''
         self.APIconfig = APIconfig if APIconfig else load_api_config()
         self.url = self.APIconfig.get('ETMURL',DEFAULT_ETM)
         self.params = {
@@ -331,6 +337,9 @@ class ETMsearch:
         self.hit_count = 0
         self.page_size = 100
         self.request_type = '/search/basic?'  # '/search/advanced?'
+        self.tm_cache = tm_cache(**kwargs)
+        self.connection_failed = False
+        transport().set_rate(urllib.parse.urlparse(self.url).netloc,ETM_RATE)
 
 
     def __base_url(self): 
@@ -340,11 +349,13 @@ class ETMsearch:
     def clone(self, to_url=''):
         myApiconfig = dict(self.APIconfig)
         myApiconfig['ETMURL'] = to_url if to_url else self.url
-        newEtMsearch =  ETMsearch(myApiconfig,self._limit(),self.params)
+        newEtMsearch =  ETMsearch(myApiconfig,limit=self._limit())
+        newEtMsearch.params = dict(self.params)
         newEtMsearch.page_size = self.page_size
         newEtMsearch.request_type = self.request_type
         newEtMsearch.hit_count = 0
         newEtMsearch.min_relevance = self.min_relevance
+        newEtMsearch.tm_cache = self.tm_cache
         return newEtMsearch
 
 
@@ -396,28 +407,23 @@ class ETMsearch:
             self.params.update({'snip': '1.desc'})
         for attempt in range(1, 11):
             try:
-                context = ssl._create_unverified_context()
-                #context=ssl.create_default_context(cafile=certifi.core.where())
-                the_page = urllib.request.urlopen(self._url_request(),context=context).read()         
-                if the_page:
-                    result = json.loads(the_page.decode('utf-8'))
+                # ETM server certificate is not verified
+                response = transport().get(self._url_request(),verify=False)
+                response.raise_for_status() # HTTPError usually means that ETM is not available
+                if response.content:
+                    result = response.json()
                     if attempt > 1:
                         print(f'ETM connection was restored on the {attempt} attempt')
-                    sleep(5)
                     return list(result['article-data']), int(result['total-hits='])
                 else:
                     return list(),int(0)
-            except HTTPError as err:
-                raise err # usually means that ETM is not available
-                timeout = 10
-                print(f'ETMStat HTTPError. Will attempt to reconnect in {timeout}')
-                time.sleep(timeout)
-            except http.client.IncompleteRead:
+            except requests.exceptions.ChunkedEncodingError:
                 timeout = 10
                 print(f'ETMStat IncompleteRead. Will attempt to reconnect in {timeout}')
                 time.sleep(timeout)
 
         print(f'Cannot connect to {self.__base_url()} after 10 attempts')
+        self.connection_failed = True # empty result is not cached
         return list(),int(0)
 
 
@@ -442,6 +448,17 @@ class ETMsearch:
             [2] references = [ref] list of Reference objects sorted by ETM relevance. len(references) == RefStats.params['limit'] 
             Relevance score is stored in ref['Relevance'] for every reference
         """
+        service = 'ETM'+self.request_type
+        cache_params = {k:v for k,v in self.params.items() if k != 'query'}
+        cache_params['min_relevance'] = self.min_relevance
+        if self.tm_cache is not None:
+            cached = self.tm_cache.get(service,self._query(),cache_params,ETMjson)
+            if cached is not None:
+                hit_count, references, _ = cached
+                self.hit_count = hit_count
+                return hit_count, self.__ref_ids(references), references
+
+        self.connection_failed = False
         articles, hit_count = self._get_articles(need_snippets=False)
 
         if self._limit() > 100:
@@ -458,13 +475,19 @@ class ETMsearch:
                     etm_ref[RELEVANCE] = [relevance_score]
                     references.append(etm_ref)
 
+        if self.tm_cache is not None and not self.connection_failed:
+            self.tm_cache.put(service,self._query(),cache_params,hit_count,references)
+        self.hit_count = hit_count #self.hit_count can be corrupted in parallel ETM requests
+        return hit_count, self.__ref_ids(references), references
+
+
+    @staticmethod
+    def __ref_ids(references:list[Reference])->dict[str,list]:
         ref_ids = defaultdict(list)
         for ref in references:
             id_type, identifier = ref.get_doc_id()
             ref_ids[id_type].append(identifier)
-
-        self.hit_count = hit_count #self.hit_count can be corrupted in parallel ETM requests
-        return hit_count, dict(ref_ids), references
+        return dict(ref_ids)
 
 
     def basic_search(self,search4concepts:list):
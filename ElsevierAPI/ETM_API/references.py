@@ -1,6 +1,6 @@
 from builtins import len
 from .medscan import MedScan
-import xlsxwriter,re,time,json,unicodedata
+import xlsxwriter,re,time,json,unicodedata,threading
 from datetime import timedelta
 from urllib.parse import urlencode,quote
 from titlecase import titlecase
@@ -168,8 +168,11 @@ class Reference(dict):
   Reference{BIBLIO_PROPS[i]:[values]};\n
   Reference.Identifiers{REF_ID_TYPES[i]:identifier};\n
   Reference.Sentences{TextRef:{SENTENCE_PROPS[i]:{Value}}}\n
+  Methods reading snippets accept "snippets" - {TextRef:{PropID:{Values}}} of relation citing Reference interned in ReferenceStore
+  (see PSRelation.ref_snippets), otherwise they read self.snippets
   '''
   pass
+  handle = -1 # index of Reference interned in ReferenceStore.refs, -1 if Reference is not interned
 
   def __init__(self, idType:str, ID:str):
     super().__init__(dict()) # self{BIBLIO_PROPS[i]:[values]};
@@ -194,6 +197,23 @@ class Reference(dict):
           return my_copy
         except KeyError: continue
       return Reference()
+
+
+  def detach(self,snippets:dict=None)->"Reference":
+      '''
+      input:
+        snippets - {TextRef:{PropID:{Values}}} of relation citing self
+      output:
+        copy of Reference interned in ReferenceStore with "snippets" that can be changed by one relation,
+        self if Reference is not interned
+      '''
+      if self.handle < 0: return self
+      my_copy = Reference(*next(iter(self.Identifiers.items())))
+      my_copy.update(self)
+      my_copy.Identifiers = self.Identifiers.copy()
+      if snippets:
+        my_copy.snippets.update({t:defaultdict(set,{p:set(v) for p,v in p2v.items()}) for t,p2v in snippets.items()})
+      return my_copy
   
 
   @staticmethod
@@ -282,9 +302,10 @@ class Reference(dict):
       return dict()
 
 
-  def my_sentence_props(self)->set[str]:
+  def my_sentence_props(self,snippets:dict=None)->set[str]:
+      snippets = self.snippets if snippets is None else snippets
       prop_names = set()
-      for prop2value in self.snippets.values():
+      for prop2value in snippets.values():
           prop_names.update(prop2value.keys())
       return prop_names
 
@@ -328,9 +349,10 @@ class Reference(dict):
 
 
 
-  def number_of_sentences(self):
+  def number_of_sentences(self,snippets:dict=None):
+    snippets = self.snippets if snippets is None else snippets
     count = 0
-    for snippet in self.snippets.values():
+    for snippet in snippets.values():
       count += len(snippet.get(SENTENCE,{})) #
     return count
 
@@ -343,17 +365,18 @@ class Reference(dict):
     [self.add_sentence_props(textref,k,list(v)) for k,v in snippet.items()]
   
     
-  def get_sentence(self,textref:str):
-    if textref in self.snippets:
-      snippets = self.snippets[textref]
+  def get_sentence(self,textref:str,snippets:dict=None):
+    snippets = self.snippets if snippets is None else snippets
+    if textref in snippets:
+      snippets = snippets[textref]
       return next(iter(snippets[SENTENCE])) if SENTENCE in snippets else ''
     return ''
 
 
-  def __is_new(self,sentence:str):
+  def __is_new(self,sentence:str,snippets:dict):
     clean_sent = sentence.strip(' .')
     sent_no_white = clean_sent.replace(" ", "")
-    for prop2vals in self.snippets.values():
+    for prop2vals in snippets.values():
       try:
         my_sentences = prop2vals[SENTENCE]
         for sentence in my_sentences:
@@ -363,38 +386,42 @@ class Reference(dict):
     return clean_sent
 
 
-  def add_sentence_props(self, TextRef:str, propID:str, prop_values:list):
+  def add_sentence_props(self, TextRef:str, propID:str, prop_values:list, snippets:dict=None):
+    snippets = self.snippets if snippets is None else snippets
     if propID == SENTENCE:
-      prop_values = list(filter(None,[self.__is_new(x) for x in prop_values if x]))
+      prop_values = list(filter(None,[self.__is_new(x,snippets) for x in prop_values if x]))
                
     if prop_values:
-      self.snippets[TextRef][propID].update(prop_values)
+      snippets.setdefault(TextRef,defaultdict(set))[propID].update(prop_values)
 
 
-  def has_property(self, prop_name:str):
-    for prop2values in self.snippets.values():
+  def has_property(self, prop_name:str, snippets:dict=None):
+    snippets = self.snippets if snippets is None else snippets
+    for prop2values in snippets.values():
       if prop_name in prop2values.keys():
         return True
     return prop_name in self.keys()
   
 
-  def get_values(self,prop_name:str):
+  def get_values(self,prop_name:str,snippets:dict=None):
     try:
       return list(self[prop_name])
     except KeyError: 
+      snippets = self.snippets if snippets is None else snippets
       prop_vals = set()
-      for prop2values in self.snippets.values():
+      for prop2values in snippets.values():
         if prop_name in prop2values:
           prop_vals.update(prop2values[prop_name])
       return list(prop_vals)
 
   
-  def has_values_in(self, in_prop2values:dict,case_sensitive=False):
+  def has_values_in(self, in_prop2values:dict,case_sensitive=False,snippets:dict=None):
     '''
     Input
     -----
     prop2values = {prop_name:[values]}
     '''
+    snippets = self.snippets if snippets is None else snippets
     # now seaching among ref properties
     for prop, values in self.items():
       try:
@@ -411,7 +438,7 @@ class Reference(dict):
       except KeyError: continue
 
     # if nothing found seach among snippet properties 
-    for my_prop2values in self.snippets.values():
+    for my_prop2values in snippets.values():
       for prop, self_snippet_values in my_prop2values.items():
         try:
           match_values = set(in_prop2values[prop])
@@ -440,7 +467,7 @@ class Reference(dict):
       return Reference()
   
 
-  def rename_prop(self, old_prop_name:str, new_prop_name:str):
+  def rename_prop(self, old_prop_name:str, new_prop_name:str, snippets:dict=None):
       '''
       Rename property in self and in self.snippets
       '''
@@ -449,7 +476,8 @@ class Reference(dict):
         return True
       
       was_renamed = False
-      for snippet_props in self.snippets.values():
+      snippets = self.snippets if snippets is None else snippets
+      for snippet_props in snippets.values():
         if old_prop_name in snippet_props:
           snippet_props[new_prop_name] = snippet_props.pop(old_prop_name)
           was_renamed = True
@@ -510,7 +538,7 @@ class Reference(dict):
       return ''
 
 
-  def to_list(self,id_types=list(),print_snippets=False,biblio_props=list(),other_props=list(),with_hyperlinks=False):
+  def to_list(self,id_types=list(),print_snippets=False,biblio_props=list(),other_props=list(),with_hyperlinks=False,snippets:dict=None):
       '''
       Return
       ------
@@ -522,7 +550,7 @@ class Reference(dict):
       id_types = id_types if isinstance(id_types,list) else ['PMID']
       for p in other_props:
           try:
-              prop_values_str = ';'.join(list(map(str,self.get_props(p))))
+              prop_values_str = ';'.join(list(map(str,self.get_props(p,snippets))))
               row.append(prop_values_str)
           except KeyError:
               row.append('')
@@ -556,7 +584,8 @@ class Reference(dict):
         row.append(prop_values_str)
 
       if print_snippets:
-        list_snippets = {k:{p:list(l)} for k,v in self.snippets.items() for p,l in v.items()}
+        snippets = self.snippets if snippets is None else snippets
+        list_snippets = {k:{p:list(l)} for k,v in snippets.items() for p,l in v.items()}
         sentence_props = json.dumps(list_snippets)
         sentence_props = re.sub(NOT_ALLOWED_IN_SENTENCE,' ',sentence_props)
         row.append(sentence_props)
@@ -574,7 +603,7 @@ class Reference(dict):
     return
     
 
-  def to_str(self,id_types=list(),col_sep='\t',print_snippets=False,biblio_props=[],other_props=[],with_hyperlinks=False):
+  def to_str(self,id_types=list(),col_sep='\t',print_snippets=False,biblio_props=[],other_props=[],with_hyperlinks=False,snippets:dict=None):
     '''
     Return
     ------
@@ -582,7 +611,7 @@ class Reference(dict):
     reference identifiers for PMID and DOI are hyperlinked if with_hyperlinks is True
     snippets are printed as json dump in one column
     '''
-    row = self.to_list(id_types,print_snippets,biblio_props,other_props,with_hyperlinks)
+    row = self.to_list(id_types,print_snippets,biblio_props,other_props,with_hyperlinks,snippets)
     return col_sep.join(row)
   
 
@@ -632,12 +661,12 @@ class Reference(dict):
       return ''
 
 
-  def number_of_snippets(self):
-      return len(self.snippets)
+  def number_of_snippets(self,snippets:dict=None):
+      return len(self.snippets if snippets is None else snippets)
 
 
-  def textrefs(self):
-      return list(self.snippets.keys())
+  def textrefs(self,snippets:dict=None):
+      return list((self.snippets if snippets is None else snippets).keys())
 
 
   def journal(self): 
@@ -725,8 +754,9 @@ class Reference(dict):
     return
 
 
-  def is_from_abstract(self):
-      for textref in self.snippets.keys():
+  def is_from_abstract(self,snippets:dict=None):
+      snippets = self.snippets if snippets is None else snippets
+      for textref in snippets.keys():
           try:
               return bool(str(textref).rindex('#abs',-8,-3))
           except ValueError:
@@ -797,15 +827,17 @@ class Reference(dict):
               return 0.0 if is_numerical else '0'
 
 
-  def sentences(self)->Generator[tuple[str,str], None, None]:
-    for textref, snippet in self.snippets.items():
+  def sentences(self,snippets:dict=None)->Generator[tuple[str,str], None, None]:
+    snippets = self.snippets if snippets is None else snippets
+    for textref, snippet in snippets.items():
       sentences = snippet.get(SENTENCE,{''})
       for sentence in sentences:
         yield textref,sentence
 
 
-  def _snippets(self):
-    for textref, snippet in self.snippets.items():
+  def _snippets(self,snippets:dict=None):
+    snippets = self.snippets if snippets is None else snippets
+    for textref, snippet in snippets.items():
       sentences = snippet.get(SENTENCE,set())
       if len(sentences) > 1:
         for i,sentence in enumerate(sentences):
@@ -816,19 +848,20 @@ class Reference(dict):
         yield textref,snippet
 
 
-  def get_snippet_prop(self,prop_name:str):
+  def get_snippet_prop(self,prop_name:str,snippets:dict=None):
       """
       output:
         {textref:[prop_vals]}
       """
+      snippets = self.snippets if snippets is None else snippets
       prop_values = dict()
-      for textref, sentence_props in self.snippets.items():
+      for textref, sentence_props in snippets.items():
         if prop_name in sentence_props:
           prop_values[textref] = sentence_props[prop_name]
       return prop_values
   
 
-  def get_props(self,prop_name:str)->list[str]:
+  def get_props(self,prop_name:str,snippets:dict=None)->list[str]:
     '''
     input:
         prop_name can be either in self.snippet or self.Identifiers or self
@@ -843,7 +876,7 @@ class Reference(dict):
       return [value]
 
     # Both checks failed, run the fallback logic
-    snippet_prop_dic = self.get_snippet_prop(prop_name)
+    snippet_prop_dic = self.get_snippet_prop(prop_name,snippets)
     props = set()
     [props.update(prop_vals) for prop_vals in snippet_prop_dic.values()]
     props = list(props)
@@ -865,12 +898,12 @@ class Reference(dict):
     return if_missing_return
   
 
-  def todict(self,as_str2str=False,relname='')->tuple[str,dict[str,list]]:
+  def todict(self,as_str2str=False,relname='',snippets:dict=None)->tuple[str,dict[str,list]]:
     dic = dict(self)
     dic.update({k:[v] for k,v in self.Identifiers.items()})
 
     add2snippet = relname+'\n' if relname else ''
-    my_snippets = sortdict(dict(self.snippets))
+    my_snippets = sortdict(dict(self.snippets if snippets is None else snippets))
     for i, textref2props in enumerate(my_snippets.items()):
         textref = textref2props[0]
         props = textref2props[1]
@@ -1151,3 +1184,67 @@ def reflist2dict(refs:list[Reference])->dict[str,Reference]:
   return refdict
 
 
+class ReferenceStore:
+  '''
+  interned references shared by relations of a graph.\n
+  References are keyed by (id_type,identifier) and (Title,title in lowercase) tuples
+  and relations keep integer handles into self.refs instead of their own Reference copies.\n
+  Interned references are bibliographic only: snippets stay with relations citing them in PSRelation.handle2snippets.\n
+  Store can be shared by threads loading references of different relations
+  '''
+  def __init__(self):
+    self.refs = list() # [Reference], handle is index in self.refs
+    self.key2handle = dict() # {(id_type,identifier):handle}
+    self.lock = threading.Lock()
+
+
+  def __len__(self):
+    return len(self.refs)
+
+
+  def __getitem__(self, handle:int)->Reference:
+    return self.refs[handle]
+
+
+  def __contains__(self, key:tuple[str,str]):
+    return key in self.key2handle
+
+
+  def find(self, keys:list[tuple[str,str]])->int:
+    '''
+    output:
+      handle of reference with any of "keys" or -1
+    '''
+    for k in keys:
+      handle = self.key2handle.get(k)
+      if handle is not None:
+        return handle
+    return -1
+
+
+  def add(self, keys:list[tuple[str,str]])->int:
+    '''
+    output:
+      handle of new Reference created from "keys"
+    '''
+    newref = Reference(*keys[0])
+    newref.Identifiers.update(dict(keys[1:]))
+    with self.lock:
+      handle = len(self.refs)
+      self.refs.append(newref)
+      self.key2handle.update({k:handle for k in keys})
+    return handle
+
+
+  def link(self, handle:int, keys:list[tuple[str,str]]):
+    '''
+    registers additional "keys" for reference with "handle"
+    '''
+    self.key2handle.update({k:handle for k in keys})
+
+
+  def clear(self):
+    self.refs.clear()
+    self.key2handle.clear()
+
+
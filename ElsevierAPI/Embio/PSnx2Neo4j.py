@@ -2,6 +2,7 @@ from ..ResnetAPI.ResnetGraph import ResnetGraph, PSObject, PSRelation
 from ..utils import execution_time, load_api_config, multithread, ThreadPoolExecutor,as_completed
 from ..ResnetAPI.NetworkxObjects import PS_REFIID_TYPES,OBJECT_TYPE,NONDIRECTIONAL_RELTYPES,CHILDS,CONNECTIVITY,DBID
 import logging,neo4j, time
+from collections import defaultdict
 from neo4j import GraphDatabase
 from neo4j import ManagedTransaction as tx
 from neo4j.exceptions import ServiceUnavailable
@@ -16,6 +17,8 @@ nondirectional_reltype = list(map(str.upper,NONDIRECTIONAL_RELTYPES))
 REL_PROP_Neo4j = ['Name', 'Effect', 'Mechanism', 'Source', 'TextRef']
 ENT_PROP_Neo4j = ['URN', 'Name', 'Description']
 REL_PROPs = list(PS_REFIID_TYPES) + REL_PROP_Neo4j
+NEO4J_BATCH_SIZE = 10000 # rows in one UNWIND transaction
+NEO4J_LOAD_THREADS = 8
 
 
 class nx2neo4j(GraphDatabase):
@@ -447,17 +450,88 @@ class nx2neo4j(GraphDatabase):
       print('%d relation were loaded in %s' % (create_relation_count,execution_time(start)))
 
 
-  def load_graph2neo4j(self, resnet:ResnetGraph):
+  @staticmethod
+  def __node_row(node:dict)->dict:
+      return {'URN':node['URN'][0],
+              'props':{k:v[0] for k, v in node.items() if k in ENT_PROP_Neo4j and k != 'URN' and v}}
+
+
+  @staticmethod
+  def __relation_props(rel:PSRelation)->dict:
+      props = {k.replace(':', ' '):v[0] for k, v in rel.items() if k in REL_PROP_Neo4j and v}
+      props['RefCount'] = rel.count_refs()
+      props['AbstractCount'] = rel.count_refs(count_abstracts=True)
+      return props
+
+
+  def create_urn_constraints(self,labels:set[str]):
+      '''
+      creates uniqueness constraints on URN for node "labels" to make MERGE and MATCH by URN use index
+      '''
+      with self.session() as session:
+          for label in labels:
+              session.run(Cypher.urn_constraint(label)).consume()
+
+
+  def __write_batch(self,cypher:str,rows:list[dict])->int:
+      def write(tx:tx):
+          return tx.run(cypher,rows=rows).consume()
+      with self.session() as session:
+          session.execute_write(write)
+      return len(rows)
+
+
+  def __write_batches(self,cypher2rows:dict[str,list[dict]],batch_size:int,max_workers:int)->int:
+      '''
+      input:
+        cypher2rows = {cypher:[row]}, where cypher needs $rows parameter
+      output:
+        number of written rows
+      '''
+      written = 0
+      with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='Neo4j batches') as executor:
+          futures = list()
+          for cypher, rows in cypher2rows.items():
+              for i in range(0,len(rows),batch_size):
+                  futures.append(executor.submit(self.__write_batch,cypher,rows[i:i+batch_size]))
+          for f in as_completed(futures):
+              written += f.result()
+      return written
+
+
+  def bulk_load(self,resnet:ResnetGraph,batch_size=NEO4J_BATCH_SIZE,max_workers=NEO4J_LOAD_THREADS):
+      '''
+      loads nodes and relations from "resnet" using parameterized UNWIND batches grouped by node label and relation type.\n
+      Nodes are merged by URN, relations are created
+      '''
+      start = time.time()
+      label2rows = defaultdict(list)
+      for _, node in resnet.nodes(data=True):
+          label2rows[node[OBJECT_TYPE][0]].append(self.__node_row(node))
+      self.create_urn_constraints(set(label2rows))
+
+      node_cyphers = {Cypher.merge_nodes(label):rows for label,rows in label2rows.items()}
+      node_count = self.__write_batches(node_cyphers,batch_size,max_workers)
+      print('%d nodes were loaded in %s' % (node_count,execution_time(start)))
+
+      rel_start = time.time()
+      rel2rows = defaultdict(list)
+      for regulator_uid, target_uid, rel in resnet.edges.data('relation'):
+          regulator = resnet.nodes[regulator_uid]
+          target = resnet.nodes[target_uid]
+          cypher = Cypher.create_relations(regulator[OBJECT_TYPE][0],rel[OBJECT_TYPE][0],target[OBJECT_TYPE][0])
+          rel2rows[cypher].append({'a':regulator['URN'][0],'b':target['URN'][0],'props':self.__relation_props(rel)})
+
+      rel_count = self.__write_batches(rel2rows,batch_size,max_workers)
+      print('%d relation were loaded in %s' % (rel_count,execution_time(rel_start)))
+
+
+  def load_graph2neo4j(self, resnet:ResnetGraph,batch_size=NEO4J_BATCH_SIZE,max_workers=NEO4J_LOAD_THREADS):
       resnet_size = resnet.number_of_edges()
       print('Importing Resnet with %d edges into local Neo4j' % resnet_size)
       import_start = time.time()
       resnet.load_references()
-      if resnet_size > 50000:
-          self.load_nodes(resnet)
-          self.load_relations_multithread(resnet)
-      else:
-          self.load_nodes_1by1(resnet)
-          self.load_relations_1by1(resnet)
+      self.bulk_load(resnet,batch_size,max_workers)
 
       print("Graph with %d nodes and %d edges was imported into Neo4j in %s ---" % 
           (resnet.number_of_nodes(), resnet_size, execution_time(import_start)))
@@ -378,3 +378,37 @@ class Cypher:
     '''
     parameter = {'urnList':[obj.urn() for obj in interactors]}
     return cypher, parameter
+
+
+
+  @staticmethod
+  def __name(label:str)->str:
+    return '`'+label.replace('`','``')+'`'
+
+
+  @staticmethod
+  def urn_constraint(label:str)->str:
+    name = ''.join(ch if ch.isalnum() else '_' for ch in label)
+    return f"CREATE CONSTRAINT {name}_urn IF NOT EXISTS FOR (n:{Cypher.__name(label)}) REQUIRE n.URN IS UNIQUE"
+
+
+  @staticmethod
+  def merge_nodes(label:str)->str:
+    '''
+    needs parameter $rows = [{'URN':urn,'props':{prop_name:value}}]
+    '''
+    return f"""UNWIND $rows AS row
+      MERGE (n:{Cypher.__name(label)} {{URN:row.URN}})
+      SET n += row.props"""
+
+
+  @staticmethod
+  def create_relations(regulator_label:str,reltype:str,target_label:str)->str:
+    '''
+    needs parameter $rows = [{'a':regulator_urn,'b':target_urn,'props':{prop_name:value}}]
+    '''
+    return f"""UNWIND $rows AS row
+      MATCH (a:{Cypher.__name(regulator_label)} {{URN:row.a}})
+      MATCH (b:{Cypher.__name(target_label)} {{URN:row.b}})
+      CREATE (a)-[r:{Cypher.__name(reltype)}]->(b)
+      SET r = row.props"""
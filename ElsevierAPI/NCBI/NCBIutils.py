@@ -1,31 +1,67 @@
 
 #C:Windows> py -m pip install entrezpy --user
-import json, datetime,os
+import json, datetime,os,certifi,requests
 import xml.etree.ElementTree as ET
-from time import sleep
-from urllib.parse import urlencode
-from collections import defaultdict
+from urllib.parse import urlencode,urlparse
+from collections import defaultdict,deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any,Callable,Generator
 from titlecase import titlecase
 from ..utils import attempt_request4,remove_duplicates,sortdict
 from ..ETM_API.references import Reference,JOURNAL,TITLE,AUTHORS,PUBYEAR
+from ..transport import transport
+from ..bulksearch import bulk_search
 
 
-RETMAX = 10000
+RETMAX = 10000 # max number of UIDs returned by one esearch and max retstart in one history server query_key
+EFETCH_BATCH = 500 # records retrieved by one efetch request
+MAX_EUTILS_REQUESTS = 8 # simultaneous efetch requests. Requests per second are limited by transport() bucket
+EFETCH_RETRIES = 3 # attempts to download and parse one efetch batch
+EUTILS_RATE_WITH_KEY = 10.0 # requests per second allowed by NCBI with API key
+
+
+def iterparse_records(source,tag:str|set[str])->Generator[ET.Element,None,None]:
+  '''
+  input:
+    source - file name or file object with XML
+    tag - tag or {tags} of records under root element, for example "PubmedArticle" or "article"
+  output:
+    generates record elements one by one. Record is removed from memory when next record is requested
+  '''
+  tags = {tag} if isinstance(tag,str) else tag
+  depth = 0
+  root = None
+  for event, elem in ET.iterparse(source,events=('start','end')):
+    if event == 'start':
+      if root is None: root = elem
+      depth += 1
+    else:
+      depth -= 1
+      if depth == 1 and elem.tag in tags:
+        yield elem
+        root.clear()
 
 class NCBIeutils:
   baseURL = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/'
   
-  def __init__(self,db:str,cache_path:str,retmode='xml'):
+  def __init__(self,db:str,cache_path:str,retmode='xml',api_key=''):
       #database names are in # from https://www.ncbi.nlm.nih.gov/books/NBK25497/table/chapter2.T._entrez_unique_identifiers_ui/?report=objectonly
       self.params = {'db':db,'retmode':retmode}
       self.cache_path = cache_path
       self.query = ''
+      self.api_key = api_key
+      self.max_concurrent = MAX_EUTILS_REQUESTS
+      if api_key:
+        transport().set_rate(urlparse(self.baseURL).netloc,EUTILS_RATE_WITH_KEY)
   
+  def _key_params(self,params:dict)->dict:
+      return dict(params,api_key=self.api_key) if getattr(self,'api_key','') else params
+
   def _esearch_url(self,params:dict):
-      return self.baseURL+'esearch.fcgi?'+urlencode(params)
+      return self.baseURL+'esearch.fcgi?'+urlencode(self._key_params(params))
   
   def _efetch_url(self,params:dict):
-      return self.baseURL+'efetch.fcgi?'+urlencode(params)
+      return self.baseURL+'efetch.fcgi?'+urlencode(self._key_params(params))
   
   def mydb(self):
     return self.params['db']
@@ -41,7 +77,7 @@ class NCBIeutils:
     count_param.update({'rettype':'count','retmode':'json'})
     my_url = self._esearch_url(count_param)
     http_response = attempt_request4(url=my_url)
-    data = dict(json.loads(http_response.data.decode('utf-8')))
+    data = dict(http_response.json())
     return int(data["esearchresult"]['count'])
   
 
@@ -55,7 +91,7 @@ class NCBIeutils:
     my_params.update(params)
     my_url = self._esearch_url(my_params)
     http_response = attempt_request4(my_url)
-    data = dict(json.loads(http_response.data.decode('utf-8')))
+    data = dict(http_response.json())
     ids = list(map(int,data["esearchresult"]['idlist'])) # NCBI returns PMIDs list in descending year order
     reversed_list = []
     [reversed_list.append(ids[i]) for i in range(len(ids) - 1, -1, -1)]
@@ -66,7 +102,9 @@ class NCBIeutils:
       '''
       Return
       ------
-      List of PMIDs sorted by PDAT
+      List of PMIDs sorted by PDAT.\n
+      Queries with more than RETMAX results are split into yearly searches by PDAT from 1965 to the current year inclusive,
+      UIDs published before 1965 are not retrieved for such queries
       '''
       json_id_dump = query_name+'PMIDs.json'
       json_id_path = os.path.join(self.cache_path,json_id_dump)
@@ -79,27 +117,148 @@ class NCBIeutils:
         all_ids = list()
         if count > RETMAX: # spliting downlaods by year
           current_year = datetime.date.today().year
-          for year in range(1965, current_year,1):
+          def year_uids(year:int):
             year_params = dict(self.params)
             year_params['term'] += f' AND ({year}/01/01[PDat]:{year}/12/31[PDat])'
-            all_ids += self._retmax_uids(year_params)
-            sleep(0.5) # 0.1 - too many requests
+            return self._retmax_uids(year_params)
+          years = list(range(1965, current_year+1,1))
+          # yearly searches run concurrently, NCBI request rate is limited by shared transport
+          year2uids = bulk_search(year_uids,years,self.max_concurrent,'esearch')
+          for year in years:
+            all_ids += year2uids.get(year,[])
           all_ids = remove_duplicates(all_ids)
-          json.dump(all_ids, open(json_id_path,'w'), indent = 2)
+          if len(year2uids) == len(years):
+            json.dump(all_ids, open(json_id_path,'w'), indent = 2)
+          else:
+            print(f'{len(years)-len(year2uids)} yearly searches failed. {json_id_dump} was not saved')
           return all_ids
         else:
           return self._retmax_uids(self.params)
 
 
+  def epost(self,ids:list[int])->tuple[str,list[tuple[str,int]]]:
+    '''
+    uploads "ids" to Entrez history server in chunks of RETMAX ids
+    output:
+      WebEnv, [(query_key,number of ids)]
+    '''
+    webenv = ''
+    query_keys = list()
+    for i in range(0, len(ids), RETMAX):
+      chunk = ids[i:i+RETMAX]
+      data = {'db':self.mydb(),'id':','.join(str(s) for s in chunk)}
+      if webenv: data['WebEnv'] = webenv
+      response = transport().post(self.baseURL+'epost.fcgi',data=self._key_params(data),verify=certifi.where())
+      response.raise_for_status()
+      result = ET.fromstring(response.content)
+      error = result.findtext('ERROR')
+      if error:
+        raise requests.HTTPError(f'epost failed: {error}')
+      webenv = result.findtext('WebEnv')
+      query_keys.append((result.findtext('QueryKey'),len(chunk)))
+    return webenv, query_keys
+
+
+  def _efetch(self,webenv:str,query_key:str,retstart:int,retmax:int,tag:str,parser:Callable[[ET.Element],Any])->list:
+    '''
+    input:
+      parser - function(record element) called for every "tag" record in efetch response. Must be thread-safe
+    output:
+      [parser(record)] for records retrieved from history server.
+      Response is parsed while it is downloaded, records failed by parser are reported and skipped.
+      Responses with <ERROR> or with less than "retmax" records are retried EFETCH_RETRIES times,
+      incomplete response from the last attempt is returned
+    '''
+    params = {'db':self.mydb(),'WebEnv':webenv,'query_key':query_key,'retstart':retstart,'retmax':retmax,'retmode':'xml'}
+    batch_name = f'efetch {retstart}-{retstart+retmax} for query_key {query_key}'
+    for attempt in range(EFETCH_RETRIES):
+      last_attempt = attempt == EFETCH_RETRIES-1
+      try:
+        parsed_records = list()
+        record_count = 0
+        with transport().get(self._efetch_url(params),stream=True,verify=certifi.where()) as response:
+          response.raise_for_status()
+          response.raw.decode_content = True
+          for record in iterparse_records(response.raw,{tag,'ERROR'}):
+            if record.tag == 'ERROR':
+              raise requests.HTTPError(f'efetch failed: {record.text}')
+            record_count += 1
+            try:
+              parsed_records.append(parser(record))
+            except Exception as e:
+              print(f'{batch_name}: record {record_count} was not parsed: {e}',flush=True)
+        if record_count < retmax and not last_attempt:
+          raise requests.RequestException(f'response has {record_count} records out of {retmax}')
+        elif record_count < retmax:
+          print(f'{batch_name} returned {record_count} records out of {retmax}',flush=True)
+        return parsed_records
+      except (ET.ParseError,requests.RequestException) as e:
+        if last_attempt: raise
+        print(f'{batch_name} failed with {e}. Retrying',flush=True)
+
+
+  def __history_batches(self,ids:list[int])->list[tuple[str,str,int,int]]:
+    '''
+    output:
+      [(WebEnv,query_key,retstart,retmax)] for efetch batches of "ids" uploaded to history server
+    '''
+    webenv, query_keys = self.epost(ids)
+    return [(webenv,key,start,min(EFETCH_BATCH,count-start)) for key,count in query_keys for start in range(0,count,EFETCH_BATCH)]
+
+
+  def __run_batches(self,fetch_batch:Callable[[tuple],Any],batches:list[tuple])->Generator[Any,None,None]:
+    '''
+    output:
+      generates fetch_batch(batch) results in the order of "batches".\n
+      Batches run concurrently in self.max_concurrent threads, only 2*self.max_concurrent results are kept in memory.
+      Failed batches are reported and skipped
+    '''
+    def batch_result(batch:tuple,future):
+      try:
+        return [future.result()]
+      except Exception as e:
+        print(f'efetch {batch[2]}-{batch[2]+batch[3]} for query_key {batch[1]} failed with {e}',flush=True)
+        return []
+
+    with ThreadPoolExecutor(max_workers=self.max_concurrent,thread_name_prefix='efetch') as e:
+      in_flight = deque()
+      for batch in batches:
+        in_flight.append((batch,e.submit(fetch_batch,batch)))
+        if len(in_flight) >= 2*self.max_concurrent:
+          yield from batch_result(*in_flight.popleft())
+      while in_flight:
+        yield from batch_result(*in_flight.popleft())
+
+
+  def records(self,ids:list[int],tag:str,parser:Callable[[ET.Element],Any])->Generator[Any,None,None]:
+    '''
+    input:
+      tag - tag of records in efetch XML, for example "PubmedArticle" or "article"
+      parser - function(record element), must be thread-safe
+    output:
+      generates parser(record) for "ids" in the order of efetch batches.\n
+      "ids" are uploaded to history server, efetch batches of EFETCH_BATCH records are downloaded and parsed concurrently
+    '''
+    if not ids: return
+    fetch_batch = lambda batch: self._efetch(*batch,tag,parser)
+    for parsed_batch in self.__run_batches(fetch_batch,self.__history_batches(ids)):
+      yield from parsed_batch
+
+
   def ids2records(self,ids:list[int]):
-    params = {'db':self.params['db'],'rettype':'XML'}
-    stepSize = 200
-    for i in range(0, len(ids), stepSize):
-      str_ids = ','.join(str(s) for s in ids[i:i+stepSize])
-      params.update({'id':str_ids})
-      my_url = self._efetch_url(params)
-      http_response = attempt_request4(my_url)
-      yield http_response.data.decode()
+    '''
+    output:
+      generates efetch XML strings with up to EFETCH_BATCH records retrieved concurrently from history server
+    '''
+    if not ids: return
+    def fetch_batch(batch:tuple[str,str,int,int]):
+      webenv, query_key, retstart, retmax = batch
+      params = {'db':self.mydb(),'WebEnv':webenv,'query_key':query_key,'retstart':retstart,'retmax':retmax,'retmode':'xml'}
+      http_response = attempt_request4(self._efetch_url(params))
+      if http_response is None:
+        raise requests.ConnectionError('no response')
+      return http_response.content.decode()
+    yield from self.__run_batches(fetch_batch,self.__history_batches(ids))
 
 
   def fetch(self,query_name:str):
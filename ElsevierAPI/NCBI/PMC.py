@@ -2,7 +2,8 @@
 #C:Windows> py -m pip install entrezpy --user
 import json,os
 import xml.etree.ElementTree as ET
-from ..utils import attempt_request4,list2chunks_generator
+from ..utils import attempt_request4,list2chunks_generator,remove_duplicates
+from ..bulksearch import bulk_search
 from .NCBIutils import NCBIeutils
 from ..pandas.panda_tricks import df
 
@@ -12,8 +13,8 @@ PMC_CACHE = os.path.join(os.getcwd(),'ENTELLECT_API/ElsevierAPI/NCBI/__ncbipmcca
 
 
 class PMC(NCBIeutils): 
-  def __init__(self,query:str,retmode='xml'):
-    super().__init__('pmc',PMC_CACHE,retmode)
+  def __init__(self,query:str,retmode='xml',api_key=''):
+    super().__init__('pmc',PMC_CACHE,retmode,api_key)
     self.query = query
     self.params.update({'filter':'availability.pmc_public'})
 
@@ -22,10 +23,9 @@ class PMC(NCBIeutils):
     counter = 0
     with open(fpath, "w", encoding='utf-8') as result:
       result.write('<pmc-articleset>\n')
-      for xml_str in self.fetch(query_name):
-        articles = ET.fromstring(xml_str).findall('article')
-        [result.write(ET.tostring(a, encoding="unicode")) for a in articles]
-        counter += len(articles)
+      for article_xml in self.records(self.get_uids(query_name),'article',lambda a: ET.tostring(a, encoding="unicode")):
+        result.write(article_xml)
+        counter += 1
       result.write('</pmc-articleset>\n')
     print(f'Downloaded {counter} PMC articles')
 
@@ -45,25 +45,23 @@ class PMC(NCBIeutils):
     xml_fname = self.path2cache(query_name,'xml')
     downloaded_ids = set()
     pubids = list()
-    with open(xml_fname,"w",encoding='utf-8') as xmlfile, open(id_fname,'w') as idfile:
+    id_queries = [' OR '.join([f'"{docid}"' for docid in id_chunk])+' [lid]' for i, id_chunk in list2chunks_generator(docids,chunk_size=75)]
+    # id searches run concurrently, NCBI request rate is limited by shared transport
+    query2uids = bulk_search(lambda q: self._retmax_uids({'term':q}),id_queries,self.max_concurrent,'esearch')
+    uids = remove_duplicates([uid for q in id_queries for uid in query2uids.get(q,[])])
+    parse = lambda a: (self.pub_ids(a),ET.tostring(a, encoding="unicode"))
+    with open(xml_fname,"w",encoding='utf-8') as xmlfile:
       xmlfile.write('<pmc-articleset>\n')
-      for i, id_chunk in list2chunks_generator(docids,chunk_size=75):
-        id_query = ' OR '.join([f'"{docid}"' for docid in id_chunk])
-        id_query  += ' [lid]'
-        self.query = id_query
-        for xml_str in self.fetch(query_name):
-          articles = ET.fromstring(xml_str).findall('article')
-          for a in articles:
-            a_ids = self.pub_ids(a)
-            downloaded_ids.update([v for idtype,v in a_ids.items() if idtype in ['pmcid','doi','pii']])
-            pubids.append(a_ids)
-            xmlfile.write(ET.tostring(a, encoding="unicode"))
+      for a_ids, article_xml in self.records(uids,'article',parse):
+        downloaded_ids.update([v for idtype,v in a_ids.items() if idtype in ['pmcid','doi','pii']])
+        pubids.append(a_ids)
+        xmlfile.write(article_xml)
       xmlfile.write('</pmc-articleset>\n')
     id_df = df(pubids)
     id_df.to_csv(id_fname,sep='\t',index=False)
     missed_ids = set(docids) - downloaded_ids
+    missedids_fname = self.path2cache(query_name,'missed_ids.txt')
     if missed_ids:
-      missedids_fname = self.path2cache(query_name,'missed_ids.txt')
       with open(missedids_fname,'w',encoding='utf-8') as mf:
         [mf.write(f'{mid}\n') for mid in missed_ids]
 
@@ -89,7 +87,7 @@ def docid2pmid(docids:list[str])->dict[str,str]:
     requesturl = 'https://www.ncbi.nlm.nih.gov/pmc/utils/idconv/v1.0/?ids='+idstr+'&format=json'
     http_response = attempt_request4(requesturl)
     if http_response:
-      data = json.loads(http_response.data.decode('utf-8'))
+      data = http_response.json()
     if data:
       for record in data["records"]:
         if 'pmcid' in record: 
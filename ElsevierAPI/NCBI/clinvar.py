@@ -1,6 +1,5 @@
 import urllib.parse, os, time
 from lxml import etree as ET
-from time import sleep
 from ..utils import dir2flist, execution_time,pretty_xml,next_tag,dir2flist,replace_non_unicode,urn_encode,attempt_request4
 from ..ResnetAPI.NetworkxObjects import PSObject,PSRelation,AUTHORS,JOURNAL,PUBYEAR
 from ..ResnetAPI.ResnetGraph import ResnetGraph,Reference,TITLE,SENTENCE,OBJECT_TYPE
@@ -53,7 +52,7 @@ def rs2rcv(rsids:list):
     req_l = BASE_URL+'elink.fcgi?'+urllib.parse.urlencode(elink_params)
     # https://eutils.ncbi.nlm.nih.gov/entrez/eutils/elink.fcgi?&db=clinvar&dbfrom=snp&id=
     response_l = attempt_request4(req_l)
-    link2cv = ET.fromstring(response_l.data)
+    link2cv = ET.fromstring(response_l.content)
     cvids = [e.text for e in link2cv.findall('LinkSet/LinkSetDb/Link/Id')]
     
   for i in range(0, len(cvids), stepSize):
@@ -61,11 +60,10 @@ def rs2rcv(rsids:list):
     efecth_params = {'db':'clinvar','id':cvids_chunk}
     url = BASE_URL+'esummary.fcgi?'+urllib.parse.urlencode(efecth_params)
     response = attempt_request4(url) # https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi?&db=clinvar&id=
-    cvs = ET.fromstring(response.data)
+    cvs = ET.fromstring(response.content)
     rcvs = [e.text for e in cvs.findall('DocumentSummarySet/DocumentSummary/supporting_submissions/rcv/string')]
     rcv_ids.update(rcvs)
     print(f'Downloaded {i+stepSize} SNPs out of {len(cvids)}')
-    sleep(1)
   return rcv_ids
 
 
@@ -432,7 +430,7 @@ def downloadCV(_4rsids:list,mapdic:dict[str, dict[str, dict[str, PSObject]]],inc
             url=BASE_URL+'efetch.fcgi?'+urllib.parse.urlencode(params)
             # url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi?db=clinvar&rettype=clinvarset&id=ids'
             response = attempt_request4(url)           
-            cvs = ET.fromstring(response.data)
+            cvs = ET.fromstring(response.content)
             f.write(pretty_xml(ET.tostring(cvs),True))
             chunk_G = rcv2rn(cvs,mapdic,rsids2download,include_benign)
             gene2gv2dis.add_graph(chunk_G)
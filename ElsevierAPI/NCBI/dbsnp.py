@@ -67,13 +67,12 @@ def downloadSNP(rsids:list,mapdic:dict[str, dict[str, dict[str, PSObject]]])->tu
                 params.update({'id':ids})
                 url=BASE_URL+'efetch.fcgi?'+urllib.parse.urlencode(params)
                 response = attempt_request4(url)
-                snps = ET.fromstring('<documents>'+response.data.decode().strip()+'</documents>')
+                snps = ET.fromstring('<documents>'+response.content.decode().strip()+'</documents>')
                 f.write(pretty_xml(ET.tostring(snps),True))
                 id2snps, gvs2genes_rels = xml2SNP(snps,mapdic)
                 id2snp.update(id2snps)
                 gvs2genes += gvs2genes_rels
                 print(f'Downloaded {i+stepSize} SNPs out of {rsids_len}')
-                time.sleep(1)
             f.write('</batch>')
     print(f'Download was done in {execution_time(start)}')
     return id2snp, ResnetGraph.from_rels(gvs2genes)
@@ -1,8 +1,9 @@
 
 #C:Windows> py -m pip install entrezpy --user
-import urllib.request, json, os
+import json, os
 import xml.etree.ElementTree as ET
 from .NCBIutils import NCBIeutils
+from ..transport import transport
 
 NCBI_CACHE = os.path.join(os.getcwd(),'ENTELLECT_API/ElsevierAPI/NCBI/__ncbipubchemcache__/')
 
@@ -40,8 +41,9 @@ class Pubchem(NCBIeutils):
       ids = ','.join(str(s) for s in allids[i:i+stepSize])
       params.update({'id':ids})
       my_url = self._efetch_url(params)
-      req = urllib.request.Request(url=my_url)
-      xml_str = urllib.request.urlopen(req).read()
+      response = transport().get(my_url)
+      response.raise_for_status()
+      xml_str = response.content
       yield xml_str
 
 
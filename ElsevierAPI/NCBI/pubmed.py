@@ -5,6 +5,7 @@ import xml.etree.ElementTree as ET
 from collections import defaultdict
 from titlecase import titlecase
 from ..utils import sortdict
+from typing import Generator
 from ..ETM_API.references import Reference,JOURNAL,TITLE,AUTHORS,PUBYEAR
 from .NCBIutils import NCBIeutils
 
@@ -15,8 +16,8 @@ def removeThe(t:str):
     return t[4:] if t.startswith('The ') else t
 
 class Pubmed(NCBIeutils):
-  def __init__(self,query:str,retmode='xml'):
-    super().__init__('pubmed',PUBMED_CACHE,retmode)
+  def __init__(self,query:str,retmode='xml',api_key=''):
+    super().__init__('pubmed',PUBMED_CACHE,retmode,api_key)
     self.journalCounter = defaultdict(int)
     self.query = query
 
@@ -25,10 +26,12 @@ class Pubmed(NCBIeutils):
   def pubmed2ref(article:ET.Element)->Reference:
     def parse_authors(AuthorList:ET.Element):
       authors = []
+      if AuthorList is None: return ''
       for author_elem in AuthorList.findall('Author'):
-          last_name = author_elem.find('LastName').text
-          fore_name = author_elem.find('ForeName').text
-          initials = author_elem.find('Initials').text
+          last_name = author_elem.findtext('LastName')
+          if last_name is None: continue # collective author
+          fore_name = author_elem.findtext('ForeName',default='')
+          initials = author_elem.findtext('Initials',default='')
           # Assuming Initials is always available and accurate for the format:
           formatted_name = f"{last_name} {initials}{fore_name}"
           authors.append(formatted_name)
@@ -51,20 +54,25 @@ class Pubmed(NCBIeutils):
     ref = Reference('PMID', pmid_elem.text)
     article_elem = medline_citation.find('Article')
     journal_elem = article_elem.find('Journal')
-    ref['ISSN'] = [journal_elem.find('ISSN').text]
-    ref[JOURNAL] = [journal_elem.find('ISOAbbreviation').text]
+    issn = journal_elem.findtext('ISSN')
+    if issn: ref['ISSN'] = [issn]
+    ref[JOURNAL] = [journal_elem.findtext('ISOAbbreviation',default='')]
     ref[PUBYEAR] = [parse_year(journal_elem)]
-    ref[TITLE] = [article_elem.find('ArticleTitle').text]
+    ref[TITLE] = [''.join(article_elem.find('ArticleTitle').itertext())]
     ref[AUTHORS] = [parse_authors(article_elem.find('AuthorList'))]
     return ref
     
 
+  def pmids2refs(self,pmids:list[int])->Generator[Reference,None,None]:
+    '''
+    output:
+      generates References for "pmids" parsed from efetch responses while they are downloaded
+    '''
+    return self.records(pmids,'PubmedArticle',self.pubmed2ref)
+
+
   def download_refs(self,pmids:list[int])->list[Reference]:
-    refs = []
-    for xml_str in self.ids2records(pmids):
-      articles = ET.fromstring(xml_str).findall('PubmedArticle')
-      [refs.append(NCBIeutils.pubmed2ref(article))for article in articles]
-    return refs
+    return list(self.pmids2refs(pmids))
 
 
   def download(self,query_name:str)->list[Reference]:
@@ -72,17 +80,15 @@ class Pubmed(NCBIeutils):
       refs = []
       with open(fpath, "w", encoding='utf-8') as result:
         result.write('<PubmedArticleSet>\n')
-        for xml_str in self.fetch(query_name):
-          abstractTree = ET.fromstring(xml_str)
-          articles = abstractTree.findall('PubmedArticle')
-          for article in articles:
-            refs.append(self.pubmed2ref(article))
-            journal = str(article.find('MedlineCitation/Article/Journal/Title').text)
+        parse = lambda article: (self.pubmed2ref(article),
+                                 str(article.findtext('MedlineCitation/Article/Journal/Title')),
+                                 ET.tostring(article, encoding="unicode"))
+        for ref, journal, article_xml in self.records(self.get_uids(query_name),'PubmedArticle',parse):
+            refs.append(ref)
             jnames = normalize_journal(journal)
             for j in jnames:
                 self.journalCounter[j] += 1
-            result.write(ET.tostring(article, encoding="unicode"))
-#          sleep(1.0)
+            result.write(article_xml)
         result.write('</PubmedArticleSet>\n')
         print(f'Downloaded {len(refs)} pubmed abstracts')
         print(f'Downloaded abstracts are in "{fpath}"')
@@ -1,10 +1,9 @@
-import urllib.request,urllib.parse,json,time
+import urllib.parse,json,time
 from collections import defaultdict
 from ..pandas.panda_tricks import df
 from ..ResnetAPI.NetworkxObjects import Reference,PUBYEAR
 from .. import execution_time
-import urllib.error as http_error
-from time import sleep
+from ..transport import transport
 
 DEFAULT_APICONFIG = 'D:/Python/ENTELLECT_API/ElsevierAPI/APIconfig.json'
 ALPHABET = [chr(i) for i in range(97, 123)] + [str(i) for i in range(10)] + ['-']# + ['(','-','+',' ']
@@ -57,21 +56,10 @@ class Pharmapendium:
     
     def _get_results(self, search_type:str, params=dict()):
         my_url = self._url_request(search_type, params)
-        try:
-            req = urllib.request.Request(my_url, headers=self.headers)
-            response = urllib.request.urlopen(req)
-        except http_error.HTTPError:
-            sleep(30)
-            try:
-                req = urllib.request.Request(my_url, headers=self.headers)
-                response = urllib.request.urlopen(req)
-            except http_error.HTTPError as error:
-                raise error
-            
-        pp_view = response.read()
-        result = json.loads(pp_view.decode('utf-8'))
-        sleep(0.34)
-        return result
+        # shared transport limits request rate and retries throttled requests
+        response = transport().get(my_url, headers=self.headers)
+        response.raise_for_status()
+        return response.json()
 
 
     def search_results(self,search_type:str, params=dict()):
@@ -0,0 +1,272 @@
+import sys,hashlib
+from .NetworkxObjects import PSObject,PSRelation,REGULATORS,TARGETS,OBJECT_TYPE,DBID,REFCOUNT,EFFECT,MECHANISM
+from .ResnetGraph import ResnetGraph
+from ..ETM_API.references import JOURNAL_PROPS,PUBYEAR
+
+MISSING = object()
+COMMON_PROPS = {'URN','Name',OBJECT_TYPE}
+# properties with short values repeated by many objects. Only their values are interned.
+# Interned strings are never freed, therefore unique values such as Name, URN, Sentence or Title are stored as plain str
+CATEGORICAL_PROPS = {OBJECT_TYPE,EFFECT,MECHANISM,PUBYEAR,'PubTypes','ChangeType','BiomarkerType','QuantitativeType',
+                     'CellType','Organ','Tissue','Organism','CellLineName','Source'}|JOURNAL_PROPS
+
+
+def _intern(value):
+  return sys.intern(value) if isinstance(value,str) else value
+
+
+def _pack(values:list, intern_values=False):
+  '''
+  output:
+    single value or tuple of values. Values are interned if "intern_values"
+  '''
+  if intern_values:
+    values = list(map(_intern,values))
+  return values[0] if len(values) == 1 else tuple(values)
+
+
+def _unpack(value)->list:
+  return list(value) if isinstance(value,tuple) else [value]
+
+
+class CompactPSObject:
+  '''
+  memory-compact read-only counterpart of PSObject.\n
+  URN, Name and ObjTypeName are stored in slots, ObjTypeName and values of CATEGORICAL_PROPS are interned strings,
+  other properties are kept in side table {prop_name:value} with tuple values only for multi-valued properties.\n
+  Supports PSObject API used for reading: get_prop, get_props, name, urn, uid, objtype, dbid, obj[prop_name], prop_name in obj
+  '''
+  __slots__ = ('_urn','_name','_objtype','_props')
+
+  def __init__(self, dic:dict=dict()):
+    self._urn = self._name = self._objtype = MISSING
+    self._props = None
+    for prop_name, values in dic.items():
+      self._set(prop_name,values)
+
+
+  def _set(self, prop_name:str, values:list):
+    if not values: return
+    if len(values) == 1 and prop_name in COMMON_PROPS:
+      if prop_name == 'URN':
+        self._urn = values[0]
+      elif prop_name == 'Name':
+        self._name = values[0]
+      else:
+        self._objtype = _intern(values[0])
+    else: # other properties and rare multi-valued common properties
+      if self._props is None:
+        self._props = dict()
+      self._props[_intern(prop_name)] = _pack(values,prop_name in CATEGORICAL_PROPS)
+
+
+  @classmethod
+  def from_psobject(cls, psobj:PSObject)->"CompactPSObject":
+    return cls(psobj)
+
+
+  def to_psobject(self)->PSObject:
+    return PSObject(dict(self.items()))
+
+
+  def __value(self, prop_name:str):
+    if self._props is not None and prop_name in self._props:
+      return self._props[prop_name]
+    if prop_name == 'URN': return self._urn
+    if prop_name == 'Name': return self._name
+    if prop_name == OBJECT_TYPE: return self._objtype
+    return MISSING
+
+
+  def __getitem__(self, prop_name:str)->list:
+    value = self.__value(prop_name)
+    if value is MISSING:
+      raise KeyError(prop_name)
+    return _unpack(value)
+
+
+  def __contains__(self, prop_name:str):
+    return self.__value(prop_name) is not MISSING
+
+
+  def get(self, prop_name:str, default=None):
+    value = self.__value(prop_name)
+    return default if value is MISSING else _unpack(value)
+
+
+  def keys(self)->list[str]:
+    keys = [k for k,v in (('URN',self._urn),('Name',self._name),(OBJECT_TYPE,self._objtype)) if v is not MISSING]
+    if self._props is not None:
+      keys += [k for k in self._props if k not in keys]
+    return keys
+
+
+  def items(self):
+    return [(k,self[k]) for k in self.keys()]
+
+
+  def get_prop(self,prop_name:str,value_index=0,if_missing_return:str|int|float='')->str|int|float:
+    '''
+    output:
+      self[prop_name][value_index]
+    '''
+    value = self.__value(prop_name)
+    if value is MISSING:
+      return if_missing_return
+    if isinstance(value,tuple):
+      return value[value_index] if value_index < len(value) else if_missing_return
+    return value if value_index == 0 else if_missing_return
+
+
+  def get_props(self,prop_name:str)->list:
+    return self.get(prop_name,[])
+
+
+  def urn(self)->str:
+    return self.get_prop('URN')
+
+
+  def name(self)->str:
+    return self.get_prop('Name')
+
+
+  def objtype(self)->str:
+    return self.get_prop(OBJECT_TYPE)
+
+
+  def dbid(self)->int:
+    return self.get_prop(DBID,if_missing_return=0)
+
+
+  def uid(self)->int:
+    return PSObject.urn2uid(self.urn())
+
+
+  def __hash__(self):
+    return self.uid()
+
+
+  def __eq__(self, other):
+    return self.urn() == other.urn()
+
+
+  def __repr__(self):
+    return f"{self.__class__.__name__}({dict(self.items())})"
+
+
+class CompactPSRelation(CompactPSObject):
+  '''
+  memory-compact read-only counterpart of PSRelation.\n
+  Regulators and targets are tuples of CompactPSObject shared with other relations,
+  PropSetToProps is packed into tuples with interned property names and CATEGORICAL_PROPS values.
+  Relation references are not kept and are made from packed PropSets by to_psrelation().refs()
+  '''
+  __slots__ = ('_regulators','_targets','_propsets')
+
+  def __init__(self, dic:dict=dict()):
+    super().__init__(dic)
+    self._regulators = tuple()
+    self._targets = tuple()
+    self._propsets = tuple() # ((PropSetID,((PropID,values),...)),...)
+
+
+  @classmethod
+  def from_psrelation(cls, rel:PSRelation, uid2node:dict[int,CompactPSObject]=None)->"CompactPSRelation":
+    '''
+    input:
+      uid2node - {uid:CompactPSObject} node table shared by relations. New nodes are added to "uid2node"
+    '''
+    uid2node = dict() if uid2node is None else uid2node
+    def compact_node(n:PSObject)->CompactPSObject:
+      uid = n.uid()
+      if uid not in uid2node:
+        uid2node[uid] = CompactPSObject(n)
+      return uid2node[uid]
+
+    compact_rel = cls(rel)
+    compact_rel._regulators = tuple(map(compact_node,rel.Nodes.get(REGULATORS,[])))
+    compact_rel._targets = tuple(map(compact_node,rel.Nodes.get(TARGETS,[])))
+    compact_rel._propsets = tuple((_intern(str(propset_id)),tuple((_intern(p),_pack(v,p in CATEGORICAL_PROPS)) for p,v in props.items() if v))
+                                  for propset_id, props in rel.PropSetToProps.items())
+    return compact_rel
+
+
+  def __hash__(self):
+    # same as PSRelation.__hash__
+    return int(hashlib.md5(str(self.urn()).encode()).hexdigest(),32)
+
+
+  def to_psrelation(self)->PSRelation:
+    rel = PSRelation(dict(self.items()))
+    rel.Nodes[REGULATORS] = [n.to_psobject() for n in self._regulators]
+    if self._targets:
+      rel.Nodes[TARGETS] = [n.to_psobject() for n in self._targets]
+    for propset_id, props in self._propsets:
+      for prop_name, value in props:
+        rel.PropSetToProps[propset_id][prop_name] = _unpack(value)
+    return rel
+
+
+  @property
+  def Nodes(self)->dict[str,list[CompactPSObject]]:
+    nodes = {REGULATORS:list(self._regulators)}
+    if self._targets:
+      nodes[TARGETS] = list(self._targets)
+    return nodes
+
+
+  @property
+  def PropSetToProps(self)->dict[str,dict[str,list]]:
+    return {propset_id:{p:_unpack(v) for p,v in props} for propset_id, props in self._propsets}
+
+
+  def regulators(self)->list[CompactPSObject]:
+    return list(self._regulators)
+
+
+  def targets(self)->list[CompactPSObject]:
+    return list(self._targets)
+
+
+  def regulator_uids(self)->list[int]:
+    return [n.uid() for n in self._regulators]
+
+
+  def target_uids(self)->list[int]:
+    return [n.uid() for n in self._targets]
+
+
+  def is_directional(self):
+    return bool(self._targets)
+
+
+  def effect(self,unknown='unknown')->str:
+    return str(self.get_prop(EFFECT,if_missing_return=unknown))
+
+
+  def count_refs(self)->int:
+    '''
+    output:
+      REFCOUNT property as PSRelation.count_refs() without loaded references, 0 if REFCOUNT is missing
+    '''
+    refcount = self.get_props(REFCOUNT)
+    return max(map(int,refcount)) if refcount else 0
+
+
+  def refs(self,ref_limit=0):
+    return self.to_psrelation().refs(ref_limit=ref_limit)
+
+
+def compact_graph(G:ResnetGraph)->tuple[dict[int,CompactPSObject],dict[str,CompactPSRelation]]:
+  '''
+  output:
+    uid2node - {uid:CompactPSObject} for all nodes in "G",
+    urn2rel - {relation urn:CompactPSRelation} for all unique relations in "G"
+  '''
+  uid2node = {uid:CompactPSObject(n) for uid, n in G.nodes(data=True)}
+  urn2rel = dict()
+  for _,_,rel in G.edges.data('relation'):
+    rel_urn = rel.urn()
+    if rel_urn not in urn2rel:
+      urn2rel[rel_urn] = CompactPSRelation.from_psrelation(rel,uid2node)
+  return uid2node, urn2rel
@@ -0,0 +1,220 @@
+import math,os,multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from .ResnetGraph import ResnetGraph,PSObject,DBID
+from ..ETM_API.references import Reference,ReferenceStore
+from ..Embio.postgres import PostgreSQL
+
+TARGET_WEIGHT = 'target weight' # default name for the target node weight for relation reference count 
+REGULATOR_WEIGHT = 'regulator weight' # default name for the regulator node weight for relation reference count 
+
+__linkers__ = dict() # {concept_name:ConceptLinker} in linking worker process
+__rows__ = list() # [entity_ids] for every DataFrame row in linking worker process
+
+
+def _init_link_worker(linkers:dict,rows:list[list]):
+  global __linkers__, __rows__
+  __linkers__ = linkers
+  __rows__ = rows
+
+
+def _link_concept(concept_name:str)->tuple[list[tuple[float,int,int]|None],int]:
+  row_links, references = __linkers__[concept_name].link(__rows__)
+  return row_links, len(references)
+
+
+class ConceptLinker:
+  '''
+  links DataFrame rows to concept in one pass over relations in connection graph.\n
+  Incidence between graph nodes and relations connecting them with concepts is made once,
+  relation references and their weights are calculated once per relation and combined for every row.
+  Results are identical to per-row linking by subgraphs of connection graph in SemanticSearch
+  '''
+  def __init__(self,connection_graph:ResnetGraph,concepts:list[PSObject],
+               connect_by_rels:list[str]=[],with_effects:list[str]=[],in_direction='',
+               relprop2weight:dict[str,dict[str,float]]=dict(),concepts_have_weights=False,
+               id_type=DBID,postgres:PostgreSQL=None,refstore:ReferenceStore=None):
+    '''
+    input:
+      connect_by_rels, with_effects, in_direction - filters for relations connecting rows to concepts
+      relprop2weight = {property_name:{prop_value:weight}} for reference weights
+      concepts_have_weights - if True concepts must have REGULATOR_WEIGHT and TARGET_WEIGHT properties
+      id_type - node property with row entity identifiers
+      refstore - ReferenceStore interning references of relations in "connection_graph", defaults to new store for connection graph.
+      Snippets of interned references are kept by relations and must be read with PSRelation.ref_snippets()
+    '''
+    self.concept_uids = set(ResnetGraph.uids(concepts))
+    self.in_direction = in_direction
+    self.relid2refs = postgres.load_refs() if postgres else dict()
+    self.refstore = ReferenceStore() if refstore is None else refstore
+    self.relprop2weight = relprop2weight
+    if concepts_have_weights:
+      self.regulatorurn2weight = {o.urn():o.get_prop(REGULATOR_WEIGHT) for o in concepts}
+      self.targeturn2weight = {o.urn():o.get_prop(TARGET_WEIGHT) for o in concepts}
+    else:
+      self.regulatorurn2weight = self.targeturn2weight = None
+
+    self.id2uids = defaultdict(list) # {node_id:[node_uid]}
+    for uid, attrs in connection_graph.nodes(data=True):
+      if (ids := attrs.get(id_type)):
+        self.id2uids[ids[0]].append(uid)
+
+    connect_by_rels = set(connect_by_rels)
+    with_effects = set(with_effects)
+    self.urn2rel = dict() # {relation urn:PSRelation} for relations between concepts and other nodes
+    self.uid2rel_urns = defaultdict(set) # {node_uid:{relation urn}} - relations of node with concepts in any direction
+    self.regulates_concept = set() # uids of nodes regulating concepts by relations passing filters
+    self.regulated_by_concept = set() # uids of nodes regulated by concepts by relations passing filters
+    for regulator_uid, target_uid, rel_urn, rel in connection_graph.edges(keys=True,data='relation'):
+      is_regulator_concept = regulator_uid in self.concept_uids
+      is_target_concept = target_uid in self.concept_uids
+      if not (is_regulator_concept or is_target_concept): continue
+      self.urn2rel[rel_urn] = rel
+      passes_filter = (not connect_by_rels or rel.objtype() in connect_by_rels) and (not with_effects or rel.effect() in with_effects)
+      if is_target_concept:
+        self.uid2rel_urns[regulator_uid].add(rel_urn)
+        if passes_filter: self.regulates_concept.add(regulator_uid)
+      if is_regulator_concept:
+        self.uid2rel_urns[target_uid].add(rel_urn)
+        if passes_filter: self.regulated_by_concept.add(target_uid)
+
+    self.__rel_refs = dict() # {relation urn:[Reference]}
+    self.__rel_stats = dict() # {relation urn:(connected node uids,relweight,nodeweight)}
+
+
+  def __has_connection(self,row_uids:set[int])->bool:
+    if self.in_direction == '>':
+      return not self.regulates_concept.isdisjoint(row_uids)
+    elif self.in_direction == '<':
+      return not self.regulated_by_concept.isdisjoint(row_uids)
+    else:
+      return not (self.regulates_concept.isdisjoint(row_uids) and self.regulated_by_concept.isdisjoint(row_uids))
+
+
+  def __refs(self,rel_urn:str)->list[Reference]:
+    try:
+      return self.__rel_refs[rel_urn]
+    except KeyError:
+      refs = self.urn2rel[rel_urn].refs(relid2refs=self.relid2refs,refstore=self.refstore)
+      self.__rel_refs[rel_urn] = refs
+      return refs
+
+
+  def __stats(self,rel_urn:str)->tuple[set[int],float,float|None]:
+    '''
+    output:
+      uids of nodes connected by relation,
+      relation weight from self.relprop2weight,
+      max weight of relation regulator-target pairs from concept weights or None if relation has no pairs
+    '''
+    try:
+      return self.__rel_stats[rel_urn]
+    except KeyError:
+      rel = self.urn2rel[rel_urn]
+      pairs = rel.get_regulators_targets()
+      connected_uids = {uid for pair in pairs for uid in pair}
+
+      relweight = 0.0
+      if self.relprop2weight:
+        weight_prop, value2weight = next(iter(self.relprop2weight.items()))
+        for value in rel.get(weight_prop,[]):
+          weight = value2weight.get(value,0.0)
+          if weight > relweight: relweight = weight
+
+      nodeweight = None
+      if self.regulatorurn2weight is not None and pairs:
+        uid2urn = {n.uid():n.urn() for nodes in rel.Nodes.values() for n in nodes}
+        nodeweight = max(self.regulatorurn2weight.get(uid2urn[r],0.0)+self.targeturn2weight.get(uid2urn[t],0.0) for r,t in pairs)
+
+      self.__rel_stats[rel_urn] = (connected_uids,relweight,nodeweight)
+      return self.__rel_stats[rel_urn]
+
+
+  def link_row(self,entity_ids:list)->tuple[float,int,int,set[Reference]]|None:
+    '''
+    input:
+      entity_ids - identifiers of row entities
+    output:
+      weighted refcount, refcount, linked concepts count, row references or None if row has no connection to concepts
+    '''
+    row_uids = {uid for i in set(entity_ids) for uid in self.id2uids.get(i,[])}
+    if not row_uids or not self.__has_connection(row_uids):
+      return None
+
+    row_rel_urns = set()
+    [row_rel_urns.update(self.uid2rel_urns[uid]) for uid in row_uids if uid in self.uid2rel_urns]
+
+    connected_uids = set()
+    ref2relweight = dict()
+    ref2nodeweight = dict()
+    for rel_urn in row_rel_urns:
+      rel_connected_uids, relweight, nodeweight = self.__stats(rel_urn)
+      connected_uids.update(rel_connected_uids)
+      for ref in self.__refs(rel_urn):
+        if ref2relweight.get(ref,-math.inf) < relweight:
+          ref2relweight[ref] = relweight
+        if nodeweight is not None and ref2nodeweight.get(ref,-math.inf) < nodeweight:
+          ref2nodeweight[ref] = nodeweight
+
+    references = set(ref2relweight)
+    ref_weights = [1.0]*len(references)
+    if self.regulatorurn2weight is not None:
+      ref_weights = [w + ref2nodeweight.get(r,0.0) for w,r in zip(ref_weights,references)]
+    if self.relprop2weight:
+      ref_weights = [w + ref2relweight[r] for w,r in zip(ref_weights,references)]
+    scopus_score = max([r.get('Relation score',[0.0])[0] for r in references],default=0.0)
+    row_score = float(sum(ref_weights)) * (1 + scopus_score/100)
+
+    number_of_children = len(list(entity_ids))
+    connected_entities_count = len(connected_uids & row_uids)
+    corrected_row_score = row_score * (1+connected_entities_count/number_of_children) # boost by multiple component connectivity
+    corrected_row_score /= math.sqrt(number_of_children) # normalize by number of entity components
+    linked_concepts_count = len(connected_uids & self.concept_uids)
+    return corrected_row_score, len(references), linked_concepts_count, references
+
+
+  def link(self,rows:list[list])->tuple[list[tuple[float,int,int]|None],set[Reference]]:
+    '''
+    input:
+      rows - [entity_ids] for every DataFrame row
+    output:
+      [(weighted refcount, refcount, linked concepts count)] or None for rows without connection to concepts,
+      references of all linked rows
+    '''
+    row_links = list()
+    all_references = set()
+    for entity_ids in rows:
+      row_link = self.link_row(entity_ids)
+      if row_link is None:
+        row_links.append(None)
+      else:
+        all_references.update(row_link[3])
+        row_links.append(row_link[:3])
+    return row_links, all_references
+
+
+def link_concepts(linkers:dict[str,ConceptLinker],rows:list[list],max_workers:int|None=None)->dict[str,tuple[list[tuple[float,int,int]|None],int]]:
+  '''
+  input:
+    linkers = {concept_name:ConceptLinker}
+    rows - [entity_ids] for every DataFrame row
+    max_workers - number of processes. Concepts are linked in the calling process if max_workers == 1
+  output:
+    {concept_name:([(weighted refcount, refcount, linked concepts count)] or None for rows without connection, number of references)}
+    Linkers and rows are inherited read-only by forked worker processes and concepts are linked independently by different processes.
+    References are not picklable, therefore concepts are linked in the calling process on platforms without "fork"
+  '''
+  if not linkers: return dict()
+  max_workers = min(max_workers or os.cpu_count() or 1,len(linkers))
+  if 'fork' not in multiprocessing.get_all_start_methods(): max_workers = 1
+  if max_workers == 1:
+    _init_link_worker(linkers,rows)
+    try:
+      return {name:_link_concept(name) for name in linkers}
+    finally:
+      _init_link_worker(dict(),list())
+
+  with ProcessPoolExecutor(max_workers=max_workers,mp_context=multiprocessing.get_context('fork'),
+                           initializer=_init_link_worker,initargs=(linkers,rows)) as e:
+    futures = {name:e.submit(_link_concept,name) for name in linkers}
+    return {name:future.result() for name,future in futures.items()}
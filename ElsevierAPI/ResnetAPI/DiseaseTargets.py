@@ -1,5 +1,7 @@
 from .ResnetGraph import PROTEIN_TYPES,PHYSICAL_INTERACTIONS,ResnetGraph,unpack
 from .PSPathway import PSPathway
+from .SparseRank import SparseRanker
+from .StatePropagator import StatePropagator
 from .FolderContent import FolderContent
 from .NetworkxObjects import ACTIVATED,REPRESSED,UNKNOWN_STATE,OBJECT_TYPE,CONNECTIVITY,EFFECT,MECHANISM,REFCOUNT,PSRelation,PSObject
 from .SemanticSearch import SemanticSearch,OQL,RANK,execution_time
@@ -733,8 +735,9 @@ class DiseaseTargets(SemanticSearch):
       self.disease_model = self.disease_model.compose(graph)
 
     if self.disease_model and 'propagate_target_state_in_model' in self.params:
-      uid2state = dict()
-      [uid2state.update(self.disease_model.propagate_state(t)) for t in targets if t.uid() in self.disease_model.nodes()]
+      model_targets = [t for t in targets if t.uid() in self.disease_model.nodes()]
+      propagator = StatePropagator(self.disease_model)
+      uid2state = propagator.states({t.uid():int(t.state()) for t in model_targets})
       #id_type = 'URN' if self.useNeo4j() else DBID
 
       def __disease_state_from_model():
@@ -883,15 +886,16 @@ class DiseaseTargets(SemanticSearch):
         unconnected_nodes = unconnected_nodes - regulation_graph_nodes
 
       print('Ranking targets by regulation score')
+      ranker = SparseRanker(regulation_graph)
       if self.disease_pathways:
         for pathway in self.disease_pathways.values():
           assert(isinstance(pathway,PSPathway))
           uid2clos = pathway.graph.closeness()
           #regulation_graph.rank_regulatorsOLD(uid2clos,PATHWAY_REGULATOR_SCORE)
-          regulation_graph.rank_regulators(uid2clos,PATHWAY_REGULATOR_SCORE)
+          regulation_graph.rank_regulators(uid2clos,PATHWAY_REGULATOR_SCORE,backend='sparse',ranker=ranker)
       else:
         #regulation_graph.rank_regulatorsOLD(uid2closeness,PATHWAY_REGULATOR_SCORE)
-        regulation_graph.rank_regulators(uid2closeness,PATHWAY_REGULATOR_SCORE)
+        regulation_graph.rank_regulators(uid2closeness,PATHWAY_REGULATOR_SCORE,backend='sparse',ranker=ranker)
 
       dbid2uid = regulation_graph.dbid2uid(id_type=self.idtype())
       for i in self.RefCountPandas.index:
@@ -932,26 +936,19 @@ class DiseaseTargets(SemanticSearch):
     self.score_GVs() # STEP 7a
     self.set_target_disease_state() # STEP 7b
 
-    kwargs = {'connect_by_rels':['Regulation'],
-              'boost_with_reltypes':['FunctionalAssociation'],
-              'concept_name':'Regulate '+ disease_str
-              }
-    _,self.RefCountPandas = self.score_concepts(self.input_diseases,**kwargs)
-
-    kwargs = {'connect_by_rels':['GeneticChange'],
-              'boost_with_reltypes':['FunctionalAssociation'],
-              'concept_name':'Genetically linked to '+ disease_str}
-    _,self.RefCountPandas = self.score_concepts(self.input_diseases,**kwargs)
-
-    kwargs = {'connect_by_rels':['Biomarker'],
-              'boost_with_reltypes':['FunctionalAssociation'],
-              'concept_name':'Target is Biomarker in '+disease_str}
-    _,self.RefCountPandas = self.score_concepts(self.input_diseases,**kwargs)
-
-    kwargs = {'connect_by_rels':['QuantitativeChange'],
-              'boost_with_reltypes':['FunctionalAssociation'],
-              'concept_name':'Quantitatively changed in '+ disease_str}
-    _,self.RefCountPandas = self.score_concepts(self.input_diseases,**kwargs)
+    # disease concepts are linked to targets by independent relation types in parallel processes
+    concept2kwargs = {
+      'Regulate '+ disease_str : (self.input_diseases,{'connect_by_rels':['Regulation'],
+                                                       'boost_with_reltypes':['FunctionalAssociation']}),
+      'Genetically linked to '+ disease_str : (self.input_diseases,{'connect_by_rels':['GeneticChange'],
+                                                                    'boost_with_reltypes':['FunctionalAssociation']}),
+      'Target is Biomarker in '+disease_str : (self.input_diseases,{'connect_by_rels':['Biomarker'],
+                                                                    'boost_with_reltypes':['FunctionalAssociation']}),
+      'Quantitatively changed in '+ disease_str : (self.input_diseases,{'connect_by_rels':['QuantitativeChange'],
+                                                                        'boost_with_reltypes':['FunctionalAssociation']})
+      }
+    max_workers = 1 if self.params.get('debug',False) else None
+    _,self.RefCountPandas = self.score_concepts_in_parallel(concept2kwargs,max_workers=max_workers)
 
     kwargs = {'connect_by_rels':['Regulation','QuantitativeChange','StateChange','Biomarker'],
               'boost_with_reltypes':['FunctionalAssociation','CellExpresion'],
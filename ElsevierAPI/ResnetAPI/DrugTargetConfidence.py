@@ -5,6 +5,217 @@ from ..utils import execution_time2,time,execution_time
 from math import log, sqrt
 from collections import defaultdict
 from ..Embio.cypher import Cypher
+from scipy import sparse
+import numpy as np
+import os,hashlib
+
+MEAN_PX = 6.7 # average pX of all DirectRegulation from Reaxys
+SCORES_EXT = '_scores.npz'
+
+
+class DrugTargetScores:
+    '''
+    drug x target matrices precomputed from drug2target cache for vectorized drug ranking:\n
+    primary - 1.0 if first drug-target relation is primary target relation,
+    pX - pX correction 1.5 + pX/12 for primary targets,
+    positive, negative - consistency coefficients for drug-target pairs with positive and negative effect.\n
+    Matrix rows are drug uids from self.drug_uids, columns are target uids from self.target_uids.\n
+    Scores are made only for drug-target pairs connected by relations in the graph used to make them
+    '''
+    matrix_names = ['primary','pX','positive','negative']
+
+    def __init__(self):
+        self.drug_urns = list()
+        self.target_urns = list()
+        self.drug_idx = dict() # {drug_uid:row}
+        self.target_idx = dict() # {target_uid:column}
+        self.values = {name:dict() for name in self.matrix_names} # {name:{(row,column):value}}
+        self.source = '' # graph_stamp() of graph used to make self
+        self.__csr = dict()
+
+
+    def __len__(self):
+        return len(self.values['primary'])+len(self.values['positive'])+len(self.values['negative'])
+
+
+    def __row(self,drug_uid:int,drug_urn:str)->int:
+        if drug_uid not in self.drug_idx:
+            self.drug_idx[drug_uid] = len(self.drug_urns)
+            self.drug_urns.append(drug_urn)
+        return self.drug_idx[drug_uid]
+
+
+    def __column(self,target_uid:int,target_urn:str)->int:
+        if target_uid not in self.target_idx:
+            self.target_idx[target_uid] = len(self.target_urns)
+            self.target_urns.append(target_urn)
+        return self.target_idx[target_uid]
+
+
+    @staticmethod
+    def graph_stamp(G:ResnetGraph)->str:
+        '''
+        output:
+            md5 digest of URNs and properties of all relations in "G"
+        '''
+        rel_keys = sorted(f'{rel.urn()}{sorted(rel.items())}' for _,_,rel in G.edges.data('relation'))
+        return hashlib.md5('\n'.join(rel_keys).encode()).hexdigest()
+
+
+    def add_graph(self,G:ResnetGraph,pairs:set[tuple[int,int]]=None):
+        '''
+        input:
+            pairs - {(drug_uid,target_uid)} to score, defaults to all pairs connected by relations in "G"
+        makes scores for drug-target pairs connected by relations in "G" replacing their existing scores
+        '''
+        for drug_uid, target_uid in (set(G.edges()) if pairs is None else pairs):
+            dt_rels = G._psrels4(drug_uid,target_uid)
+            if not dt_rels: continue
+            row = self.__row(drug_uid,G.nodes[drug_uid]['URN'][0])
+            column = self.__column(target_uid,G.nodes[target_uid]['URN'][0])
+            dt_rel = dt_rels[0]
+            is_primary = dt_rel.isprimarytarget()
+            self.values['primary'][(row,column)] = float(is_primary)
+            if is_primary:
+                pX = float(dt_rel.get_prop('Affinity',0,MEAN_PX))
+                self.values['pX'][(row,column)] = 1.5 + pX/12.0
+            else:
+                self.values['pX'].pop((row,column),None)
+            [self.values[effect].pop((row,column),None) for effect in ('positive','negative')]
+            for rel in dt_rels:
+                if rel.objtype() != 'Binding' and CONSISTENCY in rel:
+                    effect = rel.effect()
+                    if effect in ('positive','negative'):
+                        self.values[effect][(row,column)] = float(rel[CONSISTENCY][-1])
+        self.__csr.clear()
+
+
+    @classmethod
+    def from_graph(cls,G:ResnetGraph)->'DrugTargetScores':
+        scores = cls()
+        scores.add_graph(G)
+        scores.source = cls.graph_stamp(G)
+        return scores
+
+
+    def subset(self,G:ResnetGraph)->'DrugTargetScores':
+        '''
+        output:
+            DrugTargetScores for drug-target pairs connected by relations in "G" with rows and columns limited to drugs and targets in "G".\n
+            Scores of pairs missing in self are made from relations in "G"
+        '''
+        scores = DrugTargetScores()
+        scores.source = self.source
+        missing = set()
+        for drug_uid, target_uid in set(G.edges()):
+            row, column = self.drug_idx.get(drug_uid), self.target_idx.get(target_uid)
+            if row is None or column is None or (row,column) not in self.values['primary']:
+                missing.add((drug_uid,target_uid))
+                continue
+            new_pair = (scores.__row(drug_uid,self.drug_urns[row]),scores.__column(target_uid,self.target_urns[column]))
+            for name in self.matrix_names:
+                value = self.values[name].get((row,column))
+                if value is not None:
+                    scores.values[name][new_pair] = value
+        if missing:
+            scores.add_graph(G,missing)
+        return scores
+
+
+    def update_consistency(self,drug_target_confidence:dict[tuple[int,int,str],float]):
+        '''
+        input:
+            drug_target_confidence = {(drug_uid,target_uid,effect):consistency_coefficient}
+        replaces consistency coefficients of all drug-target pairs in self with coefficients from "drug_target_confidence".
+        Pairs missing in "drug_target_confidence" get no consistency correction
+        '''
+        row2drug = {row:drug_uid for drug_uid,row in self.drug_idx.items()}
+        column2target = {column:target_uid for target_uid,column in self.target_idx.items()}
+        for effect in ('positive','negative'):
+            effect_values = dict()
+            for row, column in self.values['primary']:
+                key = (row2drug[row],column2target[column],effect)
+                if key in drug_target_confidence:
+                    effect_values[(row,column)] = float(drug_target_confidence[key])
+            self.values[effect] = effect_values
+        self.__csr.clear()
+
+
+    def matrix(self,name:str)->sparse.csr_matrix:
+        if name not in self.__csr:
+            pairs = self.values[name]
+            rows = np.fromiter((p[0] for p in pairs),dtype=np.int64,count=len(pairs))
+            columns = np.fromiter((p[1] for p in pairs),dtype=np.int64,count=len(pairs))
+            data = np.fromiter(pairs.values(),dtype=np.float64,count=len(pairs))
+            shape = (len(self.drug_urns),len(self.target_urns))
+            self.__csr[name] = sparse.csr_matrix((data,(rows,columns)),shape=shape)
+        return self.__csr[name]
+
+
+    def corrections(self,drug_uids:list[int],target_uids:list[int],with_effect:str,correct_by_consistency:bool)->sparse.csr_matrix:
+        '''
+        output:
+            len(drug_uids) x len(target_uids) matrix with correction - 1 for target ranks, where\n
+            correction = pX correction for primary targets * consistency correction if "correct_by_consistency"
+        '''
+        pX = self.matrix('pX')
+        pX_delta = pX - (pX > 0).astype(np.float64)
+        delta = pX_delta
+        if correct_by_consistency:
+            consistency = self.matrix(with_effect)
+            delta = pX_delta + consistency + pX_delta.multiply(consistency)
+
+        def selector(uids:list[int],uid2idx:dict[int,int],size:int)->sparse.csr_matrix:
+            found = [(i,uid2idx[uid]) for i,uid in enumerate(uids) if uid in uid2idx]
+            positions = [f[0] for f in found]
+            indexes = [f[1] for f in found]
+            return sparse.csr_matrix((np.ones(len(found)),(positions,indexes)),shape=(len(uids),size))
+
+        rows = selector(drug_uids,self.drug_idx,len(self.drug_urns))
+        columns = selector(target_uids,self.target_idx,len(self.target_urns))
+        return (rows @ delta @ columns.T).tocsr()
+
+
+    def save(self,path:str):
+        arrays = {'drug_urns':np.array(self.drug_urns,dtype=str),'target_urns':np.array(self.target_urns,dtype=str)}
+        for name in self.matrix_names:
+            coo = self.matrix(name).tocoo()
+            arrays[name+'_row'] = coo.row
+            arrays[name+'_col'] = coo.col
+            arrays[name+'_data'] = coo.data
+        arrays['source'] = np.array(self.source)
+        np.savez_compressed(path,**arrays)
+        print(f'Drug-target scores for {len(self.drug_urns)} drugs and {len(self.target_urns)} targets were saved into "{path}"')
+
+
+    @classmethod
+    def load(cls,path:str,G:ResnetGraph)->'DrugTargetScores|None':
+        '''
+        input:
+            G - graph expected to be source of scores in "path"
+        output:
+            DrugTargetScores or None if "path" does not exist or was made from graph different from "G"
+        '''
+        try:
+            arrays = np.load(path)
+        except FileNotFoundError:
+            return None
+        source = str(arrays['source'])
+        if source != cls.graph_stamp(G):
+            print(f'"{path}" was made from different drug-target graph and will be recalculated')
+            return None
+
+        scores = cls()
+        scores.source = source
+        scores.drug_urns = arrays['drug_urns'].tolist()
+        scores.target_urns = arrays['target_urns'].tolist()
+        scores.drug_idx = {PSObject.urn2uid(urn):i for i,urn in enumerate(scores.drug_urns)}
+        scores.target_idx = {PSObject.urn2uid(urn):i for i,urn in enumerate(scores.target_urns)}
+        for name in cls.matrix_names:
+            rows, columns = arrays[name+'_row'].tolist(), arrays[name+'_col'].tolist()
+            scores.values[name] = dict(zip(zip(rows,columns),arrays[name+'_data'].tolist()))
+        return scores
+
 
 class DrugTargetConsistency(APIcache):
     '''
@@ -17,6 +228,7 @@ class DrugTargetConsistency(APIcache):
     cache_ent_props = ['Name','PharmaPendium ID','Molecular Weight']
     cache_rel_props = ['URN',EFFECT,REFCOUNT,CONSISTENCY,'pX','Affinity']
     drug_target_confidence = dict()
+    dt_scores = None # DrugTargetScores for self.network
     debug = False
     predict_effect4 = {'_4enttypes':['SmallMol'],'_4reltypes':['Binding']}
     
@@ -58,6 +270,24 @@ class DrugTargetConsistency(APIcache):
         super().__init__(*args,**my_kwargs)
 
 
+    def load_scores(self,rebuild=False)->DrugTargetScores:
+        '''
+        output:
+            self.dt_scores - DrugTargetScores for self.network loaded from file saved with drug2target cache.\n
+            Scores are recalculated from self.network and saved if file is missing, was made from different network or "rebuild" is True
+        '''
+        if not self.network:
+            self.network = self._load_cache(cache_name=self.cache_name)
+        scores_file = self.cache_path(SCORES_EXT)
+        scores = None if rebuild else DrugTargetScores.load(scores_file,self.network)
+        if scores is None:
+            scores = DrugTargetScores.from_graph(self.network)
+            if os.path.exists(self.cache_path()):
+                scores.save(scores_file)
+        self.dt_scores = scores
+        return scores
+
+
     def d2t_from_db(self,for_targets:set[PSObject],limit2drugs:set[PSObject]={}):
         rn = f'Loading drugs for {len(for_targets)} targets from database'
         target_names = {t.name() for t in for_targets}
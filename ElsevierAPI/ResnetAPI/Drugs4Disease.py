@@ -8,7 +8,8 @@ from ..FDA.fda_api import FDA
 from ..ReaxysAPI.Reaxys_API import drugs2props
 from numpy import nan_to_num
 import networkx as nx
-from .DrugTargetConfidence import DrugTargetConsistency
+from .DrugTargetConfidence import DrugTargetConsistency,DrugTargetScores
+from .SparseRank import SparseRanker
 from ..utils import run_tasks,execution_time,os,DEFAULT_CONFIG_DIR,sortdict
 
 
@@ -60,6 +61,7 @@ class Drugs4Targets(DiseaseTargets):
     my_kwargs.update(kwargs)
     super().__init__(*args,**my_kwargs)
     self.target_uid2rank = dict() # {target_dbid:rank}
+    self.dt_scores = None # DrugTargetScores for self.drugs2targets
     self.direct_target2drugs = PSObject() # used for annotation of ANTAGONIST_TARGETS_WS,AGONIST_TARGETS_WS with drugs
     self.indirect_target2drugs = PSObject() # used for annotation of ANTAGONIST_TARGETS_WS,AGONIST_TARGETS_WS with drugs
     self.add_targets2drugs_ws = True
@@ -82,33 +84,37 @@ class Drugs4Targets(DiseaseTargets):
     return self.data_dir+self.report_name()+ext
 
 
-  def __rank(self,targets:list[PSObject],_4drug:PSObject,with_effect:str,correct_by_consistency:bool)->dict[int,float]:
+  def __drug_target_scores(self)->DrugTargetScores:
     '''
     output:
-      target_uid2corrected_rank = {target_uid:rank},\n
-      if "correct_by_consistency" rank from "self.target_uid2rank" corrected by "self.dt_consist" 
+      self.dt_scores - DrugTargetScores for drug-target pairs in self.drugs2targets with consistency coefficients from self.dt_consist.\n
+      Scores are sliced from scores persisted with drug2target cache.
+      Pairs missing in cache, such as relations for metabolites, are scored from self.drugs2targets
     '''
-  # debug ranking for a drug here:
-    # if _4drug.urn() in ['urn:agi-smol:jr-446','urn:agi-cas:1808916-28-0']:
-    #    print('')
-    targets_uids = ResnetGraph.uids(targets)
-    target_uid2corrected_rank = {k:v for k,v in self.target_uid2rank.items() if k in targets_uids}
-    meanpX = 6.7 # this value was calculated as average pX of all DirectRegulation from Reaxys
-    for target in targets:
-      target_uid = target.uid()
-      dt_rels = self.drugs2targets._psrels4(_4drug.uid(),target_uid)
-      if dt_rels: # dt_rels may be empty because not every target from df is linked to drug
-        dt_rel = dt_rels[0]
-        if dt_rel.isprimarytarget():
-          pX = float(dt_rels[0].get_prop('Affinity',0,meanpX))
-          pXcorrection = 1.5 + pX/12.0
-          target_uid2corrected_rank[target_uid] *= pXcorrection
-          
-        if correct_by_consistency:
-          consistency_correction = self.dt_consist.consistency_correction(_4drug,target,with_effect)
-          target_uid2corrected_rank[target_uid] *= consistency_correction
-
-    return target_uid2corrected_rank
+    if self.dt_scores is None:
+      scores = self.dt_consist.load_scores().subset(self.drugs2targets)
+      scores.update_consistency(self.dt_consist.drug_target_confidence)
+      self.dt_scores = scores
+    return self.dt_scores
+
+
+  def __rank(self,targets:list[PSObject],drugs:list[PSObject],in_graph:ResnetGraph,with_effect:str,correct_by_consistency:bool)->dict[int,float]:
+    '''
+    output:
+      {drug_uid:rank}, where rank is ResnetGraph.rank_regulator() for target ranks from "self.target_uid2rank"
+      corrected by pX of primary targets and, if "correct_by_consistency", by drug-target consistency from "self.dt_consist"
+    '''
+    targets_uids = set(ResnetGraph.uids(targets))
+    ranker = SparseRanker(in_graph)
+    target_uid2rank = {k:v for k,v in self.target_uid2rank.items() if k in targets_uids and k in ranker.uid2idx}
+    drug_uids = ResnetGraph.uids(drugs)
+    target_uids = list(target_uid2rank)
+    target_ranks = np.array(list(target_uid2rank.values()),dtype=float)
+
+    distance_weights = ranker.distance_weights(drug_uids)[:,[ranker.uid2idx[uid] for uid in target_uids]]
+    corrections = self.__drug_target_scores().corrections(drug_uids,target_uids,with_effect,correct_by_consistency)
+    drug_ranks = distance_weights @ target_ranks + distance_weights.multiply(corrections) @ target_ranks
+    return dict(zip(drug_uids,np.ravel(drug_ranks).tolist()))
   
 
   def add_rank(self,_2df:df,d2t_graph:ResnetGraph):
@@ -239,7 +245,7 @@ Directly inhibited targets',\n'Indirectly inhibited targets',\n'Directly activat
     my_drugs = [d for d in my_drugs if d not in self._targets()] # to remove metabolite targets
     
     # initializing drug ranks   
-    drug2rank = {d.uid():[my_dtG.rank_regulator(d,self.__rank(targets,d,with_effect,correct_by_consistency))] for d in my_drugs}
+    drug2rank = {uid:[rank] for uid,rank in self.__rank(targets,my_drugs,my_dtG,with_effect,correct_by_consistency).items()}
    # print(sortdict(drug2rank, by_key=False, reverse=True, return_top=25))
     nx.set_node_attributes(my_dtG,drug2rank,DRUG2TARGET_REGULATOR_SCORE)
   
@@ -430,74 +436,47 @@ Directly inhibited targets',\n'Indirectly inhibited targets',\n'Directly activat
         concepts_rows.append([concept_name,rank,concept.name(),concept.number_of_children(),weight,connectivity])
       return concepts_rows
         
+    disease_str = self._disease2str()
+    max_workers = 1 if self.params.get('debug',False) else None
     kwargs = {'connect_by_rels':['Regulation'],
-              'with_effects':['positive'],
               'boost_with_reltypes':['FunctionalAssociation','Regulation'],
               'clone2retrieve' : REFERENCE_IDENTIFIERS,
               'init_refstat' : False,
-              'concept_name': 'Cell processess to activate in '+ self._disease2str(),
               'add_relevance_concept_column':True}
-    _,drug_df,concepts = self.score_concept('processes2activate',drug_df,**kwargs)
-    if concepts:
-      phenotypedf_rows += concepts2rows(concepts,kwargs['concept_name'])
-
-    kwargs['with_effects'] = ['negative']
-    kwargs['concept_name'] = 'Cell processess to inhibit in '+ self._disease2str()
-    kwargs['column_rank'] = drug_df.max_colrank()
-    _,drug_df,concepts = self.score_concept('processes2inhibit',drug_df,**kwargs)
-    kwargs.pop('column_rank') #need to remove 'column_rank' from kwargs to advance ranking automatically by score_concept
-    if concepts:
-      phenotypedf_rows += concepts2rows(concepts,kwargs['concept_name'])
-    
-    # self.params['processes'] are formed by score_target_semantics():
-    kwargs['with_effects'] = ['unknown']
-    kwargs['concept_name'] = 'Cell processess affected by '+ self._disease2str()
-    _,drug_df,concepts = self.score_concept('processes',drug_df,**kwargs)
-    if concepts:
-      phenotypedf_rows += concepts2rows(concepts,kwargs['concept_name'])
-
-    kwargs['with_effects'] = ['positive']
-    kwargs['concept_name'] = 'Cells to activate  in '+ self._disease2str()
-    _,drug_df,concepts = self.score_concept('cells2activate',drug_df,**kwargs)
-    if concepts:
-      phenotypedf_rows += concepts2rows(concepts,kwargs['concept_name'])
-
-    kwargs.pop('with_effects','')
-    kwargs['concept_name'] = 'Clinical parameters for '+ self._disease2str()
-    _,drug_df,concepts = self.score_concept('clinical_parameters',drug_df,**kwargs)
-    if concepts:
-      phenotypedf_rows += concepts2rows(concepts,kwargs['concept_name'])
-
+    # phenotype concepts are linked to drugs in parallel processes
+    column2params = {
+      'Cell processess to activate in '+ disease_str : ('processes2activate',dict(kwargs,with_effects=['positive'])),
+      # processes to inhibit have the same rank as processes to activate:
+      'Cell processess to inhibit in '+ disease_str : ('processes2inhibit',dict(kwargs,with_effects=['negative'],column_rank=drug_df.max_colrank()+1)),
+      # self.params['processes'] are formed by score_target_semantics():
+      'Cell processess affected by '+ disease_str : ('processes',dict(kwargs,with_effects=['unknown'])),
+      'Cells to activate  in '+ disease_str : ('cells2activate',dict(kwargs,with_effects=['positive'])),
+      'Clinical parameters for '+ disease_str : ('clinical_parameters',dict(kwargs))
+      }
+    drug_df,column2concepts = self.score_params_in_parallel(column2params,drug_df,max_workers)
+    for column_name,concepts in column2concepts.items():
+      phenotypedf_rows += concepts2rows(concepts,column_name)
+
+    column2params = dict()
     if 'symptoms' in self.params:
       # calculating first symptoms aggravated by the drug. All columns except 'Aggravated symptoms" will be deleted
       # column  Refcount aggravate symptoms for ... will be subtaracted from symptoms columns 
       # and drugs known to exacerbate symptoms more than inhibit them will be deleted from drug_df
-      kwargs['with_effects'] = ['positive']
-      aggravate_symptoms_col = 'aggravate symptoms for '+ self._disease2str()
-      kwargs['concept_name'] = aggravate_symptoms_col
-      kwargs['column_rank'] = drug_df.max_colrank() 
-      _,drug_df,_ = self.score_concept('symptoms',drug_df,**kwargs)
-      kwargs.pop('column_rank') # need to remove 'column_rank' from kwargs to advance ranking automatically by score_concept
+      aggravate_symptoms_col = 'aggravate symptoms for '+ disease_str
+      aggravate_kwargs = dict(kwargs,with_effects=['positive'],concept_name=aggravate_symptoms_col,column_rank=drug_df.max_colrank())
+      _,drug_df,_ = self.score_concept('symptoms',drug_df,**aggravate_kwargs)
       drug_df = drug_df.dfcopy(rename2={'Relevant symptoms':'Aggravated symptoms'})
+      column2params['inhibit symptoms for '+ disease_str] = ('symptoms',dict(kwargs,with_effects=['negative']))
+      column2params['symptoms for '+ disease_str] = ('symptoms',dict(kwargs,with_effects=['unknown']))
+    
+    # drugs removed below for aggravating symptoms are linked to similar diseases together with symptoms
+    column2params['regulation of diseases similar to '+ disease_str] = ('similar_diseases',dict(kwargs,with_effects=['negative']))
+    drug_df,column2concepts = self.score_params_in_parallel(column2params,drug_df,max_workers)
+    for column_name,concepts in column2concepts.items():
+      phenotypedf_rows += concepts2rows(concepts,column_name)
 
-      symptoms_columns = []
-      colname = 'inhibit symptoms for '+ self._disease2str()
-      kwargs['concept_name'] = colname
-      kwargs['with_effects'] = ['negative']
-      #kwargs['column_rank'] = 1
-      _,drug_df,concepts= self.score_concept('symptoms',drug_df,**kwargs)
-      if concepts:
-        phenotypedf_rows += concepts2rows(concepts,kwargs['concept_name'])
-        symptoms_columns.append(colname)
-
-      kwargs['with_effects'] = ['unknown']
-      colname = 'symptoms for '+ self._disease2str()
-      kwargs['concept_name'] = colname
-      _,drug_df,concepts = self.score_concept('symptoms',drug_df,**kwargs)
-      if concepts:
-        phenotypedf_rows += concepts2rows(concepts,kwargs['concept_name'])
-        symptoms_columns.append(colname)
-
+    if 'symptoms' in self.params:
+      symptoms_columns = [c for c,(param_name,_) in column2params.items() if param_name == 'symptoms' and column2concepts.get(c)]
       aggravated_symptoms_refcount_col = self._refcount_colname(aggravate_symptoms_col)
       print('Removing drugs aggravating symptoms:')
       for col in symptoms_columns:
@@ -510,23 +489,16 @@ Directly inhibited targets',\n'Indirectly inhibited targets',\n'Directly activat
       aggravated_symptoms_cols = self._refcount_columns(aggravate_symptoms_col)
       my_cols = drug_df.columns.drop(aggravated_symptoms_cols).to_list()
       drug_df = drug_df.dfcopy(my_cols)
-      kwargs.pop('with_effects','')
-
-    kwargs['concept_name'] = 'regulation of diseases similar to '+ self._disease2str()
-    kwargs['with_effects'] = ['negative']
-    _,drug_df,concepts = self.score_concept('similar_diseases',drug_df,**kwargs)
-    if concepts:
-      phenotypedf_rows += concepts2rows(concepts,kwargs['concept_name'])
 
-    kwargs['add_relevance_concept_column'] = False
-    kwargs.pop('with_effects')
-    kwargs['concept_name'] = 'regulation of '+ self._disease2str()
-    kwargs.pop('clone2retrieve','') # following steps have useful articles for Bibliography worksheet
-    _,drug_df = self.score_concepts(self.input_diseases,drug_df,**kwargs)
-
-    kwargs['concept_name'] = self._disease2str()+' clinical trials'
-    kwargs['boost_with_reltypes'] = []
-    _,drug_df = self.score_concepts(self.input_diseases,drug_df,**kwargs)
+    # following steps have useful articles for Bibliography worksheet and are not cloned
+    kwargs = {'connect_by_rels':['Regulation'],
+              'boost_with_reltypes':['FunctionalAssociation','Regulation'],
+              'init_refstat' : False}
+    concept2kwargs = {
+      'regulation of '+ disease_str : (self.input_diseases,dict(kwargs)),
+      disease_str+' clinical trials' : (self.input_diseases,dict(kwargs,boost_with_reltypes=[]))
+      }
+    _,drug_df = self.score_concepts_in_parallel(concept2kwargs,drug_df,max_workers)
 
     rank_col = 'Concept rank'
     children_col = '# children'
@@ -775,6 +747,7 @@ Directly inhibited targets',\n'Indirectly inhibited targets',\n'Directly activat
       self.drugs2targets = self.drugs2targets.compose(self.drugs4metabolites())
 
       self.drugs4add_inhibitors4()
+      self.dt_scores = None
       drugs4targets = set(self.drugs2targets._psobjs_with('SmallMol','ObjTypeName'))
       drugs4targets -= self._targets() # subtracting self._targets() to remove metabolites2inhibit from drug list
       drugs4targets = self.add_drugs_withno_targets(list(drugs4targets))
@@ -0,0 +1,183 @@
+import time, threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from .NetworkxObjects import PSObject
+
+ENTITY_BATCH_SIZE = 1000 # max number of ids in one GOQL query retrieving entities
+ENTITY_FETCH_THREADS = 8
+ENTITY_CACHE_SIZE = 1000000 # max number of cached entities. Cache is cleared if exceeded
+BATCH_WAIT = 0.05 # seconds to collect entity ids from other pages before fetching batch
+
+
+def copy_psobj(psobj:PSObject)->PSObject:
+  return PSObject({k:list(v) for k,v in psobj.items()})
+
+
+class EntityCache:
+  '''
+  session-wide cache of entity properties keyed by database id.\n
+  Entity ids requested by result pages retrieved in parallel are deduplicated
+  and fetched in batches by background threads while pages continue relation retrieval.\n
+  Entities are cached separately for every set of retrieved properties.
+  Ids not found in database are also cached and are not requested again
+  '''
+  def __init__(self,fetch,batch_size=ENTITY_BATCH_SIZE,fetch_threads=ENTITY_FETCH_THREADS,
+               max_size=ENTITY_CACHE_SIZE,batch_wait=BATCH_WAIT):
+    '''
+    input:
+      fetch(dbids:list[int],props:list[str])->dict[int,PSObject]
+    '''
+    self.fetch = fetch
+    self.batch_size = batch_size
+    self.fetch_threads = fetch_threads
+    self.max_size = max_size
+    self.batch_wait = batch_wait
+    self.lock = threading.Lock()
+    self.props2cache = defaultdict(dict) # {props:{dbid:PSObject}}
+    self.props2absent = defaultdict(set) # {props:{dbid}} for ids not found in database
+    self.pending = dict() # {(props,dbid):Future} for entities waiting for retrieval
+    self.queue = defaultdict(list) # {props:[dbid]} for entities waiting for batch
+    self.fetchers = 0 # number of batches in progress
+    self.executor = None
+    self.hits = 0
+    self.misses = 0
+    self.batches = 0
+
+
+  @staticmethod
+  def __key(props:list)->tuple:
+    return tuple(sorted(set(props)))
+
+
+  def __size(self)->int:
+    return sum(len(c) for c in self.props2cache.values()) + sum(len(a) for a in self.props2absent.values())
+
+
+  def cached(self,dbids:list[int],props:list[str])->tuple[dict[int,PSObject],list[int]]:
+    '''
+    output:
+      {dbid:PSObject} for cached "dbids", list of dbids missing in cache.\n
+      Cached ids not found in database are in neither output
+    '''
+    key = self.__key(props)
+    found = dict()
+    missing = list()
+    with self.lock:
+      cache = self.props2cache[key]
+      absent = self.props2absent[key]
+      for dbid in set(dbids):
+        if dbid in cache:
+          found[dbid] = copy_psobj(cache[dbid])
+        elif dbid not in absent:
+          missing.append(dbid)
+      self.hits += len(set(dbids)) - len(missing)
+      self.misses += len(missing)
+    return found, missing
+
+
+  def add(self,dbid2psobj:dict[int,PSObject],props:list[str],requested:list[int]=[]):
+    '''
+    input:
+      requested - dbids used to retrieve "dbid2psobj". Ids missing in "dbid2psobj" are cached as not found in database
+    '''
+    key = self.__key(props)
+    absent = set(requested).difference(dbid2psobj)
+    with self.lock:
+      if self.__size() + len(dbid2psobj) + len(absent) > self.max_size:
+        self.props2cache.clear()
+        self.props2absent.clear()
+      self.props2cache[key].update({dbid:copy_psobj(o) for dbid,o in dbid2psobj.items()})
+      self.props2absent[key].update(absent)
+
+
+  def get(self,dbids:list[int],props:list[str])->dict[int,PSObject]:
+    '''
+    output:
+      {dbid:PSObject} for "dbids" found in database.\n
+      Waits for entities from batches shared with other pages
+    '''
+    key = self.__key(props)
+    dbid2future = dict()
+    found = dict()
+    with self.lock:
+      cache = self.props2cache[key]
+      absent = self.props2absent[key]
+      for dbid in set(dbids):
+        if dbid in cache:
+          found[dbid] = copy_psobj(cache[dbid])
+          self.hits += 1
+          continue
+        if dbid in absent:
+          self.hits += 1
+          continue
+        future = self.pending.get((key,dbid))
+        if future is None:
+          future = Future()
+          self.pending[(key,dbid)] = future
+          self.queue[key].append(dbid)
+          self.misses += 1
+        else:
+          self.hits += 1
+        dbid2future[dbid] = future
+      self.__schedule(key)
+
+    for dbid, future in dbid2future.items():
+      psobj = future.result()
+      if psobj is not None:
+        found[dbid] = copy_psobj(psobj)
+    return found
+
+
+  def __schedule(self,key:tuple):
+    '''
+    starts batch fetching threads for entities in self.queue[key]. Must be called under self.lock
+    '''
+    if self.executor is None:
+      self.executor = ThreadPoolExecutor(self.fetch_threads,thread_name_prefix='EntityCache')
+    waiting = len(self.queue[key])
+    while waiting > 0 and self.fetchers < self.fetch_threads:
+      self.fetchers += 1
+      self.executor.submit(self.__fetch_batch,key)
+      waiting -= self.batch_size
+
+
+  def __fetch_batch(self,key:tuple):
+    with self.lock:
+      queue = self.queue[key]
+      wait = self.batch_wait if len(queue) < self.batch_size else 0
+    if wait:
+      time.sleep(wait) # lets other pages add their entity ids to batch
+
+    with self.lock:
+      queue = self.queue[key]
+      batch = queue[:self.batch_size]
+      self.queue[key] = queue[self.batch_size:]
+
+    try:
+      if batch:
+        dbid2psobj = self.fetch(batch,list(key))
+        self.add(dbid2psobj,list(key),batch)
+        with self.lock:
+          self.batches += 1
+          for dbid in batch:
+            self.pending.pop((key,dbid)).set_result(dbid2psobj.get(dbid))
+    except Exception as error:
+      with self.lock:
+        for dbid in batch:
+          self.pending.pop((key,dbid)).set_exception(error)
+    finally:
+      with self.lock:
+        self.fetchers -= 1
+        self.__schedule(key)
+
+
+  def clear(self):
+    with self.lock:
+      self.props2cache.clear()
+      self.props2absent.clear()
+
+
+  def close(self):
+    if self.executor is not None:
+      self.executor.shutdown(wait=False)
+      self.executor = None
@@ -0,0 +1,124 @@
+import os,json,zlib,hashlib
+from ..sqlitestore import ResultCache
+from .NetworkxObjects import PSObject,PSRelation,REGULATORS,TARGETS
+from .ResnetGraph import ResnetGraph
+
+GOQL_CACHE = os.path.join(os.getcwd(),'ENTELLECT_API/ElsevierAPI/ResnetAPI','__pscache__','goql_cache.sqlite')
+GOQL_CACHE_TTL = 30*24*3600 # seconds
+GOQL_CACHE_SIZE = 2*1024*1024*1024 # bytes of compressed query results
+
+
+def normalize_oql(oql_query:str)->str:
+  '''
+  output:
+    "oql_query" with collapsed whitespace outside quoted values and without trailing semicolon
+  '''
+  normalized = list()
+  quote = ''
+  last_is_space = False
+  for ch in oql_query.strip().rstrip(';').strip():
+    if quote:
+      normalized.append(ch)
+      if ch == quote: quote = ''
+    elif ch.isspace():
+      if not last_is_space:
+        normalized.append(' ')
+      last_is_space = True
+      continue
+    else:
+      if ch in ('"',"'"): quote = ch
+      normalized.append(ch)
+    last_is_space = False
+  return ''.join(normalized)
+
+
+def _items(d:dict)->list:
+  return [[k,list(v)] for k,v in d.items()]
+
+
+def graph2records(g:ResnetGraph)->dict:
+  '''
+  output:
+    {'nodes':[node props],'rels':[[rel props],[propsets],[regulator indexes],[target indexes]]}\n
+    plain JSON-serializable records of graph nodes and unique relations
+  '''
+  uid2idx = dict()
+  nodes = list()
+  for uid, n in g.nodes(data=True):
+    uid2idx[uid] = len(nodes)
+    nodes.append(_items(n))
+
+  rels = list()
+  unique_rels = {rel.urn():rel for _,_,rel in g.edges.data('relation')}
+  for rel in unique_rels.values():
+    rels.append([_items(rel),
+                 [[propset_id,_items(props)] for propset_id,props in rel.PropSetToProps.items()],
+                 [uid2idx[r.uid()] for r in rel.Nodes.get(REGULATORS,[])],
+                 [uid2idx[t.uid()] for t in rel.Nodes.get(TARGETS,[])]])
+  return {'nodes':nodes,'rels':rels}
+
+
+def records2graph(records:dict)->ResnetGraph:
+  '''
+  input:
+    records made by graph2records()
+  '''
+  nodes = [PSObject(dict(props)) for props in records['nodes']]
+  rels = list()
+  for props, propsets, regulator_idxs, target_idxs in records['rels']:
+    ps_rel = PSRelation(dict(props))
+    for i in regulator_idxs:
+      ps_rel.Nodes[REGULATORS].append(nodes[i])
+    for i in target_idxs:
+      ps_rel.Nodes[TARGETS].append(nodes[i])
+    for propset_id, propset in propsets:
+      for prop_name, values in propset:
+        ps_rel.PropSetToProps[propset_id][prop_name] = values
+    ps_rel.refs()
+    rels.append(ps_rel)
+
+  g = ResnetGraph()
+  g.add_psobjs(set(nodes),merge=False)
+  [g.add_rel(rel,merge=False) for rel in rels]
+  return g
+
+
+class GOQLcache(ResultCache):
+  '''
+  persistent SQLite cache of GOQL query results.\n
+  Results are keyed by normalized GOQL query and retrieved entity and relation properties,
+  expire after "ttl" seconds and least recently used results are evicted when cache exceeds "max_size" bytes
+  '''
+  def __init__(self,path2db:str=GOQL_CACHE,ttl:int=GOQL_CACHE_TTL,max_size:int=GOQL_CACHE_SIZE):
+    super().__init__(path2db,ttl,max_size,('oql',),'results_oql')
+
+
+  @staticmethod
+  def key(oql_query:str,ent_props:list,rel_props:list)->str:
+    key_parts = [normalize_oql(oql_query),sorted(set(ent_props)),sorted(set(rel_props))]
+    return hashlib.sha1(json.dumps(key_parts).encode('utf-8')).hexdigest()
+
+
+  def get(self,oql_query:str,ent_props:list,rel_props:list)->ResnetGraph|None:
+    '''
+    output:
+      cached ResnetGraph or None if query result is not in cache or expired
+    '''
+    data = self.get_data(self.key(oql_query,ent_props,rel_props))
+    return None if data is None else records2graph(json.loads(zlib.decompress(data)))
+
+
+  def put(self,oql_query:str,ent_props:list,rel_props:list,graph:ResnetGraph):
+    key = self.key(oql_query,ent_props,rel_props)
+    data = zlib.compress(json.dumps(graph2records(graph),default=str).encode('utf-8'))
+    self.put_data(key,(normalize_oql(oql_query),),data)
+
+
+  def invalidate(self,oql_query:str='')->int:
+    '''
+    input:
+      oql_query - removes results of "oql_query" retrieved with any properties. Removes all results if empty
+    output:
+      number of removed results
+    '''
+    return self.delete(oql=normalize_oql(oql_query)) if oql_query else self.delete()
@@ -1,13 +1,17 @@
 import time
 import glob
 import os
+import numpy as np
 import scipy.stats as stats
 import xml.etree.ElementTree as et
+from scipy import sparse
+from concurrent.futures import ProcessPoolExecutor
 from .rnef2sbgn import make_file_name,to_sbgn_file
 from .FolderContent import FolderContent,PSPathway
-from .Zeep2Experiment import Experiment
+from .NetworkxObjects import PSObject
+from .Zeep2Experiment import Experiment,mannwhitneyu4rows
 from ..pandas.panda_tricks import df,ExcelWriter
-from ..ETM_API.references import RELATION_PROPS
+from ..ETM_API.references import PS_REFERENCE_PROPS
 
 MEASURED_COUNT = '# measured entities'
 MEASURED_ENTITIES = 'measured entities'
@@ -17,12 +21,51 @@ def get_file_listing(dirname:str):
     return list(map(os.path.basename, listing))
 
 
+__membership__ = sparse.csr_matrix((0,0)) # pathway x member matrix in GSEA worker process
+
+def _init_gsea_worker(membership:sparse.csr_matrix):
+    global __membership__
+    __membership__ = membership
+
+
+def _gsea4sample(values:np.ndarray,pvalues:np.ndarray,has_value:np.ndarray,sample_distribution:np.ndarray,
+                 de_sample_count:int,sample_size:int,difexp_pval_cutoff:float):
+    '''
+    input:
+        values, pvalues, has_value - sample values for columns of __membership__
+        sample_distribution - absolute sample values
+    output:
+        mw_pvalues, value_sums, measured_counts, fisher_results - arrays with one row per pathway in __membership__\n
+        fisher_results has columns (oddsratio, ft_pvalue)
+    '''
+    membership = __membership__
+    mw_pvalues = mannwhitneyu4rows(membership,np.abs(values),has_value,sample_distribution,
+                                   np.ones(membership.shape[0],dtype=bool))
+    value_sums = membership @ np.where(has_value,values,0.0)
+    measured_counts = np.rint(membership @ has_value.astype(float)).astype(int)
+    with np.errstate(invalid='ignore'):
+        is_de = has_value & (pvalues <= difexp_pval_cutoff)
+    de_counts = np.rint(membership @ is_de.astype(float)).astype(int)
+
+    # pathways with identical contingency tables share one Fisher exact test
+    tables, table_idx = np.unique(np.stack([de_counts,measured_counts-de_counts],axis=1),axis=0,return_inverse=True)
+    nonde_sample_count = sample_size - de_sample_count
+    table_results = np.array([stats.fisher_exact([[de,nonde],[de_sample_count,nonde_sample_count]]) 
+                              for de,nonde in tables.tolist()],dtype=float).reshape(-1,2)
+    fisher_results = table_results[table_idx.ravel()]
+    return mw_pvalues, value_sums, measured_counts, fisher_results
+
+
 class GSEA(FolderContent):
     def __init__(self, APIconfig):
         super().__init__(APIconfig)
         self.mv_pvalue_cutoff = 0.05
         self.diffexp_pvalue_cutoff= 0.05
         self.id2pathway = dict() # self.id2pathway = {id:PSPathway}
+        self.pathway_ids = list() # rows of self.membership
+        self.member_urns = list() # columns of self.membership
+        self.membership = sparse.csr_matrix((0,0)) # pathway x member matrix made by self.load_pathways()
+        self.max_workers = os.cpu_count()
         self.data_dir = 'ElsevierAPI/ResnetAPI/__pscache__/'
         self.report_dir = ''
         wsdl_url = str(self.SOAPclient.wsdl.location)
@@ -38,7 +81,6 @@ class GSEA(FolderContent):
             p_id = len(self.id2pathway)
             p['Id'] = [p_id] # makes fake IDs
             self.id2pathway[p_id] = p
-            self.Graph.urn2obj.update(p.graph.urn2obj)
 
 
     @staticmethod
@@ -123,60 +165,110 @@ class GSEA(FolderContent):
                         % folder_name)
                 missing_in_cache.append(folder_name)
 
-        self.relProps = list(RELATION_PROPS) + ['URN']
+        self.relProps = list(PS_REFERENCE_PROPS) + ['URN']
         if missing_in_cache:
             for folder_name in missing_in_cache:
                 self.folder2rnef(folder_name)
                 self.__load_cache(must_have_urns,folder_name)
 
+        self.__make_membership_index()
+
+
+    def __make_membership_index(self):
+        '''
+        makes self.membership - sparse pathway x member matrix.\n
+        Rows are in the order of self.pathway_ids, columns are in the order of self.member_urns
+        '''
+        urn2col = dict()
+        rows, cols = list(), list()
+        self.pathway_ids = list(self.id2pathway.keys())
+        for row, pathway_id in enumerate(self.pathway_ids):
+            pathway_urns = {urns[0] for _,urns in self.id2pathway[pathway_id].graph.nodes.data('URN')}
+            for urn in pathway_urns:
+                rows.append(row)
+                cols.append(urn2col.setdefault(urn,len(urn2col)))
+
+        self.member_urns = list(urn2col.keys())
+        shape = (len(self.pathway_ids),len(self.member_urns))
+        self.membership = sparse.csr_matrix((np.ones(len(rows)),(rows,cols)),shape=shape)
+        print('Made membership index for %d pathways with %d unique members' % shape)
+
+
+    def __pathway_activity(self,ps_pathway:PSPathway,urn2value:dict):
+        pathway_activity = 0.0
+        for node_id, urns in ps_pathway.graph.nodes.data('URN'):
+            try:
+                value = urn2value[urns[0]]
+            except KeyError:
+                continue
+            node_downstrem_rels = ps_pathway.graph.downstream_relations(node_id)
+            node_impact = sum([r.effect_sign() for r in node_downstrem_rels])
+            pathway_activity += node_impact*value
+        return pathway_activity
+
 
     def gsea(self, experiment:Experiment, sample_names=[], sample_ids=[], calculate_activity=False):
+        '''
+        Mann-Whitney and Fisher exact tests for all pathways in self.membership are vectorized per sample.\n
+        Samples are tested in parallel by self.max_workers processes
+        '''
         start_time = time.time()
         print('Performing GSEA and Fisher Exact test')
+        if self.membership.shape[0] != len(self.id2pathway):
+            self.__make_membership_index()
 
         samples = experiment.get_samples(sample_names,sample_ids)
         annotated_pathway_counter = set()
-        experiment.annotate_objs(self.Graph.urn2obj,sample_names=[],sample_ids=[0])
+        urn2obj = {u:PSObject() for u in self.member_urns}
+        experiment.annotate_objs(urn2obj,sample_names,sample_ids)
+        obj_type = experiment.objtype()
+        entity_counts = [sum(1 for _,t in self.id2pathway[i].graph.nodes.data('ObjTypeName') if not obj_type or obj_type in t) 
+                         for i in self.pathway_ids]
 
+        sample_inputs = list()
         for sample in samples:
             sample_annotation = experiment.name4annotation(sample)
-            abs_sample_distribution = sample.data['value'].abs()
-
-            for ps_pathway in self.id2pathway.values():
-                annotated_pathway_obj = {u:o for u,o in self.Graph.urn2obj.items() if u in ps_pathway.graph.urn2obj and sample_annotation in o}
-                # self.Graph.urn2obj can have duplicate 'Id' because it collects objects from multiple pathways
-
-                pathway_values = [v[sample_annotation][0][0] for v in annotated_pathway_obj.values()]
-                ps_pathway[MEASURED_COUNT]= [len(pathway_values)]
-                measured_entities_urns = {n.urn() for n in annotated_pathway_obj.values()}
-                ps_pathway[MEASURED_ENTITIES] = experiment.original_identifiers(measured_entities_urns)
-                
-                sub_pd = df.from_dict({'value':pathway_values})
-                abs_sub_pd = sub_pd['value'].abs()
-                mw_results = stats.mannwhitneyu(x=abs_sample_distribution, y=abs_sub_pd, alternative = 'less') 
-                mv_pvalue = mw_results[1]
-
-                ft_result = sample.fisher_exact(annotated_pathway_obj,using_prefix=experiment.prefix4annotation())
-                if ft_result[1] < 0.05:
-                    ps_pathway[sample_annotation+':FisherExact'] = [ft_result]
-                                
-                if mv_pvalue <= self.mv_pvalue_cutoff:
-                    logfc_sum = sum([n[sample_annotation][0][0] for n in annotated_pathway_obj.values()])
-                    enity_count = ps_pathway.graph.number_of_nodes(experiment.objtype())
-                    ps_pathway[sample_annotation+':GSEA'] = [(logfc_sum/enity_count, mv_pvalue)]
-                    
-                    if calculate_activity:
-                        pathway_activity = 0.0
-                        for urn, node in annotated_pathway_obj.items():
-                            node_id = ps_pathway.urn2obj[urn]['Id'][0]
-                            node_downstrem_rels = ps_pathway.graph.downstream_relations(node_id)
-                            node_impact = 0
-                            node_impact += sum([r.effect_sign() for r in node_downstrem_rels])
-                            pathway_activity += node_impact*node[sample_annotation][0][0]
-                    
-                        ps_pathway[sample_annotation+':Activity'] = [pathway_activity]
-
-                    annotated_pathway_counter.add(ps_pathway)
+            values = np.zeros(len(self.member_urns))
+            pvalues = np.full(len(self.member_urns),np.nan)
+            has_value = np.zeros(len(self.member_urns),dtype=bool)
+            for col, urn in enumerate(self.member_urns):
+                if sample_annotation in urn2obj[urn]:
+                    values[col], pvalues[col] = urn2obj[urn][sample_annotation][0]
+                    has_value[col] = True
+
+            sample_distribution = sample.data['value'].abs().dropna().to_numpy(dtype=float)
+            de_sample_count = len(sample.data.loc[(sample.data['pvalue'] <= self.diffexp_pvalue_cutoff)])
+            sample_inputs.append((values,pvalues,has_value,sample_distribution,de_sample_count,len(sample.data),self.diffexp_pvalue_cutoff))
+
+        with ProcessPoolExecutor(max_workers=min(self.max_workers,len(samples)) if samples else 1,
+                                 initializer=_init_gsea_worker,initargs=(self.membership,)) as e:
+            futures = [e.submit(_gsea4sample,*inputs) for inputs in sample_inputs]
+            for sample, inputs, future in zip(samples,sample_inputs,futures):
+                sample_annotation = experiment.name4annotation(sample)
+                values, _, has_value = inputs[:3]
+                mw_pvalues, value_sums, measured_counts, fisher_results = future.result()
+                for row, pathway_id in enumerate(self.pathway_ids):
+                    ps_pathway = self.id2pathway[pathway_id]
+                    member_cols = [c for c in self.membership[row].indices if has_value[c]]
+                    ps_pathway[MEASURED_COUNT] = [int(measured_counts[row])]
+                    ps_pathway[MEASURED_ENTITIES] = experiment.original_identifiers({self.member_urns[c] for c in member_cols})
+                    ft_result = tuple(fisher_results[row])
+                    mv_pvalue = mw_pvalues[row]
+                    if ft_result[1] >= 0.05 and not mv_pvalue <= self.mv_pvalue_cutoff:
+                        continue
+
+                    if ft_result[1] < 0.05:
+                        ps_pathway[sample_annotation+':FisherExact'] = [ft_result]
+
+                    if mv_pvalue <= self.mv_pvalue_cutoff:
+                        ps_pathway[sample_annotation+':GSEA'] = [(value_sums[row]/max(entity_counts[row],1), mv_pvalue)]
+
+                        if calculate_activity:
+                            urn2value = {self.member_urns[c]:values[c] for c in member_cols}
+                            ps_pathway[sample_annotation+':Activity'] = [self.__pathway_activity(ps_pathway,urn2value)]
+
+                        annotated_pathway_counter.add(pathway_id)
+                print('GSEA for %s sample was done in %s' % (sample.name(),self.execution_time(start_time)))
 
         print('GSEA was done in %s' % self.execution_time(start_time))
         print('%d pathways were annotated with %d samples from %s' % 
@@ -0,0 +1,190 @@
+import os,re,csv,gzip,time
+from concurrent.futures import ThreadPoolExecutor,wait,FIRST_COMPLETED
+from collections import defaultdict
+from .ResnetGraph import ResnetGraph
+from .NetworkxObjects import PSObject,PSRelation
+from ..utils import execution_time
+
+NEO4J_NODE_PROPS = ['Name','Description']
+NEO4J_REL_PROPS = ['Name','Effect','Mechanism','Source','TextRef']
+NEO4J_SHARD_ROWS = 1000000 # rows in one CSV shard
+NEO4J_WRITE_THREADS = 4
+
+
+def _file_label(label:str)->str:
+  return re.sub(r'[^\w\-]','_',label)
+
+
+class Neo4jImportWriter:
+  '''
+  writes ResnetGraph nodes and relations into "neo4j-admin database import full" CSV shards without building DataFrames.\n
+  Node files are sharded by node label and relationship files by relation type.
+  Every label and type has a header file and data shards with up to "shard_rows" rows written by background threads.\n
+  Properties follow nx2neo4j.bulk_load: nodes are identified by URN, relations store first values of "rel_props" plus RefCount and AbstractCount
+  '''
+  def __init__(self,save2dir:str,compress=True,shard_rows=NEO4J_SHARD_ROWS,max_workers=NEO4J_WRITE_THREADS,sep='|',
+               node_props:list[str]=NEO4J_NODE_PROPS,rel_props:list[str]=NEO4J_REL_PROPS):
+    self.dir = save2dir
+    os.makedirs(save2dir,exist_ok=True)
+    self.compress = compress
+    self.shard_rows = shard_rows
+    self.max_workers = max_workers
+    self.sep = sep
+    self.node_props = [p for p in node_props if p != 'URN']
+    self.rel_props = list(rel_props)
+    self.node_urns = set()
+    self.rel_urns = set()
+    self.buffers = defaultdict(list) # {(kind,label):[row]}
+    self.shards = defaultdict(list) # {(kind,label):[shard file names]}
+    self.futures = set()
+    self.executor = ThreadPoolExecutor(max_workers,thread_name_prefix='Neo4jImport')
+    self.node_count = 0
+    self.rel_count = 0
+    self.start = time.time()
+
+
+  def __enter__(self):
+    return self
+
+
+  def __exit__(self,exc_type,exc_value,traceback):
+    if exc_type is None:
+      self.close()
+    else:
+      self.executor.shutdown(wait=True,cancel_futures=True)
+
+
+  @staticmethod
+  def __value(obj:dict,prop:str):
+    values = obj.get(prop)
+    return str(values[0]).replace('\r',' ').replace('\n',' ') if values else ''
+
+
+  def __header(self,kind:str)->list[str]:
+    if kind == 'nodes':
+      return ['URN:ID']+self.node_props
+    else:
+      return [':START_ID',':END_ID']+[p.replace(':',' ') for p in self.rel_props]+['RefCount:int','AbstractCount:int']
+
+
+  def __write_shard(self,path:str,rows:list[list]):
+    opener = gzip.open if self.compress else open
+    with opener(path,'wt',encoding='utf-8',newline='') as f:
+      csv.writer(f,delimiter=self.sep,quoting=csv.QUOTE_MINIMAL).writerows(rows)
+
+
+  def __flush(self,key:tuple):
+    rows = self.buffers.pop(key,[])
+    if not rows: return
+    kind, label = key
+    ext = '.csv.gz' if self.compress else '.csv'
+    shard_name = f'{kind}.{_file_label(label)}.part{len(self.shards[key]):05d}'+ext
+    self.shards[key].append(shard_name)
+    # bounds memory held by rows waiting for write threads
+    while len(self.futures) >= 2*self.max_workers:
+      done, self.futures = wait(self.futures,return_when=FIRST_COMPLETED)
+      [f.result() for f in done]
+    self.futures.add(self.executor.submit(self.__write_shard,os.path.join(self.dir,shard_name),rows))
+
+
+  def __append(self,key:tuple,row:list):
+    buffer = self.buffers[key]
+    buffer.append(row)
+    if len(buffer) >= self.shard_rows:
+      self.__flush(key)
+
+
+  def add_node(self,node:PSObject):
+    urn = node.urn()
+    if urn in self.node_urns: return
+    self.node_urns.add(urn)
+    self.__append(('nodes',node.objtype()),[urn]+[self.__value(node,p) for p in self.node_props])
+    self.node_count += 1
+
+
+  @staticmethod
+  def _node_pairs(rel:PSRelation)->list[tuple[PSObject,PSObject]]:
+    '''
+    output:
+      [(regulator,target)] for directional "rel", one pair per node combination for non-directional "rel"
+    '''
+    uid2node = {n.uid():n for nodes in rel.Nodes.values() for n in nodes}
+    return [(uid2node[r],uid2node[t]) for r,t in rel.get_regulators_targets(reverse4undirected=False)]
+
+
+  def add_relation(self,rel:PSRelation):
+    rel_urn = rel.urn()
+    if rel_urn in self.rel_urns: return
+    self.rel_urns.add(rel_urn)
+    props = [self.__value(rel,p) for p in self.rel_props]+[rel.count_refs(),rel.count_refs(count_abstracts=True)]
+    for regulator, target in self._node_pairs(rel):
+      self.add_node(regulator)
+      self.add_node(target)
+      self.__append(('relationships',rel.objtype()),[regulator.urn(),target.urn()]+props)
+      self.rel_count += 1
+
+
+  def add_graph(self,G:ResnetGraph):
+    for uid in G.nodes():
+      self.add_node(G._get_node(uid))
+    for _,_,rel in G.edges.data('relation'):
+      self.add_relation(rel)
+
+
+  def add_rnef(self,flist:list[str],max_workers:int|None=None):
+    '''
+    input:
+      flist - RNEF files parsed in parallel by ResnetGraph.iterRNEFflist()
+    '''
+    for nodes, rels in ResnetGraph.iterRNEFflist(flist,max_workers=max_workers):
+      [self.add_node(n) for n in nodes]
+      [self.add_relation(rel) for rel in rels]
+    print(f'{self.node_count} nodes and {self.rel_count} relations were exported from {len(flist)} RNEF files',flush=True)
+
+
+  def import_command(self,database='neo4j')->str:
+    '''
+    output:
+      "neo4j-admin database import full" command loading all shards written by self
+    '''
+    args = ['neo4j-admin database import full',f'--delimiter="{self.sep}"','--array-delimiter=";"','--overwrite-destination=true']
+    for (kind,label), shard_names in sorted(self.shards.items()):
+      option = '--nodes' if kind == 'nodes' else '--relationships'
+      files = [f'{kind}.{_file_label(label)}.header.csv']+shard_names
+      args.append(f'{option}={label}="'+','.join(os.path.join(self.dir,f) for f in files)+'"')
+    args.append(database)
+    return ' '.join(args)
+
+
+  def close(self,database='neo4j')->str:
+    '''
+    writes remaining rows, header files and "neo4j-admin_import.txt" with import command
+    output:
+      "neo4j-admin database import full" command
+    '''
+    [self.__flush(key) for key in list(self.buffers)]
+    self.executor.shutdown(wait=True)
+    [f.result() for f in self.futures]
+    self.futures.clear()
+
+    for kind, label in self.shards:
+      header_file = os.path.join(self.dir,f'{kind}.{_file_label(label)}.header.csv')
+      with open(header_file,'w',encoding='utf-8',newline='') as f:
+        csv.writer(f,delimiter=self.sep).writerow(self.__header(kind))
+
+    command = self.import_command(database)
+    with open(os.path.join(self.dir,'neo4j-admin_import.txt'),'w',encoding='utf-8') as f:
+      f.write(command+'\n')
+    print(f'{self.node_count} nodes and {self.rel_count} relations were written into {sum(len(s) for s in self.shards.values())} shards in "{self.dir}" in {execution_time(self.start)}')
+    return command
+
+
+def rnef2neo4j_import(flist:list[str],save2dir:str,compress=True,shard_rows=NEO4J_SHARD_ROWS,
+                      max_workers=NEO4J_WRITE_THREADS,parse_workers:int|None=None,sep='|')->str:
+  '''
+  output:
+    "neo4j-admin database import full" command loading CSV shards exported from RNEF files in "flist"
+  '''
+  with Neo4jImportWriter(save2dir,compress,shard_rows,max_workers,sep) as writer:
+    writer.add_rnef(flist,parse_workers)
+  return writer.import_command()
@@ -3,7 +3,7 @@ from datetime import datetime
 from collections import defaultdict
 
 from ..utils import normalize
-from ..ETM_API.references import Reference, len, reflist2dict,pubmed_hyperlink,make_hyperlink,pmc_hyperlink
+from ..ETM_API.references import Reference, ReferenceStore, len, reflist2dict,pubmed_hyperlink,make_hyperlink,pmc_hyperlink
 from ..ETM_API.references import JOURNAL,PS_REFIID_TYPES,NOT_ALLOWED_IN_SENTENCE,PS_BIBLIO_PROPS_ALL,PS_SENTENCE_PROPS,CLINTRIAL_PROPS
 from ..ETM_API.references import MEDLINETA,PUBYEAR,SENTENCE,TITLE,AUTHORS,_AUTHORS_,PS_REFERENCE_PROPS
 #from ..Embio.PSnx2Neo4j import RELATIONID
@@ -465,6 +465,7 @@ class PSRelation(PSObject):
       self.PropSetToProps = defaultdict(lambda: defaultdict(list))  # {PropSetID:{PropID:[values]}}
       self.Nodes = defaultdict(list)  # {"Regulators':[PSObject], "Targets':[PSObject]}
       self.references = list() # has to be list for sorting
+      self.handle2snippets = dict() # {handle:{TextRef:{PropID:{Values}}}} snippets of self.references interned in ReferenceStore
 
 
   def __hash__(self):
@@ -559,7 +560,7 @@ class PSRelation(PSObject):
           my_refs = self.refs()
           for prop in prop_names:
               for ref in my_refs:
-                  if ref.has_property(prop):
+                  if ref.has_property(prop,self.ref_snippets(ref)):
                       return True
                   
       return has_props
@@ -569,7 +570,7 @@ class PSRelation(PSObject):
       has_values = super().has_value_in(prop2values,case_sensitive)
       if not has_values:
           for ref in self.refs():
-              if ref.has_values_in(prop2values):
+              if ref.has_values_in(prop2values,snippets=self.ref_snippets(ref)):
                   return True
       return has_values
 
@@ -608,7 +609,7 @@ class PSRelation(PSObject):
     '''
     if not super().rename_prop(old_prop_name, new_prop_name):
         for ref in self.refs():
-          ref.rename_prop(old_prop_name, new_prop_name)
+          ref.rename_prop(old_prop_name, new_prop_name, self.ref_snippets(ref))
 
     return
    
@@ -621,6 +622,10 @@ class PSRelation(PSObject):
     '''
     if not references: return 0
     old_refcount = len(self.refs())
+    # references interned in ReferenceStore are copied before merging to keep them unchanged
+    self.references = self.detached_refs()
+    self.handle2snippets.clear()
+    references = [r.detach() for r in references]
     if old_refcount > len(references):
       larger_list = self.references
       smaller_list = references
@@ -719,18 +724,18 @@ class PSRelation(PSObject):
     '''
     my_copy = self.copy()
     my_copy.merge_obj(other)
-    my_copy._add_refs(other.refs())
+    my_copy._add_refs(other.detached_refs())
     del other
     return my_copy
 
   
   def number_of_snippets(self):
-    return sum([ref.number_of_snippets() for ref in self.refs()])
+    return sum([ref.number_of_snippets(self.ref_snippets(ref)) for ref in self.refs()])
       
 
   def textrefs(self):
     my_refs = self.refs()
-    return sum([r.textrefs() for r in my_refs],[])
+    return sum([r.textrefs(self.ref_snippets(r)) for r in my_refs],[])
 
 
   def rel2psobj(self):
@@ -741,7 +746,7 @@ class PSRelation(PSObject):
     rel.references are added to self['references'] attribute
     '''
     new_psobj = PSObject(self)
-    new_psobj['references'] = self.refs()
+    new_psobj['references'] = self.detached_refs()
     return new_psobj
 
 
@@ -750,6 +755,7 @@ class PSRelation(PSObject):
     my_copy.PropSetToProps = copy.deepcopy(self.PropSetToProps)
     my_copy.Nodes = copy.deepcopy(self.Nodes)
     my_copy.references = self.references.copy()
+    my_copy.handle2snippets = copy.deepcopy(self.handle2snippets)
     return my_copy
   
 
@@ -761,7 +767,7 @@ class PSRelation(PSObject):
         [props.pop(p,'') for p in prop_names]
 
     my_copy.references.clear()
-    for ref in self.references:
+    for ref in self.detached_refs():
         new_ref = ref.remove_props(prop_names)
         if new_ref:
           my_copy.references.append(new_ref)
@@ -809,7 +815,7 @@ class PSRelation(PSObject):
     else:
       prop_set_values = set()
       my_refs = self.refs()
-      [prop_set_values.update(ref.get_values(propname)) for ref in my_refs]
+      [prop_set_values.update(ref.get_values(propname,self.ref_snippets(ref))) for ref in my_refs]
       return list(prop_set_values)
 
 
@@ -840,34 +846,25 @@ class PSRelation(PSObject):
       return to_return
 
 
-  def refs(self,refresh=False,ref_limit=0,relid2refs:dict[str,list[Reference]]=dict())->list[Reference]:
+  def refs(self,refresh=False,ref_limit=0,relid2refs:dict[str,list[Reference]]=dict(),refstore:ReferenceStore=None)->list[Reference]:
     '''
+    input:
+      refstore - graph-level ReferenceStore shared by relations. 
+      If specified self.references are Reference objects interned in "refstore" and their snippets supporting self are in self.handle2snippets
     output:
       self.references sorted by PUBYEAR
     '''
-    if refresh: self.references.clear()     
+    if refresh: 
+      self.references.clear()
+      self.handle2snippets.clear()
     if not self.references: # making self.references from self.PropSetToProps:
       if relid2refs: # case when graph is loaded from Neo4j
         relid = int(self['RelationID'][0])
         if relid in relid2refs:
           self.references = relid2refs[relid]
       else:
-        refdict4self = dict() # {(idtype,id):ref} # holds reference dictionary to check for duplicates
-        
-        def find_ref(propSet_ids:list[tuple[str,str]])->Reference:
-          for t in propSet_ids:
-            if t in refdict4self:
-              return refdict4self[t]
-          return None
-        
-        def create_newref(propSetids: list[tuple[str,str]]):
-          newref = Reference(*propSetids[0])
-          newref.Identifiers.update(dict(propSetids[1:]))
-          self.references.append(newref)
-          newrefid_dict = {t:newref for t in propSetids}
-          refdict4self.update(newrefid_dict)
-          return newref
-
+        store = ReferenceStore() if refstore is None else refstore # holds reference dictionary to check for duplicates
+        my_handles = dict() # {handle:None} keeps order of references in self
         for propSet in self.PropSetToProps.values():
           # creating list of (id_type,id) tuples propSet to inspect for duplicates
           propSet_ids = [ (idtype, propSet[idtype][0])for idtype in PS_REFIID_TYPES if idtype in propSet]
@@ -878,34 +875,38 @@ class PSRelation(PSObject):
             continue # ignore and move to the next PropSet
         
           if propSet_ids: # propSet is valid reference with identifiers - resolving duplicates:
-            duplicate_ref = find_ref(propSet_ids)
-            if duplicate_ref is None:  # case when reference is new
+            handle = store.find(propSet_ids)
+            if handle < 0:  # case when reference is new
               if propset_title_key:
                 propSet_ids.append(propset_title_key)
-              propSet_ref = create_newref(propSet_ids)
+              handle = store.add(propSet_ids)
             else: # duplicate ref exists!
-              propSet_ref = duplicate_ref
-              propSet_ref.Identifiers.update(dict(propSet_ids))
-              [refdict4self.update({t:propSet_ref}) for t in propSet_ids]
+              store[handle].Identifiers.update(dict(propSet_ids))
               if propset_title_key:
-                refdict4self[propset_title_key] = propSet_ref
+                propSet_ids.append(propset_title_key)
+              store.link(handle,propSet_ids)
           else: # no propSet_ids => propSet is not valid reference 
             # therefore will try to create valid one using Title or TextRef:
             if propset_title_key:
-              if propset_title_key in refdict4self:
-                propSet_ref = refdict4self[propset_title_key]
-              else:
-                propSet_ref = create_newref([propset_title_key])
+              handle = store.find([propset_title_key])
+              if handle < 0:
+                handle = store.add([propset_title_key])
             elif propset_textref: # propSet has no title, no propSet_ids, but has textref:
                 propSetidtuple = Reference._textref2id(propset_textref)
-                if propSetidtuple in refdict4self:
-                  propSet_ref = refdict4self[propSetidtuple]
-                else:
-                  propSet_ref = create_newref([propSetidtuple])
+                handle = store.find([propSetidtuple])
+                if handle < 0:
+                  handle = store.add([propSetidtuple])
             else:
               # PropSet is not valid: no Ids, no title, no textref
               continue # ignore and move to the next propSet 
 
+          my_handles[handle] = None
+          propSet_ref = store[handle]
+          if refstore is None:
+            snippets = None
+          else: # snippets of interned references are kept by self
+            propSet_ref.handle = handle
+            snippets = self.handle2snippets.setdefault(handle,dict())
           # reparing TextRef, TexRef from older Resnet versions can start with 'urn:hash::'
           if not propset_textref or propset_textref[4:10] == 'hash::': 
             propset_textref = propSet_ref._make_textref()
@@ -915,7 +916,7 @@ class PSRelation(PSObject):
             if propId in PS_BIBLIO_PROPS_ALL or propId in CLINTRIAL_PROPS:
               propSet_ref.update_with_list(propId, propValues)
             elif propId in SENTENCE_PROPSET:
-              propSet_ref.add_sentence_props(propset_textref,propId, propValues)
+              propSet_ref.add_sentence_props(propset_textref,propId, propValues,snippets)
 
           if MEDLINETA in propSet_ref:
             propSet_ref[JOURNAL] = propSet_ref.pop(MEDLINETA)
@@ -924,12 +925,34 @@ class PSRelation(PSObject):
             if _AUTHORS_ in propSet_ref: # converting _AUTHORS_ to AUTHORS
               propSet_ref[AUTHORS] = [x.tostr() for x in propSet_ref[_AUTHORS_]]
           else:
-            [x.toAuthors() for x in self.references] #converting AUTHORS to _AUTHORS_
+            propSet_ref.toAuthors() #converting AUTHORS to _AUTHORS_
+
+        if refstore is None:
+          self.references = store.refs
+        else:
+          self.references = [store[h] for h in my_handles]
     
     self.references.sort(key=lambda r: r.pubyear(), reverse=True)
     return self.references[:ref_limit] if ref_limit else self.references
-  
-  
+
+
+  def ref_snippets(self, ref:Reference)->dict[str,dict[str,set]]:
+    '''
+    output:
+      {TextRef:{PropID:{Values}}} snippets of "ref" supporting self.\n
+      Snippets of references interned in ReferenceStore are kept in self.handle2snippets
+    '''
+    return ref.snippets if ref.handle < 0 else self.handle2snippets.get(ref.handle,dict())
+
+
+  def detached_refs(self)->list[Reference]:
+    '''
+    output:
+      self.refs() with interned references replaced by their copies with snippets supporting self
+    '''
+    return [ref.detach(self.ref_snippets(ref)) for ref in self.refs()]
+
+
   def filter_references(self, keep_prop2values:dict,in_place=True):
       '''
       !!!! does not change self[REFCOUNT] to keep the original number of references !!!!\n
@@ -940,7 +963,7 @@ class PSRelation(PSObject):
       prop_names2values = {prop_name:[values]}
       '''
       all_refs = self.refs()
-      ref2keep = [ref for ref in all_refs if ref.has_values_in(keep_prop2values)]
+      ref2keep = [ref for ref in all_refs if ref.has_values_in(keep_prop2values,snippets=self.ref_snippets(ref))]
       if in_place:
         self.references = ref2keep
       return self.references
@@ -953,7 +976,7 @@ class PSRelation(PSObject):
       prop2values = {prop_name:[values]}
       '''
       all_refs = self.refs()
-      ref2keep = {ref for ref in all_refs if not ref.has_values_in(with_prop2values)}
+      ref2keep = {ref for ref in all_refs if not ref.has_values_in(with_prop2values,snippets=self.ref_snippets(ref))}
       if ref2keep:
           if len(ref2keep) < len(all_refs):
               mycopy = self.copy()
@@ -967,7 +990,7 @@ class PSRelation(PSObject):
 
   def is_from_abstract(self):
       for ref in self.refs():
-          if ref.is_from_abstract():
+          if ref.is_from_abstract(self.ref_snippets(ref)):
               return True
       return False
 
@@ -980,7 +1003,7 @@ class PSRelation(PSObject):
     if self.references:
       self[REFCOUNT] = [len(self.references)]
       if count_abstracts:
-        ref_from_abstract = set([x for x in self.references if x.is_from_abstract()])
+        ref_from_abstract = set([x for x in self.references if x.is_from_abstract(self.ref_snippets(x))])
         return len(ref_from_abstract)
     else:
       refcount = self[REFCOUNT]
@@ -1004,7 +1027,7 @@ class PSRelation(PSObject):
   def is_annotated(self,with_prop:str,having_values:list=[],case_sensitive=False):
     if not super().is_annotated(with_prop,having_values,case_sensitive):
       for ref in self.refs():
-         if ref.has_values_in({with_prop:having_values}):
+         if ref.has_values_in({with_prop:having_values},snippets=self.ref_snippets(ref)):
           return True
       return False
     else:
@@ -1201,12 +1224,12 @@ class PSRelation(PSObject):
       
 
   def pX(self):
-      pXs = [float(pX) for ref in self.refs() for pX in ref.get_values('pX')]
+      pXs = [float(pX) for ref in self.refs() for pX in ref.get_values('pX',self.ref_snippets(ref))]
       return max(pXs) if pXs else -1.0
   
 
   def set_affinity(self):
-      pXs = [float(pX) for ref in self.refs() for pX in ref.get_values('pX')]
+      pXs = [float(pX) for ref in self.refs() for pX in ref.get_values('pX',self.ref_snippets(ref))]
       if pXs:
           self['Affinity'].append(max(pXs))
       return
@@ -1259,7 +1282,7 @@ class PSRelation(PSObject):
                   prop_val = ref.Identifiers[ref_prop]
                   propvals.add(prop_val)
               except KeyError:
-                  for prop2values in ref.snippets.values():
+                  for prop2values in self.ref_snippets(ref).values():
                       try:
                           prop_val = prop2values[ref_prop]
                           propvals.update(prop_val)
@@ -1281,7 +1304,7 @@ class PSRelation(PSObject):
     if include_refs:
       relname = self.name()
       my_refs = self.refs()
-      return dic,[x.todict(relname=relname) for x in my_refs] 
+      return dic,[x.todict(relname=relname,snippets=self.ref_snippets(x)) for x in my_refs] 
     else:
       return dic,[]
     
@@ -0,0 +1,222 @@
+import time, threading
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from zeep import exceptions
+from requests import exceptions as req_exceptions
+from .ResnetGraph import ResnetGraph
+
+MAX_PAGE_THREADS = 80
+START_PAGE_THREADS = 25
+TARGET_PAGE_LATENCY = 30.0 # seconds
+MIN_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 10000
+MAX_PAGE_RETRIES = 5
+# messages of SOAP faults caused by table locks and session limits. Other faults, such as invalid or expired session, are not retried
+LOCK_ERRORS = ('table is locked','resource busy','deadlock detected','too many sessions','too many connections',
+               'maximum number of sessions','session limit exceeded')
+LOCK_ORA_CODES = ('ORA-00054', # resource busy and acquire with NOWAIT specified or timeout expired
+                  'ORA-00060', # deadlock detected while waiting for resource
+                  'ORA-04021', # timeout occurred while waiting to lock object
+                  'ORA-00018', # maximum number of sessions exceeded
+                  'ORA-00020', # maximum number of processes exceeded
+                  'ORA-02391', # exceeded simultaneous SESSIONS_PER_USER limit
+                  'ORA-12516','ORA-12519','ORA-12520') # listener could not find available handler
+RETRIABLE_ERRORS = (exceptions.TransportError,req_exceptions.ConnectionError,req_exceptions.Timeout)
+
+
+class PageScheduler:
+  '''
+  Adaptive scheduler for parallel retrieval of GOQL result pages shared by APISession and its clones.\n
+  Number of pages retrieved in parallel grows by one per successful round of pages while page latency is below "target_latency"
+  and is cut when pages are slow or server returns transport errors.\n
+  Page size shrinks for slow pages and grows for fast pages.\n
+  "table is locked" and session limit errors back off exponentially before failed page is retried
+  '''
+  def __init__(self,max_workers=MAX_PAGE_THREADS,start_workers=START_PAGE_THREADS,page_size=1000,
+               target_latency=TARGET_PAGE_LATENCY,min_page_size=MIN_PAGE_SIZE,max_page_size=MAX_PAGE_SIZE,
+               max_retries=MAX_PAGE_RETRIES):
+    self.max_workers = max_workers
+    self.limit = float(min(start_workers,max_workers))
+    self.page_size = page_size
+    self.target_latency = target_latency
+    self.min_page_size = min_page_size
+    self.max_page_size = max_page_size
+    self.max_retries = max_retries
+    self.active = 0 # number of requests to server in progress
+    self.cond = threading.Condition()
+    self.consecutive_errors = 0
+    self.start_time = time.time()
+    self.pages = 0
+    self.results = 0
+    self.errors = 0
+    self.lock_errors = 0
+    self.retries = 0
+    self.busy_time = 0.0
+
+
+  @contextmanager
+  def slot(self):
+    '''
+    waits until number of requests to server is below self.limit
+    '''
+    with self.cond:
+      while self.active >= int(self.limit):
+        self.cond.wait()
+      self.active += 1
+    try:
+      yield
+    finally:
+      with self.cond:
+        self.active -= 1
+        self.cond.notify_all()
+
+
+  def record(self,latency:float,results:int,is_page=True):
+    with self.cond:
+      if is_page:
+        self.pages += 1
+        self.results += results
+        self.busy_time += latency
+      self.consecutive_errors = 0
+      if latency > self.target_latency:
+        self.limit = max(1.0,self.limit*0.75)
+        self.page_size = max(self.min_page_size,self.page_size//2)
+      else:
+        self.limit = min(float(self.max_workers),self.limit + 1.0/self.limit)
+        if latency < self.target_latency/4:
+          self.page_size = min(self.max_page_size,int(self.page_size*1.25))
+      self.cond.notify_all()
+
+
+  @staticmethod
+  def is_lock_error(error:Exception)->bool:
+    '''
+    output:
+      True if "error" message reports table lock or session limit
+    '''
+    message = str(error)
+    lower_message = message.lower()
+    return any(e in lower_message for e in LOCK_ERRORS) or any(code in message for code in LOCK_ORA_CODES)
+
+
+  @classmethod
+  def is_retriable(cls,error:Exception)->bool:
+    '''
+    output:
+      True for connection and timeout errors, transport errors other than HTTP 4xx (except 429) and SOAP faults caused by table locks or session limits.
+      Other SOAP faults, such as invalid query or authentication errors, are not retried
+    '''
+    if isinstance(error,exceptions.TransportError):
+      return error.status_code == 429 or not 400 <= error.status_code < 500
+    if isinstance(error,RETRIABLE_ERRORS):
+      return True
+    return isinstance(error,exceptions.Fault) and cls.is_lock_error(error)
+
+
+  def backoff(self,error:Exception)->float:
+    '''
+    cuts self.limit in half after "error"
+    output:
+      seconds to wait before retrying failed request
+    '''
+    with self.cond:
+      self.errors += 1
+      self.consecutive_errors += 1
+      self.limit = max(1.0,self.limit/2)
+      is_lock = self.is_lock_error(error)
+      if is_lock: self.lock_errors += 1
+      base = 10.0 if is_lock else 2.0
+      return min(300.0,base*2**(self.consecutive_errors-1))
+
+
+  def request(self,fetch,*args):
+    '''
+    executes "fetch(*args)" request to server within scheduler limits without retries
+    '''
+    with self.slot():
+      start = time.time()
+      try:
+        result = fetch(*args)
+      except Exception as error:
+        if self.is_retriable(error): self.backoff(error)
+        raise
+      self.record(time.time()-start,0,is_page=False)
+      return result
+
+
+  def __fetch_page(self,fetch,result_pos:int,page_size:int):
+    with self.slot():
+      start = time.time()
+      page_graph = fetch(result_pos,page_size)
+      return page_graph, time.time()-start
+
+
+  def run(self,fetch,start_pos:int,end_pos:int,process_name='oql_results')->ResnetGraph:
+    '''
+    input:
+      fetch(result_pos,page_size) - function retrieving one page of results as ResnetGraph
+    output:
+      ResnetGraph composed from pages of results between "start_pos" and "end_pos"
+    '''
+    entire_graph = ResnetGraph()
+    next_pos = start_pos
+    retry_pages = deque() # [(result_pos,page_size,attempt)]
+    in_flight = dict()
+    with ThreadPoolExecutor(self.max_workers,thread_name_prefix=process_name) as e:
+      while next_pos < end_pos or retry_pages or in_flight:
+        while len(in_flight) < int(self.limit) and (retry_pages or next_pos < end_pos):
+          if retry_pages:
+            result_pos, page_size, attempt = retry_pages.popleft()
+          else:
+            result_pos, page_size, attempt = next_pos, min(self.page_size,end_pos-next_pos), 0
+            next_pos += page_size
+          future = e.submit(self.__fetch_page,fetch,result_pos,page_size)
+          in_flight[future] = (result_pos,page_size,attempt)
+
+        done, _ = wait(in_flight,return_when=FIRST_COMPLETED)
+        for future in done:
+          result_pos, page_size, attempt = in_flight.pop(future)
+          try:
+            page_graph, latency = future.result()
+          except Exception as error:
+            if attempt >= self.max_retries or not self.is_retriable(error):
+              [f.cancel() for f in in_flight]
+              raise
+            pause = self.backoff(error)
+            self.retries += 1
+            print(f'Page at {result_pos} failed with "{str(error)[:200]}". Retrying in {pause:.0f} seconds with {int(self.limit)} parallel pages',flush=True)
+            time.sleep(pause)
+            retry_pages.append((result_pos,page_size,attempt+1))
+            continue
+
+          self.record(latency,page_size)
+          entire_graph = entire_graph.compose(page_graph)
+    return entire_graph
+
+
+  def metrics(self)->dict:
+    '''
+    output:
+      throughput metrics accumulated since scheduler creation
+    '''
+    with self.cond:
+      elapsed = max(time.time()-self.start_time,1e-9)
+      return {'pages':self.pages,
+              'results':self.results,
+              'errors':self.errors,
+              'lock_errors':self.lock_errors,
+              'retries':self.retries,
+              'pages_per_sec':self.pages/elapsed,
+              'results_per_sec':self.results/elapsed,
+              'mean_page_latency':self.busy_time/self.pages if self.pages else 0.0,
+              'parallel_pages':int(self.limit),
+              'page_size':self.page_size,
+              'elapsed':elapsed}
+
+
+  def report(self)->str:
+    m = self.metrics()
+    return (f"{m['pages']} pages with {m['results']} results retrieved at {m['results_per_sec']:.1f} results/sec, "
+            f"mean page latency {m['mean_page_latency']:.1f} sec, {m['errors']} errors ({m['lock_errors']} locks), "
+            f"{m['parallel_pages']} parallel pages of {m['page_size']} results")
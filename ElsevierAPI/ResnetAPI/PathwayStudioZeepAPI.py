@@ -1,5 +1,5 @@
 import pandas as pd
-import sys, time, logging, http.client, itertools
+import sys, time, logging, http.client, itertools, asyncio
 from time import sleep
 from .PathwayStudioGOQL import OQL,len
 from zeep import exceptions as zeep_exceptions
@@ -10,6 +10,7 @@ from math import pow
 
 
 CONNECTION_TIMEOUT = 20
+MAX_ASYNC_CONNECTIONS = 50
 
 def configure_logging(logger):
     logger.setLevel(logging.DEBUG)
@@ -206,6 +207,31 @@ class DataModel:
             raise req_exceptions.ConnectionError("Server connection failed after 10 attempts") 
              
 
+    def _annotate(self, obj_props):
+        '''
+        sets ObjTypeName for objects and PropName,PropDisplayName and dictionary values for properties in zeep "obj_props"
+        '''
+        for obj in obj_props.Objects.ObjectRef:
+            obj_type_id = obj['ObjTypeId']
+            obj_type_name = self.IdtoObjectType[obj_type_id]['Name']
+            obj['ObjTypeName'] = obj_type_name
+        # setting dict property values
+        for prop in obj_props.Properties.ObjectProperty:
+            id_property = prop['PropId']
+            prop_name = self.IdToPropType[id_property]['Name']
+            prop_display_name = self.IdToPropType[id_property]['DisplayName']
+            prop['PropName'] = prop_name
+            prop['PropDisplayName'] = prop_display_name
+            dict_folder_id = self.IdToPropType[id_property]['DictFolderId']
+            if dict_folder_id > 0:
+                dict_folder = self.__propid2name(id_property, dict_folder_id)
+                for i in range(0, len(prop['PropValues']['string'])):
+                    id_dict_prop_value = int(prop['PropValues']['string'][i])
+                    new_dict_value = dict_folder[id_dict_prop_value]
+                    prop['PropValues']['string'][i] = new_dict_value
+        return obj_props
+
+
     def get_folder_objects(self, FolderId, result_param):
         for i in range (0,3):
             try:
@@ -306,27 +332,7 @@ out of {max_iter} attempt at GOQL query with length {len(OQLquery)}:\n{OQLquery[
         rp.GetProperties = True
         oql_request = OQL.get_objects(obj_ids)
         obj_props = self.oql_response(oql_request, rp)
-        # setting objectType name
-        for obj in obj_props.Objects.ObjectRef:
-            obj_type_id = obj['ObjTypeId']
-            obj_type_name = self.IdtoObjectType[obj_type_id]['Name']
-            obj['ObjTypeName'] = obj_type_name
-
-        # setting dict property values and property names
-        for prop in obj_props.Properties.ObjectProperty:
-            id_property = prop['PropId']
-            prop_name = self.IdToPropType[id_property]['Name']
-            prop_display_name = self.IdToPropType[id_property]['DisplayName']
-            prop['PropName'] = prop_name
-            prop['PropDisplayName'] = prop_display_name
-            dict_folder_id = self.IdToPropType[id_property]['DictFolderId']
-            if dict_folder_id > 0:
-                dict_folder = self.__propid2name(id_property, dict_folder_id)
-                for i in range(0, len(prop['PropValues']['string'])):
-                    id_dict_prop_value = int(prop['PropValues']['string'][i])
-                    new_dict_value = dict_folder[id_dict_prop_value]
-                    prop['PropValues']['string'][i] = new_dict_value
-        return obj_props
+        return self._annotate(obj_props)
     
 
     def get_object_properties(self, obj_ids:list[int], property_names:list[str]=[]):
@@ -410,25 +416,7 @@ out of {max_iter} attempt at GOQL query with length {len(OQLquery)}:\n{OQLquery[
         if not obj_props.Objects.ObjectRef:
             return None
 
-        for obj in obj_props.Objects.ObjectRef:
-            obj_type_id = obj['ObjTypeId']
-            obj_type_name = self.IdtoObjectType[obj_type_id]['Name']
-            obj['ObjTypeName'] = obj_type_name
-        # setting dict property values
-        for prop in obj_props.Properties.ObjectProperty:
-            id_property = prop['PropId']
-            prop_name = self.IdToPropType[id_property]['Name']
-            prop_display_name = self.IdToPropType[id_property]['DisplayName']
-            prop['PropName'] = prop_name
-            prop['PropDisplayName'] = prop_display_name
-            dict_folder_id = self.IdToPropType[id_property]['DictFolderId']
-            if dict_folder_id > 0:
-                dict_folder = self.__propid2name(id_property, dict_folder_id)
-                for i in range(0, len(prop['PropValues']['string'])):
-                    id_dict_prop_value = int(prop['PropValues']['string'][i])
-                    new_dict_value = dict_folder[id_dict_prop_value]
-                    prop['PropValues']['string'][i] = new_dict_value
-        return obj_props #helpers.serialize_object(result, target_cls=dict)
+        return self._annotate(obj_props) #helpers.serialize_object(result, target_cls=dict)
 
 
     def init_session(self, OQLrequest:str, PageSize:int, property_names=None, getLinks=True):
@@ -446,25 +434,7 @@ out of {max_iter} attempt at GOQL query with length {len(OQLquery)}:\n{OQLquery[
             # print('Your SOAP response is empty! Check your OQL query and try again\n')
             return None, (obj_props.ResultRef, obj_props.ResultSize, obj_props.ResultPos)
 
-        for obj in obj_props.Objects.ObjectRef:
-            obj_type_id = obj['ObjTypeId']
-            obj_type_name = self.IdtoObjectType[obj_type_id]['Name']
-            obj['ObjTypeName'] = obj_type_name
-        # setting dict property values
-        for prop in obj_props.Properties.ObjectProperty:
-            id_property = prop['PropId']
-            prop_name = self.IdToPropType[id_property]['Name']
-            prop_display_name = self.IdToPropType[id_property]['DisplayName']
-            prop['PropName'] = prop_name
-            prop['PropDisplayName'] = prop_display_name
-            dict_folder_id = self.IdToPropType[id_property]['DictFolderId']
-            if dict_folder_id > 0:
-                dict_folder = self.__propid2name(id_property, dict_folder_id)
-                for i in range(0, len(prop['PropValues']['string'])):
-                    id_dict_prop_value = int(prop['PropValues']['string'][i])
-                    new_dict_value = dict_folder[id_dict_prop_value]
-                    prop['PropValues']['string'][i] = new_dict_value
-
+        self._annotate(obj_props)
         return obj_props, (obj_props.ResultRef, obj_props.ResultSize, obj_props.ResultPos)
 
 
@@ -493,25 +463,7 @@ out of {max_iter} attempt at GOQL query with length {len(OQLquery)}:\n{OQLquery[
             # print('Your SOAP response is empty! Check your OQL query and try again\n')
             return None,int(obj_props.ResultSize), int(obj_props.ResultPos)
         
-        for obj in obj_props.Objects.ObjectRef:
-            obj_type_id = obj['ObjTypeId']
-            obj_type_name = self.IdtoObjectType[obj_type_id]['Name']
-            obj['ObjTypeName'] = obj_type_name
-        # setting dict property values
-        for prop in obj_props.Properties.ObjectProperty:
-            id_property = prop['PropId']
-            prop_name = self.IdToPropType[id_property]['Name']
-            prop_display_name = self.IdToPropType[id_property]['DisplayName']
-            prop['PropName'] = prop_name
-            prop['PropDisplayName'] = prop_display_name
-            dict_folder_id = self.IdToPropType[id_property]['DictFolderId']
-            if dict_folder_id > 0:
-                dict_folder = self.__propid2name(id_property, dict_folder_id)
-                for i in range(0, len(prop['PropValues']['string'])):
-                    id_dict_prop_value = int(prop['PropValues']['string'][i])
-                    new_dict_value = dict_folder[id_dict_prop_value]
-                    prop['PropValues']['string'][i] = new_dict_value
-
+        self._annotate(obj_props)
         if rp.ResultPos >= rp.ResultSize:
             self.SOAPclient.service.ResultRelease(rp.ResultRef)
 
@@ -727,3 +679,162 @@ out of {max_iter} attempt at GOQL query with length {len(OQLquery)}:\n{OQLquery[
 
     def close_connection(self):
         self.SOAPclient.transport.session.close()
+
+
+
+class AsyncDataModel(DataModel):
+    '''
+    asyncio client for Pathway Studio SOAP API using zeep AsyncClient with httpx transport.\n
+    Shares database model with synchronous "data_model" and must be created inside running event loop.\n
+    No more than "max_connections" SOAP requests are sent to server simultaneously through one pool of connections
+    '''
+    def __init__(self, data_model:DataModel, max_connections=MAX_ASYNC_CONNECTIONS):
+        super().__init__(data_model.APIconfig,connect2server=False,no_mess=data_model.no_mess)
+        self.IdToPropType = data_model.IdToPropType
+        self.IdtoObjectType = data_model.IdtoObjectType
+        self.propId2dict = data_model.propId2dict
+        self.RNEFnameToPropType = data_model.RNEFnameToPropType
+
+        import httpx
+        from zeep import AsyncClient, Settings
+        from zeep.cache import SqliteCache
+        from zeep.transports import AsyncTransport
+        auth = httpx.BasicAuth(self.APIconfig['PSuserName'], self.APIconfig['PSpassword'])
+        limits = httpx.Limits(max_connections=max_connections,max_keepalive_connections=max_connections)
+        # requests wait for connection in self.request_slots. Pool timeout is disabled
+        self.http_client = httpx.AsyncClient(auth=auth,limits=limits,timeout=httpx.Timeout(300,pool=None))
+        transport = AsyncTransport(client=self.http_client,wsdl_client=httpx.Client(auth=auth),cache=SqliteCache())
+        settings = Settings(strict=False, xml_huge_tree=True)
+        self.SOAPclient = AsyncClient(wsdl=self.APIconfig['ResnetURL'], transport=transport, settings=settings)
+        self.retry_errors = (zeep_exceptions.Error,req_exceptions.RequestException,httpx.HTTPError)
+        self.request_slots = asyncio.Semaphore(max_connections)
+        self.loop = asyncio.get_running_loop()
+
+
+    async def __request(self, operation:str, *args, max_iter=10):
+        start = time.time()
+        for attempt in range(1,max_iter+1):
+            try:
+                async with self.request_slots:
+                    return await getattr(self.SOAPclient.service,operation)(*args)
+            except self.retry_errors as err:
+                if attempt == max_iter:
+                    raise
+                timeout = attempt*CONNECTION_TIMEOUT
+                print(f'\n{operation} failed after {execution_time(start)} on {attempt} out of {max_iter} attempt:\n{err}',flush=True)
+                print(f'Will make attempt #{attempt+1} after {timeout} seconds',flush=True)
+                await asyncio.sleep(timeout)
+
+
+    async def __load_dict_folders(self, obj_props):
+        '''
+        loads dictionaries for properties in "obj_props" missing in self.propId2dict
+        '''
+        prop2folder = dict()
+        for prop in obj_props.Properties.ObjectProperty:
+            id_property = prop['PropId']
+            dict_folder_id = self.IdToPropType[id_property]['DictFolderId']
+            if dict_folder_id > 0 and id_property not in self.propId2dict:
+                prop2folder[id_property] = dict_folder_id
+
+        for id_property, dict_folder_id in prop2folder.items():
+            dict_folder = await self.__request('GetDictFolder', dict_folder_id)
+            id_values_to_str = {val['Id']:val['Value'] for val in dict_folder.Values.DictValue}
+            self.propId2dict[id_property] = id_values_to_str
+            self.propId2dict[dict_folder['Name']] = id_values_to_str
+
+
+    async def _annotate_async(self, obj_props):
+        await self.__load_dict_folders(obj_props)
+        return self._annotate(obj_props)
+
+
+    async def oql_response(self, OQLquery, result_param):
+        return await self.__request('OQLSearch', OQLquery, result_param)
+
+
+    async def result_get_data(self, result_param):
+        return await self.__request('ResultGetData', result_param)
+
+
+    async def release(self, ResultRef):
+        await self.__request('ResultRelease', ResultRef)
+
+
+    async def __get_obj_props(self, obj_ids:list[int], property_names:list[str]=[]):
+        rp = self.create_result_param(property_names)
+        rp.GetObjects = True
+        rp.GetProperties = True
+        obj_props = await self.oql_response(OQL.get_objects(obj_ids), rp)
+        if obj_props is None or obj_props.Objects is None or not obj_props.Objects.ObjectRef:
+            return None
+        return await self._annotate_async(obj_props)
+
+
+    async def get_object_properties(self, obj_ids:list[int], property_names:list[str]=[]):
+        '''
+        output:
+            merged zeep object properties of chunks retrieved concurrently or None if no objects were found
+        '''
+        if not obj_ids:
+            return None
+        max_chunk_size = 1000
+        chunks = [obj_ids[i:i+max_chunk_size] for i in range(0,len(obj_ids),max_chunk_size)]
+        chunks_props = await asyncio.gather(*[self.__get_obj_props(chunk,property_names) for chunk in chunks])
+        found_props = [p for p in chunks_props if p is not None]
+        if not found_props:
+            return None
+        obj_props = found_props[0]
+        for chunk_props in found_props[1:]:
+            obj_props['Objects']['ObjectRef'] += chunk_props.Objects.ObjectRef
+            if chunk_props.Properties is not None and chunk_props.Properties.ObjectProperty:
+                obj_props['Properties']['ObjectProperty'] += chunk_props.Properties.ObjectProperty
+        return obj_props
+
+
+    async def init_session(self, OQLrequest:str, PageSize:int, property_names=None, getLinks=True):
+        rp = self.create_result_param(property_names)
+        rp.GetObjects = True
+        rp.GetProperties = True
+        rp.GetLinks = getLinks
+        rp.CreateResult = True
+        rp.MaxPageSize = PageSize
+        obj_props = await self.oql_response(OQLrequest, rp)
+
+        if type(obj_props) == type(None):
+            return None, ('', 0, 0)
+        if type(obj_props.Objects) == type(None):
+            return None, (obj_props.ResultRef, obj_props.ResultSize, obj_props.ResultPos)
+
+        await self._annotate_async(obj_props)
+        return obj_props, (obj_props.ResultRef, obj_props.ResultSize, obj_props.ResultPos)
+
+
+    async def get_session_page(self, ResultRef, ResultPos, PageSize, ResultSize, property_names=None, getLinks=True):
+        '''
+        Return
+        ------
+        tuple zeep_data, ResultSize, ResultPos
+        '''
+        property_names = ['Name'] if property_names is None else property_names
+        rp = self.create_result_param(property_names)
+        rp.GetObjects = True
+        rp.GetProperties = True
+        rp.GetLinks = getLinks
+        rp.ResultSize = ResultSize
+        rp.ResultRef = ResultRef
+        rp.MaxPageSize = PageSize
+        rp.ResultPos = ResultPos
+        obj_props = await self.result_get_data(rp)
+
+        if type(obj_props) == type(None):
+            return None, int(0), int(0)
+        if type(obj_props.Objects) == type(None):
+            return None,int(obj_props.ResultSize), int(obj_props.ResultPos)
+
+        await self._annotate_async(obj_props)
+        return obj_props, int(obj_props.ResultSize), int(obj_props.ResultPos)
+
+
+    async def close_connection(self):
+        await self.http_client.aclose()
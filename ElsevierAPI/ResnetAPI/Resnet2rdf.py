@@ -77,7 +77,11 @@ class ResnetRDF(rdf.Graph):
         #return rdf.URIRef('http://www.google.com/'+quote(node['Name'][0]))
 
 
-    def add_reference(self,ref:Reference, to_rel_uri:str):
+    def add_reference(self,ref:Reference, to_rel_uri:str, snippets:dict=None):
+        '''
+        input:
+          snippets - {TextRef:{PropID:{Values}}} of "ref" supporting relation, default ref.snippets
+        '''
         was_added = False
         for i in PS_REFIID_TYPES:
             try:
@@ -126,7 +130,7 @@ class ResnetRDF(rdf.Graph):
             self.add((ref_rel_uri, self.make_uri('etm','pubtype'), rdf.Literal(pubtype)))
         except KeyError: pass
 
-        threshold_dict = ref.get_snippet_prop(THRESHOLD)
+        threshold_dict = ref.get_snippet_prop(THRESHOLD,snippets)
         for text_ref, threshold in threshold_dict.items():
             threshold_str = ','.join(threshold)
             self.add((ref_rel_uri, self.__resnet_uri('threshold'),rdf.Literal(threshold_str)))
@@ -266,7 +270,7 @@ class ResnetRDF(rdf.Graph):
                 self.add((rel_uri, rdf.RDF.object, node2uri))
 
         rel_refs = rel.refs()
-        [self.add_reference(ref, rel_uri) for ref in rel_refs]
+        [self.add_reference(ref, rel_uri, rel.ref_snippets(ref)) for ref in rel_refs]
 
     
     @staticmethod
@@ -1,4 +1,4 @@
-import time, math, os, glob, json, threading
+import time, math, os, glob, json, threading, asyncio
 import networkx as nx
 from zeep import exceptions
 from pathlib import Path
@@ -10,7 +10,10 @@ from .ResnetGraph import ResnetGraph,df,REFCOUNT,CHILDS,DBID,PSObject,OBJECT_TYP
 from .NetworkxObjects import RELATION_PROPS,ALL_PSREL_PROPS,EFFECT
 from .PathwayStudioGOQL import OQL
 from .Zeep2Experiment import Experiment
-from ..ETM_API.references import PS_BIBLIO_PROPS,PS_SENTENCE_PROPS,PS_REFIID_TYPES
+from .GOQLcache import GOQLcache,GOQL_CACHE,GOQL_CACHE_TTL,GOQL_CACHE_SIZE
+from .PageScheduler import PageScheduler
+from .PathwayStudioZeepAPI import AsyncDataModel,MAX_ASYNC_CONNECTIONS
+from ..ETM_API.references import PS_BIBLIO_PROPS,PS_SENTENCE_PROPS,PS_REFIID_TYPES,ReferenceStore
 from ..ScopusAPI.scopus import loadCI
 from ..utils import unpack,execution_time,execution_time2,load_api_config,pretty_xml,list2chunks_generator,multithread
 from ..Embio.PSnx2Neo4j import nx2neo4j
@@ -32,7 +35,8 @@ ALL_PROPERTIES = 10
 NO_RNEF_REL_PROPS={'RelationNumberOfReferences','Name','URN'}
 
 APISESSION_KWARGS = {'what2retrieve','connect2server','no_mess','data_dir',TO_RETRIEVE,
-                  'use_cache','load_model','ent_props','rel_props','useNeo4j'}
+                  'use_cache','load_model','ent_props','rel_props','useNeo4j',
+                  'oql_cache','oql_cache_ttl','oql_cache_size'}
 MAX_SESSIONS = 25 # by default sessions_max=200 in Oracle 
 MAX_PAGE_THREADS = 80
 MAX_OQLSTR_LEN = 65000 # string properties can form long oql queries exceeding 65000 chars limit
@@ -51,6 +55,7 @@ class APISession(PSNetworx):
     resnet_size = 1000 # number of <node><control> sections in RNEF dump
     max_rnef_size = 100000000 # max size of RNEF XML dump file. If dump file exceeds max_file_size new file is opened with index++
     max_sessions = MAX_SESSIONS
+    max_async_connections = MAX_ASYNC_CONNECTIONS # simultaneous SOAP requests from coroutines of async methods
     data_dir = ''
     sep = '\t'
     dump_oql_queries = False
@@ -72,6 +77,9 @@ class APISession(PSNetworx):
         [DATABASE_REFCOUNT_ONLY,REFERENCE_IDENTIFIERS,BIBLIO_PROPERTIES,SNIPPET_PROPERTIES,ONLY_REL_PROPERTIES,ALL_PROPERTIES]
         no_mess - default True, if False your script becomes more verbose
         connect2server - default True, set to False to run script using data in __pscache__ files instead of database
+        oql_cache - default False, set to True or path to SQLite file to reuse GOQL query results retrieved by previous runs
+        oql_cache_ttl - seconds to keep GOQL query results in oql_cache, default 30 days
+        oql_cache_size - max size of oql_cache in bytes, default 2Gb
         '''
         self.GOQLquery = str()
         self.DumpFiles = []
@@ -84,7 +92,10 @@ class APISession(PSNetworx):
                             'oql_queries' : [],
                             'add2self':True,
                             'connect2server':True,
-                            'useNeo4j' : False
+                            'useNeo4j' : False,
+                            'oql_cache' : False,
+                            'oql_cache_ttl' : GOQL_CACHE_TTL,
+                            'oql_cache_size' : GOQL_CACHE_SIZE
                             }
 
         my_kwargs.update(kwargs)
@@ -93,6 +104,10 @@ class APISession(PSNetworx):
         self.set_dir(my_kwargs.get('data_dir',''))
         self.use_cache = my_kwargs.get('use_cache',False)# if True signals to use graph data from cache files instead of retrieving data from database using GOQL queries 
 
+        self.page_scheduler = PageScheduler(MAX_PAGE_THREADS,self.max_sessions,self.PageSize) # shared by clones
+        self.page_lock = threading.Lock() # serializes merging of retrieved pages into self.Graph
+        self.refstore = ReferenceStore() # references interned by relations of graphs loaded by self.load_references. Shared by clones
+        self.__async_model = None # AsyncDataModel for async methods
         rel_props = my_kwargs.pop('rel_props',[]) # saving input props to add after __retrieve__
         self.__retrieve__(my_kwargs['what2retrieve']) #__retrieve__ overides self.relProps
         # properties have to updated after self.__retrieve__
@@ -110,6 +125,12 @@ class APISession(PSNetworx):
         if my_kwargs.pop('useNeo4j',False):
           self.neo4j = nx2neo4j()
 
+        self.oql_cache = None
+        oql_cache = my_kwargs.get('oql_cache',False)
+        if oql_cache:
+          path2cache = oql_cache if isinstance(oql_cache,str) else GOQL_CACHE
+          self.oql_cache = GOQLcache(path2cache,my_kwargs['oql_cache_ttl'],my_kwargs['oql_cache_size'])
+
     @staticmethod
     def _what2retrieve(what2retrieve:int):
         if what2retrieve == NO_REL_PROPERTIES:
@@ -134,10 +155,7 @@ class APISession(PSNetworx):
             retrieve_props = self._what2retrieve(what2retrieve)
             if retrieve_props:
                 self.relProps = retrieve_props # overides self.relProps
-                if what2retrieve in [SNIPPET_PROPERTIES,ALL_PROPERTIES]:
-                  ms = 5
-                  print(f'{type(self).__name__} sets multithreading to {ms} to retreive sentence properties')
-                  self.max_sessions = ms # to avoid "table is locked" error
+                # "table is locked" errors during retrieval of sentence properties are handled by self.page_scheduler
             else:
                 return # do nothing, keep CURRENT_SPECS
         else:
@@ -192,6 +210,10 @@ class APISession(PSNetworx):
         if self.useNeo4j():
           new_session.neo4j = self.neo4j
 
+        new_session.oql_cache = self.oql_cache
+        new_session.page_scheduler = self.page_scheduler
+        new_session.refstore = self.refstore
+        new_session.entity_cache = self.entity_cache
         return new_session
 
 
@@ -228,10 +250,6 @@ class APISession(PSNetworx):
         self.relProps = self.relProps+[i for i in add_props if i not in self.relProps]
         my_sent_props = set(PS_SENTENCE_PROPS).intersection(add_props)
         if my_sent_props:
-            ms = 5
-            if self.max_sessions > ms:
-              print(f'{type(self).__name__} decreases multithreading to {ms} to retreive sentence properties')
-              self.max_sessions = ms
             if 'TextRef' not in self.relProps:
                 self.relProps.append('TextRef')
             
@@ -240,6 +258,24 @@ class APISession(PSNetworx):
         self.entProps = self.entProps+[i for i in add_props if i not in self.entProps]
 
     
+    def invalidate_oql_cache(self,oql_query:str='')->int:
+        '''
+        Removes results of "oql_query" from self.oql_cache. Removes all results if "oql_query" is empty
+        '''
+        return self.oql_cache.invalidate(oql_query) if self.oql_cache else 0
+
+
+    def __oql_props(self):
+        return (self.entProps,self.relProps) if self.getLinks else (self.entProps,[])
+
+
+    def __add_cached(self,cached_graph:ResnetGraph,add2self:bool,get_links:bool):
+        if add2self:
+            self.Graph = self.Graph.compose(cached_graph)
+            if get_links:
+                self.dbid2relation.update({rel.dbid():rel for _,_,rel in cached_graph.edges.data('relation')})
+
+
     def add_dump_file(self, dump_fname, replace_main_dump=False):
         if replace_main_dump:
             self.DumpFiles = []
@@ -255,9 +291,8 @@ class APISession(PSNetworx):
         self.__set_get_links()
         obj_props = self.relProps if self.getLinks else self.entProps
         page_size = max_result if max_result else self.PageSize
-        zeep_data, (self.ResultRef, self.ResultSize, self.ResultPos) = self.init_session(self.GOQLquery,
-                                                                                        page_size,obj_props,
-                                                                                 getLinks = self.getLinks)
+        zeep_data, (self.ResultRef, self.ResultSize, self.ResultPos) = self.page_scheduler.request(self.init_session,
+                                                                        self.GOQLquery,page_size,obj_props,self.getLinks)
         
         if max_result and self.ResultSize > max_result:
           return ResnetGraph()
@@ -272,66 +307,208 @@ class APISession(PSNetworx):
 
         if not isinstance(zeep_data, type(None)):
             if self.getLinks:
-                obj_dbids = list(set([x['EntityId'] for x in zeep_data.Links.Link]))
-                zeep_objects = self.get_object_properties(obj_dbids, self.entProps)
-                return self._load_graph(zeep_data, zeep_objects,self.add2self)
+                zeep_objects = self._entities4(zeep_data, self.entProps)
+                with self.page_lock:
+                    return self._load_graph(zeep_data, zeep_objects,self.add2self)
             else:
-                return self._load_graph(None, zeep_data,self.add2self)
+                with self.page_lock:
+                    return self._load_graph(None, zeep_data,self.add2self)
         else:
             return ResnetGraph()
 
         
-    def __nextpage__(self,result_pos:int):
+    def __nextpage__(self,result_pos:int,page_size=0):
         '''
         Input
         -----
         result_pos - resut position to begin download. Provide explicitly to initiate multithreading
+        page_size - number of results to retrieve, defaults to self.PageSize
         '''
-        with threading.Lock():
-          # current_pos does not change during multithreading initiation!!!! 
-          if int(self.ResultPos) < int(self.ResultSize):
-              obj_props = self.relProps if self.getLinks else self.entProps
-              zeep_data, self.ResultSize, current_pos = self.get_session_page(self.ResultRef, result_pos, self.PageSize,
-                                                                        self.ResultSize,obj_props,getLinks=self.getLinks)                                                          
-              if not isinstance(zeep_data, type(None)):
-                  if self.getLinks and len(zeep_data.Links.Link) > 0:
-                      obj_dbids = list(set([x['EntityId'] for x in zeep_data.Links.Link]))
-                      zeep_objects = self.get_object_properties(obj_dbids, self.entProps)
-                      return self._load_graph(zeep_data, zeep_objects,self.add2self)
-                  else:
-                      return self._load_graph(None, zeep_data,self.add2self)
-              else:
-                  return ResnetGraph()
-          else: return ResnetGraph()
+        # current_pos does not change during multithreading initiation!!!! 
+        if int(self.ResultPos) < int(self.ResultSize):
+            obj_props = self.relProps if self.getLinks else self.entProps
+            page_size = page_size if page_size else self.PageSize
+            zeep_data, result_size, current_pos = self.get_session_page(self.ResultRef, result_pos, page_size,
+                                                                    self.ResultSize,obj_props,getLinks=self.getLinks)
+            if not isinstance(zeep_data, type(None)):
+                if self.getLinks and len(zeep_data.Links.Link) > 0:
+                    zeep_objects = self._entities4(zeep_data, self.entProps)
+                    with self.page_lock:
+                        self.ResultSize = result_size
+                        return self._load_graph(zeep_data, zeep_objects,self.add2self)
+                else:
+                    with self.page_lock:
+                        self.ResultSize = result_size
+                        return self._load_graph(None, zeep_data,self.add2self)
+            else:
+                return ResnetGraph()
+        else: return ResnetGraph()
 
 
     def __thread__(self,pages:int,process_name='oql_results'):
-      max_workers = pages if pages < MAX_PAGE_THREADS else MAX_PAGE_THREADS
+      '''
+      retrieves next "pages"*self.PageSize results starting from self.ResultPos using self.page_scheduler
+      '''
+      end_pos = min(self.ResultPos+pages*self.PageSize,self.ResultSize)
       if not self.no_mess:
         print(f'Retrieval starts from {self.ResultPos} result')
-        remaining_retrieval = self.ResultSize - self.ResultPos
-        next_download_size = min(pages*self.PageSize, remaining_retrieval)
-        print(f'Begin retrieving next {next_download_size} results in {max_workers} threads',flush=True)
+        print(f'Begin retrieving next {end_pos-self.ResultPos} results in {int(self.page_scheduler.limit)} threads',flush=True)
     
-      entire_graph = ResnetGraph()
-      result_pos = self.ResultPos
-      with ThreadPoolExecutor(max_workers, thread_name_prefix=process_name) as e:
-        futures = list()
-        for i in range(0,pages):
-            futures.append(e.submit(self.__nextpage__,result_pos))
-            result_pos += self.PageSize
-        
-        for future in as_completed(futures):
-            try:
-                entire_graph = entire_graph.compose(future.result())
-            except exceptions.TransportError:
-                raise exceptions.TransportError
-        e.shutdown()
-      
-      self.ResultPos = result_pos
+      entire_graph = self.page_scheduler.run(self.__nextpage__,self.ResultPos,end_pos,process_name)
+      self.ResultPos = end_pos
+      if not self.no_mess:
+        print(self.page_scheduler.report(),flush=True)
       return entire_graph
 
 
+    def retrieval_metrics(self)->dict:
+      '''
+      output:
+        throughput metrics of self.page_scheduler shared by all clones of this session
+      '''
+      return self.page_scheduler.metrics()
+
+
+#########################  ASYNCIO RETRIEVAL   ##################################
+    def async_model(self)->AsyncDataModel:
+        '''
+        output:
+          AsyncDataModel for running event loop. Must be called from coroutine
+        '''
+        if self.__async_model is None or self.__async_model.loop is not asyncio.get_running_loop():
+            self.__async_model = AsyncDataModel(self,self.max_async_connections)
+        return self.__async_model
+
+
+    async def close_async(self):
+        if self.__async_model is not None:
+            await self.__async_model.close_connection()
+            self.__async_model = None
+
+
+    async def __zeep2graph_async(self,zeep_data,ent_props:list,get_links:bool,add2self:bool)->ResnetGraph:
+        if isinstance(zeep_data, type(None)):
+            return ResnetGraph()
+        if get_links:
+            if not zeep_data.Links.Link:
+                return ResnetGraph()
+            obj_dbids = list(set([x['EntityId'] for x in zeep_data.Links.Link]))
+            zeep_objects, missing_dbids = self.entity_cache.cached(obj_dbids,ent_props)
+            if missing_dbids:
+                zeep_missing = await self.async_model().get_object_properties(missing_dbids,ent_props)
+                missing_objects = self._zeep2psobj(zeep_missing)
+                self.entity_cache.add(missing_objects,ent_props,missing_dbids)
+                zeep_objects.update(missing_objects)
+            with self.page_lock:
+                return self._load_graph(zeep_data, zeep_objects,add2self)
+        else:
+            with self.page_lock:
+                return self._load_graph(None, zeep_data,add2self)
+
+
+    async def __page_async(self,result_ref,result_pos:int,result_size:int,ent_props:list,rel_props:list,
+                           get_links:bool,add2self:bool)->ResnetGraph:
+        obj_props = rel_props if get_links else ent_props
+        zeep_data,_,_ = await self.async_model().get_session_page(result_ref,result_pos,self.PageSize,
+                                                                  result_size,obj_props,get_links)
+        return await self.__zeep2graph_async(zeep_data,ent_props,get_links,add2self)
+
+
+    async def __oql_async(self,oql_query:str,ent_props:list,rel_props:list,add2self=True,request_name='')->ResnetGraph:
+        '''
+        retrieves "oql_query" results without changing session state used by process_oql()
+        '''
+        get_links = self.__set_get_links(oql_query)
+        cache_props = (ent_props,rel_props) if get_links else (ent_props,[])
+        if self.oql_cache is not None:
+            cached_graph = self.oql_cache.get(oql_query,*cache_props)
+            if cached_graph is not None:
+                self.__add_cached(cached_graph,add2self,get_links)
+                return cached_graph
+
+        amodel = self.async_model()
+        obj_props = rel_props if get_links else ent_props
+        zeep_data,(result_ref,result_size,result_pos) = await amodel.init_session(oql_query,self.PageSize,obj_props,get_links)
+        if request_name and not self.no_mess:
+            print(f'query "{request_name}" found {result_size} results',flush=True)
+
+        pages = [self.__zeep2graph_async(zeep_data,ent_props,get_links,add2self)]
+        for pos in range(int(result_pos),int(result_size),self.PageSize):
+            pages.append(self.__page_async(result_ref,pos,result_size,ent_props,rel_props,get_links,add2self))
+        entire_graph = ResnetGraph()
+        for page_graph in await asyncio.gather(*pages):
+            entire_graph = entire_graph.compose(page_graph)
+        if result_ref:
+            await amodel.release(result_ref)
+
+        if self.oql_cache is not None:
+            self.oql_cache.put(oql_query,*cache_props,entire_graph)
+        return entire_graph
+
+
+    async def __iterate_async(self,oql_query:str,dbids:set,ent_props:list,rel_props:list,add2self=True,step=1000)->ResnetGraph:
+        if not dbids: return ResnetGraph()
+        my_oql, iteration_size, join_list = self._iteration_specs(oql_query,dbids,step)
+        dbids_list = list(dbids)
+        oqls = [my_oql.format(ids=join_list(dbids_list[i:i+iteration_size])) for i in range(0,len(dbids_list),iteration_size)]
+        entire_graph = ResnetGraph()
+        for graph in await asyncio.gather(*[self.__oql_async(oql,ent_props,rel_props,add2self) for oql in oqls]):
+            entire_graph = entire_graph.compose(graph)
+        return entire_graph
+
+
+    async def process_oql_async(self,oql_query:str,request_name='')->ResnetGraph:
+        '''
+        asyncio version of process_oql(). Result pages are retrieved by coroutines instead of threads.\n
+        Many queries can be executed simultaneously in one thread:\n
+        graphs = await asyncio.gather(*[session.process_oql_async(oql) for oql in oqls])
+        '''
+        return await self.__oql_async(oql_query,list(self.entProps),list(self.relProps),self.add2self,request_name)
+
+
+    async def iterate_oql_async(self,oql_query:str,search_values:set[str]|set[int],use_cache=True,request_name='',step=1000)->ResnetGraph:
+        """
+        asyncio version of iterate_oql(). All chunks of "search_values" are queried simultaneously in one thread
+        # oql_query MUST contain string placeholder called {ids} if iterable id_set contains dbids\n
+        # oql_query MUST contain string placeholder called {props} if iterable id_set contain property values other than database id
+        """
+        print('Processing "%s" request\n' % request_name)
+        dbid_only_graph = await self.__iterate_async(oql_query,search_values,[],[],False,step)
+        if not dbid_only_graph:
+            return ResnetGraph()
+
+        return_subgraph,rel_dbids,node_dbids = self.__dbids2annotate(dbid_only_graph,use_cache)
+        ent_props, rel_props = list(self.entProps), list(self.relProps)
+        add2return = ResnetGraph()
+        if rel_dbids:
+            add2return = await self.__iterate_async('SELECT Relation WHERE id = ({ids})',rel_dbids,ent_props,rel_props,self.add2self,step)
+            node_dbids.difference_update(add2return.ids4nodes())
+        if node_dbids:
+            nodes_graph = await self.__iterate_async('SELECT Entity WHERE id = ({ids})',node_dbids,ent_props,rel_props,self.add2self,step)
+            add2return = add2return.compose(nodes_graph)
+        return return_subgraph.compose(add2return)
+
+
+    async def get_network_async(self,_4dbids:set,connect_by_reltypes:list=[],step=500)->ResnetGraph:
+        '''
+        asyncio version of get_network().\n
+        Relations between every pair of "step"-size chunks of "_4dbids" are retrieved simultaneously in one thread
+        '''
+        oql_query = 'SELECT Relation WHERE NeighborOf (SELECT Entity WHERE id = ({ids1})) AND NeighborOf (SELECT Entity WHERE id = ({ids2}))'
+        if connect_by_reltypes:
+            oql_query += f' AND objectType = ({str(",".join(connect_by_reltypes))})'
+
+        dbids = list(_4dbids)
+        chunks = [','.join(list(map(str,dbids[i:i+step]))) for i in range(0,len(dbids),step)]
+        oqls = [oql_query.format(ids1=chunk1,ids2=chunk2) for i,chunk1 in enumerate(chunks) for chunk2 in chunks[i:]]
+        print(f'Will load network of {len(dbids)} nodes in {len(oqls)} simultaneous queries')
+        ent_props, rel_props = list(self.entProps), list(self.relProps)
+        network = ResnetGraph()
+        for graph in await asyncio.gather(*[self.__oql_async(oql,ent_props,rel_props,self.add2self) for oql in oqls]):
+            network = network.compose(graph)
+        return network
+
+
     def process_oql(self,oql_query:str,request_name='',max_result=0, debug=False) -> ResnetGraph|int:
         '''
         Return
@@ -343,6 +520,15 @@ class APISession(PSNetworx):
           self.__replace_goql(oql_query)
           start_time = time.time()
           return_type = 'relations' if self.getLinks else 'entities'
+          use_oql_cache = self.oql_cache is not None and not max_result and not debug
+          if use_oql_cache:
+            cached_graph = self.oql_cache.get(oql_query,*self.__oql_props())
+            if cached_graph is not None:
+              self.__add_cached(cached_graph,self.add2self,self.getLinks)
+              if request_name and not self.no_mess:
+                print(f'query "{request_name}" results were loaded from GOQL cache',flush=True)
+              return cached_graph
+
           entire_graph = self.__init_session(max_result=max_result,request_name=request_name)
           if debug: return entire_graph
 
@@ -367,6 +553,9 @@ class APISession(PSNetworx):
                       (my_request_name, entire_graph.number_of_nodes(), entire_graph.number_of_edges(),
                               execution_time(start_time), pages+1),flush=True)
 
+          if use_oql_cache:
+            self.oql_cache.put(oql_query,*self.__oql_props(),entire_graph)
+
           self.ResultRef = ''
           self.ResultPos = 0
           self.ResultSize = 0
@@ -374,32 +563,43 @@ class APISession(PSNetworx):
           return entire_graph
 
 
+    def __dbids2annotate(self,id_only_graph:ResnetGraph,use_cache=True):
+        '''
+        output:
+          subgraph of self.Graph with annotations for id_only_graph,
+          dbids of relations and dbids of nodes that must be retrieved from database
+        '''
+        print(f'Retrieving annotations for graph with {len(id_only_graph)} nodes and {id_only_graph.number_of_edges()} relations')
+        need_reldbids = id_only_graph._relations_dbids()
+        need_nodedbids = id_only_graph.ids4nodes()
+        
+        if use_cache and self.Graph:
+          rels4subgraph = [rel for dbid,rel in self.dbid2relation.items() if dbid in need_reldbids]
+          return_subgraph = self.Graph.subgraph_by_rels(rels4subgraph)
+          return_subgraph.add_psobjs(set(self.Graph.psobj_with_ids(set(need_nodedbids))))
+          relations_dbids2retreive = need_reldbids.difference(self.dbid2relation.keys())
+          nodes_dbids2retreive = set(need_nodedbids).difference(set(self.Graph.ids4nodes()))
+        else:
+          return_subgraph = ResnetGraph()
+          relations_dbids2retreive = set(need_reldbids)
+          nodes_dbids2retreive = set(need_nodedbids)
+
+        exist_nodes_count = len(need_nodedbids)-len(nodes_dbids2retreive)
+        exist_rels_count = len(need_reldbids)-len(relations_dbids2retreive)
+        print(f'{exist_nodes_count} nodes, {exist_rels_count} relations were downloaded from database previously')
+        print(f'{len(nodes_dbids2retreive)} nodes, {len(relations_dbids2retreive)} relations will be loaded from database')
+        return return_subgraph, relations_dbids2retreive, nodes_dbids2retreive
+
+
     def __annotate_dbid_graph__(self,id_only_graph:ResnetGraph,use_cache=True,request_name='',step=1000):
         '''
         loads:
           new relations to self.Graph by ids in id_only_graph
         '''
         if id_only_graph.number_of_nodes() > 0:
-          print(f'Retrieving annotations for graph with {len(id_only_graph)} nodes and {id_only_graph.number_of_edges()} relations')
           req_name = f'Annotations 4 "{request_name}"'
-          need_reldbids = id_only_graph._relations_dbids()
           need_nodedbids = id_only_graph.ids4nodes()
-          
-          if use_cache and self.Graph:
-            rels4subgraph = [rel for dbid,rel in self.dbid2relation.items() if dbid in need_reldbids]
-            return_subgraph = self.Graph.subgraph_by_rels(rels4subgraph)
-            return_subgraph.add_psobjs(set(self.Graph.psobj_with_ids(set(need_nodedbids))))
-            relations_dbids2retreive = need_reldbids.difference(self.dbid2relation.keys())
-            nodes_dbids2retreive = set(need_nodedbids).difference(set(self.Graph.ids4nodes()))
-          else:
-            return_subgraph = ResnetGraph()
-            relations_dbids2retreive = set(need_reldbids)
-            nodes_dbids2retreive = set(need_nodedbids)
-
-          exist_nodes_count = len(need_nodedbids)-len(nodes_dbids2retreive)
-          exist_rels_count = len(need_reldbids)-len(relations_dbids2retreive)
-          print(f'{exist_nodes_count} nodes, {exist_rels_count} relations were downloaded from database previously')
-          print(f'{len(nodes_dbids2retreive)} nodes, {len(relations_dbids2retreive)} relations will be loaded from database')
+          return_subgraph,relations_dbids2retreive,nodes_dbids2retreive = self.__dbids2annotate(id_only_graph,use_cache)
           
           add2return = ResnetGraph()
           if relations_dbids2retreive:
@@ -434,21 +634,12 @@ class APISession(PSNetworx):
             return self.process_oql(oql,request_name)
 
 
-    def __iterate__(self,oql_query:str,dbids:set,request_name='',step=1000,download=False):
+    @staticmethod
+    def _iteration_specs(oql_query:str,dbids:set,step=1000):
         '''
-        Input
-        -----
-        oql_query MUST contain string placeholder called {ids} to iterate dbids\n
-        oql_query MUST contain string placeholder called {props} to iterate other database properties
-        "step" - controls duration of request to avoid timeout during multithreading
-
-        uses self.entProp and self.relProp to retrieve properties\n
-        use self.add2self and self.merge2self to control caching
- 
-        if download does not close the last batch file\n
-        use self.close_rnef_dump() to close batch
+        output:
+          oql_query with {ids} placeholder, number of ids in one iteration, function joining ids for oql_query
         '''
-        if not dbids: return ResnetGraph()
         if oql_query.find('{ids',20) > 0:
             my_oql = oql_query
             iteration_size =  min(step,1000)
@@ -461,7 +652,25 @@ class APISession(PSNetworx):
             iteration_size = min(step, 1000, int(MAX_OQLSTR_LEN/max_id_len))
             def join_list (l:list):
                 return OQL.join_with_quotes(l)
+        return my_oql, iteration_size, join_list
+
+
+    def __iterate__(self,oql_query:str,dbids:set,request_name='',step=1000,download=False):
+        '''
+        Input
+        -----
+        oql_query MUST contain string placeholder called {ids} to iterate dbids\n
+        oql_query MUST contain string placeholder called {props} to iterate other database properties
+        "step" - controls duration of request to avoid timeout during multithreading
 
+        uses self.entProp and self.relProp to retrieve properties\n
+        use self.add2self and self.merge2self to control caching
+ 
+        if download does not close the last batch file\n
+        use self.close_rnef_dump() to close batch
+        '''
+        if not dbids: return ResnetGraph()
+        my_oql, iteration_size, join_list = self._iteration_specs(oql_query,dbids,step)
         number_of_iterations = math.ceil(len(dbids)/iteration_size)  
         # new sessions must be created to avoid ResultRef pointer overwriting
         entire_graph = ResnetGraph()
@@ -897,13 +1106,18 @@ class APISession(PSNetworx):
 
     def load_references(self,_4graph:ResnetGraph=None,
                       relpval2weight:dict[str,dict[str,float]]={},weight_name='relweight'):
+      '''
+      output:
+        references of "_4graph" or self.Graph interned in self.refstore.
+        Use PSRelation.ref_snippets() to read snippets of references supporting specific relation
+      '''
       if _4graph:
-        Grefs = _4graph.load_references(relpval2weight,weight_name,postgres=self.postgres())
+        Grefs = _4graph.load_references(relpval2weight,weight_name,postgres=self.postgres(),refstore=self.refstore)
         if self.add2self:
           self.Graph = self.Graph.compose(_4graph)
         return Grefs
       else:
-        return self.Graph.load_references(relpval2weight,weight_name,postgres=self.postgres())
+        return self.Graph.load_references(relpval2weight,weight_name,postgres=self.postgres(),refstore=self.refstore)
 
 
     def connect_entities(self,objs:list[PSObject],and_obj:list[PSObject],
@@ -1,14 +1,16 @@
-import os,glob,zipfile,json,time
+import os,glob,zipfile,json,time,shutil
 from pathlib import Path
 from shutil import copyfile
-from .ResnetAPISession import REFERENCE_IDENTIFIERS,REFCOUNT
+from .ResnetAPISession import REFERENCE_IDENTIFIERS,DATABASE_REFCOUNT_ONLY,REFCOUNT,TO_RETRIEVE
 from .ResnetAPISession import APISession
 from ..utils import execution_time,Tee
 from .ResnetGraph import EFFECT,ResnetGraph
 from .NetworkxObjects import PSObject,PSObjectDecoder,PSObjectEncoder
+from .ResnetBinary import read_rnbin,dump2rnbin
 
 CACHE_DIR = os.path.join(os.getcwd(),'ENTELLECT_API/ElsevierAPI/ResnetAPI/__pscache__/')
 DEFAULT_CACHE_NAME = 'Resnet subset'
+MIN_URN_OVERLAP = 0.5 # min fraction of raw cache relations found in database by URN to update raw cache incrementally
 
 class APIcache(APISession):
   '''
@@ -52,7 +54,9 @@ class APIcache(APISession):
           'predict_effect4' : [], # [_4enttypes:list,_4reltypes:list] - parameters for ResnetGraph.predict_effect4()
           'no_id_version': True,
           'max_threads' : 25, # controls download speed.  Make it 10 if what2retrieve=ALL_PROPERTIES
-          'read_raw' : False
+          'read_raw' : False,
+          'binary_cache' : True, # if True loads cache from binary copy of RNEF file and makes binary copy if it is stale
+          'incremental' : False # if True "reload" downloads only new and changed relations into existing raw cache
       }
 
       ent_props = list(kwargs.pop('ent_props',[]))
@@ -74,6 +78,7 @@ class APIcache(APISession):
       self.relprops2rnef = list(rel_props)
       self.relprops2rnef += [p for p in [EFFECT,'URN',REFCOUNT] if p not in rel_props]
       
+      self.cache_kwargs = dict(my_kwargs) # for self.refresh()
       # loads cache_name from self.data_dir:
       load_cache = my_kwargs.pop('load_cache',True)
       if load_cache:
@@ -103,6 +108,14 @@ class APIcache(APISession):
     return path2raw
   
 
+  def cache_path(self,extension='.rnef')->str:
+      '''
+      output:
+        path to file with "extension" located next to cache file
+      '''
+      return self.__path2cache(**dict(self.cache_kwargs,extension=extension))
+
+
   @staticmethod
   def cache_filename(parameters:dict):
       return parameters['cache_name']+'.rnef'
@@ -204,9 +217,146 @@ class APIcache(APISession):
           my_session.download_oql(oql,reqname,resume_page=resume_from)
 
 
+  def __path2manifest(self,**kwargs)->str:
+    return self.__path2cache(**dict(kwargs,extension='_manifest.json'))
+
+
+  def __load_manifest(self,**kwargs)->dict[str,list[int]]:
+    '''
+    output:
+      {relation_urn:[dbid,refcount]} saved by last cache refresh for current self.my_oql_queries
+    '''
+    try:
+      with open(self.__path2manifest(**kwargs),'r',encoding='utf-8') as f:
+        manifest = json.load(f)
+      if manifest['queries'] == [q[0] for q in self.my_oql_queries]:
+        return manifest['relations']
+      print('Cache manifest was made for different queries and will be ignored')
+    except FileNotFoundError:
+      pass
+    return dict()
+
+
+  def __save_manifest(self,urn2dbid_refcount:dict[str,list[int]],**kwargs):
+    manifest = {'queries':[q[0] for q in self.my_oql_queries],
+                'built':time.strftime('%Y-%m-%d %H:%M:%S'),
+                'relations':urn2dbid_refcount}
+    with open(self.__path2manifest(**kwargs),'w',encoding='utf-8') as f:
+      json.dump(manifest,f)
+
+
+  def __scan_database(self)->tuple[dict[str,list[int]],ResnetGraph]:
+    '''
+    output:
+      {relation_urn:[dbid,refcount]} for relations retrieved by self.my_oql_queries from database,
+      ResnetGraph with entities retrieved by entity queries in self.my_oql_queries
+    '''
+    scan_session = self._clone_session(**{TO_RETRIEVE:DATABASE_REFCOUNT_ONLY,'no_mess':True})
+    scan_session.entProps = ['Name','URN']
+    scan_session.add2self = False
+    scan_session.oql_cache = None
+    urn2dbid_refcount = dict()
+    entity_graph = ResnetGraph()
+    for query in self.my_oql_queries:
+      oql, reqname = query[0], query[1]
+      if oql.lstrip()[7:15] == 'Relation':
+        scan_graph = scan_session.process_oql(oql,f'Scanning {reqname}')
+        for _,_,rel in scan_graph.edges.data('relation'):
+          # relations in raw cache are read from RNEF with URNs calculated by PSRelation
+          urn2dbid_refcount[rel.urn(refresh=True)] = [rel.dbid(),int(rel.get_prop(REFCOUNT,if_missing_return=0))]
+      else:
+        entity_session = self._clone_session(no_mess=True)
+        entity_session.oql_cache = None
+        entity_graph = entity_graph.compose(entity_session.process_oql(oql,reqname))
+    return urn2dbid_refcount, entity_graph
+
+
+  def __dump_raw(self,raw_graph:ResnetGraph,**kwargs):
+    '''
+    replaces RNEF files in raw cache directory with "raw_graph"
+    '''
+    dump_dir = self.__path2rawdir(**kwargs)
+    new_dir = dump_dir.rstrip(os.path.sep)+'_new'
+    shutil.rmtree(new_dir,ignore_errors=True)
+    my_session = self._clone_session(no_mess=self.no_mess,data_dir=new_dir,connect2server=False)
+    my_session.set_dump_folder(new_dir)
+    raw_graph.name = os.path.basename(dump_dir)
+    my_session._dump2rnef(raw_graph,my_session.dump_folder)
+    my_session.close_rnef_dump(my_session.dump_folder)
+    shutil.rmtree(dump_dir)
+    os.rename(new_dir,dump_dir)
+
+
+  def __update_raw(self,raw_graph:ResnetGraph,**kwargs)->ResnetGraph|None:
+    '''
+    input:
+      raw_graph - graph from raw cache directory
+    output:
+      "raw_graph" with relations deleted from database removed and with new relations and relations with changed reference count
+      reloaded from database. Changed relations are identified by comparing database with relation manifest saved by previous refresh.
+      Without manifest only relations missing in "raw_graph" are downloaded.
+      Returns None if URNs of relations in "raw_graph" do not reconcile with database URNs and cache must be reloaded in full
+    '''
+    start = time.time()
+    old_manifest = self.__load_manifest(**kwargs)
+    db_manifest, entity_graph = self.__scan_database()
+    raw_urn2rel = {rel.urn():rel for _,_,rel in raw_graph.edges.data('relation')}
+    if not self._urns_reconcile(raw_urn2rel,db_manifest):
+      print(f'Relation URNs in "{raw_graph.name}" do not match URNs in database. Cache will be downloaded in full')
+      return None
+
+    urns2update = set()
+    for urn, (dbid,refcount) in db_manifest.items():
+      if urn not in raw_urn2rel:
+        urns2update.add(urn)
+      elif old_manifest and (urn not in old_manifest or old_manifest[urn][1] != refcount):
+        urns2update.add(urn)
+    urns2delete = set(raw_urn2rel).difference(db_manifest)
+    print(f'{len(urns2update)} new or changed relations will be downloaded, {len(urns2delete)} relations will be removed from "{raw_graph.name}"')
+
+    for urn in urns2update.union(urns2delete):
+      if urn in raw_urn2rel:
+        raw_graph.remove_relation(raw_urn2rel[urn])
+
+    if urns2update:
+      my_session = self._clone_session(no_mess=self.no_mess)
+      my_session.oql_cache = None
+      dbids2update = {db_manifest[urn][0] for urn in urns2update}
+      updated_graph = my_session.iterate_oql('SELECT Relation WHERE id = ({ids})',dbids2update,use_cache=False,
+                                             request_name=f'Update {len(dbids2update)} relations')
+      raw_graph = raw_graph.compose(updated_graph)
+    if entity_graph:
+      raw_graph = raw_graph.compose(entity_graph)
+
+    if urns2update or urns2delete or entity_graph:
+      self.__dump_raw(raw_graph,**kwargs)
+    self.__save_manifest(db_manifest,**kwargs)
+    print(f'Raw cache "{raw_graph.name}" was updated in {execution_time(start)}')
+    return raw_graph
+
+
+  @staticmethod
+  def _urns_reconcile(raw_urn2rel:dict,db_manifest:dict[str,list[int]])->bool:
+    '''
+    output:
+      True if at least MIN_URN_OVERLAP of relations in raw cache are found in database by URN.
+      Incremental update assumes that URNs of raw cache relations are calculated by PSRelation same way as in database scan
+    '''
+    if not raw_urn2rel: return True
+    found = sum(1 for urn in raw_urn2rel if urn in db_manifest)
+    return found >= MIN_URN_OVERLAP*len(raw_urn2rel)
+
+
   def __read_raw(self,**kwargs):
     dump_dir = self.__path2rawdir(**kwargs)
     database_graph = ResnetGraph.fromRNEFdir(dump_dir,merge=False)
+    can_update = database_graph and self.my_oql_queries and not kwargs.get('connect_nodes',False)
+    if kwargs.get('reload',False) and kwargs.get('incremental',False) and can_update:
+      print(f'Updating cache "{dump_dir}" with changes in database')
+      updated_graph = self.__update_raw(database_graph,**kwargs)
+      if updated_graph is not None:
+        return updated_graph
+      database_graph = None
     if not database_graph or kwargs.get('reload',False):
       print(f'Cache "{dump_dir}" was not found\nBegin graph download from database')
       self.set_dump_folder(dump_dir)
@@ -256,8 +406,14 @@ class APIcache(APISession):
         return self.simplify_graph(database_graph,**kwargs)
       else:
         my_cache_file = self.__path2cache(**kwargs)
+        use_binary = kwargs.get('binary_cache',True)
         try:
-          cached_graph = ResnetGraph.fromRNEF(my_cache_file,prop2values=prop2values)
+          cached_graph = read_rnbin(my_cache_file,prop2values=prop2values) if use_binary else None
+          if cached_graph is None:
+            cached_graph = ResnetGraph.fromRNEF(my_cache_file,prop2values=prop2values)
+            if use_binary and not prop2values:
+              # binary copy is made only from complete cache
+              dump2rnbin(cached_graph,my_cache_file)
           print(f'Loaded "{cache_name}" cache with {len(cached_graph)} nodes and {cached_graph.number_of_edges()} edges')
           cached_graph.name = cache_name
           return cached_graph
@@ -286,6 +442,26 @@ class APIcache(APISession):
           return database_graph
 
 
+  def refresh(self,**kwargs)->ResnetGraph:
+      '''
+      kwargs - overrides cache parameters used for loading cache
+      output:
+        self.network updated with changes in database made after previous cache refresh
+      '''
+      my_kwargs = dict(self.cache_kwargs,incremental=True)
+      my_kwargs.update(kwargs)
+      my_kwargs['reload'] = True
+      my_kwargs['read_raw'] = True
+      self.clear()
+      self.network = self._load_cache(**my_kwargs)
+      if self.network:
+        cache_name = self.network.name
+        self.replace_cache(cache_name,self.network.remove_undirected_duplicates(),self.entProps,self.relprops2rnef)
+        self.network.name = cache_name
+        self.save_description()
+      return self.network
+
+
   def add2raw(self,graph:ResnetGraph):
       self._dump2rnef(graph,self.network.name+'_raw','raw')
 
@@ -0,0 +1,281 @@
+import os,json,time,shutil
+import numpy as np
+from collections import defaultdict
+from .NetworkxObjects import PSObject,PSRelation,REGULATORS,TARGETS
+from .ResnetGraph import ResnetGraph
+from ..utils import execution_time
+
+RNBIN_FORMAT = 'rnbin'
+RNBIN_VERSION = 1
+RNBIN_EXT = '.rnbin'
+REFS_DIR = 'refs'
+META_FILE = 'meta.json'
+STR_SEP = '\x00' # XML 1.0 cannot contain NUL therefore it is safe separator for RNEF strings
+
+# link types in rel_link_type.npy
+LINK_IN = 0 # regulator of directional relation
+LINK_OUT = 1 # target of directional relation
+LINK_INOUT = 2 # member of non-directional relation
+
+
+class StringDict:
+  '''
+  string dictionary for columnar tables.\n
+  strings are stored as one NUL-separated utf-8 blob, tables store int32 indexes into it
+  '''
+  def __init__(self):
+    self.str2idx = dict()
+    self.strings = list()
+
+
+  def idx(self,s)->int:
+    s = str(s)
+    try:
+      return self.str2idx[s]
+    except KeyError:
+      i = len(self.strings)
+      self.str2idx[s] = i
+      self.strings.append(s)
+      return i
+
+
+  def save(self,to_dir:str):
+    blob = STR_SEP.join(self.strings).encode('utf-8')
+    np.save(os.path.join(to_dir,'strings.npy'),np.frombuffer(blob,dtype=np.uint8))
+
+
+  @staticmethod
+  def load(from_dir:str,mmap_mode=None)->list[str]:
+    blob = np.load(os.path.join(from_dir,'strings.npy'),mmap_mode=mmap_mode)
+    return blob.tobytes().decode('utf-8').split(STR_SEP) if blob.size else ['']
+
+
+def _is_scalar(value):
+  return isinstance(value,(str,int,float))
+
+
+def _save_arrays(to_dir:str,arrays:dict[str,list],dtype=np.int32):
+  for name, values in arrays.items():
+    np.save(os.path.join(to_dir,name+'.npy'),np.asarray(values,dtype=dtype))
+
+
+def path2rnbin(rnef_file:str)->str:
+  '''
+  output:
+    path to binary cache directory located next to "rnef_file"
+  '''
+  return rnef_file[:-5]+RNBIN_EXT if rnef_file.endswith('.rnef') else rnef_file+RNBIN_EXT
+
+
+def _source_stamp(rnef_file:str)->dict:
+  try:
+    st = os.stat(rnef_file)
+    return {'source':os.path.basename(rnef_file),'source_size':st.st_size,'source_mtime_ns':st.st_mtime_ns}
+  except FileNotFoundError:
+    return dict()
+
+
+def read_meta(rnbin_dir:str)->dict:
+  try:
+    with open(os.path.join(rnbin_dir,META_FILE),'r',encoding='utf-8') as f:
+      return json.load(f)
+  except (FileNotFoundError,json.JSONDecodeError):
+    return dict()
+
+
+def is_fresh(rnef_file:str,rnbin_dir:str='')->bool:
+  '''
+  output:
+    True if binary cache exists, has current format version and was made from current version of "rnef_file".\n
+    Binary cache without "rnef_file" is considered stale
+  '''
+  meta = read_meta(rnbin_dir if rnbin_dir else path2rnbin(rnef_file))
+  if meta.get('format') != RNBIN_FORMAT or meta.get('version') != RNBIN_VERSION:
+    return False
+  stamp = _source_stamp(rnef_file)
+  if not stamp: return False
+  return meta.get('source_size') == stamp['source_size'] and meta.get('source_mtime_ns') == stamp['source_mtime_ns']
+
+
+def dump2rnbin(graph:ResnetGraph,rnef_file:str,with_refs=True)->str:
+  '''
+  input:
+    graph - ResnetGraph loaded from "rnef_file". Relations must keep PropSetToProps parsed from RNEF
+    rnef_file - source RNEF file. Its size and modification time are used to detect stale binary cache
+  Dumps:
+    graph into columnar binary cache directory next to "rnef_file":\n
+    node and relation property tables, relation links and references in "refs" subdirectory.\n
+    All tables are NumPy int32 arrays of indexes into string dictionary
+  output:
+    path to binary cache directory
+  '''
+  start = time.time()
+  rnbin_dir = path2rnbin(rnef_file)
+  tmp_dir = rnbin_dir+'.tmp'
+  shutil.rmtree(tmp_dir,ignore_errors=True)
+  os.makedirs(os.path.join(tmp_dir,REFS_DIR))
+
+  strs = StringDict()
+  uid2idx = dict()
+  node_urn = list()
+  node_ptr, node_pname, node_pvalue = [0], list(), list()
+  for uid, n in graph.nodes(data=True):
+    uid2idx[uid] = len(node_urn)
+    node_urn.append(strs.idx(n['URN'][0]))
+    for prop_name, prop_values in n.items():
+      pidx = strs.idx(prop_name)
+      for v in prop_values:
+        if _is_scalar(v):
+          node_pname.append(pidx)
+          node_pvalue.append(strs.idx(v))
+    node_ptr.append(len(node_pname))
+
+  ref_strs = StringDict()
+  rel_ptr, rel_pname, rel_pvalue = [0], list(), list()
+  link_ptr, link_node, link_type = [0], list(), list()
+  ref_ptr, ref_propset, ref_pname, ref_pvalue = [0], list(), list(), list()
+  unique_rels = {rel.urn():rel for _,_,rel in graph.edges.data('relation')}
+  for rel in unique_rels.values():
+    for prop_name, prop_values in rel.items():
+      pidx = strs.idx(prop_name)
+      for v in prop_values:
+        if _is_scalar(v):
+          rel_pname.append(pidx)
+          rel_pvalue.append(strs.idx(v))
+    rel_ptr.append(len(rel_pname))
+
+    if TARGETS in rel.Nodes:
+      reg_type = LINK_IN
+      for t in rel.Nodes[TARGETS]:
+        link_node.append(uid2idx[t.uid()])
+        link_type.append(LINK_OUT)
+    else:
+      reg_type = LINK_INOUT
+    for r in rel.Nodes[REGULATORS]:
+      link_node.append(uid2idx[r.uid()])
+      link_type.append(reg_type)
+    link_ptr.append(len(link_node))
+
+    if with_refs:
+      for propset_id, propset in rel.PropSetToProps.items():
+        psidx = ref_strs.idx(propset_id)
+        for prop_name, prop_values in propset.items():
+          pidx = ref_strs.idx(prop_name)
+          for v in prop_values:
+            ref_propset.append(psidx)
+            ref_pname.append(pidx)
+            ref_pvalue.append(ref_strs.idx(v))
+    ref_ptr.append(len(ref_pname))
+
+  strs.save(tmp_dir)
+  _save_arrays(tmp_dir,{'node_urn':node_urn,'node_prop_name':node_pname,'node_prop_value':node_pvalue,
+                        'rel_prop_name':rel_pname,'rel_prop_value':rel_pvalue,'rel_link_node':link_node})
+  _save_arrays(tmp_dir,{'node_ptr':node_ptr,'rel_ptr':rel_ptr,'rel_link_ptr':link_ptr},np.int64)
+  _save_arrays(tmp_dir,{'rel_link_type':link_type},np.int8)
+
+  refs_dir = os.path.join(tmp_dir,REFS_DIR)
+  ref_strs.save(refs_dir)
+  _save_arrays(refs_dir,{'ref_propset':ref_propset,'ref_prop_name':ref_pname,'ref_prop_value':ref_pvalue})
+  _save_arrays(refs_dir,{'ref_ptr':ref_ptr},np.int64)
+
+  meta = {'format':RNBIN_FORMAT,'version':RNBIN_VERSION,
+          'nodes':len(node_urn),'relations':len(unique_rels),'with_refs':with_refs,
+          'created':time.strftime('%Y-%m-%d %H:%M:%S')}
+  meta.update(_source_stamp(rnef_file))
+  with open(os.path.join(tmp_dir,META_FILE),'w',encoding='utf-8') as f:
+    json.dump(meta,f,indent=2)
+
+  shutil.rmtree(rnbin_dir,ignore_errors=True)
+  os.replace(tmp_dir,rnbin_dir)
+  print(f'Binary cache with {len(node_urn)} nodes and {len(unique_rels)} relations was written into {rnbin_dir} in {execution_time(start)}')
+  return rnbin_dir
+
+
+def _load(from_dir:str,name:str,mmap_mode=None)->np.ndarray:
+  return np.load(os.path.join(from_dir,name+'.npy'),mmap_mode=mmap_mode)
+
+
+def _psobjs(rnbin_dir:str,strings:list[str])->list[PSObject]:
+  '''
+  output:
+    [PSObject] in the order of node table
+  '''
+  node_ptr = _load(rnbin_dir,'node_ptr').tolist()
+  pnames = _load(rnbin_dir,'node_prop_name').tolist()
+  pvalues = _load(rnbin_dir,'node_prop_value').tolist()
+  nodes = list()
+  for i in range(len(node_ptr)-1):
+    props = defaultdict(list)
+    for j in range(node_ptr[i],node_ptr[i+1]):
+      props[strings[pnames[j]]].append(strings[pvalues[j]])
+    nodes.append(PSObject(props))
+  return nodes
+
+
+def read_rnbin(rnef_file:str,prop2values:dict=dict(),load_refs=True,check_fresh=True)->ResnetGraph|None:
+  '''
+  input:
+    rnef_file - source RNEF file of binary cache
+    prop2values={prop_name:[values]} - filter to load relations only for nodes with desired properties
+    load_refs - if False references are not loaded. Use for networks that do not need references
+    check_fresh - if True returns None when binary cache is stale
+  output:
+    ResnetGraph identical to ResnetGraph.fromRNEF(rnef_file,prop2values) or None if binary cache is stale or missing
+  '''
+  rnbin_dir = path2rnbin(rnef_file)
+  if check_fresh and not is_fresh(rnef_file,rnbin_dir):
+    return None
+
+  start = time.time()
+  strings = StringDict.load(rnbin_dir)
+  nodes = _psobjs(rnbin_dir,strings)
+
+  rel_ptr = _load(rnbin_dir,'rel_ptr').tolist()
+  rel_pnames = _load(rnbin_dir,'rel_prop_name').tolist()
+  rel_pvalues = _load(rnbin_dir,'rel_prop_value').tolist()
+  link_ptr = _load(rnbin_dir,'rel_link_ptr').tolist()
+  link_nodes = _load(rnbin_dir,'rel_link_node').tolist()
+  link_types = _load(rnbin_dir,'rel_link_type').tolist()
+
+  refs_dir = os.path.join(rnbin_dir,REFS_DIR)
+  load_refs = load_refs and read_meta(rnbin_dir).get('with_refs',False)
+  if load_refs:
+    ref_strings = StringDict.load(refs_dir)
+    ref_ptr = _load(refs_dir,'ref_ptr').tolist()
+    ref_propsets = _load(refs_dir,'ref_propset').tolist()
+    ref_pnames = _load(refs_dir,'ref_prop_name').tolist()
+    ref_pvalues = _load(refs_dir,'ref_prop_value').tolist()
+
+  rels = list()
+  for r in range(len(rel_ptr)-1):
+    regulators = list()
+    targets = list()
+    for j in range(link_ptr[r],link_ptr[r+1]):
+      n = nodes[link_nodes[j]]
+      (targets if link_types[j] == LINK_OUT else regulators).append(n)
+
+    if prop2values and not any(n.has_value_in(prop2values) for n in regulators+targets):
+      continue
+
+    props = defaultdict(list)
+    for j in range(rel_ptr[r],rel_ptr[r+1]):
+      props[strings[rel_pnames[j]]].append(strings[rel_pvalues[j]])
+    ps_rel = PSRelation(props)
+    ps_rel.Nodes[REGULATORS] = regulators
+    if targets:
+      ps_rel.Nodes[TARGETS] = targets
+
+    if load_refs:
+      for j in range(ref_ptr[r],ref_ptr[r+1]):
+        propset = ref_strings[ref_propsets[j]]
+        ps_rel.PropSetToProps[propset][ref_strings[ref_pnames[j]]].append(ref_strings[ref_pvalues[j]])
+      ps_rel.refs()
+
+    rels.append(ps_rel)
+
+  g = ResnetGraph.from_rels(rels)
+  if not prop2values:
+    g.add_psobjs(set(nodes),merge=False) # adding nodes without relations
+  g.name = f'from {rnef_file}'
+  print(f'Binary cache {rnbin_dir} with {g.number_of_edges()} edges and {g.number_of_nodes()} nodes was loaded in {execution_time(start)}')
+  return g
@@ -0,0 +1,443 @@
+import os,time,json
+import numpy as np
+from collections import defaultdict
+from itertools import combinations
+from .NetworkxObjects import PSObject,PSRelation,REGULATORS,TARGETS,OBJECT_TYPE
+from .ResnetGraph import ResnetGraph
+from .ResnetBinary import path2rnbin,is_fresh,dump2rnbin,read_meta,REFS_DIR,LINK_OUT
+from ..utils import execution_time
+
+CSR_VERSION = 1
+UID_BYTES = 20 # PSObject.urn2uid() returns int < 32**32 = 2**160
+
+
+def _load(from_dir:str,name:str)->np.ndarray:
+  return np.load(os.path.join(from_dir,name+'.npy'),mmap_mode='r')
+
+
+def _save(to_dir:str,name:str,array:np.ndarray):
+  np.save(os.path.join(to_dir,name+'.npy'),array)
+
+
+def _uid2bytes(uid:int)->bytes:
+  return int(uid).to_bytes(UID_BYTES,'big')
+
+
+def _csr(keys:np.ndarray,size:int)->tuple[np.ndarray,np.ndarray]:
+  '''
+  output:
+    ptr - CSR row pointers for "keys" sorted by stable sort
+    order - permutation sorting "keys"
+  '''
+  order = np.argsort(keys,kind='stable')
+  ptr = np.zeros(size+1,dtype=np.int64)
+  np.cumsum(np.bincount(keys,minlength=size),out=ptr[1:])
+  return ptr,order
+
+
+class MappedStrings:
+  '''
+  read-only string dictionary from ResnetBinary.StringDict memory-mapped from disk
+  '''
+  def __init__(self,from_dir:str):
+    self.blob = _load(from_dir,'strings')
+    self.offsets = _load(from_dir,'string_offsets')
+    self.order = _load(from_dir,'string_order')
+
+
+  @staticmethod
+  def index(in_dir:str):
+    '''
+    Dumps
+    -----
+    string_offsets - start of every string in NUL-separated blob
+    string_order - permutation of string indexes sorting strings for binary search
+    '''
+    blob = np.load(os.path.join(in_dir,'strings.npy'))
+    starts = np.concatenate(([0],np.flatnonzero(blob == 0)+1))
+    offsets = np.concatenate((starts,[blob.size+1])).astype(np.int64)
+    _save(in_dir,'string_offsets',offsets)
+    strings = blob.tobytes().decode('utf-8').split('\x00')
+    order = np.asarray(sorted(range(len(strings)),key=strings.__getitem__),dtype=np.int32)
+    _save(in_dir,'string_order',order)
+
+
+  def __len__(self):
+    return self.offsets.size-1
+
+
+  def __getitem__(self,i:int)->str:
+    return self.blob[self.offsets[i]:self.offsets[i+1]-1].tobytes().decode('utf-8')
+
+
+  def sid(self,s:str)->int:
+    '''
+    output:
+      index of string "s" or -1 if "s" is not in dictionary
+    '''
+    lo, hi = 0, len(self)
+    while lo < hi:
+      mid = (lo+hi)//2
+      if self[int(self.order[mid])] < s:
+        lo = mid+1
+      else:
+        hi = mid
+    if lo < len(self) and self[int(self.order[lo])] == s:
+      return int(self.order[lo])
+    return -1
+
+
+  def sids(self,strings:list[str])->np.ndarray:
+    found = [i for i in map(self.sid,map(str,strings)) if i >= 0]
+    return np.asarray(found,dtype=np.int32)
+
+
+class ResnetCSR:
+  '''
+  read-only ResnetGraph backed by CSR adjacency arrays memory-mapped from binary cache made by ResnetBinary.\n
+  Arrays are opened with mmap_mode='r' therefore processes opening the same cache share one copy through OS page cache.\n
+  Graph data is converted into PSObject and PSRelation only for nodes and relations returned by read functions.
+  Edges follow ResnetGraph convention: non-directional relations are duplicated in both directions
+  '''
+  def __init__(self,rnbin_dir:str,load_refs=True):
+    '''
+    input:
+      rnbin_dir - binary cache directory with CSR index made by ResnetCSR.build()
+      load_refs - if False relations are returned without references
+    '''
+    meta = read_meta(rnbin_dir)
+    if meta.get('csr_version') != CSR_VERSION:
+      raise FileNotFoundError(f'{rnbin_dir} has no CSR index. Make it with ResnetCSR.build()')
+
+    self.dir = rnbin_dir
+    self.name = meta.get('source','')
+    self.strings = MappedStrings(rnbin_dir)
+    self.node_ptr = _load(rnbin_dir,'node_ptr')
+    self.node_prop_name = _load(rnbin_dir,'node_prop_name')
+    self.node_prop_value = _load(rnbin_dir,'node_prop_value')
+    self.node_type = _load(rnbin_dir,'csr_node_type')
+    self.uid_sorted = _load(rnbin_dir,'csr_uid_sorted')
+    self.uid_order = _load(rnbin_dir,'csr_uid_order')
+
+    self.rel_ptr = _load(rnbin_dir,'rel_ptr')
+    self.rel_prop_name = _load(rnbin_dir,'rel_prop_name')
+    self.rel_prop_value = _load(rnbin_dir,'rel_prop_value')
+    self.rel_link_ptr = _load(rnbin_dir,'rel_link_ptr')
+    self.rel_link_node = _load(rnbin_dir,'rel_link_node')
+    self.rel_link_type = _load(rnbin_dir,'rel_link_type')
+    self.rel_type = _load(rnbin_dir,'csr_rel_type')
+
+    # out_* - edges sorted by regulator, in_* - edges sorted by target
+    self.out_ptr = _load(rnbin_dir,'csr_out_ptr')
+    self.out_node = _load(rnbin_dir,'csr_out_node')
+    self.out_rel = _load(rnbin_dir,'csr_out_rel')
+    self.in_ptr = _load(rnbin_dir,'csr_in_ptr')
+    self.in_node = _load(rnbin_dir,'csr_in_node')
+    self.in_rel = _load(rnbin_dir,'csr_in_rel')
+
+    self.load_refs = load_refs and meta.get('with_refs',False)
+    if self.load_refs:
+      refs_dir = os.path.join(rnbin_dir,REFS_DIR)
+      self.ref_strings = MappedStrings(refs_dir)
+      self.ref_ptr = _load(refs_dir,'ref_ptr')
+      self.ref_propset = _load(refs_dir,'ref_propset')
+      self.ref_prop_name = _load(refs_dir,'ref_prop_name')
+      self.ref_prop_value = _load(refs_dir,'ref_prop_value')
+
+
+  @staticmethod
+  def build(rnbin_dir:str):
+    '''
+    Dumps
+    -----
+    CSR adjacency, node uid index, node and relation type arrays and string indexes into "rnbin_dir"
+    '''
+    start = time.time()
+    strings = np.load(os.path.join(rnbin_dir,'strings.npy')).tobytes().decode('utf-8').split('\x00')
+    node_urn = np.load(os.path.join(rnbin_dir,'node_urn.npy'))
+    node_count = node_urn.size
+    uids = np.asarray([_uid2bytes(PSObject.urn2uid(strings[i])) for i in node_urn.tolist()],dtype=f'S{UID_BYTES}')
+    uid_order = np.argsort(uids,kind='stable').astype(np.int32)
+    _save(rnbin_dir,'csr_uid_sorted',uids[uid_order])
+    _save(rnbin_dir,'csr_uid_order',uid_order)
+
+    objtype_sid = strings.index(OBJECT_TYPE) if OBJECT_TYPE in strings else -1
+    def prop_column(prefix:str,size:int)->np.ndarray:
+      ptr = np.load(os.path.join(rnbin_dir,prefix+'_ptr.npy'))
+      names = np.load(os.path.join(rnbin_dir,prefix+'_prop_name.npy'))
+      values = np.load(os.path.join(rnbin_dir,prefix+'_prop_value.npy'))
+      column = np.full(size,-1,dtype=np.int32)
+      positions = np.flatnonzero(names == objtype_sid)
+      owners = np.searchsorted(ptr,positions,side='right')-1
+      # first value wins: assigning in reversed order
+      column[owners[::-1]] = values[positions[::-1]]
+      return column
+
+    _save(rnbin_dir,'csr_node_type',prop_column('node',node_count))
+    link_ptr = np.load(os.path.join(rnbin_dir,'rel_link_ptr.npy')).tolist()
+    link_node = np.load(os.path.join(rnbin_dir,'rel_link_node.npy')).tolist()
+    link_type = np.load(os.path.join(rnbin_dir,'rel_link_type.npy')).tolist()
+    rel_count = len(link_ptr)-1
+    _save(rnbin_dir,'csr_rel_type',prop_column('rel',rel_count))
+
+    src, dst, rel = list(), list(), list()
+    for r in range(rel_count):
+      regulators, targets = list(), list()
+      for j in range(link_ptr[r],link_ptr[r+1]):
+        (targets if link_type[j] == LINK_OUT else regulators).append(link_node[j])
+      if targets:
+        pairs = [(reg,t) for reg in regulators for t in targets]
+      else:
+        pairs = list(combinations(regulators,2))
+        pairs += [(t,reg) for reg,t in pairs]
+      for reg,t in pairs:
+        src.append(reg)
+        dst.append(t)
+        rel.append(r)
+
+    src = np.asarray(src,dtype=np.int32)
+    dst = np.asarray(dst,dtype=np.int32)
+    rel = np.asarray(rel,dtype=np.int32)
+    for prefix,keys,others in [('out',src,dst),('in',dst,src)]:
+      ptr,order = _csr(keys,node_count)
+      _save(rnbin_dir,f'csr_{prefix}_ptr',ptr)
+      _save(rnbin_dir,f'csr_{prefix}_node',others[order])
+      _save(rnbin_dir,f'csr_{prefix}_rel',rel[order])
+
+    MappedStrings.index(rnbin_dir)
+    refs_dir = os.path.join(rnbin_dir,REFS_DIR)
+    if os.path.exists(os.path.join(refs_dir,'strings.npy')):
+      MappedStrings.index(refs_dir)
+
+    meta = read_meta(rnbin_dir)
+    meta['csr_version'] = CSR_VERSION
+    meta['edges'] = int(src.size)
+    with open(os.path.join(rnbin_dir,'meta.json'),'w',encoding='utf-8') as f:
+      json.dump(meta,f,indent=2)
+    print(f'CSR index with {node_count} nodes and {src.size} edges was made in {rnbin_dir} in {execution_time(start)}')
+
+
+  @classmethod
+  def from_rnef(cls,rnef_file:str,load_refs=True)->'ResnetCSR':
+    '''
+    output:
+      ResnetCSR for binary cache of "rnef_file".\n
+      Makes binary cache and CSR index if they are stale or missing
+    '''
+    rnbin_dir = path2rnbin(rnef_file)
+    if not is_fresh(rnef_file,rnbin_dir):
+      dump2rnbin(ResnetGraph.fromRNEF(rnef_file),rnef_file)
+    if read_meta(rnbin_dir).get('csr_version') != CSR_VERSION:
+      cls.build(rnbin_dir)
+    return cls(rnbin_dir,load_refs)
+
+
+############################   INDEX INDEX INDEX   ##############################
+  def __len__(self):
+    return self.node_ptr.size-1
+
+
+  def number_of_nodes(self):
+    return len(self)
+
+
+  def number_of_edges(self):
+    return self.out_node.size
+
+
+  def _idx(self,uid:int)->int:
+    '''
+    output:
+      node index for "uid" or -1 if graph has no node with "uid"
+    '''
+    key = np.asarray(_uid2bytes(uid),dtype=f'S{UID_BYTES}')
+    pos = int(np.searchsorted(self.uid_sorted,key))
+    if pos < self.uid_sorted.size and self.uid_sorted[pos] == key:
+      return int(self.uid_order[pos])
+    return -1
+
+
+  def _idxs(self,uids)->np.ndarray:
+    found = [i for i in map(self._idx,uids) if i >= 0]
+    return np.unique(np.asarray(found,dtype=np.int32))
+
+
+  def __contains__(self,uid:int):
+    return self._idx(uid) >= 0
+
+
+  def has_node(self,node:PSObject):
+    return node.uid() in self
+
+
+  def _type_mask(self,types_column:np.ndarray,types:list[str])->np.ndarray:
+    return np.isin(types_column,self.strings.sids(types))
+
+
+  def _psobj(self,i:int)->PSObject:
+    props = defaultdict(list)
+    s = self.strings
+    for j in range(int(self.node_ptr[i]),int(self.node_ptr[i+1])):
+      props[s[int(self.node_prop_name[j])]].append(s[int(self.node_prop_value[j])])
+    return PSObject(props)
+
+
+  def _psobjs(self,idxs)->list[PSObject]:
+    return [self._psobj(int(i)) for i in idxs]
+
+
+  def _psrel(self,r:int,idx2obj:dict[int,PSObject]=None)->PSRelation:
+    '''
+    input:
+      idx2obj - {node_idx:PSObject} to reuse nodes already made for other relations
+    '''
+    idx2obj = dict() if idx2obj is None else idx2obj
+    s = self.strings
+    props = defaultdict(list)
+    for j in range(int(self.rel_ptr[r]),int(self.rel_ptr[r+1])):
+      props[s[int(self.rel_prop_name[j])]].append(s[int(self.rel_prop_value[j])])
+    rel = PSRelation(props)
+    for j in range(int(self.rel_link_ptr[r]),int(self.rel_link_ptr[r+1])):
+      n = int(self.rel_link_node[j])
+      if n not in idx2obj:
+        idx2obj[n] = self._psobj(n)
+      rel.Nodes[TARGETS if self.rel_link_type[j] == LINK_OUT else REGULATORS].append(idx2obj[n])
+
+    if self.load_refs:
+      rs = self.ref_strings
+      for j in range(int(self.ref_ptr[r]),int(self.ref_ptr[r+1])):
+        propset = rs[int(self.ref_propset[j])]
+        rel.PropSetToProps[propset][rs[int(self.ref_prop_name[j])]].append(rs[int(self.ref_prop_value[j])])
+      rel.refs()
+    rel.count_refs() # converts REFCOUNT to int as ResnetGraph.add_edge does
+    return rel
+
+
+  def _psrels(self,rel_idxs)->set[PSRelation]:
+    idx2obj = dict()
+    return {self._psrel(int(r),idx2obj) for r in np.unique(np.asarray(rel_idxs,dtype=np.int64))}
+
+
+  def _out_edges(self,idxs:np.ndarray)->tuple[np.ndarray,np.ndarray,np.ndarray]:
+    '''
+    output:
+      regulator indexes, target indexes, relation indexes for all edges going out of "idxs"
+    '''
+    return self.__edges(idxs,self.out_ptr,self.out_node,self.out_rel)
+
+
+  def _in_edges(self,idxs:np.ndarray)->tuple[np.ndarray,np.ndarray,np.ndarray]:
+    '''
+    output:
+      target indexes, regulator indexes, relation indexes for all edges coming into "idxs"
+    '''
+    return self.__edges(idxs,self.in_ptr,self.in_node,self.in_rel)
+
+
+  @staticmethod
+  def __edges(idxs:np.ndarray,ptr:np.ndarray,nodes:np.ndarray,rels:np.ndarray):
+    idxs = np.asarray(idxs,dtype=np.int64)
+    if not idxs.size:
+      empty = np.empty(0,dtype=np.int32)
+      return empty,empty,empty
+    starts = ptr[idxs]
+    counts = ptr[idxs+1]-starts
+    owners = np.repeat(idxs,counts)
+    positions = np.repeat(starts-np.cumsum(counts)+counts,counts)+np.arange(counts.sum())
+    return owners,nodes[positions],rels[positions]
+
+
+############################   READ READ READ   ##############################
+  def psobjs_with(self,with_properties:list=[OBJECT_TYPE],only_with_values:list=[])->list[PSObject]:
+    '''
+    output:
+      [PSObject] annotated "with_properties".\n
+      if "only_with_values" is not empty returns only nodes having any of "only_with_values" in "with_properties"
+    '''
+    mask = np.isin(self.node_prop_name,self.strings.sids(with_properties))
+    if only_with_values:
+      mask &= np.isin(self.node_prop_value,self.strings.sids(only_with_values))
+    owners = np.searchsorted(self.node_ptr,np.flatnonzero(mask),side='right')-1
+    return self._psobjs(np.unique(owners))
+
+
+  def _psrels4(self,regulator_uid:int,target_uid:int)->list[PSRelation]:
+    reg_idx = self._idx(regulator_uid)
+    tar_idx = self._idx(target_uid)
+    if reg_idx < 0 or tar_idx < 0:
+      return []
+    _,targets,rels = self._out_edges(np.asarray([reg_idx]))
+    return list(self._psrels(rels[targets == tar_idx]))
+
+
+  def get_neighbors(self,of_nodes:set[PSObject],allowed_neigbors:list[PSObject]=[])->list[PSObject]:
+    '''
+    output:
+      list of both upstream and downstream PSObjects
+    '''
+    idxs = self._idxs(ResnetGraph.uids(of_nodes))
+    neighbors = np.union1d(self._out_edges(idxs)[1],self._in_edges(idxs)[1])
+    if allowed_neigbors:
+      neighbors = np.intersect1d(neighbors,self._idxs(ResnetGraph.uids(allowed_neigbors)))
+    return self._psobjs(neighbors)
+
+
+  def find_targets(self,of_regulators:list=[],targets_objtype:list=[],linkedby_reltypes:list=[],min_regulators=1):
+    '''
+    input:
+      of_regulators - [PSObject]
+    output:
+      tuple [PSObject] {PSRelation} [PSObject],\nwhere
+      0 - regulators
+      1 - relations between regulators and targets
+      2 - targets
+    '''
+    if of_regulators:
+      reg_idxs = self._idxs(ResnetGraph.uids(of_regulators))
+    else:
+      reg_idxs = np.flatnonzero(np.diff(self.out_ptr))
+    regs,tars,rels = self._out_edges(reg_idxs)
+
+    mask = np.ones(rels.size,dtype=bool)
+    if targets_objtype:
+      mask &= self._type_mask(self.node_type,targets_objtype)[tars]
+    if linkedby_reltypes:
+      mask &= self._type_mask(self.rel_type,linkedby_reltypes)[rels]
+      reg_idxs = np.unique(regs[mask])
+    tars,rels = tars[mask],np.unique(rels[mask])
+
+    if min_regulators > 1:
+      # in-degree is counted in graph made from all edges of selected relations as in ResnetGraph.subgraph_by_rels()
+      _,rel_nodes,_ = self.__edges(rels,self.rel_link_ptr,self.rel_link_node,self.rel_link_node)
+      _,edge_tars,edge_rels = self._out_edges(np.unique(rel_nodes))
+      indegree = np.bincount(edge_tars[np.isin(edge_rels,rels)],minlength=len(self))
+      tars = np.flatnonzero(indegree > min_regulators)
+      _,reg_idxs,rels = self._in_edges(tars)
+      reg_idxs = np.unique(reg_idxs)
+
+    return self._psobjs(reg_idxs),self._psrels(rels),self._psobjs(np.unique(tars))
+
+
+  def upstream_regulators(self,of_node_id:int,linkedby_reltypes=list())->list[int]:
+    '''
+    output:
+      uids of regulators linked to "of_node_id" by relations with types "linkedby_reltypes"
+    '''
+    idx = self._idx(of_node_id)
+    if idx < 0: return []
+    _,regs,rels = self._in_edges(np.asarray([idx]))
+    regs = regs[self._type_mask(self.rel_type,linkedby_reltypes)[rels]]
+    return [self._psobj(int(r)).uid() for r in regs]
+
+
+  def subgraph(self,node_uids:list)->ResnetGraph:
+    '''
+    output:
+      ResnetGraph with all edges between "node_uids"
+    '''
+    idxs = self._idxs(node_uids)
+    _,tars,rels = self._out_edges(idxs)
+    sub_g = ResnetGraph.from_rels(self._psrels(rels[np.isin(tars,idxs)]))
+    sub_g.add_psobjs(set(self._psobjs(idxs)),merge=False)
+    sub_g.name = f'subgraph of {self.name}'
+    return sub_g
@@ -2,7 +2,7 @@ import networkx as nx
 from networkx.exception import NetworkXError
 from ..pandas.panda_tricks import df,np,pd
 from datetime import timedelta
-import os, math, time, torch,glob,csv
+import os, math, time, torch,glob,csv,io,mmap
 from typing import Generator
 from xml.dom import minidom
 from lxml import etree as et
@@ -10,14 +10,16 @@ from itertools import product,chain
 from typing import Optional
 from torch_geometric.data import HeteroData
 from collections import defaultdict,deque
-from concurrent.futures import ThreadPoolExecutor,as_completed
+from concurrent.futures import ThreadPoolExecutor,ProcessPoolExecutor,as_completed
 from .NetworkxObjects import PSObject,PSRelation,len, DIRECT, INDIRECT, DBID,EFFECT
 from .NetworkxObjects import REGULATORS,TARGETS,CHILDS,REFCOUNT,STATE,DIRECT_RELTYPES,OBJECT_TYPE
-from ..ETM_API.references import Reference, pubmed_hyperlink, make_hyperlink
+from ..ETM_API.references import Reference, ReferenceStore, pubmed_hyperlink, make_hyperlink
 from ..ETM_API.references import PUBYEAR,TITLE,REFERENCE_PROPS,JOURNAL,INT_PROPS,PS_CITATION_INDEX,SENTENCE_PROPS,SENTENCE,AUTHORS
 from ..ETM_API.RefStats import RefStats,IDENTIFIER_COLUMN
 from ..utils import execution_time, execution_time2,list2str,unpack,normalize,sortdict
 from ..Embio.postgres import PostgreSQL
+from .SparseRank import SparseRanker
+from .StatePropagator import StatePropagator
 
 
 RESNET = 'resnet'
@@ -34,6 +36,7 @@ SENTENCE_PROPS_SET = set(SENTENCE_PROPS+['TextRef'])
 
 RNEF_DISCLAIMER = str('Disclaimer: please refer to our Terms and Conditions on authorized use of Elsevier data. https://www.elsevier.com/legal/elsevier-website-terms-and-conditions?dgcid=RN_AGCM_Sourced_300005028')
 MAX_RNEF_THREADS = 4
+RNEF_SHARD_SIZE = 64*1024*1024 # RNEF files larger than RNEF_SHARD_SIZE bytes are parsed in parallel by byte-range shards
 
 
 CLINVAR_PMIDS = [['10447503'],['10592272'],['10612825'],['11125122'],['26619011'],
@@ -41,6 +44,110 @@ CLINVAR_PMIDS = [['10447503'],['10592272'],['10612825'],['11125122'],['26619011'
                       ['26467025'],['24728327']]
 
 
+def _find_resnet_tag(m:mmap.mmap,start:int,end:int)->int:
+  '''
+  output:
+    position of next "<resnet" tag in m[start:end] or -1
+  '''
+  pos = m.find(b'<resnet',start,end)
+  while pos >= 0 and m[pos+7:pos+8] not in (b' ',b'>',b'\n',b'\r',b'\t'):
+    pos = m.find(b'<resnet',pos+7,end)
+  return pos
+
+
+def _rnef_shards(rnef_file:str,shard_size=RNEF_SHARD_SIZE)->list[tuple[int,int]]:
+  '''
+  output:
+    [(start,end)] - byte ranges of "rnef_file" with complete <resnet> sections.\n
+    Files smaller than "shard_size" are read as one shard [(0,-1)]
+  '''
+  if os.path.getsize(rnef_file) <= shard_size:
+    return [(0,-1)]
+
+  with open(rnef_file,'rb') as f, mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) as m:
+    last = m.rfind(b'</resnet>')
+    first = _find_resnet_tag(m,0,last)
+    if first < 0:
+      return [(0,-1)]
+    last_end = last+len(b'</resnet>')
+    starts = [first]
+    while True:
+      next_start = _find_resnet_tag(m,starts[-1]+shard_size,last_end)
+      if next_start < 0: break
+      starts.append(next_start)
+  return list(zip(starts,starts[1:]+[last_end]))
+
+
+def _rnef_records(rnef_file:str,start=0,end=-1,prop2values:dict=dict(),only_relprops:set=set()):
+  '''
+  Parses <resnet> sections from byte range [start,end) of "rnef_file" in worker process.\n
+  Records are plain tuples to avoid pickling PSObject and PSRelation between processes
+  output:
+    node_table - [(urn,[(prop_name,[values])])],
+    sections - [([node indexes],[rel_record])] for every <resnet> section,
+    where rel_record = ([(prop_name,[values])],[(propset_id,[(prop_name,[values])])],[regulator indexes],[target indexes])
+  '''
+  if end < 0:
+    source = open(rnef_file,'rb')
+  else:
+    with open(rnef_file,'rb') as f:
+      f.seek(start)
+      source = io.BytesIO(b'<batch>'+f.read(end-start)+b'</batch>')
+
+  parsed = list()
+  only4objs = dict() # shares PSObject between sections of the shard
+  with source:
+    for _, elem in et.iterparse(source,tag=RESNET):
+      parsed.append(ResnetGraph._parse_nodes_controls(elem,prop2values,set(only_relprops),only4objs))
+      elem.clear()
+      while elem.getprevious() is not None:
+        del elem.getparent()[0]
+
+  urn2idx = dict()
+  node_table = list()
+  def node_idx(n:PSObject):
+    urn = n.urn()
+    idx = urn2idx.setdefault(urn,len(node_table))
+    if idx == len(node_table):
+      node_table.append((urn,[(k,list(v)) for k,v in n.items()]))
+    return idx
+
+  sections = list()
+  for nodes, rels in parsed:
+    rel_records = list()
+    for rel in rels:
+      rel_records.append(([(k,list(v)) for k,v in rel.items()],
+                          [(i,[(k,list(v)) for k,v in props.items()]) for i,props in rel.PropSetToProps.items()],
+                          [node_idx(r) for r in rel.Nodes.get(REGULATORS,[])],
+                          [node_idx(t) for t in rel.Nodes.get(TARGETS,[])]))
+    sections.append(([node_idx(n) for n in nodes],rel_records))
+  return node_table, sections
+
+
+def _records2sections(node_table:list,sections:list)->Generator[tuple[set[PSObject],set[PSRelation]],None,None]:
+  '''
+  input:
+    node_table, sections - made by _rnef_records()
+  output:
+    yields (nodes,rels) for every <resnet> section
+  '''
+  nodes = [PSObject(dict(props)) for _,props in node_table]
+  for node_idxs, rel_records in sections:
+    rels = set()
+    for props, propsets, regulator_idxs, target_idxs in rel_records:
+      ps_rel = PSRelation(dict(props))
+      for i in regulator_idxs:
+        ps_rel.Nodes[REGULATORS].append(nodes[i])
+      for i in target_idxs:
+        ps_rel.Nodes[TARGETS].append(nodes[i])
+      for propset_id, propset in propsets:
+        for prop_name, values in propset:
+          ps_rel.PropSetToProps[propset_id][prop_name] = values
+      ps_rel.refs()
+      rels.add(ps_rel)
+    yield {nodes[i] for i in node_idxs}, rels
+
+
 class ResnetGraph (nx.MultiDiGraph):
   pass
 
@@ -416,16 +523,23 @@ class ResnetGraph (nx.MultiDiGraph):
       return nx.algorithms.centrality.degree_centrality(self)
 
 
-  def rank_regulator(self,regulator:PSObject,target_weights:dict[int,float],max_distance: int = 5) -> float:
+  def rank_regulator(self,regulator:PSObject,target_weights:dict[int,float],max_distance: int = 5,
+                     backend='python',ranker:SparseRanker|None=None) -> float:
     """
     Optimized regulator ranking using single-pass BFS.
     input:
       target_weights = {node_uid:weight}
+      backend - 'python' or 'sparse' for BFS over CSR adjacency
+      ranker - SparseRanker(self) reused by repeated calls with backend='sparse'
     """
     reg_uid = regulator.uid()
     if reg_uid not in self:
         return 0.0
 
+    if backend == 'sparse':
+      ranker = SparseRanker(self) if ranker is None else ranker
+      return ranker.rank_regulator(reg_uid,target_weights,max_distance)
+
     regulator_rank = 0.0
     # BFS Initialization. Queue stores: (current_node_id, current_distance)
     queue = deque([(reg_uid, 0)])
@@ -474,10 +588,20 @@ class ResnetGraph (nx.MultiDiGraph):
       return regulator_rank
   '''
 
-  def rank_regulators(self, node_weights: dict[int, float], add2prop: str, max_distance: int = 5) -> dict:
+  def rank_regulators(self, node_weights: dict[int, float], add2prop: str, max_distance: int = 5,
+                      backend='python',ranker:SparseRanker|None=None) -> dict:
     """
     Optimized regulator ranking using manual BFS to avoid heavy NetworkX object creation.
+    input:
+      backend - 'python' or 'sparse' for batched BFS from all seeds over CSR adjacency. Both backends produce same ranks
+      ranker - SparseRanker(self) reused by repeated calls with backend='sparse'
     """
+    if backend == 'sparse':
+      ranker = SparseRanker(self) if ranker is None else ranker
+      regulator_ranks = ranker.rank_regulators(node_weights,max_distance)
+      nx.set_node_attributes(self, regulator_ranks, add2prop)
+      return regulator_ranks
+
     regulator_ranks = defaultdict(float)
     upstream_edges = set()
 
@@ -581,38 +705,37 @@ class ResnetGraph (nx.MultiDiGraph):
       return regulator_ranks
   '''
 
-  def propagate_state(self, seed:PSObject):
+  def propagate_states(self, seeds:list[PSObject], max_depth=5, propagator:StatePropagator|None=None):
+      '''
+      Input
+      -----
+      seeds must have attribute STATE equal to ACTIVATED or REPRESSED
+      max_depth - number of BFS levels downstream of every seed
+      propagator - StatePropagator(self) reused by repeated calls
+
+      Returns
+      -------
+      len(seeds) x len(self) sparse matrix with states propagated from every seed, node uids for matrix columns
+      '''
+      propagator = StatePropagator(self) if propagator is None else propagator
+      seed2state = {s.uid():int(s.state()) for s in seeds}
+      return propagator.propagate(seed2state,max_depth), propagator.uids
+
+
+  def propagate_state(self, seed:PSObject, max_depth=5):
       '''
       Input
       -----
       seed must have attribute STATE equal to ACTIVATED or REPRESSED
+
+      Returns
+      -------
+      {node_uid:state} for nodes with non-zero state propagated from seed. States are also added to node attribute STATE
       '''
-      seed_uid = seed.uid()
-      #downstream_of_edges = self.out_edges(seed_uid,data='relation')
-      nx.set_node_attributes(self,{seed_uid:seed.state()},STATE)
-      seed_tree = self.tree4(seed)
-      regulator_uids = [seed_uid]
-      max_depth = 6
-      for level in range (1,max_depth):
-          targets_uids = nx.algorithms.traversal.breadth_first_search.descendants_at_distance(seed_tree,seed_uid,level)
-          for ruid in regulator_uids:
-              regulator = self._get_node(ruid)
-              regulator_state = regulator.state()
-              if regulator_state:
-                  for tuid in targets_uids:
-                      rels = self._psrels4(ruid, tuid)
-                      target = self._get_node(tuid)
-                      for rel in rels:
-                          rel_sign = rel.effect_sign()
-                          if rel_sign:
-                              add2target_state = rel_sign*regulator_state
-                              target_state = target.state()
-                              target_state += add2target_state
-                              nx.set_node_attributes(self,{tuid:target_state},STATE)
-          regulator_uids = targets_uids
-
-      annoated_with_state = self.psobjs_with([STATE])
-      uid2state = {o.uid():o.state() for o in annoated_with_state}
+      states, uids = self.propagate_states([seed],max_depth)
+      row = states.getrow(0)
+      uid2state = {uids[i]:int(s) for i,s in zip(row.indices,row.data) if s}
+      nx.set_node_attributes(self,{uid:[s] for uid,s in uid2state.items()},STATE)
       return uid2state
           
 
@@ -621,8 +744,13 @@ class ResnetGraph (nx.MultiDiGraph):
   def load_references(self, 
                     relpval2weight: dict[str, dict[str, float]] = None, 
                     weight_name: str = 'relweight',
-                    postgres: PostgreSQL = None) -> set[Reference]:
-    
+                    postgres: PostgreSQL = None,
+                    refstore: ReferenceStore = None) -> set[Reference]:
+    '''
+    input:
+      refstore - ReferenceStore shared by graphs with common relations, e.g. subgraphs of one graph.\n
+      Relations citing the same document get one interned Reference from "refstore"
+    '''
     if not relpval2weight:
       weight_prop = None
       val2weight = None
@@ -633,16 +761,20 @@ class ResnetGraph (nx.MultiDiGraph):
 
     graph_references = set()
     relid2refs = postgres.load_refs() if postgres else {}
-    if val2weight:
+    if val2weight and refstore is None:
       for _, _, rel in self.edges.data('relation'):
         graph_references.update(rel.refs(relid2refs=relid2refs))
         rel.set_weight2ref(weight_prop, val2weight, weight_name)
     else:
       # chain.from_iterable lazily flattens the results without building a list.
       # set.update consumes this iterator at C-speed instead of Python speed in "for" loop.
-      graph_references.update(chain.from_iterable(rel.refs(relid2refs=relid2refs) 
+      graph_references.update(chain.from_iterable(rel.refs(relid2refs=relid2refs,refstore=refstore) 
                                     for _, _, rel in self.edges.data('relation'))
                               )
+      if val2weight:
+        # interned references may keep weights from relations outside of self
+        [ref.pop(weight_name,None) for ref in graph_references]
+        [rel.set_weight2ref(weight_prop, val2weight, weight_name) for _, _, rel in self.edges.data('relation')]
     return graph_references
 
 
@@ -679,6 +811,8 @@ class ResnetGraph (nx.MultiDiGraph):
           nodes must have "regulator weight" and "target weight" properties.  
           If both regulator and target node has no "weight" property references with no previously annotated weight will receive zero weight property
       '''
+      # references interned in ReferenceStore may keep weights from relations outside of self
+      [ref.pop(weight_name,None) for _,_,rel in self.edges.data('relation') for ref in rel.refs()]
       for r,t,urn,rel in self.edges.data('relation',keys=True):
           regulator_weight = regurn2weight.get(self._get_node(r).urn(),0.0)
           target_weight = tarurn2weight.get(self._get_node(t).urn(),0.0)
@@ -891,7 +1025,7 @@ class ResnetGraph (nx.MultiDiGraph):
         try:
           annotated_ref = annotated_refs[id_type+':'+identifier]
           ref_citation_idex = str(annotated_ref[PS_CITATION_INDEX][0])
-          ref_list = ref.to_list(ref_identifiers,False,ref_biblio_props,ref_sentence_props,True)
+          ref_list = ref.to_list(ref_identifiers,False,ref_biblio_props,ref_sentence_props,True,rel.ref_snippets(ref))
           row = [regulator_name,my_graph.nodes[regulatorID][OBJECT_TYPE][0],target_name,my_graph.nodes[targetID][OBJECT_TYPE][0]] if add_nodetype else [regulator_name,target_name]
           if add_rel_props:
             row += [relname,reltype,releffect,refcount]
@@ -2265,7 +2399,8 @@ class ResnetGraph (nx.MultiDiGraph):
         references = list(set(rel.refs()))
         ref_index = 0
         for ref in references:# each snippet has its own index in RNEF
-          for textref, snippet in ref._snippets(): # printing snippets props
+          ref_snippets = rel.ref_snippets(ref)
+          for textref, snippet in ref._snippets(ref_snippets): # printing snippets props
             et.SubElement(xml_control, 'attr',{'name': str('TextRef'), 'value': textref, 'index': str(ref_index)},nsmap=None)
             for sentprop_name, sentprop_values in snippet.items():
               if _2b_printed(sentprop_name,list(snippet_props)):
@@ -2288,7 +2423,7 @@ class ResnetGraph (nx.MultiDiGraph):
               
             ref_index += 1 # incrementing index for next snippet
 
-          if not ref.snippets:
+          if not ref_snippets:
             textref = ref._make_textref()
             et.SubElement(xml_control, 'attr',{'name': str('TextRef'), 'value': textref, 'index': str(ref_index)},nsmap=None)
             for prop_name, prop_values in ref.items():
@@ -2631,24 +2766,58 @@ class ResnetGraph (nx.MultiDiGraph):
           raise FileNotFoundError
 
 
+  @staticmethod
+  def __parse_in_processes(flist:list[str],prop2values:dict=dict(),only_relprops:set=set(),
+                           max_workers:int|None=None,shard_size=RNEF_SHARD_SIZE):
+      '''
+      output:
+        yields records made by _rnef_records() for files and byte-range shards of large files in "flist"\n
+        in the order they are parsed by process pool
+      '''
+      shards = [(f,start,end) for f in flist for start,end in _rnef_shards(f,shard_size)]
+      if not shards: return
+      max_workers = min(max_workers or os.cpu_count() or 1,len(shards))
+      with ProcessPoolExecutor(max_workers=max_workers) as e:
+        futures = [e.submit(_rnef_records,f,start,end,prop2values,only_relprops) for f,start,end in shards]
+        try:
+          for future in as_completed(futures):
+            yield future.result()
+        finally:
+          [f.cancel() for f in futures]
+
+
+  @staticmethod
+  def iterRNEFflist(flist:list[str],prop2values:dict=dict(),only_relprops:set=set(),
+                    max_workers:int|None=None,shard_size=RNEF_SHARD_SIZE)->Generator[tuple[set[PSObject],set[PSRelation]],None,None]:
+      '''
+      input:
+        prop2values={prop_name:[values]} - filter to load relations only for nodes with desired properties
+        shard_size - files larger than "shard_size" bytes are split into shards parsed by different processes
+      output:
+        yields (nodes,rels) for every <resnet> section in "flist" as soon as its shard is parsed
+      '''
+      for node_table, sections in ResnetGraph.__parse_in_processes(flist,prop2values,only_relprops,max_workers,shard_size):
+        yield from _records2sections(node_table,sections)
+
+
   @classmethod
   def fromRNEFflist(cls,flist:list[str],prop2values:dict=dict(),
-                  only_relprops:set=set(),merge=True,edge_duplication=True)->"ResnetGraph":
+                  only_relprops:set=set(),merge=True,edge_duplication=True,max_workers:int|None=None)->"ResnetGraph":
       '''
       input:
         set merge=True if graph loaded form multiple RNEF files with multiple <resnet> sections
         prop2values={prop_name:[values]} - filter to load relations only for nodes with desired properties
+        max_workers - number of parsing processes, default os.cpu_count()
       '''
-      #max_workers = min(32,len(flist),(os.cpu_count() or 1) + 4) now is default in Python > 3.8
       combo_g = ResnetGraph()
-      with ThreadPoolExecutor(thread_name_prefix='readRNEFdir') as e:
-        futures = list()
-        [futures.append(e.submit(combo_g.__read_rnef,f,prop2values,only_relprops,True)) for f in flist]
-        for f in as_completed(futures):
-          nodes,rels = f.result()
-          combo_g.add_psobjs(nodes,merge)
-          combo_g.__add_psrels(rels,add_nodes=False,merge=merge,edge_duplication=edge_duplication)
-        e.shutdown()    
+      for node_table, sections in cls.__parse_in_processes(flist,prop2values,only_relprops,max_workers):
+        nodes = set()
+        rels = set()
+        for section_nodes, section_rels in _records2sections(node_table,sections):
+          nodes.update(section_nodes)
+          rels.update(section_rels)
+        combo_g.add_psobjs(nodes,merge)
+        combo_g.__add_psrels(rels,add_nodes=False,merge=merge,edge_duplication=edge_duplication)
       return combo_g
 
 
@@ -3120,7 +3289,7 @@ class ResnetGraph (nx.MultiDiGraph):
         ranks - [[str,..]], where str - PSRelation obtypes sorted by rank.
       '''
       best_rel = ResnetGraph.__bestrel(from_rels,ranks)
-      refs2add = [ref for rel in from_rels for ref in rel.refs()]
+      refs2add = [ref for rel in from_rels for ref in rel.detached_refs()]
       # refs2add must be list because some refs may come from the same article and have the same __hash__
       best_rel._add_refs(refs2add)
 
@@ -4105,7 +4274,7 @@ class ResnetGraph (nx.MultiDiGraph):
     '''         
     refset_dicts = list()
     ref_dicts = list()
-    my_refs = set()
+    my_refs = dict() # {Reference:{(TextRef,sentence):None}}
 
     rel_rows = list()
     for r,t,rel in self.iterate():
@@ -4128,8 +4297,8 @@ class ResnetGraph (nx.MultiDiGraph):
       refset_dicts.append(refset)
 
       rel_refs = rel.refs()
-      my_refs.update(rel_refs)
       for ref in rel_refs:
+        my_refs.setdefault(ref,dict()).update(dict.fromkeys(ref.sentences(rel.ref_snippets(ref))))
         ref_id = ref.doi_or_id()
         refrel_urn = f'urn:els-BelongsTo:in-out:{ref_id}:in:{refset_id}'
         refrel_name = f'{ref_id}---BelongTo--->{relname}'
@@ -4152,9 +4321,9 @@ class ResnetGraph (nx.MultiDiGraph):
     reldf_cols = [':START_ID',':END_ID','Ontology','Relationship', OBJECT_TYPE,'URN','Name']
     relations_pd = pd.DataFrame(rel_rows,columns=reldf_cols).rename(columns={OBJECT_TYPE:':TYPE'})
 
-    for ref in my_refs:
+    for ref, ref_sentences in my_refs.items():
       assert isinstance(ref,Reference)
-      for textref,sentence in ref.sentences():
+      for textref,sentence in ref_sentences:
         id_type, identifier = ref.get_doc_id() 
         if id_type and textref.startswith(('info:','urn:agi-nctrial')):
           refdic = {'Identifier':id_type+':'+identifier,
@@ -4168,12 +4337,16 @@ class ResnetGraph (nx.MultiDiGraph):
     return self._get_nodes(),df.from_pd(relations_pd),df.from_pd(refset_pd),df(ref_dicts)
   
 
-  def rn2neo4jDump(self,save2dir:str,sep='|'):
-    nodopG = self.remove_undirected_duplicates()
-    nodes_df,relations_df = nodopG.neo4j_df()
-    extension = '.txt' if sep== '|' else '.tsv' if sep== '\t' else '.csv'
-    #nodes_df.to_csv(save2dir+f'{self.name}Nodes.neo4j'+extension,sep=sep,index=False,quoting=csv.QUOTE_MINIMAL)
-    relations_df.to_csv(save2dir+f'{self.name}Relations.neo4j'+extension,sep=sep,index=False,quoting=csv.QUOTE_MINIMAL)
+  def rn2neo4jDump(self,save2dir:str,sep='|',compress=True,shard_rows=1000000,max_workers=4)->str:
+    '''
+    writes "neo4j-admin database import" CSV shards for nodes and relations of self into "save2dir"
+    output:
+      "neo4j-admin database import full" command
+    '''
+    from .Neo4jImport import Neo4jImportWriter
+    with Neo4jImportWriter(save2dir,compress,shard_rows,max_workers,sep) as writer:
+      writer.add_graph(self)
+    return writer.import_command()
 
 
   @staticmethod
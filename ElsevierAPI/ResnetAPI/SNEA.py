@@ -4,9 +4,10 @@ from .ResnetGraph import REFCOUNT, ResnetGraph, nx, EFFECT,NUMBER_OF_TARGETS,PRO
 from ..pandas.panda_tricks import df, ExcelWriter
 from .Drugs4Disease import Drugs4Targets
 from .Drugs4Disease import ANTAGONIST_TARGETS_WS,AGONIST_TARGETS_WS,RANK,DRUG2TARGET_REGULATOR_SCORE,PHARMAPENDIUM_ID
-from .Zeep2Experiment import Experiment, Sample, ENSEMBL_ID,HAS_PVALUE
+from .Zeep2Experiment import Experiment, Sample, ENSEMBL_ID,HAS_PVALUE,mannwhitneyu4rows
 from ..utils import Tee,execution_time
 from scipy.stats._mannwhitneyu import mannwhitneyu
+from scipy import sparse
 import numpy as np
 from concurrent.futures import ThreadPoolExecutor
 
@@ -237,6 +238,116 @@ class SNEA(APIcache):
     return regulator_activation_score, regulome_values, effect_target_counter
 
 
+  @staticmethod
+  def regulome_matrices(regulomes:dict[int,list[PSObject]],according2:ResnetGraph):
+    '''
+    input:
+      regulomes = {regulator_uid:[PSObject]} made by ResnetGraph.regulome_dict()
+    output:
+      targets - [PSObject] unique targets from "regulomes" in the order of matrix columns,\n
+      signs - sparse regulator x target matrix with effect sign of the first relation between regulator and target,\n
+      members - sparse regulator x target matrix with 1 for every target in regulator regulome.\n
+      Matrix rows are in the order of "regulomes" keys
+    '''
+    uid2col = dict()
+    targets = list()
+    rows, cols, signs = list(), list(), list()
+    for row, (regulator_uid, regulome) in enumerate(regulomes.items()):
+      for target in regulome:
+        target_uid = target.uid()
+        col = uid2col.setdefault(target_uid,len(targets))
+        if col == len(targets):
+          targets.append(target)
+        rels = according2._psrels4(regulator_uid,target_uid)
+        rows.append(row)
+        cols.append(col)
+        signs.append(rels[0].effect_sign() if rels else 0)
+
+    shape = (len(regulomes),len(targets))
+    members = sparse.csr_matrix((np.ones(len(rows)),(rows,cols)),shape=shape)
+    sign_matrix = sparse.csr_matrix((np.asarray(signs,dtype=float),(rows,cols)),shape=shape)
+    sign_matrix.eliminate_zeros()
+    return targets, sign_matrix, members
+
+
+  def target_matrices(self,samples:list[Sample],targets:list[PSObject]):
+    '''
+    output:
+      values, annotated, significant - target x sample matrices with expression values,\n
+      mask of targets annotated with sample values and mask of targets used for activation score by SNEA.activity()
+    '''
+    values = np.zeros((len(targets),len(samples)))
+    pvalues = np.full((len(targets),len(samples)),np.nan)
+    annotated = np.zeros((len(targets),len(samples)),dtype=bool)
+    for col, sample in enumerate(samples):
+      annotated_with_sample = self.experiment.name4annotation(sample)
+      for row, target in enumerate(targets):
+        if annotated_with_sample in target:
+          values[row,col], pvalues[row,col] = target[annotated_with_sample][0]
+          annotated[row,col] = True
+
+    with np.errstate(invalid='ignore'):
+      significant = annotated & ((pvalues < 0.05) | (np.isnan(pvalues) & (np.abs(values) >= 1.0)))
+    return values, annotated, significant
+
+
+  def activity_matrix4(self,samples:list[Sample],regulomes:dict[int,list[PSObject]],according2:ResnetGraph):
+    '''
+    output:
+      scores - regulator x sample matrix with activation scores identical to SNEA.activity(),\n
+      effect_target_counts - regulator x sample matrix with number of targets used for scores,\n
+      regulome_sizes - regulator x sample matrix with number of targets annotated with sample values,\n
+      targets, members, values, annotated - made by SNEA.regulome_matrices() and SNEA.target_matrices()
+    '''
+    targets, signs, members = self.regulome_matrices(regulomes,according2)
+    values, annotated, significant = self.target_matrices(samples,targets)
+    numerators = signs @ (values*significant)
+    effect_target_counts = abs(signs) @ significant.astype(float)
+    regulome_sizes = members @ annotated.astype(float)
+
+    scores = np.full(numerators.shape,np.nan)
+    is_valid = (regulome_sizes >= self.min_subnet_size) & (effect_target_counts > 0)
+    scores[is_valid] = numerators[is_valid]/np.sqrt(effect_target_counts[is_valid])
+    return scores, effect_target_counts, regulome_sizes, targets, members, values, annotated
+
+
+  def __regulators4samples(self,samples:list[Sample],regulomes:dict,my_graph:ResnetGraph)->dict[str,set[int]]:
+      '''
+      Vectorized SNEA.__regulators4sample() for all "samples":\n
+      activation scores for all regulators and samples are calculated by sparse matrix product,
+      Mann-Whitney test is vectorized across regulators
+
+      Return
+      ------
+      {sample_name:{regulator_uids}}
+      regulators in my_graph are annotated with SNEA activation score and p-value calculated from every sample
+      '''
+      start = time.time()
+      regulator_uids = list(regulomes.keys())
+      scores,effect_target_counts,_,_,members,values,annotated = self.activity_matrix4(samples,regulomes,my_graph)
+      print(f'Calculated activation scores for {len(regulator_uids)} regulators in {len(samples)} samples in {execution_time(start)}')
+
+      sample2regulators = dict()
+      for col, sample in enumerate(samples):
+        sample_start = time.time()
+        abs_sample_distribution = sample.data['value'].abs().dropna(how='all').to_numpy(dtype=float)
+        pvalues = mannwhitneyu4rows(members,np.abs(values[:,col]),annotated[:,col],
+                                          abs_sample_distribution,scores[:,col] > 0)
+        new_prop_name = self.__sample_annotation(sample)
+        sample_regulator_uids = set()
+        annotations = dict()
+        for row in np.flatnonzero(pvalues <= self.subnet_pvalue_cutoff):
+          regulator_uid = regulator_uids[row]
+          annotations[regulator_uid] = {new_prop_name:[float(scores[row,col]),float(pvalues[row]),int(effect_target_counts[row,col])]}
+          sample_regulator_uids.add(regulator_uid)
+        nx.set_node_attributes(my_graph,annotations)
+        sample2regulators[sample.name()] = sample_regulator_uids
+        print('Found %d regulators with pvalue < %.2f in %s sample in %s'
+              % (len(sample_regulator_uids),self.subnet_pvalue_cutoff,sample.name(),execution_time(sample_start)),flush=True)
+
+      return sample2regulators # must return uids and not PSObjects here
+
+
   def __regulators4sample(self,sample:Sample,regulomes:dict,
                           from_graph=ResnetGraph(),target_annotation_prefix='')->set[int]:
       '''
@@ -292,10 +403,11 @@ class SNEA(APIcache):
       return sample_regulator_uids # must return uids and not PSObjects here 
 
 
-  def expression_regulators(self,regulomes=dict(),from_graph=ResnetGraph(),prefix4target_annotation=''):
+  def expression_regulators(self,regulomes=dict(),from_graph=ResnetGraph(),prefix4target_annotation='',vectorized=True):
       """
       input:
         samples from self.__my_sample_names__
+        vectorized - if True scores all regulators in all samples at once using SNEA.__regulators4samples()
 
       output:
       self.__regulators__ = {sample_name:[regulator_uids]} with expression regulators annotated with tuple (activity, pvalue, # valid targets) for each sample\n
@@ -308,7 +420,11 @@ class SNEA(APIcache):
       samples = self.experiment.get_samples(self.__my_sample_names__)
       my_regulomes = regulomes if regulomes else my_graph.regulome_dict(PROTEIN_TYPES,min_size=2)
 
-      for counter, sample in enumerate(samples):
+      if vectorized:
+        print('Finding regulators for %d samples' % len(samples))
+        self.__regulators__.update(self.__regulators4samples(samples,my_regulomes,my_graph))
+      else:
+        for counter, sample in enumerate(samples):
           print('Finding regulators for %s sample (%d out of %d)' % (sample['Name'][0],counter+1,len(samples)))
           sample_regulators_uids = self.__regulators4sample(sample,my_regulomes,my_graph,prefix4target_annotation)
           self.__regulators__[sample.name()] = sample_regulators_uids
@@ -410,13 +526,11 @@ class SNEA(APIcache):
     print('Finding drugs inhibiting differential expression for each sample')
     all_drugs = set()
     drug2proteins_regulomes = DPERNET4experiment.regulome_dict(['SmallMol'],min_size=2)
-    for sample in self.__my_samples():
-      drugs4sample = list() 
-      for drug_uid,targets in drug2proteins_regulomes.items():
-        drug_activation_score = self.activity(sample,drug_uid,targets,DPERNET4experiment)[0]
-        if drug_activation_score < 0:
-          drugs4sample.append(DPERNET4experiment._get_node(drug_uid))
-      
+    drug_uids = list(drug2proteins_regulomes.keys())
+    samples = self.__my_samples()
+    drug_scores = self.activity_matrix4(samples,drug2proteins_regulomes,DPERNET4experiment)[0]
+    for col, sample in enumerate(samples):
+      drugs4sample = [DPERNET4experiment._get_node(drug_uids[row]) for row in np.flatnonzero(drug_scores[:,col] < 0)]
       self.__sample2drugs__[sample.name()] = drugs4sample
       all_drugs.update(drugs4sample)
     # to make sure all ranked targets are in self.Graph which is required by Drugs4Targets::load_target_ranks() 
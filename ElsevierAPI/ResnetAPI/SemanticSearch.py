@@ -1,12 +1,13 @@
 import time,math,os
 from .PathwayStudioGOQL import OQL
-from ..ETM_API.references import Reference, NODEWEIGHT, RELWEIGHT
+from ..ETM_API.references import Reference
 from ..pandas.panda_tricks import np, pd, df,MAX_TAB_LENGTH
 from .ResnetGraph import ResnetGraph,PSObject,EFFECT,defaultdict
 from .ResnetAPISession import APISession,CURRENT_SPECS
 from .ResnetAPISession import DO_NOT_CLONE,BELONGS2GROUPS,NO_REL_PROPERTIES,REFERENCE_IDENTIFIERS,DBID
 from ..ETM_API.RefStats import SBSstats
 from ..utils import execution_time,sortdict,ThreadPoolExecutor,unpack
+from .ConceptLinker import ConceptLinker,link_concepts,TARGET_WEIGHT,REGULATOR_WEIGHT
 
 
 COUNTS = 'counts'
@@ -23,8 +24,6 @@ REFCOUNT_COLUMN = '#sentences with co-occurrence. Link opens most relevant artic
 INFO_WORKSHEET = 'info'
 INPUT_WOKSHEET = 'Input'
 PHENOTYPE_WORKSHEET = 'Phenotype'
-TARGET_WEIGHT = 'target weight' # default name for the target node weight for relation reference count 
-REGULATOR_WEIGHT = 'regulator weight' # default name for the regulator node weight for relation reference count 
 
 
 class SemanticSearch (APISession):
@@ -56,6 +55,8 @@ class SemanticSearch (APISession):
           [DATABASE_REFCOUNT_ONLY,REFERENCE_IDENTIFIERS,BIBLIO_PROPERTIES,SNIPPET_PROPERTIES,ONLY_REL_PROPERTIES,ALL_PROPERTIES]
           connect2server - default True, set to False to run script using data in __pscache__ files instead of database
           max_ontology_parent - default: 10
+          tm_cache - default False, set to True or path to SQLite file to reuse SBS/ETM search results retrieved by previous runs
+          tm_cache_ttl, tm_cache_size - see TMcache.tm_cache()
       '''
       my_kwargs = {
               'what2retrieve':REFERENCE_IDENTIFIERS,
@@ -82,6 +83,7 @@ class SemanticSearch (APISession):
       self.max_ontology_parent = self.params.get('max_ontology_parent',10)
 
       search_kwargs = {'limit':10,'min_relevance':self.min_etm_relevance}
+      search_kwargs.update({k:v for k,v in self.params.items() if k in ('tm_cache','tm_cache_ttl','tm_cache_size')})
       self.RefStats = SBSstats(self.APIconfig,**search_kwargs)
 
       self.report_pandas=dict() # stores pandas used to generate report file
@@ -629,24 +631,7 @@ class SemanticSearch (APISession):
       return in_df
 
 
-  def __link2concept(self,ConceptName:str,concepts:list[PSObject],to_entities:df|pd.DataFrame,
-                     how2connect)->tuple[ResnetGraph,df]:
-    """
-    input:
-      to_entities.columns must have self.__temp_id_col__\n
-      concepts - [PSObject]\n
-      how2connect - function with instructions how to connect "concepts","to_entities"
-    output:
-      linked_row_count -int\n
-      linked_entitiess - {PSObject}\n
-      copy of "to_entities" df with 4 columns added:
-        "weighted Refcount to {ConceptName}", 
-        "Refcount to {ConceptName}", 
-        "Linked {ConceptName} count", 
-        "{ConceptName} count"
-    """
-    my_df = to_entities.dfcopy() if isinstance(to_entities,df) else df.from_pd(to_entities)
-
+  def __add_link_columns(self,ConceptName:str,concepts:list[PSObject],my_df:df):
     concept_size = len(concepts)-1 if concepts else 0
     if (len(concepts) > 501 and len(my_df) > 500):
         print(f'"{ConceptName}" concept has {concept_size} ontology children! Linking may take a while, be patient' )
@@ -658,8 +643,7 @@ class SemanticSearch (APISession):
     linked_count_column = self._linkedconcepts_colname(ConceptName)
     concept_size_column = self._concept_size_colname(ConceptName)
 
-    concepts_uids = set(ResnetGraph.uids(concepts))
-    concepts_count = len(concepts_uids)
+    concepts_count = len(set(ResnetGraph.uids(concepts)))
     try:
         my_df.insert(len(my_df.columns),weighted_refcount_column,[float(0)]*len(my_df))
         my_df.insert(len(my_df.columns),refcount_column,[0]*len(my_df))
@@ -670,67 +654,41 @@ class SemanticSearch (APISession):
         print('%s column already exists in dataframe!!!' % refcount_column)
         pass
 
-    linked_row_count = 0
-    #linked_entities = set()
-    start_time  = time.time()
-    id_type = 'URN' if self.useNeo4j() else DBID
+
+  def __connect2concept(self,ConceptName:str,concepts:list[PSObject],my_df:df,how2connect)->tuple[ResnetGraph,ConceptLinker|None]:
+    '''
+    output:
+      connection graph between "concepts" and entities in "my_df",
+      ConceptLinker for connection graph or None if connection graph is empty
+    '''
     connection_graph = self.connect(my_df,concepts, how2connect)
     if connection_graph.number_of_edges()>0:
       self.__annotate_rels(connection_graph, ConceptName)
-      ref_counter = set()
-      for idx in my_df.index:
-        entities_ids = set(my_df.at[idx,self.__temp_id_col__])
-        row_has_connection = False
-        row_entities = connection_graph.psobj_with_ids(entities_ids,id_type)
-        if row_entities:
-          if self.__rel_dir__ =='>':
-            row_has_connection = connection_graph.relation_exist(row_entities,concepts,
-                                          self.__connect_by_rels__,self.__rel_effect__,[],False)
-          elif self.__rel_dir__ =='<':
-            row_has_connection = connection_graph.relation_exist(concepts,row_entities,
-                                          self.__connect_by_rels__,self.__rel_effect__,[],False)
-          else:
-            row_has_connection = connection_graph.relation_exist(concepts,row_entities,
-                                          self.__connect_by_rels__,self.__rel_effect__,[],True)
-
-        if not row_has_connection:
-          continue
-
-        row_subgraph = connection_graph.get_subgraph(row_entities, concepts)
-        connected_concepts_uids = [c for c in row_subgraph.nodes() if row_subgraph.degree(c) and c in concepts_uids]
-        my_df.at[idx,linked_count_column] = len(connected_concepts_uids) # used to calculate concept incidence at normalization step
-        #it measures the occurence of concepts linked to row entities among all input concepts
-        references = list(row_subgraph.load_references(self.relprop2weight,postgres=self.postgres()))
-        # placeholder for possible future use of Scopus citation index:
-        # references = [self.RefStats.citation_index(r) for r in references]
-        ref_weights = [1.0]*len(references)
-        scopus_score = max([x.get('Relation score',[0.0])[0] for x in references])
-
-        if self.ConceptsHaveWeights: # add ref_nodeweights to ref_weights
-        # assumes concepts are annotated by REGULATOR_WEIGHT and/or TARGET_WEIGHT
-        # currently does not differentiate between regulators and targets because concepts can be upstream and downstream from entities
-          regulatorurn2weight = {o.urn():o.get_prop(REGULATOR_WEIGHT) for o in concepts}
-          targeturn2weight = {o.urn():o.get_prop(TARGET_WEIGHT) for o in concepts}
-          row_subgraph.add_node_weight2ref(regulatorurn2weight,targeturn2weight)
-          ref_nodeweights = [r.get_weight(NODEWEIGHT) for r in references]       
-          ref_weights = [x + y for x, y in zip(ref_weights, ref_nodeweights)]
-        
-        if self.relprop2weight:# add ref_relweights to ref_weights
-          ref_relweights = [r.get_weight(RELWEIGHT) for r in references]    
-          ref_weights =  [x + y for x, y in zip(ref_weights, ref_relweights)]
+      # concepts weights assume concepts are annotated by REGULATOR_WEIGHT and/or TARGET_WEIGHT
+      # currently does not differentiate between regulators and targets because concepts can be upstream and downstream from entities
+      id_type = 'URN' if self.useNeo4j() else DBID
+      linker = ConceptLinker(connection_graph,concepts,self.__connect_by_rels__,self.__rel_effect__,self.__rel_dir__,
+                             self.relprop2weight,self.ConceptsHaveWeights,id_type,self.postgres(),self.refstore)
+      return connection_graph, linker
+    else:
+      return connection_graph, None
 
-        row_score = float(sum(ref_weights)) * (1 + scopus_score/100)
 
-        number_of_children = len(list(my_df.at[idx,self.__temp_id_col__]))
-        entities_uids = ResnetGraph.uids(row_entities)
-        connected_entities_count = len([c for c in row_subgraph.nodes() if row_subgraph.degree(c) and c in entities_uids])
-        corrected_row_score = row_score * (1+connected_entities_count/number_of_children)  # boost by multiple component connectivity
-        corrected_row_score /= math.sqrt(number_of_children) # normalize by number of entity components
+  def __fill_link_columns(self,ConceptName:str,my_df:df,connection_graph:ResnetGraph,
+                          row_links:list[tuple[float,int,int]|None],ref_count:int,start_time:float):
+    weighted_refcount_column = self._weighted_refcount_colname(ConceptName) 
+    refcount_column = self._refcount_colname(ConceptName)
+    linked_count_column = self._linkedconcepts_colname(ConceptName)
+    linked_row_count = 0
+    if connection_graph.number_of_edges()>0:
+      for idx, row_link in zip(my_df.index,row_links):
+        if row_link is None:
+          continue
         # correction by the number of connected concepts is done by self.normalize function
-        my_df.at[idx,weighted_refcount_column] = corrected_row_score
-        my_df.at[idx,refcount_column] = len(references)
-        
-        ref_counter.update(references)
+        my_df.at[idx,weighted_refcount_column] = row_link[0]
+        my_df.at[idx,refcount_column] = row_link[1]
+        my_df.at[idx,linked_count_column] = row_link[2] # used to calculate concept incidence at normalization step
+        #it measures the occurence of concepts linked to row entities among all input concepts
         linked_row_count += 1
 
       effecStr = ','.join(self.__rel_effect__) if len(self.__rel_effect__)>0 else 'all'
@@ -738,13 +696,39 @@ class SemanticSearch (APISession):
       exec_time = execution_time(start_time)
       if linked_row_count:
         print("Concept \"%s\" is linked to %d entities by %s relations of type \"%s\" supported by %d references with effect \"%s\" in %s" %
-              (ConceptName,linked_row_count, connection_graph.number_of_edges(),relTypeStr,len(ref_counter),effecStr,exec_time))
+              (ConceptName,linked_row_count, connection_graph.number_of_edges(),relTypeStr,ref_count,effecStr,exec_time))
       elif connection_graph:
         print("Concept \"%s\" has no links of type \"%s\" with effect \"%s\" to entities in boosted graph" %
             (ConceptName,relTypeStr,effecStr))
     else:  # connection_graph is empty
         print("Concept \"%s\" has no links to entities" % (ConceptName))
 
+
+  def __link2concept(self,ConceptName:str,concepts:list[PSObject],to_entities:df|pd.DataFrame,
+                     how2connect)->tuple[ResnetGraph,df]:
+    """
+    input:
+      to_entities.columns must have self.__temp_id_col__\n
+      concepts - [PSObject]\n
+      how2connect - function with instructions how to connect "concepts","to_entities"
+    output:
+      linked_row_count -int\n
+      linked_entitiess - {PSObject}\n
+      copy of "to_entities" df with 4 columns added:
+        "weighted Refcount to {ConceptName}", 
+        "Refcount to {ConceptName}", 
+        "Linked {ConceptName} count", 
+        "{ConceptName} count"
+    """
+    my_df = to_entities.dfcopy() if isinstance(to_entities,df) else df.from_pd(to_entities)
+    self.__add_link_columns(ConceptName,concepts,my_df)
+    start_time  = time.time()
+    connection_graph, linker = self.__connect2concept(ConceptName,concepts,my_df,how2connect)
+    row_links, ref_count = list(), 0
+    if linker:
+      row_links, references = linker.link(my_df[self.__temp_id_col__].to_list())
+      ref_count = len(references)
+    self.__fill_link_columns(ConceptName,my_df,connection_graph,row_links,ref_count,start_time)
     return connection_graph, my_df
 
 
@@ -773,6 +757,46 @@ class SemanticSearch (APISession):
       return self.__link2concept(to_concept_named,concepts,to_entities,how2connect)
 
 
+  def link2concepts(self,concept2links:dict[str,tuple[list[PSObject],dict]],to_entities:df|pd.DataFrame,
+                    max_workers:int|None=None)->tuple[dict[str,ResnetGraph],df]:
+    """
+    input:
+      concept2links = {concept_name:([PSObject],kwargs)}, where kwargs are arguments for self.set_how2connect() 
+      and optional 'clone2retrieve'\n
+      to_entities.columns must have self.__temp_id_col__\n
+      max_workers - number of processes linking concepts. Defaults to os.cpu_count()
+    output:
+      {concept_name:connection_graph},
+      df copy of "to_entities" with 4 columns added for every concept in concept2links order
+    Connection graphs are retrieved one concept at a time.
+    Rows are linked to independent concepts in parallel processes sharing "to_entities" rows and connection graphs
+    """
+    my_df = to_entities.dfcopy() if isinstance(to_entities,df) else df.from_pd(to_entities)
+    connection_graphs = dict()
+    linkers = dict()
+    for concept_name, (concepts,kwargs) in concept2links.items():
+      self.__add_link_columns(concept_name,concepts,my_df)
+      how2connect = self.set_how2connect(**kwargs)
+      clone2retrieve = kwargs.get('clone2retrieve',DO_NOT_CLONE)
+      if clone2retrieve:
+        my_session = self._clone(to_retrieve=clone2retrieve,init_refstat=False)
+        connection_graph, linker = my_session.__connect2concept(concept_name,concepts,my_df,how2connect)
+        my_session.close_connection()
+      else:
+        connection_graph, linker = self.__connect2concept(concept_name,concepts,my_df,how2connect)
+      connection_graphs[concept_name] = connection_graph
+      if linker:
+        linkers[concept_name] = linker
+
+    start_time  = time.time()
+    concept2row_links = link_concepts(linkers,my_df[self.__temp_id_col__].to_list(),max_workers)
+    for concept_name, connection_graph in connection_graphs.items():
+      self.set_how2connect(**concept2links[concept_name][1]) # restores relation filters for the log message
+      row_links, ref_count = concept2row_links.get(concept_name,(list(),0))
+      self.__fill_link_columns(concept_name,my_df,connection_graph,row_links,ref_count,start_time)
+    return connection_graphs, my_df
+
+
   def link2RefCountPandas(self,to_concept_named:str,concepts:list,how2connect=set_how2connect,clone2retrieve=DO_NOT_CLONE):
       '''
       Input
@@ -1106,6 +1130,39 @@ class SemanticSearch (APISession):
       return connectionG,scored_df
     else:
       return ResnetGraph(),df2score
+
+
+  def score_concepts_in_parallel(self,concept2kwargs:dict[str,tuple[list[PSObject],dict]],df2score:df|None=None,
+                                 max_workers:int|None=None)->tuple[dict[str,ResnetGraph],df]:
+    '''
+    input:
+      concept2kwargs = {concept_name:([PSObject],kwargs)}, where kwargs are the same as in score_concepts() except 'concept_name'\n
+      df2score - will score self.RefCountPandas if None\n
+      max_workers - number of processes linking concepts. Defaults to os.cpu_count()
+    output:
+      {concept_name:connection graph}, df with new columns ranked in concept2kwargs order.
+      Same as calling score_concepts() for every concept in concept2kwargs, 
+      but rows are linked to independent concepts in parallel processes
+    '''
+    df2score = self.RefCountPandas if df2score is None else df2score
+    self.add2self = any(kwargs.get('add_relevance_concept_column',False) for _,kwargs in concept2kwargs.values())
+    concept2links = dict()
+    for concept_name, (concepts,kwargs) in concept2kwargs.items():
+      if not concepts: continue
+      my_kwargs = dict(kwargs)
+      if len(concepts) > 500:
+        # to avoid table lock in Oracle:
+        my_kwargs['step'] = 250
+      concept2links[concept_name] = (concepts,my_kwargs)
+
+    connection_graphs, scored_df = self.link2concepts(concept2links,df2score,max_workers)
+    df_uids = scored_df.uids()
+    for concept_name, connectionG in connection_graphs.items():
+      linked_row_count = len(connectionG._get_nodes(df_uids))
+      print(f'{linked_row_count} rows linked to column {concept_name}')
+      if linked_row_count:
+        self.set_rank4(concept_name,scored_df,concept2links[concept_name][1].get('column_rank',None))
+    return connection_graphs, scored_df
     
 
   def __explode(self, concepts:list[PSObject], using_concept_params:dict):
@@ -1149,6 +1206,50 @@ class SemanticSearch (APISession):
     return exploded_concepts
   
   
+  def __param_concepts(self,param_name:str)->tuple[list[PSObject],set[PSObject]]:
+    '''
+    output:
+      concepts found in ontology for concept names in self.params[param_name], 
+      same concepts exploded with ontology children and annotated with weights from parameters
+    '''
+    concept_params = self.params.get(param_name,[])
+    concept_names = list(concept_params.keys())  if isinstance(concept_params,dict) else concept_params
+    if not concept_names:
+      return [],set()
+    
+    if self.useNeo4j():
+      input_concepts = self.neo4j.get_nodes('','Name',concept_names)
+    else:
+      request_name = f'Loading "{param_name}" from script parameters'
+      oql = OQL.get_entities_by_props(concept_names,['Name'])
+      input_concepts = self.process_oql(oql,request_name)._get_nodes()
+
+    if input_concepts:
+      print(f'Found {len(input_concepts)} {param_name} in ontology for {len(concept_params)} {param_name} in parameters')
+      return input_concepts, self.__explode(input_concepts,concept_params)
+    else:
+      print(f'No concepts found for {concept_names}. Check your spelling !!!')
+      return [],set()
+
+
+  def __annotate_param_concepts(self,param_name:str,input_concepts:list[PSObject],exploded_concepts:set[PSObject],
+                                connectionG:ResnetGraph,scored_df:df,rank:int,**kwargs)->tuple[df,list[PSObject]]:
+    '''
+    output:
+      scored_df with "Relevant {param_name}" column if kwargs['add_relevance_concept_column'],
+      concepts from input_concepts annotated with 'Local connectivity' and 'rank' of their column
+    '''
+    if kwargs.get('add_relevance_concept_column',False):
+      scored_df = self.add_relevant_concepts(scored_df,{param_name:list(exploded_concepts)},connectionG)
+    
+    annotated_inconcepts = [c for c in exploded_concepts if c in input_concepts]
+    for c in annotated_inconcepts:
+      connectivity = connectionG.connectivity(c,with_children=True)
+      c.set_property('Local connectivity',connectivity)
+      c.set_property('rank',rank)
+    return scored_df,annotated_inconcepts
+
+
   def score_concept(self,*args,**kwargs)->tuple[ResnetGraph,df,list[PSObject]]:
     '''
     output:
@@ -1172,55 +1273,73 @@ class SemanticSearch (APISession):
     '''
     start = time.time()
     df2score = args[1] if len(args) > 1 else self.RefCountPandas
-    concept_params = self.params.get(args[0],[])
-    if not concept_params:
+    concept_name = args[0]
+    if not self.params.get(concept_name,[]):
       return ResnetGraph(),df2score,[]
       
-    concept_names = list(concept_params.keys())  if isinstance(concept_params,dict) else concept_params
-    if concept_names:
-      concept_name = args[0]
-      print(f'\n\nLinking concepts from "{concept_name}" parameter to "{df2score._name_}" worksheet with {len(df2score)} rows',flush=True)
-      print(f'Results will be added to column "{kwargs['concept_name']}"')
-     
-      if self.useNeo4j():
-        input_concepts = self.neo4j.get_nodes('','Name',concept_names)
-      else:
-        request_name = f'Loading "{concept_name}" from script parameters'
-        oql = OQL.get_entities_by_props(concept_names,['Name'])
-        input_concepts = self.process_oql(oql,request_name)._get_nodes()
+    print(f'\n\nLinking concepts from "{concept_name}" parameter to "{df2score._name_}" worksheet with {len(df2score)} rows',flush=True)
+    print(f'Results will be added to column "{kwargs['concept_name']}"')
+    input_concepts, exploded_concepts = self.__param_concepts(concept_name)
+    if input_concepts:
+      connectionG,scored_df = self.score_concepts(exploded_concepts,df2score,**kwargs)
+      self.ConceptsHaveWeights = False
 
-      if input_concepts:
-        print(f'Found {len(input_concepts)} {concept_name} in ontology for {len(concept_params)} {concept_name} in parameters')
-        exploded_concepts = self.__explode(input_concepts,concept_params)
-        connectionG,scored_df = self.score_concepts(exploded_concepts,df2score,**kwargs)
-        self.ConceptsHaveWeights = False
-
-        if connectionG:
-          if kwargs.get('add_relevance_concept_column',False):
-            scored_df = self.add_relevant_concepts(scored_df,{concept_name:list(exploded_concepts)},connectionG)
-          
-          annotated_inconcepts = [c for c in exploded_concepts if c in input_concepts]
-          for c in annotated_inconcepts:
-            connectivity = connectionG.connectivity(c,with_children=True)
-            c.set_property('Local connectivity',connectivity)
-            c.set_property('rank',scored_df.max_colrank())
-
-          print(f'Linked {len(exploded_concepts)} expanded from "{concept_name} to  worksheet "{df2score._name_}" by {connectionG.size()} references')
-          print(f'Linking was done in {execution_time(start)}',flush=True)
-          return connectionG,scored_df,annotated_inconcepts
-        else:
-          print(f'No entities were linked to {concept_names}')
-          return ResnetGraph(),df2score,[]
+      if connectionG:
+        scored_df,annotated_inconcepts = self.__annotate_param_concepts(concept_name,input_concepts,exploded_concepts,
+                                                                        connectionG,scored_df,scored_df.max_colrank(),**kwargs)
+        print(f'Linked {len(exploded_concepts)} expanded from "{concept_name} to  worksheet "{df2score._name_}" by {connectionG.size()} references')
+        print(f'Linking was done in {execution_time(start)}',flush=True)
+        return connectionG,scored_df,annotated_inconcepts
       else:
-          print(f'No concepts found for {concept_names}. Check your spelling !!!')
-          self.ConceptsHaveWeights = False
-          return ResnetGraph(),df2score,[]
+        print(f'No entities were linked to {concept_name}')
+        return ResnetGraph(),df2score,[]
     else:
-      print('No concept name was provided!!!!')
       self.ConceptsHaveWeights = False
       return ResnetGraph(),df2score,[]
 
 
+  def score_params_in_parallel(self,column2params:dict[str,tuple[str,dict]],df2score:df|None=None,
+                               max_workers:int|None=None)->tuple[df,dict[str,list[PSObject]]]:
+    '''
+    input:
+      column2params = {column_concept_name:(param_name,kwargs)}, where param_name is key name in self.params 
+      that holds the list of concept names and kwargs are the same as in score_concept() except 'concept_name'\n
+      df2score - will score self.RefCountPandas if None\n
+      max_workers - number of processes linking concepts. Defaults to os.cpu_count()
+    output:
+      df with new columns ranked in column2params order, {column_concept_name:annotated concepts}.
+      Same as calling score_concept() for every column in column2params, 
+      but rows are linked to independent concepts in parallel processes
+    '''
+    start = time.time()
+    df2score = self.RefCountPandas if df2score is None else df2score
+    column2concepts = dict()
+    concept2kwargs = dict()
+    for column_name, (param_name,kwargs) in column2params.items():
+      print(f'\n\nLinking concepts from "{param_name}" parameter to "{df2score._name_}" worksheet with {len(df2score)} rows',flush=True)
+      print(f'Results will be added to column "{column_name}"')
+      input_concepts, exploded_concepts = self.__param_concepts(param_name)
+      if input_concepts:
+        column2concepts[column_name] = (input_concepts,exploded_concepts)
+        concept2kwargs[column_name] = (list(exploded_concepts),kwargs)
+
+    connection_graphs, scored_df = self.score_concepts_in_parallel(concept2kwargs,df2score,max_workers)
+    self.ConceptsHaveWeights = False
+    column2annotated = dict()
+    for column_name, connectionG in connection_graphs.items():
+      if connectionG:
+        param_name, kwargs = column2params[column_name]
+        input_concepts, exploded_concepts = column2concepts[column_name]
+        rank = scored_df.col2rank.get(self._weighted_refcount_colname(column_name),scored_df.max_colrank())
+        scored_df,column2annotated[column_name] = self.__annotate_param_concepts(param_name,input_concepts,exploded_concepts,
+                                                                                 connectionG,scored_df,rank,**kwargs)
+        print(f'Linked {len(exploded_concepts)} expanded from "{param_name} to  worksheet "{df2score._name_}" by {connectionG.size()} references')
+      else:
+        print(f'No entities were linked to {column2params[column_name][0]}')
+    print(f'Linking was done in {execution_time(start)}',flush=True)
+    return scored_df,column2annotated
+
+
 ##################  ANNOTATE  ############################## ANNOTATE ############################
   def tm_refcount_colname(self,between_column:str,and_concepts:str|list):
     concept_str = and_concepts if isinstance(and_concepts,str) else ','.join(and_concepts)
@@ -0,0 +1,195 @@
+import numpy as np
+import networkx as nx
+from scipy import sparse
+
+SEED_BATCH_SIZE = 512 # number of seeds expanded together by SparseRanker.rank_regulators
+
+
+def _expand(ptr:np.ndarray,idx:np.ndarray,nodes:np.ndarray)->tuple[np.ndarray,np.ndarray,np.ndarray]:
+  '''
+  output:
+    entry - index in "nodes" for every neighbor,
+    neighbors - CSR neighbors of "nodes",
+    local - position of neighbor in adjacency of its node
+  '''
+  starts = ptr[nodes]
+  counts = ptr[nodes+1]-starts
+  entry = np.repeat(np.arange(len(nodes)),counts)
+  local = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts)-counts,counts)
+  return entry, idx[starts[entry]+local], local
+
+
+class SparseRanker:
+  '''
+  CSR adjacency of ResnetGraph for regulator ranking by level-synchronous breadth-first search.\n
+  Used by ResnetGraph.rank_regulators() and ResnetGraph.rank_regulator() with backend='sparse'.
+  Keep SparseRanker for repeated ranking on unchanged graph to avoid rebuilding adjacency
+  '''
+  def __init__(self,G:nx.MultiDiGraph):
+    self.uids = list(G.nodes())
+    self.uid2idx = {uid:i for i,uid in enumerate(self.uids)}
+    n = len(self.uids)
+    # predecessors are kept in G.pred order to reproduce discovery order of python BFS
+    pred_ptr = np.zeros(n+1,dtype=np.int64)
+    pred_idx = list()
+    for i,uid in enumerate(self.uids):
+      pred_idx.extend(map(self.uid2idx.__getitem__,G.pred[uid]))
+      pred_ptr[i+1] = len(pred_idx)
+    self.pred_ptr = pred_ptr
+    self.pred_idx = np.asarray(pred_idx,dtype=np.int64)
+    # successors: row r has unique targets of r
+    pred = sparse.csr_matrix((np.ones(len(self.pred_idx),dtype=np.int8),self.pred_idx,self.pred_ptr),shape=(n,n))
+    succ = pred.T.tocsr()
+    self.succ_ptr = succ.indptr.astype(np.int64)
+    self.succ_idx = succ.indices.astype(np.int64)
+
+
+  def __len__(self):
+    return len(self.uids)
+
+
+  def rank_regulators(self,node_weights:dict[int,float],max_distance=5,batch_size=SEED_BATCH_SIZE)->dict[int,float]:
+    '''
+    input:
+      node_weights = {node_uid:weight}
+    output:
+      {regulator_uid:rank} identical to python backend of ResnetGraph.rank_regulators()
+    '''
+    n = len(self.uids)
+    seeds = [(self.uid2idx[uid],float(w)) for uid,w in node_weights.items() if uid in self.uid2idx]
+    base = np.zeros(n)
+    discovered = np.zeros(n,dtype=bool)
+    expanded = np.zeros(n,dtype=bool) # nodes expanded by any seed. Their in-edges are in upstream edges of python backend
+    # order of first discovery = (seed number,level,position in level):
+    first = np.full(n,np.iinfo(np.int64).max,dtype=np.int64)
+    max_degree = int(np.diff(self.pred_ptr).max()) + 1 if n else 1
+    if max_distance < 1 or not seeds:
+      return dict()
+
+    for s0 in range(0,len(seeds),batch_size):
+      batch = seeds[s0:s0+batch_size]
+      b = len(batch)
+      rows = np.arange(b)
+      nodes = np.array([i for i,_ in batch],dtype=np.int64)
+      weights = np.array([w for _,w in batch])
+      pos = np.zeros(b,dtype=np.int64)
+      visited = sparse.csr_matrix((np.ones(b,dtype=bool),(rows,nodes)),shape=(b,n)) # per-seed visited masks
+      expanded[nodes] = True
+      for level in range(1,max_distance+1):
+        entry, neighbors, local = _expand(self.pred_ptr,self.pred_idx,nodes)
+        if not len(entry): break
+        seed_rows = rows[entry]
+        key = pos[entry]*max_degree + local # BFS discovery key within seed level
+        is_new = ~np.asarray(visited[seed_rows,neighbors]).ravel().astype(bool)
+        seed_rows, neighbors, key = seed_rows[is_new], neighbors[is_new], key[is_new]
+        if not len(seed_rows): break
+
+        # node is discovered by its first parent in BFS order
+        codes = seed_rows*n + neighbors
+        order = np.lexsort((key,codes))
+        codes, key = codes[order], key[order]
+        is_first = np.ones(len(codes),dtype=bool)
+        is_first[1:] = codes[1:] != codes[:-1]
+        codes, key = codes[is_first], key[is_first]
+        seed_rows, neighbors = codes//n, codes%n
+        order = np.lexsort((key,seed_rows))
+        seed_rows, neighbors = seed_rows[order], neighbors[order]
+        pos = np.arange(len(seed_rows)) - np.searchsorted(seed_rows,seed_rows,side='left')
+
+        level_matrix = sparse.csr_matrix((np.ones(len(seed_rows)),(seed_rows,neighbors)),shape=(b,n))
+        base += level_matrix.T @ (weights/(level*level))
+        discovered[neighbors] = True
+        np.minimum.at(first,neighbors,((seed_rows+s0)*(max_distance+1)+level)*n+pos)
+        visited = visited + level_matrix.astype(bool)
+        if level < max_distance:
+          expanded[neighbors] = True
+        rows, nodes = seed_rows, neighbors
+
+    ranked = np.flatnonzero(discovered)
+    ranked = ranked[np.argsort(first[ranked],kind='stable')] # insertion order of python backend
+    ranks = self.__boost(ranked,base[ranked],discovered,expanded)
+    return dict(zip([self.uids[i] for i in ranked.tolist()],ranks.tolist()))
+
+
+  def __boost(self,ranked:np.ndarray,base:np.ndarray,discovered:np.ndarray,expanded:np.ndarray)->np.ndarray:
+    '''
+    boosts regulators regulating other regulators that were not expanded by BFS.\n
+    Python backend updates ranks in insertion order: targets ranked earlier contribute boosted ranks,
+    others contribute ranks before boost
+    '''
+    k = len(ranked)
+    n = len(self.uids)
+    rank_pos = np.full(n,-1,dtype=np.int64)
+    rank_pos[ranked] = np.arange(k)
+    entry, targets, _ = _expand(self.succ_ptr,self.succ_idx,ranked)
+    is_boosting = discovered[targets] & ~expanded[targets]
+    regulators = entry[is_boosting]
+    targets = rank_pos[targets[is_boosting]]
+    earlier = targets < regulators
+    L = sparse.csr_matrix((np.ones(int(earlier.sum())),(regulators[earlier],targets[earlier])),shape=(k,k))
+    U = sparse.csr_matrix((np.ones(int((~earlier).sum())),(regulators[~earlier],targets[~earlier])),shape=(k,k))
+    from_later = U @ base
+    ranks = base.copy()
+    # L is strictly lower triangular: iterations converge after the longest chain of boosting targets
+    for _ in range(k+1):
+      neighborhood_weight = L @ ranks + from_later
+      new_ranks = np.where(neighborhood_weight > 0, base + 0.5*neighborhood_weight, base)
+      if np.array_equal(new_ranks,ranks): break
+      ranks = new_ranks
+    return ranks
+
+
+  def rank_regulator(self,regulator_uid:int,target_weights:dict[int,float],max_distance=5)->float:
+    '''
+    input:
+      target_weights = {node_uid:weight}
+    '''
+    if regulator_uid not in self.uid2idx: return 0.0
+    n = len(self.uids)
+    weights = np.zeros(n)
+    for uid, w in target_weights.items():
+      i = self.uid2idx.get(uid)
+      if i is not None: weights[i] = w
+
+    start = self.uid2idx[regulator_uid]
+    visited = np.zeros(n,dtype=bool)
+    visited[start] = True
+    frontier = np.array([start],dtype=np.int64)
+    regulator_rank = 0.0
+    for level in range(1,max_distance+1):
+      _, neighbors, _ = _expand(self.succ_ptr,self.succ_idx,frontier)
+      frontier = np.unique(neighbors[~visited[neighbors]])
+      if not len(frontier): break
+      visited[frontier] = True
+      regulator_rank += float(weights[frontier].sum())/(level*level)
+    return regulator_rank
+
+
+  def distance_weights(self,regulator_uids:list[int],max_distance=5,batch_size=SEED_BATCH_SIZE)->sparse.csr_matrix:
+    '''
+    output:
+      len(regulator_uids) x len(self) sparse matrix with 1/level^2 for every node downstream of regulator.\n
+      Row product with vector of node weights equals rank_regulator() for every regulator.
+      Rows for regulators not in graph are empty
+    '''
+    n = len(self.uids)
+    succ = sparse.csr_matrix((np.ones(len(self.succ_idx)),self.succ_idx,self.succ_ptr),shape=(n,n))
+    rows = [self.uid2idx.get(uid,-1) for uid in regulator_uids]
+    batches = list()
+    for b0 in range(0,len(rows),batch_size):
+      batch = np.array(rows[b0:b0+batch_size],dtype=np.int64)
+      in_graph = np.flatnonzero(batch >= 0)
+      frontier = sparse.csr_matrix((np.ones(len(in_graph)),(in_graph,batch[in_graph])),shape=(len(batch),n))
+      visited = frontier.copy()
+      weights = sparse.csr_matrix((len(batch),n))
+      for level in range(1,max_distance+1):
+        next_level = frontier @ succ
+        next_level.data[:] = 1.0
+        next_level = next_level - next_level.multiply(visited)
+        next_level.eliminate_zeros()
+        if not next_level.nnz: break
+        weights = weights + next_level/(level*level)
+        visited = visited + next_level
+        frontier = next_level
+      batches.append(weights)
+    return sparse.vstack(batches,format='csr') if batches else sparse.csr_matrix((0,n))
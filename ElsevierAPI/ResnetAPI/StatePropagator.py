@@ -0,0 +1,93 @@
+import numpy as np
+import networkx as nx
+from scipy import sparse
+from concurrent.futures import ThreadPoolExecutor
+from .NetworkxObjects import PSRelation
+
+STATE_BATCH_SIZE = 1024 # number of seeds propagated together by StatePropagator.propagate
+STATE_THREADS = 4
+
+
+class StatePropagator:
+  '''
+  signed sparse adjacency of ResnetGraph compiled once for propagation of node states from many seeds.\n
+  signs[r,t] = sum of PSRelation.effect_sign() for all relations between regulator r and target t.
+  State of node on BFS level L from the seed is sum of signs[r,t]*state[r] over all its regulators r on level L-1
+  '''
+  def __init__(self,G:nx.MultiDiGraph):
+    self.uids = list(G.nodes())
+    self.uid2idx = {uid:i for i,uid in enumerate(self.uids)}
+    n = len(self.uids)
+    regulators, targets, signs = list(), list(), list()
+    for r,t,rel in G.edges.data('relation'):
+      regulators.append(self.uid2idx[r])
+      targets.append(self.uid2idx[t])
+      signs.append(rel.effect_sign() if isinstance(rel,PSRelation) else 0)
+
+    self.signs = sparse.csr_matrix((np.array(signs,dtype=np.float64),(regulators,targets)),shape=(n,n))
+    self.signs.sum_duplicates()
+    # BFS levels use all edges regardless of relation effect
+    self.adjacency = sparse.csr_matrix((np.ones(len(regulators),dtype=np.int32),(regulators,targets)),shape=(n,n))
+    self.adjacency.sum_duplicates()
+    self.adjacency.data[:] = 1
+
+
+  def __len__(self):
+    return len(self.uids)
+
+
+  def __propagate_batch(self,seed_idxs:list[int],seed_states:list[int],max_depth:int)->sparse.csr_matrix:
+    b, n = len(seed_idxs), len(self.uids)
+    rows = np.arange(b)
+    frontier = sparse.csr_matrix((np.ones(b,dtype=np.int32),(rows,seed_idxs)),shape=(b,n))
+    visited = frontier.copy()
+    level_states = sparse.csr_matrix((np.array(seed_states,dtype=np.float64),(rows,seed_idxs)),shape=(b,n))
+    states = level_states.copy()
+    for _ in range(max_depth):
+      next_level = frontier @ self.adjacency
+      next_level.data[:] = 1
+      next_level = next_level - next_level.multiply(visited)
+      next_level.eliminate_zeros()
+      if not next_level.nnz: break
+      level_states = (level_states @ self.signs).multiply(next_level).tocsr()
+      level_states.eliminate_zeros()
+      states = states + level_states
+      visited = visited + next_level
+      frontier = next_level
+    return states.tocsr()
+
+
+  def propagate(self,seed2state:dict[int,int],max_depth=5,batch_size=STATE_BATCH_SIZE,max_workers=STATE_THREADS)->sparse.csr_matrix:
+    '''
+    input:
+      seed2state = {seed_uid:state}, where state is ACTIVATED or REPRESSED
+      max_depth - number of BFS levels downstream of every seed
+    output:
+      len(seed2state) x len(self) sparse matrix with node states propagated from every seed.
+      Rows follow seed2state order, columns follow self.uids.
+      Rows for seeds not in graph are empty
+    '''
+    n = len(self.uids)
+    seeds = [(row,self.uid2idx[uid],int(state)) for row,(uid,state) in enumerate(seed2state.items()) if uid in self.uid2idx]
+    batches = [seeds[i:i+batch_size] for i in range(0,len(seeds),batch_size)]
+    def propagate_batch(batch:list[tuple[int,int,int]]):
+      return self.__propagate_batch([s[1] for s in batch],[s[2] for s in batch],max_depth)
+
+    with ThreadPoolExecutor(max(1,min(max_workers,len(batches)))) as e:
+      batch_states = list(e.map(propagate_batch,batches))
+
+    states = sparse.vstack(batch_states,format='csr') if batch_states else sparse.csr_matrix((0,n))
+    rows = [s[0] for s in seeds]
+    # moving rows for seeds in graph to their positions in seed2state
+    placement = sparse.csr_matrix((np.ones(len(rows)),(rows,np.arange(len(rows)))),shape=(len(seed2state),len(rows)))
+    return (placement @ states).tocsr()
+
+
+  def states(self,seed2state:dict[int,int],max_depth=5)->dict[int,int]:
+    '''
+    output:
+      {node_uid:state} for nodes with non-zero states summed over all seeds in "seed2state"
+    '''
+    total = np.asarray(self.propagate(seed2state,max_depth).sum(axis=0)).ravel()
+    nonzero = np.flatnonzero(total)
+    return {self.uids[i]:int(total[i]) for i in nonzero}
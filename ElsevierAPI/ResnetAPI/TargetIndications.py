@@ -1096,8 +1096,13 @@ AND NeighborOf downstream (SELECT Entity WHERE objectType = GeneticVariant)'
       ------
       adds Refcount score columns "in_worksheet" from self.raw_data
       """
-      my_df = in_df.dfcopy()
       booster_reltypes = ['Regulation','Biomarker','GeneticChange','QuantitativeChange','StateChange','FunctionalAssociation']
+      regulator_weight = {'nodeweight_prop': 'regulator weight'} if self.targets_have_weights else dict()
+      target_weight = {'nodeweight_prop': 'target weight'} if self.targets_have_weights else dict()
+      # {concept:([PSObject],kwargs,(message,message_args))} in the order of column ranks. 
+      # message is formatted with number of linked indications followed by message_args
+      concept2links = dict()
+      tox_concepts = set() # toxicity columns have the same rank as drug columns preceding them
       
       t_n = self.target_names_str()
       target_in_header = t_n if len(t_n) < 45 else 'targets'
@@ -1112,18 +1117,8 @@ AND NeighborOf downstream (SELECT Entity WHERE objectType = GeneticVariant)'
                 'with_effects' : [with_effect_on_indication],
                 'boost_by_reltypes' : booster_reltypes
                 }
-      if self.targets_have_weights:
-          kwargs.update({'nodeweight_prop': 'regulator weight'})
-      how2connect = self.set_how2connect(**kwargs)
-      connectionG,my_df = self.link2concept(concept,targets,my_df,how2connect)
-      linked_row_count = len(connectionG._get_nodes(my_df_uids))
-      if linked_row_count:
-        self.set_rank4(concept,my_df)
-
-      print(f'{linked_row_count} indications are {with_effect_on_indication}ly regulated by {t_n}')
-      self.nodeweight_prop = ''
-      my_df_uids = ResnetGraph.uids(my_df.Entities4df)
-      self.score_GVs(my_df)
+      concept2links[concept] = (targets,dict(kwargs,**regulator_weight),
+                                ('%d indications are %sly regulated by %s',(with_effect_on_indication,t_n)))
 
       score4antagonists = True if with_effect_on_indication == 'positive' else False
       link_effect, drug_class, drug_connect_concepts = self._drug_connect_params(direct_modulators=True,score_antagonists=score4antagonists)
@@ -1131,47 +1126,28 @@ AND NeighborOf downstream (SELECT Entity WHERE objectType = GeneticVariant)'
       if drug_connect_concepts:
         # references suggesting that known drugs for the target as treatments for indication
         concept = target_in_header+' '+drug_class+' clin. trials'
-        concept = target_in_header+' '+drug_class
         kwargs = {'connect_by_rels':['ClinicalTrial']}
-        if self.targets_have_weights:
-            kwargs.update({'nodeweight_prop': 'regulator weight'})
-        how2connect = self.set_how2connect(**kwargs)
-        connectionG,my_df = self.link2concept(concept,drug_connect_concepts,my_df,how2connect)
-        linked_row_count = len(connectionG._get_nodes(my_df_uids))
-        if linked_row_count:
-          self.set_rank4(concept,my_df)
-        print(f'Linked {linked_row_count} clinical trial indictions for {t_n} {drug_class}')
+        concept2links[concept] = (drug_connect_concepts,dict(kwargs,**regulator_weight),
+                                  ('Linked %d clinical trial indictions for %s %s',(t_n,drug_class)))
 
         concept = target_in_header+' '+drug_class
         kwargs = {'connect_by_rels':['Regulation'],
               'with_effects' : [link_effect],
               'boost_by_reltypes' :['Regulation','FunctionalAssociation']
               }
-        how2connect = self.set_how2connect(**kwargs)
-        connectionG,my_df = self.link2concept(concept,drug_connect_concepts,my_df,how2connect)
-        linked_row_count = len(connectionG._get_nodes(my_df_uids))
-        if linked_row_count:
-          self.set_rank4(concept,my_df)
-        print(f'Linked {linked_row_count} indications for {t_n} {drug_class}')
+        concept2links[concept] = (drug_connect_concepts,kwargs,('Linked %d indications for %s %s',(t_n,drug_class)))
 
       #references reporting target agonists exacerbating indication or causing indication as adverse events
-      link_effect, drug_class, tox_concepts = self._drug_tox_params(direct_modulators=True,score_antagonists=score4antagonists)
-      if tox_concepts:
+      link_effect, drug_class, concepts = self._drug_tox_params(direct_modulators=True,score_antagonists=score4antagonists)
+      if concepts:
         concept = target_in_header+' '+drug_class
         kwargs = {'connect_by_rels':['Regulation'],
               'with_effects' : [link_effect],
               'boost_by_reltypes' :['Regulation','FunctionalAssociation']
               }
-        how2connect = self.set_how2connect(**kwargs)
-        connectionG,my_df = self.link2concept(concept,tox_concepts,my_df,how2connect)
-        linked_row_count = len(connectionG._get_nodes(my_df_uids))
-        if linked_row_count:
-          max_rank = my_df.max_colrank()
-          if not drug_connect_concepts:
-            max_rank += 1 # advancing max_rank only if drug_connect_concepts were empty, otherwise they have the same max_rank
-          self.set_rank4(concept,my_df,max_rank)
-        print(f'Linked {linked_row_count} indications as toxicities for {t_n} {drug_class}')
-
+        concept2links[concept] = (concepts,kwargs,('Linked %d indications as toxicities for %s %s',(t_n,drug_class)))
+        if drug_connect_concepts:
+          tox_concepts.add(concept)
 
       #references where target expression or activity changes in the indication
       if target_in_header == 'targets':
@@ -1187,15 +1163,8 @@ AND NeighborOf downstream (SELECT Entity WHERE objectType = GeneticVariant)'
                 'with_effects' : [with_effect_on_indication],
                 'boost_by_reltypes' : ['Biomarker','StateChange','FunctionalAssociation'],
                 }
-      if self.targets_have_weights:
-          kwargs.update({'nodeweight_prop': 'target weight'})
-      how2connect = self.set_how2connect(**kwargs)
-      connectionG,my_df= self.link2concept(concept,targets,my_df,how2connect)
-      linked_row_count = len(connectionG._get_nodes(my_df_uids))
-      if linked_row_count:
-        self.set_rank4(concept,my_df)
-      print(f'{linked_row_count} indications {with_effect_on_indication}ly regulate {t_n}')
-      self.nodeweight_prop = ''
+      concept2links[concept] = (targets,dict(kwargs,**target_weight),
+                                ('%d indications %sly regulate %s',(with_effect_on_indication,t_n)))
 
       #references suggesting target partners as targets for indication
       if with_partners:
@@ -1204,16 +1173,8 @@ AND NeighborOf downstream (SELECT Entity WHERE objectType = GeneticVariant)'
               'with_effects' : [with_effect_on_indication],
               'boost_by_reltypes' : ['Regulation','FunctionalAssociation']
               }
-        if self.targets_have_weights:
-          kwargs.update({'nodeweight_prop': 'regulator weight'})
-        how2connect = self.set_how2connect(**kwargs)
-        connectionG,my_df = self.link2concept(concept,with_partners,my_df,how2connect)
-        linked_row_count = len(connectionG._get_nodes(my_df_uids))
-        if linked_row_count:
-          self.set_rank4(concept,my_df)
-        print('Linked %d indications for %d %s partners' % 
-            (linked_row_count,len(with_partners),t_n))
-        self.nodeweight_prop = ''
+        concept2links[concept] = (with_partners,dict(kwargs,**regulator_weight),
+                                  ('Linked %d indications for %d %s partners',(len(with_partners),t_n)))
 
       # references reporting that cells producing the target linked to indication  
       # only used if taregts are secretred ligands
@@ -1223,49 +1184,28 @@ AND NeighborOf downstream (SELECT Entity WHERE objectType = GeneticVariant)'
               'with_effects' : [with_effect_on_indication],
               'boost_by_reltypes' : ['Regulation','FunctionalAssociation']
               }
-        if self.targets_have_weights:
-            kwargs.update({'nodeweight_prop': 'regulator weight'})
-        how2connect = self.set_how2connect(**kwargs)
-        connectionG,my_df = self.link2concept(concept,self.__targets__secretingCells,my_df,how2connect)
-        linked_row_count = len(connectionG._get_nodes(my_df_uids))
-        if linked_row_count:
-          self.set_rank4(concept,my_df)
-        print(f'Liked {linked_row_count} indications linked {len(self.__targets__secretingCells)} cells producing {t_n}')
-
+        concept2links[concept] = (self.__targets__secretingCells,dict(kwargs,**regulator_weight),
+                                  ('Linked %d indications to %d cells producing %s',(len(self.__targets__secretingCells),t_n)))
 
       # references suggesting that known drugs for the target as treatments for indication
+      # cloning session to avoid adding relations to self.Graph
       link_effect, drug_class, drug_connect_concepts = self._drug_connect_params(direct_modulators=False,
                                                                     score_antagonists=score4antagonists)
       if drug_connect_concepts:
         concept = target_in_header+' '+drug_class+' clin. trials'
-        kwargs = {'connect_by_rels':['ClinicalTrial']}
-        if self.targets_have_weights:
-            kwargs.update({'nodeweight_prop': 'regulator weight'})
-        # cloning session to avoid adding relations to self.Graph
-        new_session = self._clone(to_retrieve=REFERENCE_IDENTIFIERS)
-        how2connect = new_session.set_how2connect(**kwargs)
-        connectionG,my_df = new_session.link2concept(concept,drug_connect_concepts,my_df,how2connect)
-        linked_row_count = len(connectionG._get_nodes(my_df_uids))
-        if linked_row_count:
-          self.set_rank4(concept,my_df)
-        print(f'Linked {linked_row_count} clinical trial indications for {t_n} {drug_class}')
-        new_session.close_connection()
+        kwargs = {'connect_by_rels':['ClinicalTrial'],
+                  'clone2retrieve' : REFERENCE_IDENTIFIERS}
+        concept2links[concept] = (drug_connect_concepts,dict(kwargs,**regulator_weight),
+                                  ('Linked %d clinical trial indications for %s %s',(t_n,drug_class)))
 
         concept = target_in_header+' '+drug_class
         kwargs = {'connect_by_rels':['Regulation'],
               'with_effects' : [link_effect],
-              'boost_by_reltypes' : ['Regulation'] # boosting with unknown effect Regulation
+              'boost_by_reltypes' : ['Regulation'], # boosting with unknown effect Regulation
+              'clone2retrieve' : REFERENCE_IDENTIFIERS
               }
-        if self.targets_have_weights:
-            kwargs.update({'nodeweight_prop': 'regulator weight'})
-        new_session = self._clone(to_retrieve=REFERENCE_IDENTIFIERS)
-        how2connect = new_session.set_how2connect(**kwargs)
-        connectionG,my_df = new_session.link2concept(concept,drug_connect_concepts,my_df,how2connect)
-        linked_row_count = len(connectionG._get_nodes(my_df_uids))
-        if linked_row_count:
-          self.set_rank4(concept,my_df)
-        print('Linked %d indications for %s %s' % (linked_row_count,t_n,drug_class))
-        new_session.close_connection()
+        concept2links[concept] = (drug_connect_concepts,dict(kwargs,**regulator_weight),
+                                  ('Linked %d indications for %s %s',(t_n,drug_class)))
 
       #references reporting target agonists exacerbating indication or causing indication as adverse events
       link_effect, drug_class, concepts = self._drug_tox_params(direct_modulators=False,
@@ -1274,22 +1214,13 @@ AND NeighborOf downstream (SELECT Entity WHERE objectType = GeneticVariant)'
         concept = target_in_header+' '+drug_class
         kwargs = {'connect_by_rels':['Regulation'],
               'with_effects' : [link_effect],
-              'boost_by_reltypes' : ['Regulation'] # boosting with unknown effect Regulation
+              'boost_by_reltypes' : ['Regulation'], # boosting with unknown effect Regulation
+              'clone2retrieve' : REFERENCE_IDENTIFIERS
               }
-        if self.targets_have_weights:
-            kwargs.update({'nodeweight_prop': 'regulator weight'})
-        # cloning session to avoid adding relations to self.Graph
-        new_session = self._clone(to_retrieve=REFERENCE_IDENTIFIERS)
-        how2connect = new_session.set_how2connect(**kwargs)
-        connectionG,my_df = new_session.link2concept(concept,concepts,my_df,how2connect)
-        linked_row_count = len(connectionG._get_nodes(my_df_uids))
-        if linked_row_count:
-          max_colrank = my_df.max_colrank()
-          if not drug_connect_concepts:
-            max_colrank += 1 # advancing max_rank only if drug_connect_concepts were empty, otherwise they have the same max_rank
-          self.set_rank4(concept,my_df,max_colrank)
-        print('Linked %d indications as toxicities for %s %s' % (linked_row_count,t_n,drug_class))
-        new_session.close_connection()
+        concept2links[concept] = (concepts,dict(kwargs,**regulator_weight),
+                                  ('Linked %d indications as toxicities for %s %s',(t_n,drug_class)))
+        if drug_connect_concepts:
+          tox_concepts.add(concept)
     
       #references linking target pathways to indication
       if hasattr(self, 'PathwayComponents'):
@@ -1297,18 +1228,25 @@ AND NeighborOf downstream (SELECT Entity WHERE objectType = GeneticVariant)'
         kwargs = {'connect_by_rels':['Regulation'],
               'with_effects' : [with_effect_on_indication],
               'boost_by_reltypes' : ['Regulation'],  # boosting with unknown effect Regulation
-              'step' : 50
+              'step' : 50,
+              'clone2retrieve' : REFERENCE_IDENTIFIERS
               }
-        # cloning session to avoid adding relations to self.Graph:
-        new_session = self._clone(to_retrieve=REFERENCE_IDENTIFIERS)
-        how2connect = new_session.set_how2connect(**kwargs)
-        connectionG,my_df = new_session.link2concept(concept,list(self.PathwayComponents),my_df,how2connect)
+        concept2links[concept] = (list(self.PathwayComponents),kwargs,('Linked %d indications to %s pathway components',(t_n,)))
+
+      # indications are linked to independent concepts in parallel processes
+      max_workers = 1 if self.params.get('debug',False) else None
+      concept2kwargs = {c:(concepts,kwargs) for c,(concepts,kwargs,_) in concept2links.items()}
+      connection_graphs, my_df = self.link2concepts(concept2kwargs,in_df,max_workers)
+      my_df_uids = my_df.uids()
+      for i, (concept,connectionG) in enumerate(connection_graphs.items()):
         linked_row_count = len(connectionG._get_nodes(my_df_uids))
         if linked_row_count:
-          self.set_rank4(concept,my_df)
-        print('Linked %d indications to %s pathway components' % (linked_row_count,t_n))
-        new_session.close_connection()
- 
+          rank = my_df.max_colrank() if concept in tox_concepts else None
+          self.set_rank4(concept,my_df,rank)
+        message, message_args = concept2links[concept][2]
+        print(message % ((linked_row_count,)+message_args))
+        if i == 0:
+          self.score_GVs(my_df) # genetic variants are ranked after first column
       return my_df
 
 
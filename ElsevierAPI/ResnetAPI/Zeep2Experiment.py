@@ -4,11 +4,62 @@ from .ResnetGraph import ResnetGraph,PSObject
 from ..pandas.panda_tricks import df, pd,np
 from  .PathwayStudioZeepAPI import DataModel
 import scipy.stats as stats
+from scipy import sparse,special
 from datetime import timedelta
 
 HAS_PVALUE = 'hasPvalue'
 ENSEMBL_ID = 'Ensembl ID'
 
+def mannwhitneyu4rows(members:sparse.csr_matrix,x:np.ndarray,has_x:np.ndarray,y:np.ndarray,greater:np.ndarray):
+    '''
+    input:
+        members - sparse matrix with one row per tested set of "x" columns, e.g. regulator x target or pathway x member
+        x - column values, has_x - mask of columns with values
+        y - sample distribution
+        greater - mask of rows tested with alternative='greater'. Other rows are tested with alternative='less'
+    output:
+        pvalues of mannwhitneyu(x[row members],y) for every row of "members", nan for rows without values.\n
+        Uses tie-corrected normal approximation with continuity correction as scipy method="auto" does for inputs with ties.
+        Rows that scipy tests by exact method are tested by scipy
+    '''
+    y_sorted = np.sort(y)
+    n2 = y_sorted.size
+    x_cols = np.flatnonzero(has_x)
+    x = x[x_cols]
+    members = members[:,x_cols]
+    n1 = np.asarray(members.sum(axis=1)).ravel()
+
+    # combined midranks of x sum to sum(#y < x + #y == x/2) + n1*(n1+1)/2 therefore:
+    below = np.searchsorted(y_sorted,x,side='left')
+    ties_y = np.searchsorted(y_sorted,x,side='right') - below
+    U1 = members @ (below + 0.5*ties_y)
+
+    # tie correction for combined x and y
+    _, y_counts = np.unique(y_sorted,return_counts=True)
+    y_tie_term = float(np.sum(y_counts**3 - y_counts))
+    x_values, x_groups = np.unique(x,return_inverse=True)
+    tx = (members @ sparse.csr_matrix((np.ones(x.size),(np.arange(x.size),x_groups.ravel())),
+                                      shape=(x.size,x_values.size))).tocoo()
+    ty = np.searchsorted(y_sorted,x_values,side='right') - np.searchsorted(y_sorted,x_values,side='left')
+    ty = ty[tx.col]
+    t = ty + tx.data
+    tie_term = y_tie_term + np.bincount(tx.row,weights=(t**3 - t) - (ty**3 - ty),minlength=n1.size)
+
+    n = n1 + n2
+    mu = n1*n2/2
+    U = np.where(greater,U1,n1*n2 - U1)
+    with np.errstate(divide='ignore',invalid='ignore'):
+        s = np.sqrt(n1*n2/12*((n + 1) - tie_term/(n*(n - 1))))
+        pvalues = np.clip(special.ndtr(-(U - mu - 0.5)/s),0.0,1.0)
+    pvalues[n1 == 0] = np.nan
+
+    for row in np.flatnonzero((n1 > 0) & ((n1 <= 8) | (n2 <= 8)) & (tie_term == 0)):
+        row_x = x[members[row].indices]
+        alternative = 'greater' if greater[row] else 'less'
+        pvalues[row] = stats.mannwhitneyu(x=row_x,y=y_sorted,alternative=alternative)[1]
+    return pvalues
+
+
 class Sample(PSObject):
 
     def __init__(self,dic=dict()):
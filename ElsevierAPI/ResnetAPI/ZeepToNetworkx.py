@@ -3,6 +3,7 @@ from  .PathwayStudioGOQL import OQL
 from  .PathwayStudioZeepAPI import DataModel
 from  .NetworkxObjects import PSObject,PSRelation,len,REGULATORS,TARGETS,EFFECT
 from  .ResnetGraph import ResnetGraph,REFCOUNT
+from  .EntityCache import EntityCache
 from ..utils import execution_time
 import math, time
 
@@ -24,6 +25,7 @@ class PSNetworx(DataModel):
         super().__init__(*args,**my_kwargs)
         self.dbid2relation = dict()  # {relID:{node_id1,node_id2,PSRelation}} needs to be - Resnet relations may not be binary
         self.Graph = ResnetGraph()
+        self.entity_cache = EntityCache(self._fetch_entities) # {dbid:PSObject} shared by all result pages
 
 
     @staticmethod
@@ -55,6 +57,20 @@ class PSNetworx(DataModel):
         return dbid2entity
 
 
+    def _fetch_entities(self,obj_ids:list[int],entity_props:list[str])->dict[int,PSObject]:
+        return self._zeep2psobj(self.get_object_properties(obj_ids,entity_props))
+
+
+    def _entities4(self,zeep_relations,entity_props:list[str])->dict[int,PSObject]:
+        '''
+        Returns
+        -------
+        {db_id:PSObject} for entities linked to "zeep_relations" retrieved via self.entity_cache
+        '''
+        obj_ids = list(set([x['EntityId'] for x in zeep_relations.Links.Link]))
+        return self.entity_cache.get(obj_ids,list(entity_props))
+
+
     def __psrel2dict(self,rels:dict[int,PSRelation]):
         '''
         Input
@@ -69,9 +85,14 @@ class PSNetworx(DataModel):
             
         
     def _load_graph(self, zeep_relations, zeep_objects, add2self=True, merge_data=False):
+        '''
+        Input
+        -----
+        zeep_objects - zeep entities or {db_id:PSObject} made by self._entities4()
+        '''
         new_graph = ResnetGraph()
         # loading entities and their properties
-        id2psobj = self._zeep2psobj(zeep_objects)
+        id2psobj = zeep_objects if isinstance(zeep_objects,dict) else self._zeep2psobj(zeep_objects)
         new_graph.add_nodes_from([(n.uid(),n.items()) for n in id2psobj.values()])
 
         new_relations = dict()
@@ -144,8 +165,7 @@ class PSNetworx(DataModel):
         if get_links:
             zeep_relations = self.get_data(oql_query, list(relation_props), getLinks=True)
             if type(zeep_relations) != type(None):
-                obj_id_list = list(set([x['EntityId'] for x in zeep_relations.Links.Link]))
-                zeep_objects = self.get_object_properties(obj_id_list, list(entity_props))
+                zeep_objects = self._entities4(zeep_relations, entity_props)
                 return self._load_graph(zeep_relations,zeep_objects,add2self)
             else: return ResnetGraph()
         else:
@@ -166,8 +186,7 @@ class PSNetworx(DataModel):
         oql_query = OQL.drugs4(for_targets_with_ids)
         zeep_relations = self.get_data(oql_query, REL_PROPS)
         if type(zeep_relations) != type(None):
-            obj_ids = list(set([x['EntityId'] for x in zeep_relations.Links.Link]))
-            zeep_objects = self.get_object_properties(obj_ids, ENTITY_PROPS)
+            zeep_objects = self._entities4(zeep_relations, ENTITY_PROPS)
             new_ps_relations = self._load_graph(zeep_relations, zeep_objects)
             return new_ps_relations
         else:
@@ -178,8 +197,7 @@ class PSNetworx(DataModel):
         oql_query = OQL.get_reaxys_substances(ForTargetsIDlist)
         zeep_relations = self.get_data(oql_query, REL_PROPS)
         if type(zeep_relations) != type(None):
-            obj_ids = list(set([x['EntityId'] for x in zeep_relations.Links.Link]))
-            zeep_objects = self.get_object_properties(obj_ids, ENTITY_PROPS)
+            zeep_objects = self._entities4(zeep_relations, ENTITY_PROPS)
             return self._load_graph(zeep_relations, zeep_objects)
         else:
             return ResnetGraph()
@@ -200,8 +218,7 @@ class PSNetworx(DataModel):
         zeep_relations = self.get_data(oql_query, list(rel_props))
         
         if type(zeep_relations) != type(None):
-            obj_ids = list(set([x['EntityId'] for x in zeep_relations.Links.Link]))
-            zeep_objects = self.get_object_properties(obj_ids, list(ent_props))
+            zeep_objects = self._entities4(zeep_relations, ent_props)
             return self._load_graph(zeep_relations, zeep_objects)
         else:
             return ResnetGraph()
@@ -1,9 +1,11 @@
 from ..utils import load_api_config, greek2english,urlencode,json,multithread,execution_time
 from ..ETM_API.references import Reference,DocMine, Author
+from ..transport import transport
+from ..bulksearch import BulkSearch,bulk_search
+from ..ETM_API.TMcache import tm_cache
 from ..ETM_API.references import AUTHORS,_AUTHORS_,GRANT_APPLICATION,JOURNAL,SENTENCE,RELEVANCE
 from scibite_toolkit.scibite_search import SBSRequestBuilder as s
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import re,threading,requests
+import re,threading
 from time import sleep, time
 from datetime import datetime
 
@@ -16,7 +18,12 @@ DATASET2IDTYPE = {'Medline':'PMID',
 
 BM25SCORE = 'BM25score'
 MAX_SBS_SESSIONS = 3
+MAX_SBS_SEARCHES = 8 # concurrent queries run by sentcooc4list and abscooc4list
 SBS_ID = 'sbs_id'
+# services in TMcache
+SBS_SENTENCES = 'SBS sentences'
+SBS_DOCUMENT = 'SBS document'
+SBS_ABSTRACTS = 'SBS abstracts'
 
 
 class SBSRef(DocMine):
@@ -236,22 +243,34 @@ class SBSRef(DocMine):
 
 ####################### SBSapi ############# SBSapi ###################### SBSapi ##############
 class SBSapi():
-  def __init__(self,api_config:dict=dict()):
+  def __init__(self,api_config:dict=dict(),**kwargs):
+    '''
+    kwargs:
+      tm_cache, tm_cache_ttl, tm_cache_size - see TMcache.tm_cache()
+    '''
     self.APIconfig = api_config.copy() if api_config else load_api_config()
     self.term2id = dict() #contains dictionary of search terms to ontology IDs
     self.refCache = dict() # {ref_key:SBSRef}
+    self.cache_lock = threading.RLock() # guards self.refCache shared with clones
     self.timestamp = datetime.now()
     self.SBSsearch = self.__get_token()
     self.multithread = True
+    self.tm_cache = tm_cache(**kwargs)
     
 
   def clone(self):
     new_session = SBSapi(self.APIconfig)
     new_session.term2id = self.term2id
     new_session.refCache = self.refCache
+    new_session.cache_lock = self.cache_lock
+    new_session.tm_cache = self.tm_cache
     return new_session
 
 
+  def _max_searches(self):
+    return MAX_SBS_SEARCHES if self.multithread else 1
+
+
   def __get_token(self):  # This is actually regenerating a new builder request object.
     sbs = s()
     sbs.set_url(self.APIconfig['SBSurl'])
@@ -269,9 +288,9 @@ class SBSapi():
 
   def __get_entities(self,search_term:str, in_vocab:str)->dict:
     options = {"limit": 1,"suggestPrefix":search_term,"includeVocabularies":[in_vocab]}
-    req = requests.get(self.SBSsearch.url + "/api/search/v1/entities", 
-                      params=options, headers=self.SBSsearch.headers,
-                      verify=self.SBSsearch.verify_request)
+    req = transport().get(self.SBSsearch.url + "/api/search/v1/entities", 
+                         params=options, headers=self.SBSsearch.headers,
+                         verify=self.SBSsearch.verify_request)
     try:
       return req.json()
     except json.JSONDecodeError as e:
@@ -340,7 +359,7 @@ class SBSapi():
     output:
       equivalent to fetched_refs [SBSRef] from self.refCache with updated bibliography and all sentences
     '''
-    with threading.Lock(): # to prevent lock during multithreading
+    with self.cache_lock:
       cache_equivalent_refs = set()
       new_refs = []
       for ref in fetched_refs:
@@ -354,17 +373,18 @@ class SBSapi():
           cache_equivalent_refs.add(ref)
           new_refs.append(ref)
 
-      if from_sent:
-        self.sents2docs(new_refs)
-      
-      return list(cache_equivalent_refs)
+    # bibliography is loaded outside of lock to let concurrent searches merge their references
+    if from_sent:
+      self.sents2docs(new_refs)
+    
+    return list(cache_equivalent_refs)
   
 
   def bm25_Relevance(self):
     '''
     adjusts ref[RELEVANCE] in self.refCache by ref.number_of_sentences()
     '''
-    with threading.Lock():
+    with self.cache_lock:
       for ref in self.refCache.values():
         ref[RELEVANCE] = [ref.relevance(BM25SCORE)*(1.0+ref.number_of_sentences()/2.0)]
 
@@ -425,15 +445,22 @@ class SBSapi():
     '''
     assert (not sent_ref.has_bibliography())
     senref_sbsid = sent_ref.sbsid()
-    doc = self.SBSsearch.get_document(senref_sbsid,markup=False)
-    if 'data' in doc:
-      ref = SBSRef.from_doc(doc['data'])
-      sent_ref._merge(ref)
-      assert(self.refCache[sent_ref.key()].has_bibliography())
-      return sent_ref if ref.is_valid() else None
+    params = {'markup':False}
+    cached = self.tm_cache.get(SBS_DOCUMENT,senref_sbsid,params,SBSRef) if self.tm_cache is not None else None
+    if cached is not None:
+      ref = cached[1][0]
     else:
-      print(f'Invalid document: {str(self.APIconfig['SBSurl']).rstrip('/')+'/documents/'+senref_sbsid}\n')
-      return None
+      doc = self.SBSsearch.get_document(senref_sbsid,**params)
+      if 'data' not in doc:
+        print(f'Invalid document: {str(self.APIconfig['SBSurl']).rstrip('/')+'/documents/'+senref_sbsid}\n')
+        return None
+      ref = SBSRef.from_doc(doc['data'])
+      if self.tm_cache is not None:
+        self.tm_cache.put(SBS_DOCUMENT,senref_sbsid,params,1,[ref])
+
+    sent_ref._merge(ref)
+    assert(self.refCache[sent_ref.key()].has_bibliography())
+    return sent_ref if ref.is_valid() else None
 
 
   def sents2docs(self,sent_refs:list[SBSRef]):
@@ -456,8 +483,8 @@ class SBSapi():
     '''
     options = dict(kwargs)
     options["queries"] = query
-    req = requests.get(self.SBSsearch.url + "/api/search/v1/sentences/", params=options, 
-                        headers=self.SBSsearch.headers, verify=self.SBSsearch.verify_request)
+    req = transport().get(self.SBSsearch.url + "/api/search/v1/sentences/", params=options, 
+                          headers=self.SBSsearch.headers, verify=self.SBSsearch.verify_request)
     try:
       return req.json()
     except json.JSONDecodeError as e:
@@ -474,6 +501,38 @@ class SBSapi():
         return dict()
 
 
+  def __probe_limit(self,query:str,json_response:dict,hit_count=0,**kwargs)->dict:
+    '''
+    SBS returns error instead of data when page "limit" exceeds number of available sentences
+    input:
+      json_response - error response for kwargs['limit']
+      hit_count - number of sentences reported by previous page. Usually close to the real number
+    output:
+      json_response for the largest page limit returning data found by bisection 
+      or error response if no limit returns data
+    '''
+    my_kwargs = dict(kwargs)
+    limit = my_kwargs['limit']
+    if hit_count:
+      leftover = hit_count-my_kwargs['offset']
+      if 0 < leftover < limit:
+        my_kwargs['limit'] = leftover
+        response = self.__get_sentences2__(query,**my_kwargs)
+        if 'data' in response: return response
+        limit = leftover
+
+    low, high = 1, limit-1 # limit is known to return error
+    while low <= high:
+      my_kwargs['limit'] = (low+high)//2
+      response = self.__get_sentences2__(query,**my_kwargs)
+      if 'data' in response:
+        json_response = response
+        low = my_kwargs['limit']+1
+      else:
+        high = my_kwargs['limit']-1
+    return json_response
+
+
   def _try2getsents(self,query:str,**kwargs)->tuple[int,list[SBSRef]]:
     '''
     output:
@@ -488,39 +547,16 @@ class SBSapi():
     
     my_kwargs.update(kwargs)
     hit_count = my_kwargs.pop('hit_count',0)
+    if self.tm_cache is not None:
+      cached = self.tm_cache.get(SBS_SENTENCES,query,my_kwargs,SBSRef)
+      if cached is not None:
+        return cached[0], cached[1]
+
     for attempt in range(1,11):
       try:
         json_response = self.__get_sentences2__(query,**my_kwargs)
         if 'data' not in json_response: # bug in SBS
-          limit = my_kwargs['limit']
-          if hit_count: # case when hit count is known but is incorrect
-            leftover = hit_count-my_kwargs['offset']
-            if leftover < limit:
-              limit = leftover
-            while 'error' in json_response: #usually the real hit count is close to incorrect hit count
-              limit -= 1
-              if limit <= 0: break
-              my_kwargs['limit'] = limit
-              json_response = self.__get_sentences2__(query,**my_kwargs)
-              
-          while 'error' in json_response: # case when hit count is not known
-            limit -= 10
-            if limit <= 0: break
-            my_kwargs['limit'] = limit
-            json_response = self.__get_sentences2__(query,**my_kwargs)
-            
-          while 'error' not in json_response:
-            limit += 5
-            if limit > 100: break
-            my_kwargs['limit'] = limit
-            json_response = self.__get_sentences2__(query,**my_kwargs)
-
-          limit -= 5
-          while 'error' in json_response:
-            limit -= 1
-            if limit <= 0: break
-            my_kwargs['limit'] = limit
-            json_response = self.__get_sentences2__(query,**my_kwargs)
+          json_response = self.__probe_limit(query,json_response,hit_count,**my_kwargs)
             
         if 'data' in json_response:
           data = json_response['data']
@@ -533,9 +569,11 @@ class SBSapi():
                 sent_refs[-1]._merge(new_ref)
               else:
                 sent_refs.append(new_ref)
-            return sentence_count, sent_refs
           else:
-            return 0,[]
+            sentence_count, sent_refs = 0, []
+          if self.tm_cache is not None:
+            self.tm_cache.put(SBS_SENTENCES,query,my_kwargs,sentence_count,sent_refs)
+          return sentence_count, sent_refs
         else:
           return 0,[]
       except Exception as ex:
@@ -561,23 +599,18 @@ class SBSapi():
       return 0,[]
 
 
-  def __sentcooc4list(self,entities:list[str], and_concepts:list[str]|set[str],
-                add2query:list[str]=[])->dict[str,tuple[str,int,list[SBSRef]]]:
+  def entities2queries(self,entities:list[str], and_concepts:list[str]|set[str],
+                       add2query:list[str]=[])->dict[str,tuple[str,str]]:
     '''
     input:
       quoted entities are searched as is without ontology synonym expansion
     output:
-      references for each search "entity and_concepts" as {entity:(sentence_count,[SBSRef])}
+      {entity:(query,search_url)}. Ontology IDs of entities are retrieved concurrently
     '''
-    results = dict()
-    for entity in entities:
-      query,search_url = self.join2query(entity,and_concepts,add2query)
-      if entity == entities[0]:
-        print(f'Will find sentence co-occurence for {len(entities)} entities')
-        print(f'Sample query for sentence co-occurence: {query}\n')
-      sentence_count,refs = self.search_sents(query)
-      results[entity] = (search_url,sentence_count,refs)
-    return results
+    my_concepts = list(and_concepts)
+    self.__map2terms(my_concepts+add2query) # caches concept IDs in self.term2id before concurrent lookups
+    join = lambda entity: self.join2query(entity,my_concepts,add2query)
+    return bulk_search(join,entities,self._max_searches(),'SBS query')
   
 
   def sentcooc4list(self,entities:list[str], link2concepts:list[str]|set[str],
@@ -588,23 +621,20 @@ class SBSapi():
       {entity:(search_url,sentence_count,[SBSRef])}, where RELEVANCE is adjusted by number of sentences in every SBSRef
     '''
     start = time()
+    entity2query = self.entities2queries(entities,link2concepts,add2query)
+    if entity2query:
+      print(f'Will find sentence co-occurence for {len(entity2query)} entities')
+      print(f'Sample query for sentence co-occurence: {next(iter(entity2query.values()))[0]}\n')
+
+    # entities with identical queries share one search
     entity2rfks = dict()
-    if self.multithread:
-      chunk_size = int(len(entities)/MAX_SBS_SESSIONS)
-      with ThreadPoolExecutor(max_workers=MAX_SBS_SESSIONS, thread_name_prefix='SBS') as e:
-        futures = list()
-        new_session = self.clone()
-        for chunk in range(0,len(entities),chunk_size):
-          fut_entities = entities[chunk:chunk+chunk_size]
-          future = e.submit(new_session.__sentcooc4list,fut_entities,link2concepts,add2query)
-          futures.append(future)
-        
-        for f in as_completed(futures):
-          results = f.result()
-          entity2rfks.update(results)
-        e.shutdown()
-    else:
-      entity2rfks = self.__sentcooc4list(entities,link2concepts,add2query)
+    def add_result(entity:str,results:list):
+      search_url = entity2query[entity][1]
+      entity2rfks[entity] = (search_url,*results[0]) if results[0] is not None else (search_url,0,[])
+    
+    row2queries = {entity:[query] for entity,(query,_) in entity2query.items()}
+    searched = BulkSearch(self.search_sents,self._max_searches(),'SBS').run(row2queries,add_result)
+    print(f'{searched} unique SBS queries for {len(entity2query)} entities')
 
     self.bm25_Relevance()
 
@@ -633,8 +663,8 @@ class SBSapi():
     '''
     options = dict(kwargs)
     options["queries"] = query
-    req = requests.get(self.SBSsearch.url + "/api/search/v1/documents", params=options,
-                       headers=self.SBSsearch.headers, verify=self.SBSsearch.verify_request)
+    req = transport().get(self.SBSsearch.url + "/api/search/v1/documents", params=options,
+                          headers=self.SBSsearch.headers, verify=self.SBSsearch.verify_request)
     try:
       return req.json()
     except json.JSONDecodeError as e:
@@ -695,81 +725,68 @@ class SBSapi():
     return sorted_refs
 
 
-  def __abscooc4list(self,entities:list[str],concepts:list[str])->dict[str,tuple[int,float]]:
+  def __abscooc(self,query:str)->tuple[int,float]|None:
     '''
-    input:
-      quoted entities are searched as is without ontology synonym expansion
     output:
-      references found by search "entity1 AND entity2" deduplicated by titles and are added to self.refCache
-      ref_ids = {id_type:[identifiers]}, where len(ref_ids) == ETMsearch.params['limit']   
+      number of Medline abstracts found by "query" and sum of their relevance scores or None if query failed
     '''
+    if self.tm_cache is not None:
+      cached = self.tm_cache.get(SBS_ABSTRACTS,query,dict())
+      if cached is not None:
+        return cached[0], cached[2]['relevance']
+
     self.token_refresh()
-    entity2abscount = dict()
-    number_of_entities = len(entities)
-    #abs_query = 'dataset = "medline" AND field = "abstract" AND content ~ ({q})'
-    abs_query = 'dataset = "medline" AND abstract ~ ({q})'
-    for entity in entities:
-      jq,_ = self.join2query(entity,concepts)
-      if jq:
-        limit = 100
-        query = abs_query.format(q=jq)
-        if entity == entities[0]:
-          print(f'\nWill find abstract coocurence for {number_of_entities} entities')
-          print(f'Sample query for abstract co-ocurence: {query}\n')
-        kwargs = {'markup':False,
-                 'limit':limit,
-                 'offset':0,
-                 'maxSnippets':0,
-                 'fields':[]}
-        abstract_count = 0
-        abstract_relevance = 0.0
-        json_response = self.get_docs2(query,**kwargs)
-        if json_response and 'data' in json_response:
-          data = json_response['data']
-          if data:
-            hit_count = int(json_response['pagination']['totalItems'])
-            abstract_count = hit_count
-            abstract_relevance = sum([a['_score'] for a in data])
-          
-            for offset in range(limit,hit_count,limit):
-              kwargs['offset'] = offset
-              json_response = self.get_docs2(query,**kwargs)
-              if json_response and 'data' in json_response :
-                abstract_relevance += sum([a['_score'] for a in json_response['data']])
-        else:
-          print(f'No abstract co-occurence for query {query}')
-          continue
+    limit = 100
+    kwargs = {'markup':False,
+              'limit':limit,
+              'offset':0,
+              'maxSnippets':0,
+              'fields':[]}
+    json_response = self.get_docs2(query,**kwargs)
+    if not json_response or 'data' not in json_response:
+      print(f'No abstract co-occurence for query {query}')
+      return None
 
-      entity2abscount[entity]=(abstract_count,abstract_relevance)
-    return entity2abscount
+    data = json_response['data']
+    abstract_count = int(json_response['pagination']['totalItems']) if data else 0
+    abstract_relevance = sum([a['_score'] for a in data],0.0)
+    for offset in range(limit,abstract_count,limit):
+      kwargs['offset'] = offset
+      json_response = self.get_docs2(query,**kwargs)
+      if json_response and 'data' in json_response :
+        abstract_relevance += sum([a['_score'] for a in json_response['data']])
+    
+    if self.tm_cache is not None:
+      self.tm_cache.put(SBS_ABSTRACTS,query,dict(),abstract_count,values={'relevance':abstract_relevance})
+    return abstract_count, abstract_relevance
   
 
   def abscooc4list(self,entities:list[str],link2concepts:list[str]|set[str],)->dict[str,tuple[int,float]]:
     '''
     Entry function for RefStat.add_abs_cooc\n
+    input:
+      quoted entities are searched as is without ontology synonym expansion
+    output:
+      {entity:(abstract_count,abstract_relevance)} for entities with successful search
     '''
     start = time()
+    #abs_query = 'dataset = "medline" AND field = "abstract" AND content ~ ({q})'
+    abs_query = 'dataset = "medline" AND abstract ~ ({q})'
+    entity2query = self.entities2queries(entities,link2concepts)
+    row2queries = {entity:[abs_query.format(q=query)] for entity,(query,_) in entity2query.items()}
+    if row2queries:
+      print(f'\nWill find abstract coocurence for {len(row2queries)} entities')
+      print(f'Sample query for abstract co-ocurence: {next(iter(row2queries.values()))[0]}\n')
+
     entity2stat = dict()
-    if self.multithread:
-      chunk_size = int(len(entities)/MAX_SBS_SESSIONS)
-      with ThreadPoolExecutor(max_workers=MAX_SBS_SESSIONS, thread_name_prefix='SBS') as e:
-        futures = list()
-        new_session = self.clone()
-        for chunk in range(0,len(entities),chunk_size):
-          fut_entities = entities[chunk:chunk+chunk_size]
-          future = e.submit(new_session.__abscooc4list,fut_entities,link2concepts)
-          futures.append(future)
-        
-        for f in as_completed(futures):
-          results = f.result()
-          entity2stat.update(results)
-    else:
-      entity2stat = self.__abscooc4list(entities,link2concepts)
+    def add_result(entity:str,results:list):
+      if results[0] is not None:
+        entity2stat[entity] = results[0]
+    BulkSearch(self.__abscooc,self._max_searches(),'SBS abstracts').run(row2queries,add_result)
 
     print(f'Abstract co-occurence for {len(entities)} entities finished in {execution_time(start)}')
     return entity2stat
 
-
 if __name__ == "__main__":
     s = SBSapi()
     #response_getdocs = s._try2getdocs(query='abstract ~ INDICATION$D008175 AND DRUG$*',limit=100,markup=True)
@@ -0,0 +1,148 @@
+import os,json,time,threading
+from ..sqlitestore import connect,SharedStores
+
+SCOPUS_STORE_DIR = os.path.join(os.getcwd(),'ENTELLECT_API/ElsevierAPI/ScopusAPI/__scpcache__/')
+SCOPUS_STORE = os.path.join(SCOPUS_STORE_DIR,'scopus_store.sqlite')
+CITATIONS_MAX_AGE = 30*24*3600 # seconds. Older citation counts are retrieved again
+SQL_CHUNK = 500 # max number of parameters in one "IN" clause
+
+
+def normalize_issn(issn:str)->str:
+    return str(issn).replace('-','').strip().upper()
+
+
+def normalize_id(id_type:str,identifier:str)->str:
+    return str(identifier).strip().lower() if id_type == 'DOI' else str(identifier).strip()
+
+
+class ScopusStore:
+    '''
+    SQLite store of Scopus journal metrics, canonical affiliation names and citation counts.\n
+    Journals are indexed by normalized ISSN, citation counts by (id_type,identifier).
+    Records are committed as soon as they are added, therefore records retrieved before a crash are kept
+    '''
+    def __init__(self,path2db:str=SCOPUS_STORE,journal_json='',affiliation_json=''):
+        '''
+        input:
+            journal_json, affiliation_json - JSON caches made by previous versions of Scopus class.
+            They are imported into empty store
+        '''
+        self.path = path2db
+        self.lock = threading.Lock()
+        self.db = connect(path2db)
+        self.db.execute('CREATE TABLE IF NOT EXISTS journals (issn TEXT PRIMARY KEY, record TEXT NOT NULL, updated REAL NOT NULL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS affiliations (name TEXT PRIMARY KEY, canonical TEXT NOT NULL)')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS citations (id_type TEXT NOT NULL, identifier TEXT NOT NULL,
+                        cited_by INTEGER, updated REAL NOT NULL, PRIMARY KEY (id_type,identifier))''')
+        self.__import_json(journal_json,affiliation_json)
+
+
+    def __import_json(self,journal_json:str,affiliation_json:str):
+        if journal_json and os.path.exists(journal_json) and not self.__count('journals'):
+            with open(journal_json,'r',encoding='utf-8') as f:
+                self.add_journals(json.load(f))
+        if affiliation_json and os.path.exists(affiliation_json) and not self.__count('affiliations'):
+            with open(affiliation_json,'r',encoding='utf-8') as f:
+                self.add_affiliations(json.load(f))
+
+
+    def __count(self,table:str)->int:
+        with self.lock:
+            return self.db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+    def __executemany(self,sql:str,rows:list):
+        if not rows: return
+        with self.lock:
+            self.db.execute('BEGIN')
+            try:
+                self.db.executemany(sql,rows)
+                self.db.execute('COMMIT')
+            except Exception:
+                self.db.execute('ROLLBACK')
+                raise
+
+
+    def __select_in(self,sql:str,values:list,*params)->list[tuple]:
+        '''
+        input:
+            sql - SELECT statement with {marks} placeholder for "IN" clause
+        '''
+        rows = list()
+        with self.lock:
+            for i in range(0,len(values),SQL_CHUNK):
+                chunk = values[i:i+SQL_CHUNK]
+                marks = ','.join('?'*len(chunk))
+                rows += self.db.execute(sql.format(marks=marks),(*params,*chunk)).fetchall()
+        return rows
+
+
+    def journals(self,issns:list[str]=[])->dict[str,list]:
+        '''
+        output:
+            {normalized issn:[journal_title,publisher,CiteScore,SJRscore,SNIPscore]} for "issns" found in store.
+            Returns all journals if "issns" is empty
+        '''
+        if issns:
+            rows = self.__select_in('SELECT issn, record FROM journals WHERE issn IN ({marks})',list({normalize_issn(i) for i in issns}))
+        else:
+            with self.lock:
+                rows = self.db.execute('SELECT issn, record FROM journals').fetchall()
+        return {issn:json.loads(record) for issn,record in rows}
+
+
+    def add_journals(self,issn2record:dict[str,list]):
+        now = time.time()
+        rows = [(normalize_issn(issn),json.dumps(record),now) for issn,record in issn2record.items()]
+        self.__executemany('INSERT OR REPLACE INTO journals VALUES (?,?,?)',rows)
+
+
+    def affiliation(self,name:str)->str|None:
+        with self.lock:
+            row = self.db.execute('SELECT canonical FROM affiliations WHERE name = ?',(name,)).fetchone()
+        return row[0] if row else None
+
+
+    def add_affiliations(self,name2canonical:dict[str,str]):
+        self.__executemany('INSERT OR REPLACE INTO affiliations VALUES (?,?)',list(name2canonical.items()))
+
+
+    def citations(self,id_type:str,identifiers:list[str],max_age=CITATIONS_MAX_AGE)->dict[str,int|None]:
+        '''
+        output:
+            {normalized identifier:cited_by} for "identifiers" retrieved less than "max_age" seconds ago.\n
+            cited_by is None for identifiers not found in Scopus
+        '''
+        ids = list({normalize_id(id_type,i) for i in identifiers})
+        sql = 'SELECT identifier, cited_by FROM citations WHERE id_type = ? AND updated > ? AND identifier IN ({marks})'
+        min_updated = time.time()-max_age if max_age else 0.0
+        return dict(self.__select_in(sql,ids,id_type,min_updated))
+
+
+    def add_citations(self,id_type:str,id2cited_by:dict[str,int|None]):
+        '''
+        input:
+            id2cited_by - {identifier:cited_by}, where cited_by is None for identifiers not found in Scopus
+        '''
+        now = time.time()
+        rows = [(id_type,normalize_id(id_type,i),c,now) for i,c in id2cited_by.items()]
+        self.__executemany('INSERT OR REPLACE INTO citations VALUES (?,?,?,?)',rows)
+
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+__scopus_stores__ = SharedStores()
+
+def scopus_store(path2db:str=SCOPUS_STORE)->ScopusStore:
+    '''
+    output:
+        ScopusStore shared by all Scopus clients in the process.
+        JSON caches JournalInfo.json and AffiliationInfo.json from SCOPUS_STORE_DIR are imported into new store
+    '''
+    def new_store(path:str):
+        store_dir = os.path.dirname(path)
+        return ScopusStore(path,os.path.join(store_dir,'JournalInfo.json'),os.path.join(store_dir,'AffiliationInfo.json'))
+    return __scopus_stores__.get(path2db,new_store)
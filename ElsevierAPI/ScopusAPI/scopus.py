@@ -1,9 +1,11 @@
-import urllib.request,urllib.parse,json,os
+import urllib.parse,json,os
 from xml.etree.ElementTree import fromstring
-from time import sleep
+from collections import defaultdict
+from ..transport import transport
+from ..bulksearch import BulkSearch
+from .ScopusStore import scopus_store,normalize_issn,normalize_id,CITATIONS_MAX_AGE
 from ..ETM_API.references import Reference, Author, DocMine
 from ..ETM_API.references import SCOPUS_CI,ARTICLE_ID_TYPES,INSTITUTIONS,AUTHORS,PUBLISHER,_AUTHORS_
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from titlecase import titlecase
 
 
@@ -16,35 +18,23 @@ SCOPUS_AUTHORIDS = 'scopusAuthors'
 SCOPUS_CITESCORE = 'CiteScore'
 SCOPUS_SJR = 'Scientific Journal Rankings'
 SCOPUS_SNIP = 'Source Normalized Impact per Paper'
+MAX_SCOPUS_REQUESTS = 8 # concurrent requests of batched lookups. Request rate is limited by shared transport
+JOURNAL_BATCH = 25 # ISSNs per Serial Title API request
+CITATION_BATCH = 100 # identifiers per Scopus Search API query
+SEARCH_PAGE_SIZE = 200 # max "count" of Scopus Search API with STANDARD view
+SCOPUS_ID_FIELDS = {'PMID':'PMID','DOI':'DOI','EID':'EID'} # {id_type:Scopus search field}
 
 
 class Scopus:
     base_url = 'https://api.elsevier.com/content/'
     page_size = 25
 
-    @staticmethod
-    def __journal_cache_name():
-        return SCOPUS_CACHE_DIR+'JournalInfo.json'
-    
-    @staticmethod
-    def __aff_cache_name():
-        return SCOPUS_CACHE_DIR+'AffiliationInfo.json'
-    
-    
     def __init__(self,APIconfig:dict,add_param=dict()):
         self.params = {'apiKey':APIconfig['ELSapikey'], 'insttoken':APIconfig['insttoken'],'httpAccept':'application/json'}
         self.params.update(add_param)
-        try:
-            self.JournalInfo = json.load(open(self.__journal_cache_name(),'r',encoding='utf-8'))
-        except FileNotFoundError:
-            self.JournalInfo = dict()
-
-        try:
-            self.AffiliationInfo = json.load(open(self.__aff_cache_name(),'r',encoding='utf-8'))
-        except FileNotFoundError:
-            self.AffiliationInfo = dict()
-
-        os.makedirs(SCOPUS_CACHE_DIR, exist_ok=True)
+        # journal metrics, affiliations and citation counts shared by all Scopus clients.
+        # JournalInfo.json and AffiliationInfo.json from SCOPUS_CACHE_DIR are imported into new store
+        self.store = scopus_store(os.path.join(SCOPUS_CACHE_DIR,'scopus_store.sqlite'))
         
 
     def _get_param_str(self):
@@ -55,42 +45,46 @@ class Scopus:
         return self.base_url+self._get_param_str()
 
 
-    def _get_results(self,sleep_time = 0.3):
-        for attempt in range(0,1):
-            try:
-                url_reg = self._url_request()
-                response = urllib.request.urlopen(url_reg)
-                scopus_view = response.read().decode('utf-8')
-                result = json.loads(scopus_view)
-                sleep(sleep_time)
-                return result
-            except Exception:
-                sleep(sleep_time)
-    
-        return dict()
-    
+    def _get_results(self):
+        '''
+        Scopus request rate is limited by shared transport
+        '''
+        try:
+            response = transport().get(self._url_request())
+            response.raise_for_status()
+            return response.json()
+        except Exception:
+            return dict()
 
-    def close(self):
-        def write_journal_info():
-            with open(self.__journal_cache_name(), 'w',encoding='utf-8') as f:
-                json.dump(self.JournalInfo,f,indent=1)
 
-        def write_instituion_info():
-            with open(self.__aff_cache_name(), 'w',encoding='utf-8') as f1:
-                json.dump(self.AffiliationInfo,f1,indent=1)        
+    def _request(self,url:str,**params)->dict:
+        '''
+        thread-safe version of _get_results(): self.params and self.base_url are not changed
+        output:
+            JSON response from "url" requested with self.params updated by "params" or empty dict if request failed
+        '''
+        try:
+            response = transport().get(url,params={**self.params,**params})
+            response.raise_for_status()
+            return response.json()
+        except Exception:
+            return dict()
+    
 
-        with ThreadPoolExecutor(2, thread_name_prefix='CloseScopusCache') as e:
-                e.submit(write_journal_info)
-                e.submit(write_instituion_info)
-        e.shutdown()
+    def close(self):
+        '''
+        records in self.store are committed when they are added, therefore nothing is written at closing
+        '''
+        return
 
 
     @staticmethod
     def oa_status(doi:str):
         url = 'https://api.elsevier.com/content/abstract/doi/'+doi
         try:
-            result = urllib.request.urlopen(url).read().decode('utf-8')
-            record = fromstring(result)
+            response = transport().get(url)
+            response.raise_for_status()
+            record = fromstring(response.content)
             ns = {
                 "abstract": "http://www.elsevier.com/xml/svapi/abstract/dtd"
             }
@@ -105,39 +99,109 @@ class Scopus:
         return Scopus.oa_status(doi) if doi else True
     
 
+    @staticmethod
+    def __journal_record(entry:dict)->list:
+        '''
+        output:
+            [journal_title,publisher,CiteScore,SJRscore,SNIPscore] from Serial Title API "entry"
+        '''
+        assert( isinstance(entry,dict))
+        j_title = entry['dc:title']
+        publisher = str(entry['dc:publisher'])
+        CiteScore = entry.get('citeScoreYearInfoList',{}).get('citeScoreCurrentMetric','')
+        if isinstance(CiteScore,str):
+            CiteScore = float(CiteScore) if CiteScore else 0.0
+        SJRscore = entry.get('SJRList',{}).get('SJR',[])
+        if SJRscore:
+            SJRscore = SJRscore[0]
+            SJRscore = SJRscore['$'] + ' ('+SJRscore['@year']+')'
+        SNIPscore = entry.get('SNIPList',{}).get('SNIP',[])
+        if SNIPscore:
+            SNIPscore = SNIPscore[0]
+            SNIPscore = SNIPscore['$'] + ' ('+SNIPscore['@year']+')'
+        return [j_title,publisher,CiteScore,SJRscore,SNIPscore]
+
+
     def __journal_info(self,issn:str,j_title=''):
-        try:
-            return self.JournalInfo[issn]
-        except KeyError:
-            self.base_url = SCOPUS_API_BASEURL+'serial/title/issn/'+issn+'?'
-            self.params.update({'view':'CITESCORE'})
-            #result_str = urllib.request.urlopen(url).read().decode('utf-8')
-            #result = json.loads(result_str)
-            result = self._get_results()
+        record = self.store.journals([issn]).get(normalize_issn(issn))
+        if record is None:
+            result = self._request(SCOPUS_API_BASEURL+'serial/title/issn/'+issn,view='CITESCORE')
             if result:
-                entry = result['serial-metadata-response']['entry'][0]
-                assert( isinstance(entry,dict))
-                j_title = entry['dc:title']
-                publisher = str(entry['dc:publisher'])
-                CiteScore = entry.get('citeScoreYearInfoList',{}).get('citeScoreCurrentMetric','')
-                if isinstance(CiteScore,str):
-                    CiteScore = float(CiteScore) if CiteScore else 0.0
-                SJRscore = entry.get('SJRList',{}).get('SJR',[])
-                if SJRscore:
-                    SJRscore = SJRscore[0]
-                    SJRscore = SJRscore['$'] + ' ('+SJRscore['@year']+')'
-                SNIPscore = entry.get('SNIPList',{}).get('SNIP',[])
-                if SNIPscore:
-                    SNIPscore = SNIPscore[0]
-                    SNIPscore = SNIPscore['$'] + ' ('+SNIPscore['@year']+')'
-                record = [j_title,publisher,CiteScore,SJRscore,SNIPscore]
+                record = self.__journal_record(result['serial-metadata-response']['entry'][0])
             else:
                 record = [j_title,f'with ISSN {issn} has no Scopus record' ,'','','']
                 print(f'{j_title} with ISSN {issn} has no Scopus record')
+            self.store.add_journals({issn:record})
+        return record
+
 
-            self.JournalInfo[issn] = record
-            self.params.pop('view','')
-            return record
+    def __journal_batch(self,issns:tuple[str])->dict[str,list]:
+        '''
+        output:
+            {normalized issn:record} for "issns" retrieved by one Serial Title API request.
+            ISSNs missing in batch response are retrieved one by one
+        '''
+        result = self._request(SCOPUS_API_BASEURL+'serial/title',issn=','.join(issns),view='CITESCORE',count=len(issns))
+        issn2record = dict()
+        for entry in result.get('serial-metadata-response',{}).get('entry',[]):
+            if 'error' in entry or 'dc:title' not in entry: continue
+            record = self.__journal_record(entry)
+            for issn_field in ('prism:issn','prism:eIssn'):
+                issn = normalize_issn(entry.get(issn_field,''))
+                if issn in issns:
+                    issn2record[issn] = record
+        for issn in issns:
+            if issn not in issn2record:
+                issn2record[issn] = self.__journal_info(issn)
+        return issn2record
+
+
+    def journal_metrics(self,issns:list[str],max_workers=MAX_SCOPUS_REQUESTS)->dict[str,list]:
+        '''
+        output:
+            {normalized issn:[journal_title,publisher,CiteScore,SJRscore,SNIPscore]}\n
+            ISSNs missing in self.store are retrieved in batches of JOURNAL_BATCH ISSNs by "max_workers" concurrent requests.
+            Records of every batch are added to self.store as soon as the batch is retrieved
+        '''
+        issn2record = self.store.journals(issns)
+        missing = sorted({normalize_issn(i) for i in issns if i}.difference(issn2record))
+        batches = [tuple(missing[i:i+JOURNAL_BATCH]) for i in range(0,len(missing),JOURNAL_BATCH)]
+        def add_batch(batch:tuple,results:list):
+            if results[0] is not None:
+                self.store.add_journals(results[0])
+                issn2record.update(results[0])
+
+        BulkSearch(self.__journal_batch,max_workers,'Scopus journals').run({b:[b] for b in batches},add_batch)
+        return issn2record
+
+
+    @staticmethod
+    def __add_journal_record(ref:Reference,record:list)->bool:
+        j_title,publisher,CiteScore,SJRscore,SNIPscore = record
+        if publisher:
+            ref[PUBLISHER] = [publisher]
+            ref[SCOPUS_CITESCORE] = [CiteScore]
+            ref[SCOPUS_SJR] = SJRscore
+            ref[SCOPUS_SNIP] = SNIPscore
+            return True
+        return False
+
+
+    def annotate_journals(self,references:list[Reference],max_workers=MAX_SCOPUS_REQUESTS)->int:
+        '''
+        batched version of scopus_stats4() for many references
+        output:
+            number of references annotated with PUBLISHER, SCOPUS_CITESCORE, SCOPUS_SJR, SCOPUS_SNIP
+        '''
+        issn2record = self.journal_metrics([issn for ref in references for issn in ref.get_props('ISSN')],max_workers)
+        annotated = 0
+        for ref in references:
+            for issn in ref.get_props('ISSN'):
+                record = issn2record.get(normalize_issn(issn))
+                if record and self.__add_journal_record(ref,record):
+                    annotated += 1
+                    break
+        return annotated
 
 
     def get_affiliation(self,institution:str):
@@ -146,24 +210,24 @@ class Scopus:
             canonical institution name for input institution name.  In case of multiple hits returns name of the most relevant Scopus hit  
         '''
         titlecase_institution = titlecase(institution)
-        try:
-            return str(self.AffiliationInfo[titlecase_institution])
-        except KeyError:
-            self.base_url = SCOPUS_API_BASEURL+'search/affiliation?'
-            query = f'affil({institution})'
-            self.params.update({'query': query,'sort':'relevancy'}) # ensures the most relevant hit to be 1st
-            result = self._get_results()
-            if result:
-                entry = result["search-results"]["entry"][0]
-                if 'error' in entry: return ''
-                affil_name = str(entry['affiliation-name'])
-                affil_variants = entry['name-variant']
-                for variant in affil_variants:
-                    self.AffiliationInfo[titlecase(variant['$'])] = affil_name
-                    self.AffiliationInfo[titlecase_institution] = affil_name
-                return affil_name
-            else:
-                return ''
+        affil_name = self.store.affiliation(titlecase_institution)
+        if affil_name is not None:
+            return affil_name
+        
+        query = f'affil({institution})'
+        # sort by relevancy ensures the most relevant hit to be 1st
+        result = self._request(SCOPUS_API_BASEURL+'search/affiliation',query=query,sort='relevancy')
+        if result:
+            entry = result["search-results"]["entry"][0]
+            if 'error' in entry: return ''
+            affil_name = str(entry['affiliation-name'])
+            affil_variants = entry['name-variant']
+            name2canonical = {titlecase(variant['$']):affil_name for variant in affil_variants}
+            name2canonical[titlecase_institution] = affil_name
+            self.store.add_affiliations(name2canonical)
+            return affil_name
+        else:
+            return ''
 
 
     def normalize_affiliations(self,ref:Reference):
@@ -191,14 +255,9 @@ class Scopus:
             journal_title,publisher,CiteScore,SJRscore,SNIPscore
         '''
         for issn in ref.get_props('ISSN'):
-            j_title,publisher,CiteScore,SJRscore,SNIPscore = self.__journal_info(issn,ref.journal())
-            if publisher:
-                ref[PUBLISHER] = [publisher]
-                ref[SCOPUS_CITESCORE] = [CiteScore]
-                ref[SCOPUS_SJR] = SJRscore
-                ref[SCOPUS_SNIP] = SNIPscore
-
-                return j_title,publisher,CiteScore,SJRscore,SNIPscore
+            record = self.__journal_info(issn,ref.journal())
+            if self.__add_journal_record(ref,record):
+                return tuple(record)
         return '','','','',''
     
 
@@ -210,6 +269,69 @@ class Scopus:
 
         result = self._get_results()
         return result["abstract-citations-response"]
+
+
+    def __search_citations(self,batch:tuple[str,tuple[str]])->dict[str,int]:
+        '''
+        input:
+            batch - (id_type,(identifiers))
+        output:
+            {normalized identifier:cited_by} for articles found in Scopus
+        '''
+        id_type, ids = batch
+        field = SCOPUS_ID_FIELDS[id_type]
+        query = field+'(' + ' OR '.join(f'"{i}"' for i in ids) + ')'
+        id2cited_by = dict()
+        start = 0
+        while True:
+            result = self._request(SCOPUS_API_BASEURL+'search/scopus',query=query,start=start,count=SEARCH_PAGE_SIZE,
+                                   field='eid,prism:doi,pubmed-id,citedby-count')
+            if 'search-results' not in result:
+                raise ConnectionError(f'Scopus search for {len(ids)} {id_type} identifiers failed')
+            entries = result['search-results'].get('entry',[])
+            for article in entries:
+                article_ids = {'PMID':article.get('pubmed-id'),'DOI':article.get('prism:doi'),'EID':article.get('eid')}
+                identifier = article_ids.get(id_type)
+                if identifier:
+                    id2cited_by[normalize_id(id_type,identifier)] = int(article.get('citedby-count',0))
+            start += SEARCH_PAGE_SIZE
+            if start >= int(result['search-results'].get('opensearch:totalResults',0)) or not entries:
+                return id2cited_by
+
+
+    def citation_counts(self,id_type2ids:dict[str,list[str]],max_workers=MAX_SCOPUS_REQUESTS,
+                        max_age=CITATIONS_MAX_AGE)->dict[str,dict[str,int|None]]:
+        '''
+        input:
+            id_type2ids - {id_type:[identifiers]}. Only id types from SCOPUS_ID_FIELDS are searched
+            max_age - seconds. Citation counts retrieved earlier are searched again
+        output:
+            {id_type:{normalized identifier:cited_by}}, where cited_by is None for identifiers not found in Scopus\n
+            Identifiers missing in self.store are searched in batches of CITATION_BATCH identifiers by "max_workers" concurrent requests.
+            Citation counts of every batch are added to self.store as soon as the batch is retrieved
+        '''
+        counts = dict()
+        row2queries = dict()
+        for id_type, ids in id_type2ids.items():
+            if id_type not in SCOPUS_ID_FIELDS: continue
+            counts[id_type] = self.store.citations(id_type,ids,max_age)
+            missing = sorted({normalize_id(id_type,i) for i in ids}.difference(counts[id_type]))
+            for i in range(0,len(missing),CITATION_BATCH):
+                batch = (id_type,tuple(missing[i:i+CITATION_BATCH]))
+                row2queries[batch] = [batch]
+
+        def add_batch(batch:tuple[str,tuple[str]],results:list):
+            if results[0] is None: return # failed batch will be searched by next run
+            id_type, ids = batch
+            id2cited_by = dict.fromkeys(ids)
+            id2cited_by.update({i:c for i,c in results[0].items() if i in id2cited_by})
+            self.store.add_citations(id_type,id2cited_by)
+            counts[id_type].update(id2cited_by)
+
+        if row2queries:
+            print(f'Retrieving citation counts from Scopus in {len(row2queries)} batches')
+        BulkSearch(self.__search_citations,max_workers,'Scopus citations').run(row2queries,add_batch)
+        return counts
     
 
 class AuthorRetreival(Scopus):
@@ -376,43 +498,29 @@ def loadCI(APIconfig:dict, references:set[Reference])->tuple[set[Reference], set
     Return
     ------
     articles_with_ci - {Reference} annotated with [SCOPUS_CI]\n
-    no_ci_articles - {Reference}
+    no_ci_articles - {Reference}\n
+    Citation counts are retrieved by Scopus.citation_counts() and kept in ScopusStore
     '''
-    idtype2id2ref = dict()
+    idtype2id2refs = defaultdict(lambda: defaultdict(list))
     for ref in references:
         id_type,refid = ref.get_doc_id()
-        if id_type in ARTICLE_ID_TYPES:
-            try:
-                idtype2id2ref[id_type][refid] = ref
-            except KeyError:
-                idtype2id2ref[id_type] = {refid:ref}
-
-    with ThreadPoolExecutor(100, thread_name_prefix='ScopusCI') as e:
-        scopus_futures = list()
-        for id_type, id2ref in idtype2id2ref.items():
-            ids = list(id2ref.keys())
-            for i in range(0,len(ids),100):
-                query = '{id_type}(' + ' OR '.join(ids[i:i+100])+')'
-                query = query.format(id_type=id_type)
-                search = ScopusSearch(query,APIconfig)
-                scopus_futures.append(e.submit(search._get_results))
-
-        scopus_articles = [f.result() for f in as_completed(scopus_futures)]
-        e.shutdown()
-
-    for article in scopus_articles:
-        id_type,id = ScopusSearch.get_doc_id(article)
-        try:
-            idtype2id2ref[id_type][id][SCOPUS_CI] = article['citedby-count']
-        except KeyError:
-            continue
+        if id_type in SCOPUS_ID_FIELDS:
+            idtype2id2refs[id_type][normalize_id(id_type,refid)].append(ref)
+
+    counts = Scopus(APIconfig).citation_counts({t:list(id2refs) for t,id2refs in idtype2id2refs.items()})
+    for id_type, id2refs in idtype2id2refs.items():
+        for id, refs in id2refs.items():
+            cited_by = counts[id_type].get(id)
+            if cited_by is not None:
+                for ref in refs:
+                    ref[SCOPUS_CI] = [cited_by]
     
     articles_with_ci = set()
     no_ci_articles = set()
-    for id_type, id2ref in idtype2id2ref.items():
-        for id, ref in id2ref.items():
-            assert(isinstance(ref, Reference))
-            [no_ci_articles,articles_with_ci][ref.has_property(SCOPUS_CI)].add(ref)
+    for ref in references:
+        assert(isinstance(ref, Reference))
+        if ref.get_doc_id()[0] not in ARTICLE_ID_TYPES: continue
+        [no_ci_articles,articles_with_ci][ref.has_property(SCOPUS_CI)].add(ref)
 
     return articles_with_ci, no_ci_articles
 
@@ -0,0 +1,91 @@
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Hashable
+
+MAX_CONCURRENT_SEARCHES = 16 # simultaneous searches. Requests per second are limited by transport() buckets
+
+
+class BulkSearch:
+  '''
+  asyncio driver for many blocking literature searches.\n
+  Identical queries from different rows are searched once.
+  Number of simultaneous searches is bounded by semaphore, blocking "search" function runs in thread pool.
+  Results are passed to "on_row" as soon as all queries of a row are finished
+  '''
+  def __init__(self, search:Callable[[Hashable],Any], max_concurrent=MAX_CONCURRENT_SEARCHES, name='search'):
+    '''
+    input:
+      search - function(query) returning search result. Must be thread-safe
+    '''
+    self.search = search
+    self.max_concurrent = max(1,max_concurrent)
+    self.name = name
+    self.failed = dict() # {query:exception}
+
+
+  async def __search(self, query:Hashable, request_slots:asyncio.Semaphore, executor:ThreadPoolExecutor):
+    async with request_slots:
+      try:
+        return query, await asyncio.get_running_loop().run_in_executor(executor,self.search,query)
+      except Exception as ex:
+        print(f'{self.name} for {query} failed with {ex} exception',flush=True)
+        self.failed[query] = ex
+        return query, None
+
+
+  async def run_async(self, row2queries:dict[Hashable,list[Hashable]], on_row:Callable[[Hashable,list],None])->int:
+    '''
+    input:
+      row2queries - {row:[queries]}
+      on_row - function(row,[results]) called in event loop thread when all queries of row are finished.
+      Results are in the order of row queries. Results of failed queries are None
+    output:
+      number of unique queries searched
+    '''
+    query2rows = defaultdict(list)
+    pending = dict()
+    for row, queries in row2queries.items():
+      pending[row] = len(queries)
+      [query2rows[q].append(row) for q in queries]
+      if not queries: on_row(row,[])
+
+    query2result = dict()
+    request_slots = asyncio.Semaphore(self.max_concurrent)
+    with ThreadPoolExecutor(max_workers=self.max_concurrent,thread_name_prefix=self.name) as executor:
+      tasks = [self.__search(q,request_slots,executor) for q in query2rows]
+      for finished in asyncio.as_completed(tasks):
+        query, result = await finished
+        query2result[query] = result
+        for row in query2rows[query]:
+          pending[row] -= 1
+          if not pending[row]:
+            on_row(row,[query2result[q] for q in row2queries[row]])
+    return len(query2rows)
+
+
+  def run(self, row2queries:dict[Hashable,list[Hashable]], on_row:Callable[[Hashable,list],None])->int:
+    '''
+    synchronous entry point for run_async().\n
+    Runs event loop in separate thread if called from running event loop, for example from Jupyter notebook
+    '''
+    try:
+      asyncio.get_running_loop()
+    except RuntimeError:
+      return asyncio.run(self.run_async(row2queries,on_row))
+    with ThreadPoolExecutor(max_workers=1) as e:
+      return e.submit(asyncio.run,self.run_async(row2queries,on_row)).result()
+
+
+def bulk_search(search:Callable[[Hashable],Any], queries:list[Hashable], max_concurrent=MAX_CONCURRENT_SEARCHES, name='search')->dict[Hashable,Any]:
+  '''
+  output:
+    {query:result} for unique "queries" in the order of "queries". Failed queries are omitted
+  '''
+  query2result = dict()
+  def on_row(query,results:list):
+    if results[0] is not None:
+      query2result[query] = results[0]
+  unique_queries = dict.fromkeys(queries)
+  BulkSearch(search,max_concurrent,name).run({q:[q] for q in unique_queries},on_row)
+  return {q:query2result[q] for q in unique_queries if q in query2result}
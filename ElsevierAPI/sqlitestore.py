@@ -0,0 +1,145 @@
+import os,time,sqlite3,threading
+from typing import Any,Callable
+
+
+def connect(path2db:str)->sqlite3.Connection:
+  '''
+  output:
+    autocommit SQLite connection with write-ahead log that can be used by several threads.
+    Directory for "path2db" is created if it does not exist
+  '''
+  os.makedirs(os.path.dirname(os.path.abspath(path2db)),exist_ok=True)
+  db = sqlite3.connect(path2db,check_same_thread=False,isolation_level=None)
+  db.execute('PRAGMA journal_mode=WAL')
+  db.execute('PRAGMA synchronous=NORMAL')
+  return db
+
+
+class ResultCache:
+  '''
+  SQLite table "results" with compressed query results keyed by hash of query and its parameters.\n
+  Results expire after "ttl" seconds and least recently used results are evicted when cache exceeds "max_size" bytes.
+  Results larger than "max_size" are not cached
+  '''
+  def __init__(self,path2db:str,ttl:int,max_size:int,label_columns:tuple[str,...],label_index:str):
+    '''
+    input:
+      label_columns - text columns identifying query in "results" table, used by delete()
+      label_index - name of "results" index on label_columns
+    '''
+    self.path = path2db
+    self.ttl = ttl
+    self.max_size = max_size
+    self.hits = 0
+    self.misses = 0
+    self.label_columns = label_columns
+    self.lock = threading.Lock()
+    self.db = connect(path2db)
+    label_defs = ', '.join(f'{c} TEXT NOT NULL' for c in label_columns)
+    self.db.execute(f'''CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, {label_defs},
+                    created REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL, data BLOB NOT NULL)''')
+    self.db.execute(f"CREATE INDEX IF NOT EXISTS {label_index} ON results({','.join(label_columns)})")
+    self.db.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results(accessed)')
+
+
+  def get_data(self,key:str)->bytes|None:
+    '''
+    output:
+      cached data or None if "key" is not in cache or expired
+    '''
+    with self.lock:
+      row = self.db.execute('SELECT created, data FROM results WHERE key = ?',(key,)).fetchone()
+      if row is None:
+        self.misses += 1
+        return None
+      created, data = row
+      if self.ttl and time.time() - created > self.ttl:
+        self.db.execute('DELETE FROM results WHERE key = ?',(key,))
+        self.misses += 1
+        return None
+      self.db.execute('UPDATE results SET accessed = ? WHERE key = ?',(time.time(),key))
+      self.hits += 1
+      return data
+
+
+  def put_data(self,key:str,labels:tuple[str,...],data:bytes)->bool:
+    '''
+    input:
+      labels - values of self.label_columns
+    output:
+      False if "data" is larger than self.max_size and was not cached
+    '''
+    if len(data) > self.max_size: return False
+    now = time.time()
+    marks = ','.join('?'*(len(labels)+5))
+    with self.lock:
+      self.db.execute(f'INSERT OR REPLACE INTO results VALUES ({marks})',(key,*labels,now,now,len(data),data))
+      self.__evict()
+    return True
+
+
+  def __evict(self):
+    '''
+    deletes least recently used results until cache size is below self.max_size
+    '''
+    total_size = self.db.execute('SELECT COALESCE(SUM(size),0) FROM results').fetchone()[0]
+    if total_size <= self.max_size: return
+    keys2delete = list()
+    for key, size in self.db.execute('SELECT key, size FROM results ORDER BY accessed'):
+      keys2delete.append((key,))
+      total_size -= size
+      if total_size <= self.max_size: break
+    self.db.executemany('DELETE FROM results WHERE key = ?',keys2delete)
+
+
+  def delete(self,**labels)->int:
+    '''
+    input:
+      labels - {label_column:value}, removes all results if empty
+    output:
+      number of removed results
+    '''
+    assert set(labels).issubset(self.label_columns), f'Unknown columns {set(labels)-set(self.label_columns)}'
+    where = ' AND '.join(f'{c} = ?' for c in labels)
+    with self.lock:
+      if where:
+        cursor = self.db.execute(f'DELETE FROM results WHERE {where}',tuple(labels.values()))
+      else:
+        cursor = self.db.execute('DELETE FROM results')
+      return cursor.rowcount
+
+
+  def expire(self)->int:
+    '''
+    removes results older than self.ttl
+    '''
+    if not self.ttl: return 0
+    with self.lock:
+      cursor = self.db.execute('DELETE FROM results WHERE created < ?',(time.time()-self.ttl,))
+      return cursor.rowcount
+
+
+  def close(self):
+    with self.lock:
+      self.db.close()
+
+
+class SharedStores:
+  '''
+  process-wide registry of SQLite stores: all clients using the same SQLite file share one store
+  '''
+  def __init__(self):
+    self.stores = dict() # {abspath:store}
+    self.lock = threading.Lock()
+
+
+  def get(self,path2db:str,factory:Callable[[str],Any]):
+    '''
+    input:
+      factory - function(abspath) making new store
+    '''
+    path2db = os.path.abspath(path2db)
+    with self.lock:
+      if path2db not in self.stores:
+        self.stores[path2db] = factory(path2db)
+      return self.stores[path2db]
@@ -0,0 +1,220 @@
+import time,threading,requests
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from collections import defaultdict
+
+POOL_SIZE = 32 # keep-alive connections per host shared by all threads
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 300 # seconds. Longer Retry-After is treated as failure
+# requests per second allowed by public APIs. Hosts not listed here are not rate limited
+HOST_RATES = {
+  'api.elsevier.com': 3.0, # Scopus and Pharmapendium
+  'eutils.ncbi.nlm.nih.gov': 3.0, # 10 with NCBI API key
+  'pubchem.ncbi.nlm.nih.gov': 5.0,
+  'www.ncbi.nlm.nih.gov': 3.0,
+  }
+
+
+class TokenBucket:
+  '''
+  allows "rate" requests per second on average with bursts up to "capacity" requests
+  '''
+  def __init__(self, rate:float, capacity:float=0.0):
+    self.rate = rate
+    self.capacity = capacity if capacity else max(1.0,rate)
+    self.tokens = self.capacity
+    self.updated = time.monotonic()
+    self.lock = threading.Lock()
+
+
+  def acquire(self)->float:
+    '''
+    output:
+      seconds spent waiting for token
+    '''
+    waited = 0.0
+    while True:
+      with self.lock:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now-self.updated)*self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+          self.tokens -= 1.0
+          return waited
+        wait = (1.0-self.tokens)/self.rate
+      time.sleep(wait)
+      waited += wait
+
+
+  def pause(self, seconds:float):
+    '''
+    empties bucket for "seconds" to honour Retry-After from server
+    '''
+    with self.lock:
+      self.tokens = min(self.tokens, 0.0) - seconds*self.rate
+      self.updated = time.monotonic()
+
+
+class EndpointStats:
+  def __init__(self):
+    self.requests = 0
+    self.errors = 0
+    self.retries = 0
+    self.latency = 0.0
+    self.max_latency = 0.0
+    self.throttled = 0.0
+    self.lock = threading.Lock()
+
+
+  def add(self, latency:float, throttled:float, is_error:bool):
+    with self.lock:
+      self.requests += 1
+      self.latency += latency
+      self.max_latency = max(self.max_latency,latency)
+      self.throttled += throttled
+      if is_error: self.errors += 1
+
+
+  def retry(self):
+    with self.lock:
+      self.retries += 1
+
+
+  def todict(self)->dict[str,float]:
+    with self.lock:
+      return {'requests':self.requests,'errors':self.errors,'retries':self.retries,
+              'mean latency':self.latency/self.requests if self.requests else 0.0,
+              'max latency':self.max_latency,'rate limit wait':self.throttled}
+
+
+def endpoint(url:str)->str:
+  '''
+  output:
+    host and path of "url" with path segments containing digits replaced by "{id}"
+  '''
+  parsed = urlparse(url)
+  segments = ['{id}' if any(c.isdigit() for c in s) else s for s in parsed.path.split('/')]
+  return parsed.netloc + '/'.join(segments)
+
+
+def retry_after(response:requests.Response)->float|None:
+  '''
+  output:
+    seconds from Retry-After header or None if header is missing or invalid
+  '''
+  value = response.headers.get('Retry-After')
+  if not value: return None
+  try:
+    return max(0.0,float(value))
+  except ValueError:
+    try:
+      return max(0.0,parsedate_to_datetime(value).timestamp()-time.time())
+    except (TypeError, ValueError):
+      return None
+
+
+class Transport:
+  '''
+  keep-alive HTTP connection pools shared by literature API clients.\n
+  Requests are rate limited by token bucket of their host.
+  Responses with status in RETRY_STATUSES and connection errors are retried with exponential backoff,
+  429 and 503 responses wait for Retry-After
+  '''
+  def __init__(self, host_rates:dict[str,float]=HOST_RATES, pool_size=POOL_SIZE):
+    self.session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    self.session.mount('https://', adapter)
+    self.session.mount('http://', adapter)
+    self.buckets = {host:TokenBucket(rate) for host,rate in host_rates.items()}
+    self.stats = defaultdict(EndpointStats)
+    self.lock = threading.Lock()
+
+
+  def set_rate(self, host:str, rate:float, capacity:float=0.0):
+    '''
+    limits requests to "host" by "rate" requests per second. Existing bucket with the same rate is kept
+    '''
+    with self.lock:
+      bucket = self.buckets.get(host)
+      if bucket is None or bucket.rate != rate or (capacity and bucket.capacity != capacity):
+        self.buckets[host] = TokenBucket(rate,capacity)
+
+
+  def request(self, method:str, url:str, retries=5, backoff_factor=1.0, timeout=120, **kwargs)->requests.Response:
+    '''
+    input:
+      kwargs - arguments of requests.Session.request: params, headers, data, json, verify
+    output:
+      last response. Raises requests.RequestException if connection failed after all retries
+    '''
+    bucket = self.buckets.get(urlparse(url).netloc)
+    with self.lock:
+      stats = self.stats[endpoint(url)]
+    for attempt in range(retries+1):
+      throttled = bucket.acquire() if bucket else 0.0
+      start = time.monotonic()
+      try:
+        response = self.session.request(method, url, timeout=timeout, **kwargs)
+      except (requests.ConnectionError, requests.Timeout):
+        stats.add(time.monotonic()-start, throttled, True)
+        if attempt == retries: raise
+        stats.retry()
+        time.sleep(backoff_factor * 2**attempt)
+        continue
+
+      stats.add(time.monotonic()-start, throttled, response.status_code >= 400)
+      if response.status_code not in RETRY_STATUSES or attempt == retries:
+        return response
+
+      stats.retry()
+      wait = retry_after(response) if response.status_code in (429,503) else None
+      if wait is None:
+        wait = backoff_factor * 2**attempt
+      elif wait > MAX_RETRY_AFTER:
+        return response
+      if bucket: bucket.pause(wait)
+      else: time.sleep(wait)
+    return response
+
+
+  def get(self, url:str, **kwargs)->requests.Response:
+    return self.request('GET', url, **kwargs)
+
+
+  def post(self, url:str, **kwargs)->requests.Response:
+    return self.request('POST', url, **kwargs)
+
+
+  def metrics(self)->dict[str,dict[str,float]]:
+    '''
+    output:
+      {endpoint:{'requests','errors','retries','mean latency','max latency','rate limit wait'}}, latencies in seconds
+    '''
+    with self.lock:
+      return {e:s.todict() for e,s in sorted(self.stats.items())}
+
+
+  def print_metrics(self):
+    for e, m in self.metrics().items():
+      print(f"{e}: {m['requests']} requests, {m['errors']} errors, {m['retries']} retries, "
+            f"mean latency {m['mean latency']:.3f} sec, max latency {m['max latency']:.3f} sec, rate limit wait {m['rate limit wait']:.1f} sec")
+
+
+  def close(self):
+    self.session.close()
+
+
+__transport__ = None
+__transport_lock__ = threading.Lock()
+
+def transport()->Transport:
+  '''
+  output:
+    Transport shared by all API clients in the process
+  '''
+  global __transport__
+  with __transport_lock__:
+    if __transport__ is None:
+      __transport__ = Transport()
+    return __transport__
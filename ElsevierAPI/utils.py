@@ -1,5 +1,5 @@
 
-import time,sys,os,json, requests,re,traceback,urllib3,unicodedata,certifi
+import time,sys,os,json, requests,re,traceback,unicodedata,certifi
 from urllib.parse import quote as urlencode
 from collections import Counter
 from itertools import chain as iterchain
@@ -10,6 +10,7 @@ from xml.dom import minidom
 from requests.auth import HTTPBasicAuth
 from lxml import etree as et
 from concurrent.futures import ThreadPoolExecutor,as_completed
+from .transport import transport,RETRY_STATUSES
 
 DEFAULT_CONFIG_DIR = os.path.join(os.getcwd(),'ENTELLECT_API/ElsevierAPI/')
 DEFAULT_APICONFIG = os.path.join(DEFAULT_CONFIG_DIR,'APIconfig.json')
@@ -445,32 +446,23 @@ def bisect(data_list:list, criterion):
     return bisector_index
 
 
-def attempt_request4(url:str,retries=10,backoff_factor=1):
-  retry_strategy = urllib3.Retry(
-    total=retries,
-    backoff_factor=backoff_factor,
-    status_forcelist=[429, 500, 502, 503, 504]
-    )
-  
-  http = urllib3.PoolManager(
-        cert_reqs='CERT_REQUIRED',  # Ensure certificate verification is required
-        ca_certs=certifi.where(),    # Use certifi's CA bundle
-        retries=retry_strategy
-    )
-  
+def attempt_request4(url:str,retries=10,backoff_factor=1)->requests.Response|None:
+  '''
+  output:
+    response from shared keep-alive transport rate limited by host or None if request failed after "retries"
+  '''
   try:
-    return http.request('GET', url)
-  except urllib3.exceptions.MaxRetryError as e:
-      print(f"Error: Max retries exceeded: {e}")
-      if e.reason:
-          print(f"  Reason: {e.reason}")
+    response = transport().get(url,retries=retries,backoff_factor=backoff_factor,verify=certifi.where())
+    if response.status_code in RETRY_STATUSES:
+      print(f"Error: Max retries exceeded for {url} with status {response.status_code}")
       return None
-  except urllib3.exceptions.NewConnectionError as e:
-      print(f"Connection Error: {e}")
-      return None
-  except urllib3.exceptions.SSLError as e:
+    return response
+  except requests.exceptions.SSLError as e:
       print(f"SSL Error: {e}")
       return None
+  except requests.ConnectionError as e:
+      print(f"Connection Error: {e}")
+      return None
   except Exception as e:
       print(f"An unexpected error occurred: {e}")
       return None
@@ -0,0 +1,232 @@
+#!/bin/python3 -u
+
+import logging, os, io, csv, argparse, textwrap
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from datetime import datetime
+from lxml import etree as et
+import psycopg2
+
+from src.logging import start_logging
+from readresnet import parseResnetElem
+
+# tables loaded from RNEF dump in the order of tuples made by parseResnetElem.
+# True - rows are deduplicated by the hash in the first column
+TABLES = {"attr":True, "node":True, "control":True, "reference":False, "pathway":True}
+STAGING = "_staging" # suffix for unlogged tables receiving COPY streams from parsing processes
+COPY_BUFFER_SIZE = 16*1024*1024 # bytes of CSV buffered by every table before COPY FROM STDIN
+RECENT_HASHES = 100000 # default number of most recent hashes per table in every parsing process used to skip duplicate rows before COPY
+
+
+class RecentHashes:
+  '''
+  bounded memory filter of duplicate hashes.\n
+  Remembers only "capacity" most recently seen hashes, therefore rows that passed the filter may still
+  have duplicates in staging tables. Exact deduplication is done by merge_staging() in the database
+  '''
+  def __init__(self, capacity=RECENT_HASHES):
+    self.capacity = capacity
+    self.hashes = OrderedDict()
+
+
+  def add(self, hcode)->bool:
+    '''
+    output:
+      True if hcode was not seen among recent hashes
+    '''
+    if hcode in self.hashes:
+      self.hashes.move_to_end(hcode)
+      return False
+    self.hashes[hcode] = None
+    if len(self.hashes) > self.capacity:
+      self.hashes.popitem(last=False)
+    return True
+
+
+def csvalue(value):
+  '''
+  output:
+    value formatted for COPY in CSV format. Lists are written as Postgres arrays
+  '''
+  if isinstance(value, (list, tuple)):
+    return "{" + ",".join(map(str, value)) + "}"
+  return value
+
+
+class CopyWriter:
+  '''
+  streams rows into "table" with COPY FROM STDIN in CSV format
+  '''
+  def __init__(self, cursor, table:str, dedup=True, buffer_size=COPY_BUFFER_SIZE, recent_hashes=RECENT_HASHES):
+    self.cursor = cursor
+    self.table = table
+    self.recent = RecentHashes(recent_hashes) if dedup and recent_hashes > 0 else None
+    self.buffer_size = buffer_size
+    self.buffer = io.StringIO()
+    self.writer = self.__csv_writer()
+    self.rows = 0
+    self.skipped = 0
+
+
+  def __csv_writer(self):
+    # COPY in CSV format loads unquoted empty values as NULL. Quoting keeps empty strings in text columns
+    return csv.writer(self.buffer, lineterminator="\n", quoting=csv.QUOTE_NONNUMERIC)
+
+
+  def write(self, row:tuple):
+    if self.recent is not None and not self.recent.add(row[0]):
+      self.skipped += 1
+      return
+    self.writer.writerow([csvalue(v) for v in row])
+    self.rows += 1
+    if self.buffer.tell() >= self.buffer_size:
+      self.flush()
+
+
+  def flush(self):
+    if self.buffer.tell():
+      self.buffer.seek(0)
+      self.cursor.copy_expert(f"COPY {self.table} FROM STDIN WITH (FORMAT csv)", self.buffer)
+      self.buffer = io.StringIO()
+      self.writer = self.__csv_writer()
+
+
+def copy_resnet(path2rnef:str, dsn:str, schema:str, recent_hashes:int = RECENT_HASHES):
+  '''
+  input:
+    path2rnef - RNEF file parsed by lxml.iterparse one <resnet> at a time
+    recent_hashes - number of most recent hashes remembered for every deduplicated table. 0 disables filtering before COPY
+  output:
+    control_count, pathway_count, invalid_rnef_attrs, {table:(copied rows, skipped duplicates)}
+  '''
+  start = datetime.now()
+  invalid_rnef_attrs = set()
+  control_counter = 0
+  pathway_counter = 0
+  db = psycopg2.connect(dsn)
+  try:
+    with db.cursor() as cursor:
+      writers = [CopyWriter(cursor, f"{schema}.{t}{STAGING}", dedup, recent_hashes=recent_hashes) for t, dedup in TABLES.items()]
+      context = et.iterparse(path2rnef, tag="resnet", recover=True, huge_tree=True)
+      for resnet_counter, (_, elem) in enumerate(context, 1):
+        # attachments are not loaded into database
+        for attachments in elem.findall("attachments"):
+          elem.remove(attachments)
+        attributes, nodes, controls, references, pathways, invalid_attrs = parseResnetElem(elem)
+        invalid_rnef_attrs.update(invalid_attrs)
+        for writer, rows in zip(writers, (attributes, nodes, controls, references, pathways)):
+          [writer.write(r) for r in rows]
+        control_counter += len(controls)
+        pathway_counter += len(pathways)
+        if resnet_counter%50000 == 0:
+          print(f'Processed {resnet_counter} resnet sections from {path2rnef} in {datetime.now()-start}')
+        elem.clear()
+        while elem.getprevious() is not None:
+          del elem.getparent()[0]
+      del context
+
+      [w.flush() for w in writers]
+    db.commit()
+  finally:
+    db.close()
+
+  print(f'Finished copying {control_counter} controls and {pathway_counter} pathways in {datetime.now()-start} from {path2rnef} file')
+  return control_counter, pathway_counter, invalid_rnef_attrs, {t:(w.rows, w.skipped) for t, w in zip(TABLES, writers)}
+
+
+def create_staging(dsn:str, schema:str):
+  '''
+  creates empty unlogged copies of tables in "schema" to receive COPY streams
+  '''
+  db = psycopg2.connect(dsn)
+  try:
+    with db.cursor() as cursor:
+      for table in TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {schema}.{table}{STAGING}")
+        cursor.execute(f"CREATE UNLOGGED TABLE {schema}.{table}{STAGING} (LIKE {schema}.{table} INCLUDING DEFAULTS)")
+    db.commit()
+  finally:
+    db.close()
+
+
+def merge_staging(dsn:str, schema:str):
+  '''
+  moves rows from staging tables into tables in "schema".\n
+  Rows with hashes existing in the table or in other staging rows are skipped
+  '''
+  db = psycopg2.connect(dsn)
+  try:
+    with db.cursor() as cursor:
+      for table, dedup in TABLES.items():
+        start = datetime.now()
+        staging = f"{schema}.{table}{STAGING}"
+        if dedup:
+          cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_schema = %s AND table_name = %s AND ordinal_position = 1", (schema, table))
+          key = cursor.fetchone()[0]
+          cursor.execute(f'''INSERT INTO {schema}.{table} SELECT DISTINCT ON (s.{key}) s.* FROM {staging} s
+                         WHERE NOT EXISTS (SELECT 1 FROM {schema}.{table} t WHERE t.{key} = s.{key})''')
+        else:
+          cursor.execute(f"INSERT INTO {schema}.{table} SELECT * FROM {staging}")
+        print(f'Added {cursor.rowcount} rows to {schema}.{table} in {datetime.now()-start}')
+        cursor.execute(f"DROP TABLE {staging}")
+    db.commit()
+  finally:
+    db.close()
+
+
+def copy_dump(dump_dir:str, dsn:str, schema:str = "resnet18", max_workers:int|None = None, recent_hashes:int = RECENT_HASHES):
+  '''
+  input:
+    dump_dir - directory with RNEF files or single RNEF file
+    dsn - libpq connection string, for example "dbname=resnet user=postgres host=localhost"
+    recent_hashes - size of duplicate filter for every deduplicated table in every worker process.
+    Memory used by filters grows with max_workers*recent_hashes
+  '''
+  start = datetime.now()
+  path = Path(dump_dir)
+  rnef_files = sorted(str(f) for f in path.glob("*.rnef")) if path.is_dir() else [str(path)]
+  create_staging(dsn, schema)
+
+  control_counter = 0
+  pathway_counter = 0
+  invalid_rnef_attrs = set()
+  table_counts = {t:[0, 0] for t in TABLES}
+  max_workers = min(max_workers or os.cpu_count() or 1, len(rnef_files)) if rnef_files else 1
+  with ProcessPoolExecutor(max_workers) as executor:
+    futures = [executor.submit(copy_resnet, f, dsn, schema, recent_hashes) for f in rnef_files]
+    for f in as_completed(futures):
+      control_count, pathway_count, invalid_attrs, counts = f.result()
+      control_counter += control_count
+      pathway_counter += pathway_count
+      invalid_rnef_attrs.update(invalid_attrs)
+      for table, (rows, skipped) in counts.items():
+        table_counts[table][0] += rows
+        table_counts[table][1] += skipped
+
+  print(f'Parsed {control_counter} controls and {pathway_counter} pathways from {len(rnef_files)} files in {datetime.now()-start}')
+  for table, (rows, skipped) in table_counts.items():
+    logging.info(f"{table}: copied {rows} rows, skipped {skipped} duplicates")
+  merge_staging(dsn, schema)
+  print('Invalid attributes in RNEF:')
+  print(invalid_rnef_attrs)
+  print(f'Loaded {dump_dir} into {schema} in {datetime.now()-start}')
+
+
+if __name__ == "__main__":
+  instructions = '''
+    dump - directory with RNEF files or single RNEF file
+    dsn - libpq connection string to database with tables attr, node, control, reference, pathway in "schema"
+    Files are parsed by separate processes streaming rows into unlogged staging tables with COPY FROM STDIN.
+    Staging tables are merged into "schema" tables after all files are parsed
+    '''
+  parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter, epilog=textwrap.dedent(instructions))
+  parser.add_argument('dump', type=str)
+  parser.add_argument('-d', '--dsn', type=str, default='dbname=resnet host=localhost')
+  parser.add_argument('-s', '--schema', type=str, default='resnet18')
+  parser.add_argument('-w', '--workers', type=int, default=None)
+  parser.add_argument('-r', '--recent-hashes', type=int, default=RECENT_HASHES, help='hashes remembered per table by every worker to skip duplicates before COPY')
+  args = parser.parse_args()
+
+  start_logging(folder=".", file=Path(args.dump).stem)
+  copy_dump(args.dump, args.dsn, args.schema, args.workers, args.recent_hashes)
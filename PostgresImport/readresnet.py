@@ -186,8 +186,16 @@ def parseResnet(resnet_xml:str):
   if "<attachments>" in resnet_xml:
     resnet_xml = re.sub("<attachments>.*</attachments>", "", resnet_xml, flags=re.M)
 
-  resnet_elem = ElementTree(ET.fromstring(resnet_xml))
-  resnet_root = resnet_elem.getroot()
+  return parseResnetElem(ET.fromstring(resnet_xml))
+
+
+def parseResnetElem(resnet_root:ET.Element):
+  '''
+  input:
+    <resnet> element parsed by xml.etree or lxml
+  output:
+    attributes, nodes, controls, references, pathways, invalid_rnef_attrs
+  '''
   nodes = []
   attributes = []
   controls = []
@@ -202,7 +210,7 @@ def parseResnet(resnet_xml:str):
   if resnet_type: # <resnet> is either Pathway or Group
     if resnet_type == "Pathway":
       isPathway = True
-      for attr in resnet_elem.findall("./properties/attr"):
+      for attr in resnet_root.findall("./properties/attr"):
         attr_tuple = indexAttribute(attr)
         resnetHashes.append(attr_tuple[0])
         # keep those attributes connected to resnet properties
@@ -212,7 +220,7 @@ def parseResnet(resnet_xml:str):
       return [], [], [], [], [], {} #attributes, nodes, controls, [], pathways, invalid_attrs
 
   nodeLocalId = {}
-  for node in resnet_elem.findall("./nodes/node"):  # node
+  for node in resnet_root.findall("./nodes/node"):  # node
     nodeRef = []
     urn = node.get("urn")
     local_id = node.get("local_id")
@@ -232,12 +240,12 @@ def parseResnet(resnet_xml:str):
         attributes.append((hcode1, name1, value1))
         nodeRef.append(hcode1)
 
-      node_tuple = (nodehash, urn, nodeName, nodeType, nodeRef)
-      nodes.append(node_tuple)
+    node_tuple = (nodehash, urn, nodeName, nodeType, nodeRef)
+    nodes.append(node_tuple)
 
   controlHashes = []
 
-  for control in resnet_elem.findall("./controls/control"):  # controls
+  for control in resnet_root.findall("./controls/control"):  # controls
     inref = []
     outref = []
     inoutref = []
@@ -343,7 +351,7 @@ def parseResnet(resnet_xml:str):
       localrefs[i] = tuple(refrow)
 
     [references.append(r) for r in localrefs]
-    # end of this control in resnet_elem.findall("./controls/control")
+    # end of this control in resnet_root.findall("./controls/control")
     #
     # use the absolute references for hash, not 'local' to enable combining unique controls
     controlHashes.append(chash)
@@ -441,4 +449,5 @@ def main(fname:str = ''):
 
 #renin-angiot-system.rnef
 # main('C:/ResnetDump/PostgresTestData/resnet18_mammal_07152025.rnef')
-main()
\ No newline at end of file
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,59 @@
+from ElsevierAPI.ResnetAPI.ResnetGraph import ResnetGraph
+from ElsevierAPI.ResnetAPI.SparseRank import SparseRanker
+import os,time,random,argparse,textwrap
+import numpy as np
+
+SAMPLE_CACHE = os.path.join(os.path.dirname(__file__),'ElsevierAPI/ResnetAPI/__pscache__/protein_expression_network.rnef')
+
+
+def assert_same_ranks(python_ranks:dict[int,float],sparse_ranks:dict[int,float]):
+  assert python_ranks.keys() == sparse_ranks.keys(), f'{len(python_ranks.keys() ^ sparse_ranks.keys())} regulators are ranked by one backend only'
+  mismatches = [uid for uid,rank in python_ranks.items() if not np.isclose(rank,sparse_ranks[uid])]
+  assert not mismatches, f'{len(mismatches)} regulators have different ranks'
+
+
+if __name__ == "__main__":
+  instructions = '''
+    infile - RNEF file with graph for regulator ranking. Default: ResnetAPI/__pscache__/protein_expression_network.rnef
+    seeds - number of randomly selected nodes with random weights used as node_weights
+    max_distance - max_distance for ResnetGraph.rank_regulators()
+    Script compares execution time of python and sparse backends of ResnetGraph.rank_regulators() and ResnetGraph.rank_regulator()
+    and fails if they produce different ranks. Same ranks are tested in tests/test_sparse_rank.py
+    '''
+  parser = argparse.ArgumentParser(formatter_class=argparse.RawDescriptionHelpFormatter,epilog=textwrap.dedent(instructions))
+  parser.add_argument('-i', '--infile', type=str, default=SAMPLE_CACHE)
+  parser.add_argument('-s', '--seeds', type=int, default=100)
+  parser.add_argument('-d', '--max_distance', type=int, default=5)
+  args = parser.parse_args()
+
+  G = ResnetGraph.fromRNEF(args.infile)
+  random.seed(0)
+  node_uids = list(G.nodes())
+  node_weights = {uid:random.random() for uid in random.sample(node_uids,min(args.seeds,len(node_uids)))}
+
+  start = time.time()
+  python_ranks = G.rank_regulators(node_weights,'python rank',args.max_distance)
+  python_time = time.time()-start
+
+  start = time.time()
+  ranker = SparseRanker(G)
+  build_time = time.time()-start
+  start = time.time()
+  sparse_ranks = G.rank_regulators(node_weights,'sparse rank',args.max_distance,backend='sparse',ranker=ranker)
+  sparse_time = time.time()-start
+
+  regulators = [G._get_node(uid) for uid in node_uids]
+  start = time.time()
+  python_rank = [G.rank_regulator(r,node_weights,args.max_distance) for r in regulators]
+  python_single_time = time.time()-start
+  start = time.time()
+  sparse_rank = [G.rank_regulator(r,node_weights,args.max_distance,backend='sparse',ranker=ranker) for r in regulators]
+  sparse_single_time = time.time()-start
+  assert_same_ranks(python_ranks,sparse_ranks)
+  assert_same_ranks(dict(enumerate(python_rank)),dict(enumerate(sparse_rank)))
+
+  print(f'Graph "{os.path.basename(args.infile)}": {G.number_of_nodes()} nodes, {G.number_of_edges()} edges, {len(node_weights)} seeds')
+  print(f'SparseRanker was built in {build_time:.3f} sec')
+  print(f'{"method":<20}{"python sec":>12}{"sparse sec":>12}')
+  print(f'{"rank_regulators":<20}{python_time:>12.3f}{sparse_time:>12.3f}')
+  print(f'{"rank_regulator":<20}{python_single_time:>12.3f}{sparse_single_time:>12.3f}')
@@ -1,4 +1,5 @@
 from ENTELLECT_API.ElsevierAPI.ResnetAPI.ResnetGraph import ResnetGraph,df
+from ENTELLECT_API.ElsevierAPI.ResnetAPI.Neo4jImport import rnef2neo4j_import
 from ENTELLECT_API.ElsevierAPI.utils import dir2flist,str2str,Tee
 import os,csv,argparse,textwrap
 
@@ -18,6 +19,11 @@ if __name__ == "__main__":
 
   args = parser.parse_args()
   resnet_dump = args.indir
+  if args.db == 'neo4j':
+    # streams RNEF files into neo4j-admin import shards without loading whole graph
+    dir_files = dir2flist(args.indir,file_ext='.rnef')
+    print(rnef2neo4j_import(dir_files,args.outdir))
+    exit()
   dump_name,_ = os.path.splitext(os.path.basename(resnet_dump))
 
   ext = '.txt'
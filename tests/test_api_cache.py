@@ -0,0 +1,76 @@
+import os
+from ElsevierAPI.ResnetAPI.ResnetGraph import ResnetGraph, REFCOUNT, EFFECT
+from ElsevierAPI.ResnetAPI.NetworkxObjects import PSObject, PSRelation
+from ElsevierAPI.ResnetAPI.ResnetAPIcache import APIcache
+
+
+def make_node(uid:int)->PSObject:
+  return PSObject({'URN':[f'urn:agi-llid:{uid}'],'Name':[f'P{uid}'],'ObjTypeName':['Protein']})
+
+
+def database_graph(dbids:range)->ResnetGraph:
+  '''
+  output:
+    graph with relations annotated by database URNs and ids as retrieved from database
+  '''
+  G = ResnetGraph()
+  for dbid in dbids:
+    regulator, target = make_node(dbid), make_node(dbid+100)
+    rel = PSRelation.make_rel(regulator,target,{'ObjTypeName':['Regulation'],EFFECT:['positive'],REFCOUNT:[dbid]},[])
+    rel['URN'] = [f'urn:agi-Regulation:db-{dbid}'] # database URN is not the URN calculated by PSRelation
+    rel['Id'] = [dbid]
+    G.add_psobjs({regulator,target})
+    G.add_rel(rel)
+  return G
+
+
+class SessionStub:
+  def __init__(self, dbids:range):
+    self.dbids = dbids
+    self.oql_cache = None
+
+  def process_oql(self, oql, request_name='', **kwargs)->ResnetGraph:
+    return database_graph(self.dbids)
+
+  def iterate_oql(self, oql, dbids, **kwargs)->ResnetGraph:
+    return database_graph([i for i in self.dbids if i in dbids])
+
+
+def make_cache(dbids:range)->APIcache:
+  cache = APIcache.__new__(APIcache)
+  cache.no_mess = True
+  cache.my_oql_queries = [('SELECT Relation WHERE objectType = Regulation','regulations')]
+  cache._APIcache__load_manifest = lambda **kwargs: dict()
+  cache._APIcache__save_manifest = lambda *args, **kwargs: None
+  cache._APIcache__dump_raw = lambda *args, **kwargs: None
+  cache._clone_session = lambda **kwargs: SessionStub(dbids)
+  return cache
+
+
+def raw_cache(dbids:range, path:str)->ResnetGraph:
+  os.makedirs(path,exist_ok=True)
+  database_graph(dbids).dump2rnef(os.path.join(path,'raw.rnef'),['Name','URN'],['URN',EFFECT,REFCOUNT])
+  return ResnetGraph.fromRNEFdir(path,merge=False)
+
+
+def test_raw_cache_urns_reconcile_with_database_scan(tmp_path):
+  raw_graph = raw_cache(range(1,7),str(tmp_path/'raw'))
+  raw_urn2rel = {rel.urn():rel for _,_,rel in raw_graph.edges.data('relation')}
+  db_manifest,_ = make_cache(range(1,7))._APIcache__scan_database()
+  assert set(raw_urn2rel) == set(db_manifest)
+  assert APIcache._urns_reconcile(raw_urn2rel,db_manifest)
+
+
+def test_incremental_update_patches_raw_cache(tmp_path):
+  raw_graph = raw_cache(range(1,7),str(tmp_path/'raw'))
+  cache = make_cache(range(2,8)) # relation 1 was deleted, relation 7 is new
+  updated = cache._APIcache__update_raw(raw_graph)
+  db_manifest,_ = cache._APIcache__scan_database()
+  assert {rel.urn(refresh=True) for _,_,rel in updated.edges.data('relation')} == set(db_manifest)
+
+
+def test_incremental_update_falls_back_when_urns_do_not_reconcile(tmp_path):
+  raw_graph = raw_cache(range(1,7),str(tmp_path/'raw'))
+  raw_urn2rel = {rel.urn():rel for _,_,rel in raw_graph.edges.data('relation')}
+  assert not APIcache._urns_reconcile(raw_urn2rel,{f'urn:agi-Regulation:db-{i}':[i,i] for i in range(1,7)})
+  assert make_cache(range(11,17))._APIcache__update_raw(raw_graph) is None
@@ -0,0 +1,38 @@
+from ElsevierAPI.ResnetAPI.NetworkxObjects import PSObject, PSRelation, REFCOUNT
+from ElsevierAPI.ResnetAPI.CompactObjects import CompactPSObject, CompactPSRelation
+
+
+def make_rel(props:dict)->PSRelation:
+  rel = PSRelation({'ObjTypeName':['Regulation'],'Effect':['positive'],**props})
+  rel.Nodes['Regulators'] = [PSObject({'Name':['A'],'URN':['urn:agi-llid:1'],'ObjTypeName':['Protein']})]
+  rel.Nodes['Targets'] = [PSObject({'Name':['B'],'URN':['urn:agi-llid:2'],'ObjTypeName':['Protein']})]
+  rel.PropSetToProps['1'] = {'PMID':['1'],'TextRef':['info:pmid/1#abs:1']}
+  rel.PropSetToProps['2'] = {'PMID':['2'],'TextRef':['info:pmid/2#abs:1']}
+  rel.urn()
+  return rel
+
+
+def test_hash_matches_psobject_and_psrelation():
+  rel = make_rel({REFCOUNT:['5']})
+  compact_rel = CompactPSRelation.from_psrelation(rel)
+  assert hash(compact_rel) == hash(rel)
+  node = rel.Nodes['Regulators'][0]
+  assert hash(CompactPSObject(node)) == hash(node)
+
+
+def test_count_refs_matches_psrelation():
+  for props in ({REFCOUNT:['5']},{REFCOUNT:['3','7']},{REFCOUNT:[]}):
+    rel = make_rel(props)
+    assert CompactPSRelation.from_psrelation(rel).count_refs() == rel.count_refs()
+
+
+def test_only_categorical_values_are_interned():
+  rels = list()
+  for _ in range(2):
+    rel = make_rel({REFCOUNT:['5']})
+    rel['Effect'] = [''.join(['posi','tive'])]
+    rel.PropSetToProps['1']['Sentence'] = [''.join(['A activates ','B in unique text'])]
+    rels.append(CompactPSRelation.from_psrelation(rel))
+  assert rels[0].get_prop('Effect') is rels[1].get_prop('Effect')
+  sentence1, sentence2 = [r.PropSetToProps['1']['Sentence'][0] for r in rels]
+  assert sentence1 == sentence2 and sentence1 is not sentence2
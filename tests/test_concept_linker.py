@@ -0,0 +1,80 @@
+import random
+from ElsevierAPI.ETM_API.references import SENTENCE
+from ElsevierAPI.ResnetAPI.ResnetGraph import ResnetGraph
+from ElsevierAPI.ResnetAPI.NetworkxObjects import PSObject, PSRelation
+from ElsevierAPI.ResnetAPI.ConceptLinker import ConceptLinker
+
+ID_TYPE = 'Name'
+
+
+def make_node(name:str, uid:int)->PSObject:
+  return PSObject({'URN':[f'urn:agi-test:{uid}'],'Name':[name],'ObjTypeName':['Protein']})
+
+
+def connection_graph(seed:int)->tuple[ResnetGraph,list[PSObject],list[list[str]]]:
+  '''
+  output:
+    graph where relations of different nodes cite the same articles with different sentences, concepts, rows of entity names
+  '''
+  random.seed(seed)
+  concepts = [make_node(f'C{i}',i) for i in range(3)]
+  entities = [make_node(f'E{i}',100+i) for i in range(12)]
+  G = ResnetGraph()
+  for entity in entities:
+    for concept in random.sample(concepts,2):
+      regulator, target = (entity,concept) if random.random() < 0.5 else (concept,entity)
+      rel = PSRelation.make_rel(regulator,target,{'ObjTypeName':['Regulation'],'Effect':['positive']},[],True)
+      for propset_id, pmid in enumerate(random.sample(range(5),3)):
+        sentence = f'{regulator.name()} activates {target.name()} in article {pmid}.'
+        rel.PropSetToProps[str(propset_id)] = {'PMID':[str(pmid)],'Title':[f'Article {pmid}'],'PubYear':['2020'],
+                                               'TextRef':[f'info:pmid/{pmid}#abs:{random.randint(1,3)}'],SENTENCE:[sentence]}
+      G.add_psobjs({regulator,target})
+      G.add_rel(rel)
+
+  names = [e.name() for e in entities]
+  rows = [random.sample(names,random.randint(1,3)) for _ in range(8)]
+  return G, concepts, rows
+
+
+def per_row_links(G:ResnetGraph, concepts:list[PSObject], rows:list[list[str]])->list[tuple[int,int]|None]:
+  '''
+  output:
+    [(refcount, number of snippets)] from row subgraphs as linked by SemanticSearch before ConceptLinker
+  '''
+  links = list()
+  for entity_ids in rows:
+    row_entities = G.psobj_with_ids(set(entity_ids),ID_TYPE)
+    if not row_entities:
+      links.append(None)
+      continue
+    row_subgraph = G.get_subgraph(row_entities,concepts)
+    references = row_subgraph.load_references()
+    snippets = sum(rel.number_of_snippets() for _,_,rel in row_subgraph.edges.data('relation'))
+    links.append((len(references),snippets))
+  return links
+
+
+def test_links_keep_snippets_of_per_row_path():
+  for seed in (0,1,2):
+    old_links = per_row_links(*connection_graph(seed)) # graph copies share relations
+    G, concepts, rows = connection_graph(seed)
+
+    linker = ConceptLinker(G,concepts,id_type=ID_TYPE)
+    row_links, references = linker.link(rows)
+    for entity_ids, row_link, old_link in zip(rows,row_links,old_links):
+      if old_link is None:
+        assert row_link is None
+        continue
+      row_entities = G.psobj_with_ids(set(entity_ids),ID_TYPE)
+      row_subgraph = G.get_subgraph(row_entities,concepts)
+      snippets = sum(rel.number_of_snippets() for _,_,rel in row_subgraph.edges.data('relation'))
+      assert (row_link[1],snippets) == old_link
+
+    for _,_,rel in G.edges.data('relation'):
+      own_rel = rel.copy()
+      own_rel.references.clear()
+      own_rel.handle2snippets.clear()
+      assert rel.number_of_snippets() == own_rel.number_of_snippets()
+      assert rel.textrefs() == own_rel.textrefs()
+    assert all(ref.handle >= 0 for ref in references) # references are interned by relations of connection graph
+    assert len(references) == len(linker.refstore)
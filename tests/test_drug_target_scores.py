@@ -0,0 +1,132 @@
+import random
+import numpy as np
+import pytest
+from ElsevierAPI.ResnetAPI.ResnetGraph import ResnetGraph, CONSISTENCY
+from ElsevierAPI.ResnetAPI.NetworkxObjects import PSObject, PSRelation
+from ElsevierAPI.ResnetAPI.DrugTargetConfidence import DrugTargetScores
+from ElsevierAPI.ResnetAPI.Drugs4Disease import Drugs4Targets
+
+
+def make_node(uid:int, objtype:str)->PSObject:
+  return PSObject({'URN':[f'urn:agi-test:{uid}'],'Name':[f'{objtype}{uid}'],'ObjTypeName':[objtype]})
+
+
+def add_rel(G:ResnetGraph, regulator:PSObject, target:PSObject, reltype:str, effect:str, props:dict={}):
+  rel_props = {'ObjTypeName':[reltype],'Effect':[effect],'RelationNumberOfReferences':[random.randint(1,10)],**props}
+  rel = PSRelation.make_rel(regulator,target,rel_props,[],is_directional=(reltype != 'Binding'))
+  G.add_psobjs({regulator,target})
+  G.add_rel(rel)
+
+
+def drug_target_graphs(seed:int)->tuple[ResnetGraph,ResnetGraph,list[PSObject],list[PSObject]]:
+  '''
+  output:
+    drugs2targets, graph used for ranking with extra drug-target relations missing in drugs2targets, drugs, targets
+  '''
+  random.seed(seed)
+  drugs = [make_node(i,'SmallMol') for i in range(30)]
+  targets = [make_node(100+i,'Protein') for i in range(40)]
+  drugs2targets = ResnetGraph()
+  for drug in drugs:
+    for target in random.sample(targets,5):
+      props = dict()
+      if random.random() < 0.5: props['Affinity'] = [round(random.uniform(4,9),2)]
+      if random.random() < 0.5: props[CONSISTENCY] = [round(random.uniform(-1,1),3)]
+      add_rel(drugs2targets,drug,target,random.choice(['DirectRegulation','Regulation','Binding']),random.choice(['positive','negative']),props)
+
+  rank_graph = drugs2targets.copy()
+  for _ in range(80):
+    regulator, target = random.sample(targets,2)
+    add_rel(rank_graph,regulator,target,'Regulation',random.choice(['positive','negative']))
+  for drug in random.sample(drugs,10): # drug-target pairs missing in drugs2targets must not be corrected
+    add_rel(rank_graph,drug,random.choice(targets),'DirectRegulation','negative',{'Affinity':[9.0]})
+  return drugs2targets, rank_graph, drugs, targets
+
+
+def old_rank(ranker:Drugs4Targets, targets:list[PSObject], drug:PSObject, in_graph:ResnetGraph, with_effect:str, correct_by_consistency:bool)->float:
+  '''
+  per-drug ranking used by Drugs4Targets before DrugTargetScores
+  '''
+  targets_uids = ResnetGraph.uids(targets)
+  target_uid2corrected_rank = {k:v for k,v in ranker.target_uid2rank.items() if k in targets_uids}
+  for target in targets:
+    target_uid = target.uid()
+    dt_rels = ranker.drugs2targets._psrels4(drug.uid(),target_uid)
+    if dt_rels:
+      dt_rel = dt_rels[0]
+      if dt_rel.isprimarytarget():
+        pX = float(dt_rels[0].get_prop('Affinity',0,6.7))
+        target_uid2corrected_rank[target_uid] *= 1.5 + pX/12.0
+      if correct_by_consistency:
+        key = (drug.uid(),target_uid,with_effect)
+        target_uid2corrected_rank[target_uid] *= 1 + ranker.dt_consist.drug_target_confidence.get(key,0.0)
+  return in_graph.rank_regulator(drug,target_uid2corrected_rank)
+
+
+class ConsistencyStub:
+  def __init__(self, drug_target_confidence:dict, network:ResnetGraph):
+    self.drug_target_confidence = drug_target_confidence
+    self.network = network
+
+  def load_scores(self)->DrugTargetScores:
+    return DrugTargetScores.from_graph(self.network)
+
+
+def make_ranker(drugs2targets:ResnetGraph, targets:list[PSObject], drugs:list[PSObject], network:ResnetGraph)->Drugs4Targets:
+  '''
+  input:
+    network - drug2target cache graph with scores sliced by ranker to pairs in "drugs2targets"
+  '''
+  ranker = Drugs4Targets.__new__(Drugs4Targets)
+  ranker.drugs2targets = drugs2targets
+  ranker.target_uid2rank = {t.uid():random.random() for t in targets}
+  ranker.dt_scores = None
+  confidence = dict()
+  for drug, target, rel in drugs2targets.iterate():
+    if rel.objtype() != 'Binding' and CONSISTENCY in rel and random.random() < 0.7:
+      confidence[(drug.uid(),target.uid(),rel.effect())] = float(rel[CONSISTENCY][-1])
+  for drug in drugs: # coefficients for pairs without relations in drugs2targets must be ignored
+    target = random.choice(targets)
+    confidence[(drug.uid(),target.uid(),random.choice(['positive','negative']))] = 0.9
+  ranker.dt_consist = ConsistencyStub(confidence,network)
+  return ranker
+
+
+@pytest.mark.parametrize('seed',[0,1,2])
+@pytest.mark.parametrize('with_effect',['positive','negative'])
+@pytest.mark.parametrize('correct_by_consistency',[True,False])
+def test_rank_matches_per_drug_rank(seed, with_effect, correct_by_consistency):
+  drugs2targets, rank_graph, drugs, targets = drug_target_graphs(seed)
+  ranker = make_ranker(drugs2targets,targets,drugs,rank_graph)
+  new_ranks = ranker._Drugs4Targets__rank(targets,drugs,rank_graph,with_effect,correct_by_consistency)
+  old_ranks = [old_rank(ranker,targets,d,rank_graph,with_effect,correct_by_consistency) for d in drugs]
+  assert np.allclose([new_ranks[d.uid()] for d in drugs],old_ranks)
+
+
+def test_cached_scores_are_invalidated_for_changed_graph(tmp_path):
+  drugs2targets, _, _, _ = drug_target_graphs(0)
+  path = str(tmp_path/'scores.npz')
+  DrugTargetScores.from_graph(drugs2targets).save(path)
+  assert DrugTargetScores.load(path,drugs2targets) is not None
+
+  _, _, rel = next(drugs2targets.iterate())
+  rel['Affinity'] = [9.5]
+  assert DrugTargetScores.load(path,drugs2targets) is None
+
+
+def test_subset_matches_scores_made_from_subgraph():
+  drugs2targets, network, _, _ = drug_target_graphs(1)
+  cache_scores = DrugTargetScores.from_graph(network)
+  metabolite = make_node(500,'SmallMol')
+  add_rel(drugs2targets,metabolite,make_node(100,'Protein'),'DirectRegulation','negative',{'Affinity':[8.0]}) # pair missing in cache
+
+  subset = cache_scores.subset(drugs2targets)
+  expected = DrugTargetScores.from_graph(drugs2targets)
+  drug_uids, target_uids = list(expected.drug_idx), list(expected.target_idx)
+  assert set(subset.drug_idx) == set(drug_uids) and set(subset.target_idx) == set(target_uids)
+  for name in DrugTargetScores.matrix_names:
+    assert len(subset.values[name]) == len(expected.values[name])
+  for with_effect in ('positive','negative'):
+    subset_corrections = subset.corrections(drug_uids,target_uids,with_effect,True).toarray()
+    expected_corrections = expected.corrections(drug_uids,target_uids,with_effect,True).toarray()
+    assert np.allclose(subset_corrections,expected_corrections)
@@ -0,0 +1,73 @@
+import io
+import pytest
+import requests
+import ElsevierAPI.NCBI.NCBIutils as NCBIutils
+from ElsevierAPI.NCBI.NCBIutils import NCBIeutils, EFETCH_RETRIES
+
+
+class ResponseStub:
+  def __init__(self, xml:str):
+    self.raw = io.BytesIO(xml.encode())
+
+  def raise_for_status(self):
+    pass
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    return False
+
+
+class TransportStub:
+  def __init__(self, responses:list[str]):
+    self.responses = responses
+    self.calls = 0
+
+  def get(self, url, **kwargs)->ResponseStub:
+    self.calls += 1
+    return ResponseStub(self.responses[min(self.calls,len(self.responses))-1])
+
+
+def articles(pmids:list[int])->str:
+  return '<PubmedArticleSet>'+''.join(f'<PubmedArticle><PMID>{p}</PMID></PubmedArticle>' for p in pmids)+'</PubmedArticleSet>'
+
+
+def efetch(monkeypatch, responses:list[str], retmax:int, parser=lambda r: int(r.findtext('PMID')))->tuple[list,TransportStub]:
+  stub = TransportStub(responses)
+  monkeypatch.setattr(NCBIutils,'transport',lambda: stub)
+  eutils = NCBIeutils('pubmed','')
+  return eutils._efetch('webenv','1',0,retmax,'PubmedArticle',parser), stub
+
+
+def test_error_response_is_retried(monkeypatch):
+  error = '<eFetchResult><ERROR>Unable to obtain query #1</ERROR></eFetchResult>'
+  records, stub = efetch(monkeypatch,[error,articles([1,2,3])],3)
+  assert records == [1,2,3]
+  assert stub.calls == 2
+
+
+def test_error_response_raises_after_retries(monkeypatch):
+  error = '<eFetchResult><ERROR>Unable to obtain query #1</ERROR></eFetchResult>'
+  with pytest.raises(requests.HTTPError):
+    efetch(monkeypatch,[error],3)
+
+
+def test_incomplete_response_is_retried(monkeypatch):
+  records, stub = efetch(monkeypatch,[articles([1]),articles([1,2,3])],3)
+  assert records == [1,2,3]
+  assert stub.calls == 2
+
+  records, stub = efetch(monkeypatch,[articles([1,2])],3)
+  assert records == [1,2] # last incomplete response is returned
+  assert stub.calls == EFETCH_RETRIES
+
+
+def test_parser_errors_skip_only_failed_records(monkeypatch):
+  def parser(record):
+    pmid = int(record.findtext('PMID'))
+    if pmid == 2: raise ValueError('bad record')
+    return pmid
+  records, stub = efetch(monkeypatch,[articles([1,2,3])],3,parser)
+  assert records == [1,3]
+  assert stub.calls == 1
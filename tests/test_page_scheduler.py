@@ -0,0 +1,30 @@
+import pytest
+from zeep import exceptions
+from requests import exceptions as req_exceptions
+from ElsevierAPI.ResnetAPI.PageScheduler import PageScheduler
+
+
+@pytest.mark.parametrize('message',['Invalid session','Session expired. Please login again','Authentication failed: wrong password',
+                                    'ORA-01017: invalid username/password; logon denied','Invalid GOQL query: unknown lock property'])
+def test_auth_and_query_faults_are_not_retried(message):
+  assert not PageScheduler.is_retriable(exceptions.Fault(message))
+
+
+@pytest.mark.parametrize('message',['Table is locked','ORA-00054: resource busy and acquire with NOWAIT specified',
+                                    'Too many sessions are open','ORA-00018: maximum number of sessions exceeded'])
+def test_lock_and_session_limit_faults_are_retried(message):
+  assert PageScheduler.is_retriable(exceptions.Fault(message))
+
+
+def test_transport_errors():
+  assert PageScheduler.is_retriable(exceptions.TransportError(status_code=503))
+  assert PageScheduler.is_retriable(exceptions.TransportError(status_code=429))
+  assert not PageScheduler.is_retriable(exceptions.TransportError(status_code=401))
+  assert PageScheduler.is_retriable(req_exceptions.ConnectionError())
+
+
+def test_backoff_is_longer_for_locks():
+  scheduler = PageScheduler(start_workers=8)
+  assert scheduler.backoff(exceptions.Fault('Table is locked')) == 10.0
+  assert scheduler.limit == 4.0
+  assert scheduler.lock_errors == 1
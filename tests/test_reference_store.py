@@ -0,0 +1,95 @@
+from ElsevierAPI.ETM_API.references import ReferenceStore, SENTENCE
+from ElsevierAPI.ResnetAPI.NetworkxObjects import PSObject, PSRelation
+from ElsevierAPI.ResnetAPI.ResnetGraph import ResnetGraph
+
+
+def make_node(name:str, urn:str)->PSObject:
+  return PSObject({'Name':[name],'URN':[urn],'ObjTypeName':['Protein']})
+
+
+def make_rel(target:str, textref:str, sentence:str)->PSRelation:
+  rel = PSRelation({'ObjTypeName':['Regulation'],'Effect':['positive']})
+  rel.Nodes['Regulators'] = [make_node('A','urn:agi-llid:1')]
+  rel.Nodes['Targets'] = [make_node(target,'urn:agi-llid:'+target)]
+  rel.PropSetToProps['1'] = {'PMID':['123'],'Title':['Shared article'],'PubYear':['2020'],
+                             'TextRef':[textref],SENTENCE:[sentence]}
+  return rel
+
+
+def two_relations()->tuple[PSRelation,PSRelation]:
+  rel1 = make_rel('B','info:pmid/123#abs:1','A activates B.')
+  rel2 = make_rel('C','info:pmid/123#abs:2','A activates C.')
+  return rel1, rel2
+
+
+def test_relations_sharing_pmid_keep_own_snippets():
+  refstore = ReferenceStore()
+  rel1, rel2 = two_relations()
+  ref1 = rel1.refs(refstore=refstore)[0]
+  ref2 = rel2.refs(refstore=refstore)[0]
+
+  assert ref1 is ref2
+  assert len(refstore) == 1
+  assert not ref1.snippets # interned reference is bibliographic only
+  assert rel1.number_of_snippets() == 1
+  assert rel2.number_of_snippets() == 1
+  assert rel1.textrefs() == ['info:pmid/123#abs:1']
+  assert rel2.textrefs() == ['info:pmid/123#abs:2']
+  assert list(ref1.sentences(rel1.ref_snippets(ref1))) == [('info:pmid/123#abs:1','A activates B')]
+  assert list(ref2.sentences(rel2.ref_snippets(ref2))) == [('info:pmid/123#abs:2','A activates C')]
+
+
+def test_interned_snippets_match_per_relation_references():
+  refstore = ReferenceStore()
+  shared = two_relations()
+  [rel.refs(refstore=refstore) for rel in shared]
+  for shared_rel, own_rel in zip(shared,two_relations()):
+    own_ref = own_rel.refs()[0]
+    assert own_ref.handle < 0
+    assert shared_rel.number_of_snippets() == own_rel.number_of_snippets()
+    assert shared_rel.textrefs() == own_rel.textrefs()
+    assert shared_rel.get_props(SENTENCE) == own_rel.get_props(SENTENCE)
+    assert shared_rel.todict(include_refs=True) == own_rel.todict(include_refs=True)
+
+
+def test_same_sentence_is_kept_by_each_relation():
+  refstore = ReferenceStore()
+  rel1 = make_rel('B','info:pmid/123#abs:1','A activates B and C.')
+  rel2 = make_rel('C','info:pmid/123#abs:2','A activates B and C.')
+  rel1.refs(refstore=refstore)
+  rel2.refs(refstore=refstore)
+  assert rel1.get_props(SENTENCE) == ['A activates B and C']
+  assert rel2.get_props(SENTENCE) == ['A activates B and C']
+
+
+def test_merged_relation_does_not_change_interned_reference():
+  refstore = ReferenceStore()
+  rel1, rel2 = two_relations()
+  interned_ref = rel1.refs(refstore=refstore)[0]
+  rel2.refs(refstore=refstore)
+
+  own1, own2 = two_relations()
+  merged = rel1.merge_rel(rel2)
+  assert merged.textrefs() == own1.merge_rel(own2).textrefs()
+  assert not interned_ref.snippets
+  assert rel1.textrefs() == ['info:pmid/123#abs:1']
+  assert rel2.textrefs() == ['info:pmid/123#abs:2']
+
+
+def test_graph_references_share_store_without_sharing_weights():
+  refstore = ReferenceStore()
+  graphs = list()
+  for rel in two_relations():
+    G = ResnetGraph()
+    G.add_psobjs(set(rel.Nodes['Regulators']+rel.Nodes['Targets']))
+    G.add_rel(rel)
+    graphs.append(G)
+
+  refs1 = graphs[0].load_references(refstore=refstore)
+  refs2 = graphs[1].load_references(refstore=refstore)
+  assert refs1 == refs2 and next(iter(refs1)) is next(iter(refs2))
+  assert graphs[0].number_of_snippets() == graphs[1].number_of_snippets() == 1
+
+  graphs[0].add_node_weight2ref({'urn:agi-llid:1':5.0},{})
+  graphs[1].add_node_weight2ref({'urn:agi-llid:1':1.0},{})
+  assert next(iter(refs2)).get_weight('nodeweight') == 1.0
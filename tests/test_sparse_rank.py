@@ -0,0 +1,53 @@
+import os,random
+import numpy as np
+import pytest
+from ElsevierAPI.ResnetAPI.ResnetGraph import ResnetGraph
+from ElsevierAPI.ResnetAPI.NetworkxObjects import PSObject, PSRelation
+from ElsevierAPI.ResnetAPI.SparseRank import SparseRanker
+
+SAMPLE_CACHE = os.path.join(os.path.dirname(__file__),'..','ElsevierAPI','ResnetAPI','__pscache__','protein_expression_network.rnef')
+
+
+def random_graph(node_count=200, rel_count=1000, seed=0)->ResnetGraph:
+  random.seed(seed)
+  nodes = [PSObject({'URN':[f'urn:agi-llid:{i}'],'Name':[f'N{i}'],'ObjTypeName':['Protein']}) for i in range(node_count)]
+  G = ResnetGraph()
+  for _ in range(rel_count):
+    regulator, target = random.sample(nodes,2)
+    reltype = random.choice(['Regulation','Expression','Binding','DirectRegulation'])
+    props = {'ObjTypeName':[reltype],'Effect':[random.choice(['positive','negative','unknown'])]}
+    rel = PSRelation.make_rel(regulator,target,props,[],is_directional=(reltype != 'Binding'))
+    G.add_psobjs({regulator,target})
+    G.add_rel(rel)
+  return G
+
+
+def random_seeds(G:ResnetGraph, seed_count:int, seed=0)->dict[int,float]:
+  random.seed(seed)
+  node_uids = list(G.nodes())
+  return {uid:random.uniform(-1,2) for uid in random.sample(node_uids,min(seed_count,len(node_uids)))}
+
+
+def assert_same_ranks(G:ResnetGraph, node_weights:dict[int,float], max_distance:int):
+  python_ranks = G.rank_regulators(node_weights,'python rank',max_distance)
+  ranker = SparseRanker(G)
+  sparse_ranks = G.rank_regulators(node_weights,'sparse rank',max_distance,backend='sparse',ranker=ranker)
+  assert list(python_ranks) == list(sparse_ranks)
+  assert np.allclose(list(python_ranks.values()),list(sparse_ranks.values()))
+
+  regulators = [G._get_node(uid) for uid in G.nodes()]
+  python_rank = [G.rank_regulator(r,node_weights,max_distance) for r in regulators]
+  sparse_rank = [G.rank_regulator(r,node_weights,max_distance,backend='sparse',ranker=ranker) for r in regulators]
+  assert np.allclose(python_rank,sparse_rank)
+
+
+@pytest.mark.parametrize('max_distance',[1,2,5])
+@pytest.mark.parametrize('seed',[0,1])
+def test_sparse_backend_ranks_random_graph(max_distance, seed):
+  G = random_graph(seed=seed)
+  assert_same_ranks(G,random_seeds(G,50,seed),max_distance)
+
+
+def test_sparse_backend_ranks_sample_cache():
+  G = ResnetGraph.fromRNEF(SAMPLE_CACHE)
+  assert_same_ranks(G,random_seeds(G,100),5)